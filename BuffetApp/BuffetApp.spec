@@ -1,8 +1,7 @@
 """BuffetApp.spec
 Optimizada para tamaño: se eliminaron pandas/numpy porque:
  - numpy: no hay ningun import.
- - pandas: solo se usa de forma diferida en historial_view para exportar (import pandas as pd dentro de una función). Si el usuario NO exporta, no se necesita. Para reducir MB no lo incluimos por defecto.
-Si se requiere soporte de exportación a Excel en un futuro, instalar pandas y añadirlo manualmente.
+ - pandas: ya no se usa; la exportación a Excel/CSV (exportador.py) escribe el XLSX con la librería estándar.
 """
 from PyInstaller.building.build_main import Analysis, PYZ, EXE, COLLECT
 from pathlib import Path
@@ -1,7 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from db_utils import get_connection
+from virtual_treeview import VirtualTreeview
 from init_db import log_error
+from busqueda import filtro_productos, filtro_tickets
+from monitor_cambios import get_monitor
 
 class TicketCajaActualView(tk.Frame):
     def __init__(self, master, controller=None):
@@ -10,6 +13,12 @@ class TicketCajaActualView(tk.Frame):
         self._build_ui()
         self._load_productos_lista()
         self._load_data()
+        # Ventas y anulaciones hechas desde otro equipo (o el hilo escritor) se ven sin tocar Actualizar
+        get_monitor().suscribir(self, ('tickets', 'ventas'), self._on_cambios)
+
+    def _on_cambios(self, _tablas):
+        if self._get_caja_abierta_id():
+            self._load_data(conservar=True)
 
     def _build_ui(self):
         tk.Label(self, text="Tickets de la caja actual", font=("Arial", 18)).pack(pady=(10,6))
@@ -18,14 +27,15 @@ class TicketCajaActualView(tk.Frame):
         top.pack(fill=tk.X, padx=8, pady=(0,8))
         # Ir a Ventas (volver)
         tk.Button(top, text="Ir a Ventas", command=self._volver).pack(side=tk.LEFT, padx=(0,8))
-        # Filtro producto (Combobox desplegable)
+        # Filtro producto: elegir de la lista o escribir parte del nombre/código o del identificador de ticket (Enter)
         prod_frame = tk.Frame(top)
         prod_frame.pack(side=tk.LEFT, padx=(0,10))
-        tk.Label(prod_frame, text="Producto:", font=("Arial", 10)).pack(anchor="w")
+        tk.Label(prod_frame, text="Producto / ticket:", font=("Arial", 10)).pack(anchor="w")
         self.var_producto = tk.StringVar(value="(Todos)")
-        self.cmb_productos = ttk.Combobox(prod_frame, textvariable=self.var_producto, state='readonly', width=30)
+        self.cmb_productos = ttk.Combobox(prod_frame, textvariable=self.var_producto, width=30)
         self.cmb_productos.pack()
         self.cmb_productos.bind('<<ComboboxSelected>>', lambda e: self._load_data())
+        self.cmb_productos.bind('<Return>', lambda e: self._load_data())
         # Filtro estado
         state_frame = tk.Frame(top)
         state_frame.pack(side=tk.LEFT, padx=(10,10))
@@ -42,11 +52,15 @@ class TicketCajaActualView(tk.Frame):
         # Tree
         content = tk.Frame(self)
         content.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0,6))
-        self.tree = ttk.Treeview(
+        # Tabla virtual: sólo las filas visibles son ítems de Tk; el orden por columna lo resuelve SQL
+        self.tree = VirtualTreeview(
             content,
             columns=("fecha_hora","item","total","categoria","status","codigo_caja","identificador","metodo_pago"),
-            show='headings'
+            show='headings',
+            etiquetas=lambda fila: ('anul',) if str(fila[4]).lower() == 'anulado' else (),
+            on_sort=lambda _col, _desc: self._load_data(),
         )
+        self.tree.tag_configure('anul', background='#D3D3D3')
         self.tree.heading("fecha_hora", text="Fecha")
         self.tree.heading("item", text="Item")
         self.tree.heading("total", text="Monto Total")
@@ -122,11 +136,11 @@ class TicketCajaActualView(tk.Frame):
             except Exception:
                 pass
 
-    def _load_data(self):
+    def _load_data(self, conservar=False):
         caja_id = self._get_caja_abierta_id()
         if not caja_id:
             messagebox.showinfo("Tickets", "No hay caja abierta.")
-            self.tree.delete(*self.tree.get_children())
+            self.tree.limpiar()
             return
         # Producto seleccionado en Combobox ("(Todos)" = sin filtro)
         prod_f = ''
@@ -150,19 +164,30 @@ class TicketCajaActualView(tk.Frame):
                 "WHERE v.caja_id = ? "
             )
             params = [caja_id]
-            if prod_f:
+            if prod_f and prod_f in self.cmb_productos['values']:
                 base += "AND p.nombre = ? "
                 params.append(prod_f)
+            elif prod_f:
+                # Texto escrito: producto o identificador de ticket por el índice FTS
+                cond_prod, params_prod = filtro_productos(prod_f, "vi.producto_id")
+                cond_tick, params_tick = filtro_tickets(prod_f, "vi.ticket_id")
+                base += f"AND ({cond_prod} OR {cond_tick}) "
+                params += params_prod + params_tick
             if est and est != 'Todos':
                 base += "AND t.status = ? "
                 params.append(est)
+            orden = self.tree.orden
+            if orden and orden[0] in self._ORDEN_SQL:
+                order_by = f"{self._ORDEN_SQL[orden[0]]} {'DESC' if orden[1] else 'ASC'}, v.id, t.categoria_id"
+            else:
+                order_by = "v.fecha_hora DESC, v.id, t.categoria_id"
             sel = (
                 "SELECT v.fecha_hora, p.nombre, vi.subtotal, c.descripcion, t.status, cd.codigo_caja, t.identificador_ticket, mp.descripcion "
-                + base + " ORDER BY v.fecha_hora DESC, v.id, t.categoria_id"
+                + base + " ORDER BY " + order_by
             )
             cur.execute(sel, params)
             rows = cur.fetchall(); conn.close()
-            self._fill_tree(rows)
+            self._fill_tree(rows, conservar)
         except Exception as e:
             import datetime, traceback
             fecha_hora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -176,19 +201,23 @@ class TicketCajaActualView(tk.Frame):
                 pass
             messagebox.showerror("Error", "No se pudo cargar los tickets de la caja actual.")
 
-    def _fill_tree(self, rows):
-        self.tree.delete(*self.tree.get_children())
+    # Columna de la tabla -> expresión SQL para ordenar
+    _ORDEN_SQL = {
+        "fecha_hora": "v.fecha_hora", "item": "p.nombre", "total": "vi.subtotal", "categoria": "c.descripcion",
+        "status": "t.status", "codigo_caja": "cd.codigo_caja", "identificador": "t.identificador_ticket",
+        "metodo_pago": "mp.descripcion",
+    }
+
+    def _fill_tree(self, rows, conservar=False):
+        filas = []
         for r in rows:
             fecha_hora, nombre, subtotal, categoria, status, codigo_caja, identificador, mp = r
             try:
                 monto_str = f"$ {int(round(float(subtotal))):,}".replace(",", ".")
             except Exception:
                 monto_str = f"$ {subtotal}"
-            bg = '#D3D3D3' if str(status).lower() == 'anulado' else ''
-            iid = self.tree.insert('', tk.END, values=(fecha_hora, nombre, monto_str, categoria, status, codigo_caja, identificador, mp or '' ))
-            if bg:
-                self.tree.item(iid, tags=('anul',))
-                self.tree.tag_configure('anul', background=bg)
+            filas.append((fecha_hora, nombre, monto_str, categoria, status, codigo_caja, identificador, mp or ''))
+        self.tree.set_filas(filas, conservar=conservar)
 
     def _get_selected_ticket_id(self):
         sel = self.tree.selection()
@@ -265,24 +294,15 @@ class TicketCajaActualView(tk.Frame):
             return
         if not messagebox.askyesno("Anular Ticket", "¿Confirma que desea anular el ticket seleccionado?"):
             return
-        try:
-            conn = get_connection(); cur = conn.cursor()
-            cur.execute("UPDATE tickets SET status='Anulado' WHERE id=?", (tid,))
-            # Devolver stock de productos si contabiliza_stock=1
-            cur.execute("SELECT producto_id, cantidad FROM venta_items WHERE ticket_id=?", (tid,))
-            items = cur.fetchall()
-            for prod_id, cantidad in items:
-                try:
-                    cur.execute("SELECT COALESCE(contabiliza_stock,1) FROM products WHERE id=?", (prod_id,))
-                    row = cur.fetchone(); contabiliza = int(row[0]) if row and row[0] is not None else 1
-                except Exception:
-                    contabiliza = 1
-                if contabiliza == 1:
-                    cur.execute("UPDATE products SET stock_actual = COALESCE(stock_actual,0) + ? WHERE id=?", (cantidad, prod_id))
-            conn.commit(); conn.close()
+        # Misma anulación que el historial: stock, caja_resumen y ventas_diarias en una transacción
+        from sales_service import anular_ticket
+        from db_writer import get_writer
+
+        def _ok(_result):
             self._load_data()
             messagebox.showinfo("Anular Ticket", "Ticket anulado y stock actualizado.")
-        except Exception as e:
+
+        def _error(e):
             import datetime, traceback
             fecha_hora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             tb = traceback.extract_tb(e.__traceback__)
@@ -295,6 +315,9 @@ class TicketCajaActualView(tk.Frame):
                 pass
             messagebox.showerror("Anular Ticket", "No se pudo anular el ticket.")
 
+        # Marcar como anulado y devolver stock en el hilo escritor
+        get_writer().submit(anular_ticket, tid, on_done=_ok, on_error=_error)
+
     def _volver(self):
         if self.controller and hasattr(self.controller, 'mostrar_ventas'):
             self.controller.mostrar_ventas()
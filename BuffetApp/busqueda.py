@@ -0,0 +1,85 @@
+"""Búsqueda de productos y tickets con índices FTS5.
+
+products_fts indexa nombre y codigo_producto; tickets_fts, identificador_ticket.
+Son tablas FTS5 de contenido externo (no duplican el texto) que mantienen al
+día los triggers de la migración 006, con el tokenizador unicode61 y
+remove_diacritics, así "cafe" encuentra "Café" igual que _normalize_text.
+
+Cada palabra buscada se toma como prefijo de una palabra indexada ("coca co"
+encuentra "Coca Cola"; "bar-0001-00" encuentra "BAR-0001-00042"), y todas
+tienen que aparecer. Las vistas usan filtro_productos()/filtro_tickets() como
+una condición más del WHERE. Si el SQLite instalado no trae FTS5 (la migración
+no crea las tablas), los filtros caen a LIKE por subcadena: andan, pero recorren
+la tabla.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+
+from db_utils import get_connection
+
+_TABLAS_FTS = ('products_fts', 'tickets_fts')
+_disponible = None
+
+
+def fts_disponible(cursor=None) -> bool:
+    """True si la base tiene los índices FTS (una vez encontrados no se vuelve a consultar)."""
+    global _disponible
+    if not _disponible:
+        try:
+            cur = cursor if cursor is not None else get_connection().cursor()
+            cur.execute(
+                f"SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name IN ({','.join('?' * len(_TABLAS_FTS))})",
+                _TABLAS_FTS,
+            )
+            _disponible = cur.fetchone()[0] == len(_TABLAS_FTS)
+        except Exception:
+            _disponible = False
+    return _disponible
+
+
+def palabras(texto) -> list:
+    """Palabras de búsqueda sin acentos ni signos, en minúsculas."""
+    if not isinstance(texto, str):
+        return []
+    nfkd = unicodedata.normalize('NFKD', texto)
+    sin_acentos = "".join(c for c in nfkd if not unicodedata.combining(c))
+    return re.findall(r"[a-z0-9]+", sin_acentos.lower())
+
+
+def expresion_fts(texto):
+    """Expresión MATCH de FTS5 (todas las palabras como prefijo), o None si no hay palabras."""
+    partes = palabras(texto)
+    if not partes:
+        return None
+    return " ".join(f'"{p}"*' for p in partes)
+
+
+def filtro_productos(texto, columna='p.id'):
+    """(condición SQL, params) para quedarse con los productos que coinciden con texto."""
+    expr = expresion_fts(texto)
+    if expr is None:
+        return "1=1", []
+    if fts_disponible():
+        return f"{columna} IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)", [expr]
+    return _filtro_like(columna, "products", ("nombre", "codigo_producto"), texto)
+
+
+def filtro_tickets(texto, columna='t.id'):
+    """(condición SQL, params) para quedarse con los tickets cuyo identificador coincide con texto."""
+    expr = expresion_fts(texto)
+    if expr is None:
+        return "1=1", []
+    if fts_disponible():
+        return f"{columna} IN (SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH ?)", [expr]
+    return _filtro_like(columna, "tickets", ("identificador_ticket",), texto)
+
+
+def _filtro_like(columna, tabla, campos, texto):
+    # Sin FTS5: cada palabra tiene que aparecer (como subcadena) en alguno de los campos
+    condiciones, params = [], []
+    for p in palabras(texto):
+        condiciones.append("(" + " OR ".join(f"{c} LIKE ?" for c in campos) + ")")
+        params.extend([f"%{p}%"] * len(campos))
+    return f"{columna} IN (SELECT id FROM {tabla} WHERE {' AND '.join(condiciones)})", params
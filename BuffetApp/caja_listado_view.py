@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from db_utils import get_connection
+from caja_resumen import listar_cajas
+from db_reader import get_reader
+from monitor_cambios import get_monitor
 from theme import apply_treeview_style, format_currency
 # Permitir import tanto como paquete (BuffetApp.*) como módulo suelto (tests)
 try:
@@ -40,6 +43,10 @@ class CajaListadoView(tk.Frame):
 		super().__init__(parent)
 		self.on_caja_cerrada = on_caja_cerrada
 		self._detalle_frame = None
+		# Carga del listado en curso en el hilo lector (db_reader)
+		self._consulta = None
+		# La carga la cortó un cambio de vista: repetirla cuando el listado vuelva a verse
+		self._recargar_al_mostrar = False
 		self._filter_date = None  # fecha seleccionada para filtrar (str 'YYYY-MM-DD') o None para todas
 		self.var_fecha = tk.StringVar()
 		self.combo_fecha = None
@@ -78,9 +85,18 @@ class CajaListadoView(tk.Frame):
 		self.hsb.pack(side=tk.BOTTOM, fill=tk.X)
 
 		self.tree.bind('<Double-1>', lambda e: self._btn_ver_detalle())
+		self.tree.bind('<Map>', self._al_mostrar, add='+')
 
 		# Cargar listado inicial
 		self.cargar_cajas()
+		# Cajas abiertas/cerradas y ventas de otro equipo: recargar sin tocar Refrescar.
+		# Atado al tree: con el detalle abierto el aviso espera a que vuelva el listado
+		get_monitor().suscribir(self.tree, ('caja_diaria', 'caja_movimiento', 'ventas', 'tickets'), self._on_cambios)
+
+	def _on_cambios(self, tablas):
+		if 'caja_diaria' in tablas:
+			self.actualizar_fechas_combo()
+		self.cargar_cajas()
 
 	def _refresh_list(self):
 		"""Recarga las fechas y el listado aplicando el filtro actual."""
@@ -88,84 +104,66 @@ class CajaListadoView(tk.Frame):
 		self.cargar_cajas()
 
 	def cargar_cajas(self):
+		usuario = None
+		# Si el rol es cajero, limitar a sus cajas
+		try:
+			if getattr(self, 'logged_role', '').lower() == 'cajero':
+				usuario = getattr(self, 'logged_user', None)
+		except Exception:
+			pass
+		# Cerradas desde caja_resumen; abiertas calculadas en vivo. Corre en el hilo lector
+		# y una recarga nueva (p. ej. al cambiar la fecha) cancela la anterior.
+		if self._consulta is not None:
+			self._consulta.cancelar()
+		self._consulta = get_reader().ejecutar(
+			listar_cajas, fecha=self._filter_date, usuario_apertura=usuario,
+			on_done=self._mostrar_cajas,
+			on_error=lambda e: setattr(self, '_consulta', None),
+			on_cancel=self._carga_cancelada,
+		)
+
+	def _carga_cancelada(self):
+		self._consulta = None
+		self._recargar_al_mostrar = True
+
+	def _al_mostrar(self, _event=None):
+		if self._recargar_al_mostrar:
+			self._recargar_al_mostrar = False
+			self.cargar_cajas()
+
+	def _mostrar_cajas(self, rows):
+		self._consulta = None
+		# Conservar la selección si la caja sigue en el listado
+		seleccion = self.tree.selection()
 		# limpia
 		for it in self.tree.get_children():
 			self.tree.delete(it)
 
-		with get_connection() as conn:
-			cur = conn.cursor()
-			# Base query
-			query = (
-					"SELECT cd.id, cd.codigo_caja, cd.fecha, COALESCE(cd.cajero_apertura, cd.usuario_apertura) as cajero_apertura, COALESCE(cd.fondo_inicial,0),"
-				" (SELECT COALESCE(SUM(t.total_ticket),0) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=cd.id AND t.status!='Anulado') as total_ventas,"
-				# Ventas en efectivo: siempre por método de pago efectivo
-				" (SELECT COALESCE(SUM(t.total_ticket),0) FROM tickets t JOIN ventas v ON v.id=t.venta_id LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id WHERE v.caja_id=cd.id AND t.status!='Anulado' AND (LOWER(mp.descripcion) LIKE 'efectivo%' OR LOWER(mp.descripcion)='efectivo')) as ventas_efectivo,"
-				# Transferencias: si la caja está abierta, suma en vivo; si no, usa valor final o suma en vivo
-				" CASE WHEN LOWER(COALESCE(cd.estado,''))='abierta' THEN ("
-				"   SELECT COALESCE(SUM(t.total_ticket),0)"
-				"     FROM tickets t"
-				"     JOIN ventas v ON v.id=t.venta_id"
-				"     LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id"
-				"    WHERE v.caja_id=cd.id AND t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'transfer%'"
-				")"
-				" ELSE COALESCE(cd.transferencias_final, ("
-				"   SELECT COALESCE(SUM(t.total_ticket),0)"
-				"     FROM tickets t"
-				"     JOIN ventas v ON v.id=t.venta_id"
-				"     LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id"
-				"    WHERE v.caja_id=cd.id AND t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'transfer%')) END AS transferencias_final,"
-				" (SELECT COALESCE(SUM(m.monto),0) FROM caja_movimiento m WHERE m.caja_id=cd.id AND m.tipo='INGRESO') as ingresos,"
-				" (SELECT COALESCE(SUM(m.monto),0) FROM caja_movimiento m WHERE m.caja_id=cd.id AND m.tipo='RETIRO') as retiros,"
-				" COALESCE(cd.conteo_efectivo_final,0),"
-				" COALESCE(cd.diferencia,0),"
-				" (SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=cd.id AND t.status!='Anulado') as total_tickets,"
-				" (SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=cd.id AND t.status='Anulado') as tickets_anulados,"
-				" COALESCE(cd.estado, ''), COALESCE(cd.descripcion_evento, '')"
-				" FROM caja_diaria cd"
-			)
-			params = []
-			# Si el rol es cajero, limitar a sus cajas
-			try:
-				if getattr(self, 'logged_role', '').lower() == 'cajero':
-					user = getattr(self, 'logged_user', None)
-					if user:
-						if 'WHERE' in query:
-							query += " AND cd.usuario_apertura = ?"
-						else:
-							query += " WHERE cd.usuario_apertura = ?"
-						params.append(user)
-			except Exception:
-				pass
-			if self._filter_date:
-				query += " WHERE cd.fecha = ? ORDER BY cd.fecha DESC, cd.codigo_caja DESC"
-				params.append(self._filter_date)
+		for row in rows:
+			(cid, codigo, fecha, usuario, fondo_inicial, total_ventas, ventas_efectivo,  transfer, ingresos, retiros, conteo_final, diferencia_db,total_tickets, tickets_anulados, estado, descripcion_evento) = row
+
+			# Si diferencia guardada es NULL => calcular por la fórmula del negocio
+			if diferencia_db is None:
+				try:
+					# Nueva lógica: real = conteo_final + transferencias
+					real = float(conteo_final or 0) + float(transfer or 0)
+					# teor = fondo_inicial + total_ventas + ingresos - retiros
+					teor = float(fondo_inicial or 0) + float(total_ventas or 0) + float(ingresos or 0) - float(retiros or 0)
+					diferencia = real - teor
+				except Exception:
+					diferencia = 0
 			else:
-				query += " ORDER BY cd.fecha DESC LIMIT 200"
-			cur.execute(query, params)
-			rows = cur.fetchall()
-
-			for row in rows:
-				(cid, codigo, fecha, usuario, fondo_inicial, total_ventas, ventas_efectivo,  transfer, ingresos, retiros, conteo_final, diferencia_db,total_tickets, tickets_anulados, estado, descripcion_evento) = row
-
-				# Si diferencia guardada es NULL => calcular por la fórmula del negocio
-				if diferencia_db is None:
-					try:
-						# Nueva lógica: real = conteo_final + transferencias
-						real = float(conteo_final or 0) + float(transfer or 0)
-						# teor = fondo_inicial + total_ventas + ingresos - retiros
-						teor = float(fondo_inicial or 0) + float(total_ventas or 0) + float(ingresos or 0) - float(retiros or 0)
-						diferencia = real - teor
-					except Exception:
-						diferencia = 0
-				else:
-					diferencia = diferencia_db or 0
-
-				# Build visible values (omit internal id, append estado)
-				values = [codigo, fecha, descripcion_evento, usuario, fondo_inicial, total_ventas, ventas_efectivo,  transfer, ingresos, retiros, conteo_final, diferencia,total_tickets, tickets_anulados, estado]
-				tags = ()
-				if str(estado).lower() == 'abierta':
-					tags = ('abierta',)
-				self.tree.insert('', 'end', iid=str(cid), values=values, tags=tags)
+				diferencia = diferencia_db or 0
+
+			# Build visible values (omit internal id, append estado)
+			values = [codigo, fecha, descripcion_evento, usuario, fondo_inicial, total_ventas, ventas_efectivo,  transfer, ingresos, retiros, conteo_final, diferencia,total_tickets, tickets_anulados, estado]
+			tags = ()
+			if str(estado).lower() == 'abierta':
+				tags = ('abierta',)
+			self.tree.insert('', 'end', iid=str(cid), values=values, tags=tags)
+		seleccion = [iid for iid in seleccion if self.tree.exists(iid)]
+		if seleccion:
+			self.tree.selection_set(seleccion)
 
 		# Pedir al controlador que refresque el pie global si este frame está contenido en la app principal
 		try:
@@ -2,7 +2,9 @@
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
 import datetime
-from db_utils import get_connection
+from db_utils import get_connection, transaction
+from caja_resumen import guardar_resumenes
+from caja_snapshot import get_snapshot, invalidar as invalidar_snapshot
 try:
     from db_migrations import backup_db
 except Exception:
@@ -23,6 +25,12 @@ except Exception:
         return False
     def cloud_sync_caja(_caja_id: int):
         raise RuntimeError("Sincronización en la nube no disponible")
+def _productos_por_total(snap):
+    """[(producto, cantidad, total)] del snapshot, de mayor a menor total."""
+    filas = [(prod, cant, total) for _cat, prod, cant, total in snap.por_producto]
+    return sorted(filas, key=lambda r: r[2] or 0, reverse=True)
+
+
 class DetalleCajaFrame(tk.Frame):
     def __init__(self, parent, caja_id, on_close=None, disable_movimientos=True):
         super().__init__(parent)
@@ -480,6 +488,7 @@ class DetalleCajaFrame(tk.Frame):
                             )
                             return
                         conn2.commit()
+                    invalidar_snapshot(self.caja_id)
                     monto_entry.delete(0, tk.END)
                     obs_entry.delete(0, tk.END)
                     _refresh_list()
@@ -525,414 +534,331 @@ class DetalleCajaFrame(tk.Frame):
         except Exception as e:
             messagebox.showerror('Error', f'No se pudo abrir ventana de movimientos: {e}')
             
-    def _load_data(self):
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            # Cargar datos básicos de la caja (usar nombres de columnas para evitar dependencias de índice)
-            try:
-                cursor.execute("""
-                    SELECT cd.id, cd.codigo_caja, cd.fecha, cd.hora_apertura, cd.hora_cierre,
-                           cd.usuario_apertura, cd.usuario_cierre, cd.fondo_inicial,
-                           cd.observaciones_apertura, cd.obs_cierre, cd.total_ventas,
-                           cd.total_efectivo_teorico, cd.conteo_efectivo_final, cd.transferencias_final,
-                           cd.ingresos, cd.retiros, cd.diferencia, cd.total_tickets, cd.estado,
-                           d.descripcion as nombre_disciplina, cd.descripcion_evento
-                    FROM caja_diaria cd
-                    LEFT JOIN disciplinas d ON d.codigo = cd.disciplina
-                    WHERE cd.id = ?
-                """, (self.caja_id,))
-                row = cursor.fetchone()
-                if row:
-                    cols = [c[0] for c in cursor.description]
-                    caja = dict(zip(cols, row))
-                else:
-                    caja = None
-            except sqlite3.Error:
-                caja = None
-            if not caja:
-                messagebox.showerror("Error", "No se encontró la caja especificada")
-                if self.on_close:
-                    self.on_close()
-                return
-            # Calcular totales (seguro ante tablas faltantes)
-            total_ventas = 0
-            try:
-                cursor.execute("""
-                    SELECT COALESCE(SUM(t.total_ticket),0) as total
-                    FROM tickets t 
-                    JOIN ventas v ON v.id = t.venta_id
-                    WHERE v.caja_id = ? AND t.status != 'Anulado'
-                """, (self.caja_id,))
-                total_ventas = cursor.fetchone()[0] or 0
-            except sqlite3.Error:
-                total_ventas = 0
+    def _snapshot(self, refresh=False):
+        """CajaSnapshot de esta caja (cacheado; ver caja_snapshot.py)."""
+        return get_snapshot(self.caja_id, refresh=refresh)
 
-            # Mapear campos de caja a atributos usando nombres de columna
+    def _movimientos_totales(self):
+        """(ingresos, retiros): los cargados en el frame o, si faltan, los del snapshot."""
+        ingresos = getattr(self, 'ingresos', None)
+        retiros = getattr(self, 'retiros', None)
+        if ingresos is None or retiros is None:
             try:
-                self.codigo_caja = caja.get('codigo_caja')
-                self.fecha = caja.get('fecha')
-                self.hora_apertura = caja.get('hora_apertura')
-                self.hora_cierre = caja.get('hora_cierre')
-                self.usuario_apertura = caja.get('usuario_apertura')
-                self.usuario_cierre = caja.get('usuario_cierre')
-                self.fondo_inicial = caja.get('fondo_inicial') or 0
-                self.observaciones_apertura = caja.get('observaciones_apertura') or ''
-                self.obs_cierre_db = caja.get('obs_cierre') or ''
-                # total_ventas puede venir vacío en la tabla
-                self.total_ventas = caja.get('total_ventas') or total_ventas or 0
-                self.total_teorico = caja.get('total_efectivo_teorico') if caja.get('total_efectivo_teorico') is not None else None
-                self.conteo_efectivo_final = caja.get('conteo_efectivo_final') or 0
-                self.transferencias_final = caja.get('transferencias_final') or 0
-                self.ingresos = caja.get('ingresos') or 0
-                self.retiros = caja.get('retiros') or 0
-                self.diferencia_db = caja.get('diferencia')
-                self.total_tickets = caja.get('total_tickets') or 0
-                # contar tickets anulados explícitamente
-                try:
-                    cursor.execute("SELECT COALESCE(COUNT(*),0) FROM tickets t JOIN ventas v ON v.id = t.venta_id WHERE v.caja_id=? AND t.status='Anulado'", (self.caja_id,))
-                    self.tickets_anulados = cursor.fetchone()[0] or 0
-                except Exception:
-                    self.tickets_anulados = 0
-                self.nombre_disciplina = caja.get('nombre_disciplina') or ''
-                self.descripcion_evento = caja.get('descripcion_evento') or ''
-                # estado de la caja
-                self.estado = caja.get('estado') or ''
+                snap = self._snapshot()
             except Exception:
-                # Si algo falla, inicializar valores por seguridad
-                self.codigo_caja = None
-                self.fecha = self.hora_apertura = self.hora_cierre = self.usuario_apertura = self.usuario_cierre = ''
-                self.fondo_inicial = 0
-                self.observaciones_apertura = self.obs_cierre_db = ''
-                self.total_ventas = total_ventas or 0
-                self.total_teorico = getattr(self, 'total_teorico', 0)
-                self.conteo_efectivo_final = self.transferencias_final = self.ingresos = self.retiros = 0
-                self.diferencia_db = None
-                self.total_tickets = 0
-                self.nombre_disciplina = ''
-                self.estado = ''
-            # Si total_teorico no está presente en la fila, estimar con una suma segura
-            if getattr(self, 'total_teorico', None) is None:
-                try:
-                    cursor.execute("""
-                        SELECT COALESCE(SUM(t.total_ticket),0)
-                        FROM tickets t
-                        JOIN ventas v ON v.id = t.venta_id
-                        LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
-                        WHERE v.caja_id = ? AND (mp.descripcion='Efectivo' OR mp.descripcion IS NULL) AND t.status != 'Anulado'
-                    """, (self.caja_id,))
-                    efectivo_ventas = cursor.fetchone()[0] or 0
-                except Exception:
-                    efectivo_ventas = total_ventas
-                # Para evitar depender de posibles valores desactualizados en caja_diaria,
-                # obtener ingresos y retiros sumados directamente desde caja_movimiento
-                try:
-                    cursor.execute(
-                        "SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto END),0),\n                                COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto END),0)\n                         FROM caja_movimiento WHERE caja_id=?",
-                        (self.caja_id,)
-                    )
-                    _mv = cursor.fetchone() or (0, 0)
-                    ingresos_sum = _mv[0] or 0
-                    retiros_sum = _mv[1] or 0
-                except Exception:
-                    ingresos_sum = getattr(self, 'ingresos', 0) or 0
-                    retiros_sum = getattr(self, 'retiros', 0) or 0
-                # Actualizar atributos para mantener consistencia en el resto de la vista/exports
-                try:
-                    self.ingresos = ingresos_sum
-                    self.retiros = retiros_sum
-                except Exception:
-                    pass
-                # Estimación: fondo inicial + efectivo ventas + ingresos - retiros + transferencias
-                self.total_teorico = self.fondo_inicial + efectivo_ventas + ingresos_sum - retiros_sum + self.transferencias_final
-            # Poblamos observaciones de apertura
-            try:
-                self.obs_apertura_text.config(state='normal')
-                self.obs_apertura_text.delete('1.0', tk.END)
-                texto_ap = getattr(self, 'observaciones_apertura', '')
-                if getattr(self, 'descripcion_evento', ''):
-                    texto_ap = f"Evento: {self.descripcion_evento}\n" + (texto_ap or '')
-                self.obs_apertura_text.insert('1.0', texto_ap)
-                self.obs_apertura_text.config(state='disabled')
-            except Exception:
-                pass
-            # Actualizar etiqueta de disciplina en el panel de cierre
+                snap = None
+            if ingresos is None:
+                ingresos = snap.ingresos if snap else 0
+            if retiros is None:
+                retiros = snap.retiros if snap else 0
+        return ingresos, retiros
+
+    def _load_data(self):
+        # Todos los totales salen de una sola foto de la caja
+        try:
+            snap = self._snapshot()
+        except sqlite3.Error:
+            snap = None
+        caja = snap.info if snap else None
+        if not caja:
+            messagebox.showerror("Error", "No se encontró la caja especificada")
+            if self.on_close:
+                self.on_close()
+            return
+        self.snapshot = snap
+        total_ventas = snap.total_ventas or 0
+
+        # Mapear campos de caja a atributos usando nombres de columna
+        try:
+            self.codigo_caja = caja.get('codigo_caja')
+            self.fecha = caja.get('fecha')
+            self.hora_apertura = caja.get('hora_apertura')
+            self.hora_cierre = caja.get('hora_cierre')
+            self.usuario_apertura = caja.get('usuario_apertura')
+            self.usuario_cierre = caja.get('usuario_cierre')
+            self.fondo_inicial = caja.get('fondo_inicial') or 0
+            self.observaciones_apertura = caja.get('observaciones_apertura') or ''
+            self.obs_cierre_db = caja.get('obs_cierre') or ''
+            # total_ventas puede venir vacío en la tabla
+            self.total_ventas = caja.get('total_ventas') or total_ventas or 0
+            self.total_teorico = caja.get('total_efectivo_teorico') if caja.get('total_efectivo_teorico') is not None else None
+            self.conteo_efectivo_final = caja.get('conteo_efectivo_final') or 0
+            self.transferencias_final = caja.get('transferencias_final') or 0
+            self.ingresos = caja.get('ingresos') or 0
+            self.retiros = caja.get('retiros') or 0
+            self.diferencia_db = caja.get('diferencia')
+            self.total_tickets = caja.get('total_tickets') or 0
+            self.tickets_anulados = snap.tickets_anulados
+            self.nombre_disciplina = caja.get('nombre_disciplina') or ''
+            self.descripcion_evento = caja.get('descripcion_evento') or ''
+            # estado de la caja
+            self.estado = caja.get('estado') or ''
+        except Exception:
+            # Si algo falla, inicializar valores por seguridad
+            self.codigo_caja = None
+            self.fecha = self.hora_apertura = self.hora_cierre = self.usuario_apertura = self.usuario_cierre = ''
+            self.fondo_inicial = 0
+            self.observaciones_apertura = self.obs_cierre_db = ''
+            self.total_ventas = total_ventas or 0
+            self.total_teorico = getattr(self, 'total_teorico', 0)
+            self.conteo_efectivo_final = self.transferencias_final = self.ingresos = self.retiros = 0
+            self.diferencia_db = None
+            self.total_tickets = 0
+            self.nombre_disciplina = ''
+            self.estado = ''
+        # Si total_teorico no está presente en la fila, estimar con una suma segura
+        if getattr(self, 'total_teorico', None) is None:
+            efectivo_ventas = sum(total for metodo, _c, total in snap.por_metodo if metodo in ('Efectivo', None))
+            # Para evitar depender de posibles valores desactualizados en caja_diaria,
+            # usar ingresos y retiros sumados desde caja_movimiento
+            ingresos_sum = snap.ingresos
+            retiros_sum = snap.retiros
+            # Actualizar atributos para mantener consistencia en el resto de la vista/exports
             try:
-                nombre = getattr(self, 'nombre_disciplina', '') or '-'
-                self.disciplina_label.config(text=f"Disciplina: {nombre}")
+                self.ingresos = ingresos_sum
+                self.retiros = retiros_sum
             except Exception:
                 pass
-            # Listar movimientos y sus observaciones en el textbox correspondiente
-            # Listar movimientos: almacenar en lista y mostrar solo uno a la vez con navegación
+            # Estimación: fondo inicial + efectivo ventas + ingresos - retiros + transferencias
+            self.total_teorico = self.fondo_inicial + efectivo_ventas + ingresos_sum - retiros_sum + self.transferencias_final
+        # Poblamos observaciones de apertura
+        try:
+            self.obs_apertura_text.config(state='normal')
+            self.obs_apertura_text.delete('1.0', tk.END)
+            texto_ap = getattr(self, 'observaciones_apertura', '')
+            if getattr(self, 'descripcion_evento', ''):
+                texto_ap = f"Evento: {self.descripcion_evento}\n" + (texto_ap or '')
+            self.obs_apertura_text.insert('1.0', texto_ap)
+            self.obs_apertura_text.config(state='disabled')
+        except Exception:
+            pass
+        # Actualizar etiqueta de disciplina en el panel de cierre
+        try:
+            nombre = getattr(self, 'nombre_disciplina', '') or '-'
+            self.disciplina_label.config(text=f"Disciplina: {nombre}")
+        except Exception:
+            pass
+        # Listar movimientos y sus observaciones en el textbox correspondiente
+        # Listar movimientos: almacenar en lista y mostrar solo uno a la vez con navegación
+        self._movimientos_list = []
+        self._mov_index = 0
+        try:
+            for tipo, monto, observacion, creado in snap.movimientos:
+                text = f"{tipo}: {format_currency(monto)} - {observacion or ''} ({creado})"
+                self._movimientos_list.append(text)
+        except Exception:
             self._movimientos_list = []
-            self._mov_index = 0
+        try:
+            self._mov_index = max(0, len(self._movimientos_list) - 1)
+        except Exception:
+            # keep internal list empty on error
+            self._movimientos_list = []
+        # Colocar observacion de cierre en el campo editable
+        try:
+            self.obs_text.delete('1.0', tk.END)
+            if getattr(self, 'obs_cierre_db', ''):
+                self.obs_text.insert('1.0', getattr(self, 'obs_cierre_db', ''))
+        except Exception:
+            pass
+        # Rellenar los campos de cierre con los valores guardados (si existen)
+        try:
+            # conteo, transferencias, usuario
             try:
-                cursor.execute("SELECT tipo, monto, observacion, creado_ts FROM caja_movimiento WHERE caja_id=? ORDER BY creado_ts", (self.caja_id,))
-                for tipo, monto, observacion, creado in cursor.fetchall():
-                    text = f"{tipo}: {format_currency(monto)} - {observacion or ''} ({creado})"
-                    self._movimientos_list.append(text)
+                self.conteo_entry.delete(0, tk.END)
+                self.conteo_entry.insert(0, str(getattr(self, 'conteo_efectivo_final', '') or ''))
             except Exception:
-                self._movimientos_list = []
+                pass
             try:
-                self._mov_index = max(0, len(self._movimientos_list) - 1)
+                self.transf_entry.delete(0, tk.END)
+                self.transf_entry.insert(0, str(getattr(self, 'transferencias_final', '') or ''))
             except Exception:
-                # keep internal list empty on error
-                self._movimientos_list = []
-            # Colocar observacion de cierre en el campo editable
+                pass
             try:
-                self.obs_text.delete('1.0', tk.END)
-                if getattr(self, 'obs_cierre_db', ''):
-                    self.obs_text.insert('1.0', getattr(self, 'obs_cierre_db', ''))
+                self.usuario_entry.delete(0, tk.END)
+                self.usuario_entry.insert(0, str(getattr(self, 'usuario_cierre', '') or ''))
             except Exception:
                 pass
-            # Rellenar los campos de cierre con los valores guardados (si existen)
-            try:
-                # conteo, transferencias, usuario
-                try:
-                    self.conteo_entry.delete(0, tk.END)
-                    self.conteo_entry.insert(0, str(getattr(self, 'conteo_efectivo_final', '') or ''))
-                except Exception:
-                    pass
+        except Exception:
+            pass
+        # Ventas por método de pago
+        ventas_por_metodo = snap.por_metodo
+        # KPIs con valores calculados y consistentes
+        # Clear previous KPIs to avoid duplicates when reloading
+        try:
+            for c in list(self.kpis.winfo_children()):
                 try:
-                    self.transf_entry.delete(0, tk.END)
-                    self.transf_entry.insert(0, str(getattr(self, 'transferencias_final', '') or ''))
+                    c.destroy()
                 except Exception:
                     pass
+        except Exception:
+            pass
+        try:
+            for c in list(self.kpis_row2.winfo_children()):
                 try:
-                    self.usuario_entry.delete(0, tk.END)
-                    self.usuario_entry.insert(0, str(getattr(self, 'usuario_cierre', '') or ''))
+                    c.destroy()
                 except Exception:
                     pass
-            except Exception:
-                pass
-            # Ventas por método de pago
-            try:
-                cursor.execute("""
-                    SELECT mp.descripcion, COUNT(*) as cantidad, SUM(t.total_ticket) as total
-                    FROM ventas v
-                    JOIN tickets t ON t.venta_id = v.id
-                    LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
-                    WHERE v.caja_id = ? AND t.status != 'Anulado'
-                    GROUP BY mp.descripcion
-                """, (self.caja_id,))
-                ventas_por_metodo = cursor.fetchall()
-            except sqlite3.Error:
-                ventas_por_metodo = []
-            # KPIs con valores calculados y consistentes
-            # Clear previous KPIs to avoid duplicates when reloading
+        except Exception:
+            pass
+
+        try:
+            # Fondo inicial
+            self.create_kpi(
+                self.kpis, "💰", "Fondo Inicial",
+                format_currency(getattr(self, 'fondo_inicial', 0)),
+                FINANCE_COLORS.get('transfer_bg', '#eee'),
+                FINANCE_COLORS.get('transfer_fg', '#000')
+            )
+        except Exception:
+            self.create_kpi(self.kpis, "💰", "Fondo Inicial", format_currency(getattr(self, 'fondo_inicial', 0)), '#ffffff', '#000000')
+        # Ingresos y Retiros: siempre sumados desde caja_movimiento para reflejar los movimientos reales
+        ingresos_val = snap.ingresos
+        retiros_val = snap.retiros
+        # Mantener atributos sincronizados con los valores mostrados
+        try:
+            self.ingresos = ingresos_val
+            self.retiros = retiros_val
+        except Exception:
+            pass
+        try:
+            self.create_kpi(self.kpis, "ingresos", "Ingresos", format_currency(ingresos_val), FINANCE_COLORS.get('positive_bg', '#e6ffed'), FINANCE_COLORS.get('positive_fg', '#0a0'))
+            self.create_kpi(self.kpis, "retiros", "Retiros", format_currency(retiros_val), FINANCE_COLORS.get('negative_bg', '#ffecec'), FINANCE_COLORS.get('negative_fg', '#c00'))
+        except Exception:
+            self.create_kpi(self.kpis, "⬆️", "Ingresos", format_currency(ingresos_val), '#ffffff', '#000000')
+            self.create_kpi(self.kpis, "⬇️", "Retiros", format_currency(retiros_val), '#ffffff', '#000000')
+        # Ventas por medio de pago sumas (efectivo / transferencias)
+        total_efectivo = sum(total for metodo, cant, total in ventas_por_metodo if (metodo or '').lower() == 'efectivo') if ventas_por_metodo else 0
+        total_transf = sum(total for metodo, cant, total in ventas_por_metodo if (metodo or '').lower() != 'efectivo') if ventas_por_metodo else 0
+        try:
+            self.create_kpi(self.kpis_row2, "💵", "Efectivo", format_currency(total_efectivo), FINANCE_COLORS.get('transfer_bg', '#fff'), FINANCE_COLORS.get('transfer_fg', '#000'))
+            self.create_kpi(self.kpis_row2, "🔁", "Transferencias", format_currency(total_transf), FINANCE_COLORS.get('transfer_bg', '#fff'), FINANCE_COLORS.get('transfer_fg', '#000'))
+        except Exception:
+            self.create_kpi(self.kpis_row2, "💵", "Efectivo", format_currency(total_efectivo), '#ffffff', '#000000')
+            self.create_kpi(self.kpis_row2, "🔁", "Transferencias", format_currency(total_transf), '#ffffff', '#000000')
+        # # KPI: tickets anulados
+        # try:
+        #     self.create_kpi(self.kpis, "🚫", "Anulados", str(getattr(self, 'tickets_anulados', 0)), COLORS.get('surface'), COLORS.get('text'))
+        # except Exception:
+        #     try:
+        #         self.create_kpi(self.kpis, "🚫", "Anulados", str(getattr(self, 'tickets_anulados', 0)), '#ffffff', '#000')
+        #     except Exception:
+        #         pass
+        # Replace single "Ventas totales" highlight with three KPIs in the second row:
+        # Anulados | Emitidos | Ventas totales
+        try:
+            # tickets emitidos (status != 'Anulado')
+            tickets_emitidos = snap.total_tickets
+
+            # Anulados KPI
             try:
-                for c in list(self.kpis.winfo_children()):
-                    try:
-                        c.destroy()
-                    except Exception:
-                        pass
+                self.create_kpi(self.kpis, "🚫", "Anulados", str(getattr(self, 'tickets_anulados', 0)), '#ffffff', '#000')
             except Exception:
                 pass
+
+            # Emitidos KPI (simple display)
             try:
-                for c in list(self.kpis_row2.winfo_children()):
-                    try:
-                        c.destroy()
-                    except Exception:
-                        pass
+                self.create_kpi(self.kpis, "🎟️", "Emitidos", str(tickets_emitidos), '#ffffff', '#000')
             except Exception:
                 pass
 
+            # Ventas totales KPI (destacado a la derecha)
             try:
-                # Fondo inicial
-                self.create_kpi(
-                    self.kpis, "💰", "Fondo Inicial",
-                    format_currency(getattr(self, 'fondo_inicial', 0)),
-                    FINANCE_COLORS.get('transfer_bg', '#eee'),
-                    FINANCE_COLORS.get('transfer_fg', '#000')
-                )
-            except Exception:
-                self.create_kpi(self.kpis, "💰", "Fondo Inicial", format_currency(getattr(self, 'fondo_inicial', 0)), '#ffffff', '#000000')
-            # Ingresos y Retiros: siempre sumar desde caja_movimiento para reflejar los movimientos reales
-            try:
-                cursor.execute(
-                    "SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto END),0),\n                            COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto END),0)\n                     FROM caja_movimiento WHERE caja_id=?",
-                    (self.caja_id,)
-                )
-                mv = cursor.fetchone() or (0, 0)
-                ingresos_val = mv[0] or 0
-                retiros_val = mv[1] or 0
+                self.create_kpi(self.kpis_row2, "📊", "Ventas totales", format_currency(getattr(self, 'total_ventas', total_ventas)), FINANCE_COLORS.get('total_sales_bg', COLORS.get('surface', '#f5f5f5')), FINANCE_COLORS.get('total_sales_fg', COLORS.get('text', '#000')))
             except Exception:
-                ingresos_val = getattr(self, 'ingresos', 0) or 0
-                retiros_val = getattr(self, 'retiros', 0) or 0
-            # Mantener atributos sincronizados con los valores mostrados
+                pass
+        except Exception:
+            pass
+        # Cargar tablas: categorías (ya ordenadas por total)
+        rows = snap.por_categoria
+        for cat in self.cat_tree.get_children():
+            self.cat_tree.delete(cat)
+        for row in rows:
+            cat = row[0] or 'Sin categoría'
+            total = row[1] or 0
+            self.cat_tree.insert('', 'end', values=(cat, format_currency(total)))
+        # Productos vendidos
+        prod_rows = _productos_por_total(snap)
+        for prod in self.prod_tree.get_children():
+            self.prod_tree.delete(prod)
+        for row in prod_rows:
             try:
-                self.ingresos = ingresos_val
-                self.retiros = retiros_val
+                self.prod_tree.insert('', 'end', values=(row[0], int(row[1]), format_currency(row[2] or 0)))
             except Exception:
                 pass
+        # Obtener estado actual (cerrada/abierta) desde la fila ya leída
+        esta_cerrada = (getattr(self, 'estado', '') == 'cerrada')
+        # Ajustar estado de campos de cierre según si la caja está cerrada
+        if esta_cerrada:
+            # Deshabilitar campos editables del cierre
             try:
-                self.create_kpi(self.kpis, "ingresos", "Ingresos", format_currency(ingresos_val), FINANCE_COLORS.get('positive_bg', '#e6ffed'), FINANCE_COLORS.get('positive_fg', '#0a0'))
-                self.create_kpi(self.kpis, "retiros", "Retiros", format_currency(retiros_val), FINANCE_COLORS.get('negative_bg', '#ffecec'), FINANCE_COLORS.get('negative_fg', '#c00'))
+                self.conteo_entry.config(state='disabled')
+                self.transf_entry.config(state='disabled')
+                self.usuario_entry.config(state='disabled')
+                # Observaciones de cierre no editables (gris)
+                self.obs_text.config(state='disabled', bg=COLORS.get('disabled_bg', '#f5f5f5'))
             except Exception:
-                self.create_kpi(self.kpis, "⬆️", "Ingresos", format_currency(ingresos_val), '#ffffff', '#000000')
-                self.create_kpi(self.kpis, "⬇️", "Retiros", format_currency(retiros_val), '#ffffff', '#000000')
-            # Ventas por medio de pago sumas (efectivo / transferencias)
-            total_efectivo = sum(total for metodo, cant, total in ventas_por_metodo if (metodo or '').lower() == 'efectivo') if ventas_por_metodo else 0
-            total_transf = sum(total for metodo, cant, total in ventas_por_metodo if (metodo or '').lower() != 'efectivo') if ventas_por_metodo else 0
+                pass
+            # Ocultar o deshabilitar botón de cerrar y mostrar/habilitar imprimir
             try:
-                self.create_kpi(self.kpis_row2, "💵", "Efectivo", format_currency(total_efectivo), FINANCE_COLORS.get('transfer_bg', '#fff'), FINANCE_COLORS.get('transfer_fg', '#000'))
-                self.create_kpi(self.kpis_row2, "🔁", "Transferencias", format_currency(total_transf), FINANCE_COLORS.get('transfer_bg', '#fff'), FINANCE_COLORS.get('transfer_fg', '#000'))
+                # preferimos deshabilitar botón de cerrar si existe
+                self.btn_cerrar.config(state='disabled')
             except Exception:
-                self.create_kpi(self.kpis_row2, "💵", "Efectivo", format_currency(total_efectivo), '#ffffff', '#000000')
-                self.create_kpi(self.kpis_row2, "🔁", "Transferencias", format_currency(total_transf), '#ffffff', '#000000')
-            # # KPI: tickets anulados
-            # try:
-            #     self.create_kpi(self.kpis, "🚫", "Anulados", str(getattr(self, 'tickets_anulados', 0)), COLORS.get('surface'), COLORS.get('text'))
-            # except Exception:
-            #     try:
-            #         self.create_kpi(self.kpis, "🚫", "Anulados", str(getattr(self, 'tickets_anulados', 0)), '#ffffff', '#000')
-            #     except Exception:
-            #         pass
-            # Replace single "Ventas totales" highlight with three KPIs in the second row:
-            # Anulados | Emitidos | Ventas totales
-            try:
-                # compute tickets emitted (status != 'Anulado')
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=? AND t.status != 'Anulado'", (self.caja_id,))
-                    tickets_emitidos = cursor.fetchone()[0] or 0
-                except Exception:
-                    tickets_emitidos = getattr(self, 'total_tickets', 0) or 0
-
-                # Anulados KPI
-                try:
-                    self.create_kpi(self.kpis, "🚫", "Anulados", str(getattr(self, 'tickets_anulados', 0)), '#ffffff', '#000')
-                except Exception:
-                    pass
-
-                # Emitidos KPI (simple display)
                 try:
-                    self.create_kpi(self.kpis, "🎟️", "Emitidos", str(tickets_emitidos), '#ffffff', '#000')
+                    self.btn_cerrar.pack_forget()
                 except Exception:
                     pass
-
-                # Ventas totales KPI (destacado a la derecha)
+            try:
+                self.btn_imprimir.config(state='normal')
+                self.btn_imprimir.pack(fill='x', pady=2)
+            except Exception:
                 try:
-                    self.create_kpi(self.kpis_row2, "📊", "Ventas totales", format_currency(getattr(self, 'total_ventas', total_ventas)), FINANCE_COLORS.get('total_sales_bg', COLORS.get('surface', '#f5f5f5')), FINANCE_COLORS.get('total_sales_fg', COLORS.get('text', '#000')))
+                    self.btn_imprimir.pack(fill='x', pady=2)
                 except Exception:
                     pass
+        # Mostrar diferencia almacenada si la caja está cerrada; si está abierta, calcular en vivo
+        if esta_cerrada:
+            # Mostrar valor guardado en la base (self.diferencia_db)
+            diff_val = getattr(self, 'diferencia_db', None)
+            if diff_val is None:
+                diff_val = 0.0
+            color = FINANCE_COLORS['positive_fg'] if float(diff_val) >= 0 else FINANCE_COLORS['negative_fg']
+            self.diff_label.config(text=f"🧮 Diferencia: {format_currency(diff_val, include_sign=True)}", fg=color)
+        else:
+            # Caja abierta: campos editables y botón de cerrar activo; mantener cálculo en vivo
+            try:
+                self.conteo_entry.config(state='normal')
+                self.transf_entry.config(state='normal')
+                self.usuario_entry.config(state='normal')
+                self.obs_text.config(state='normal')
             except Exception:
                 pass
-            # Cargar tablas: categorías
             try:
-                cursor.execute("""
-                    SELECT c.descripcion, SUM(t.total_ticket) as total
-                    FROM tickets t
-                    JOIN ventas v ON v.id = t.venta_id
-                    LEFT JOIN Categoria_Producto c ON c.id = t.categoria_id
-                    WHERE v.caja_id = ? AND t.status != 'Anulado'
-                    GROUP BY c.descripcion
-                    ORDER BY total DESC
-                """, (self.caja_id,))
-                rows = cursor.fetchall()
-            except sqlite3.Error:
-                rows = []
-            for cat in self.cat_tree.get_children():
-                self.cat_tree.delete(cat)
-            for row in rows:
-                cat = row[0] or 'Sin categoría'
-                total = row[1] or 0
-                self.cat_tree.insert('', 'end', values=(cat, format_currency(total)))
-            # Productos vendidos
+                self._calcular_diferencia()
+            except Exception:
+                pass
             try:
-                cursor.execute("""
-                    SELECT p.nombre, SUM(vi.cantidad) as cant, 
-                           SUM(vi.cantidad * vi.precio_unitario) as total
-                    FROM venta_items vi
-                    JOIN tickets t ON t.id = vi.ticket_id
-                    JOIN ventas v ON v.id = t.venta_id
-                    JOIN products p ON p.id = vi.producto_id
-                    WHERE v.caja_id = ? AND t.status != 'Anulado'
-                    GROUP BY p.nombre
-                    ORDER BY total DESC
-                """, (self.caja_id,))
-                prod_rows = cursor.fetchall()
-            except sqlite3.Error:
-                prod_rows = []
-            for prod in self.prod_tree.get_children():
-                self.prod_tree.delete(prod)
-            for row in prod_rows:
-                try:
-                    self.prod_tree.insert('', 'end', values=(row[0], int(row[1]), format_currency(row[2] or 0)))
-                except Exception:
-                    pass
-            # Obtener estado actual (cerrada/abierta) desde la fila ya leída
-            esta_cerrada = (getattr(self, 'estado', '') == 'cerrada')
-            # Ajustar estado de campos de cierre según si la caja está cerrada
-            if esta_cerrada:
-                # Deshabilitar campos editables del cierre
-                try:
-                    self.conteo_entry.config(state='disabled')
-                    self.transf_entry.config(state='disabled')
-                    self.usuario_entry.config(state='disabled')
-                    # Observaciones de cierre no editables (gris)
-                    self.obs_text.config(state='disabled', bg=COLORS.get('disabled_bg', '#f5f5f5'))
-                except Exception:
-                    pass
-                # Ocultar o deshabilitar botón de cerrar y mostrar/habilitar imprimir
-                try:
-                    # preferimos deshabilitar botón de cerrar si existe
-                    self.btn_cerrar.config(state='disabled')
-                except Exception:
-                    try:
-                        self.btn_cerrar.pack_forget()
-                    except Exception:
-                        pass
-                try:
-                    self.btn_imprimir.config(state='normal')
-                    self.btn_imprimir.pack(fill='x', pady=2)
-                except Exception:
-                    try:
-                        self.btn_imprimir.pack(fill='x', pady=2)
-                    except Exception:
-                        pass
-            # Mostrar diferencia almacenada si la caja está cerrada; si está abierta, calcular en vivo
-            if esta_cerrada:
-                # Mostrar valor guardado en la base (self.diferencia_db)
-                diff_val = getattr(self, 'diferencia_db', None)
-                if diff_val is None:
-                    diff_val = 0.0
-                color = FINANCE_COLORS['positive_fg'] if float(diff_val) >= 0 else FINANCE_COLORS['negative_fg']
-                self.diff_label.config(text=f"🧮 Diferencia: {format_currency(diff_val, include_sign=True)}", fg=color)
-            else:
-                # Caja abierta: campos editables y botón de cerrar activo; mantener cálculo en vivo
-                try:
-                    self.conteo_entry.config(state='normal')
-                    self.transf_entry.config(state='normal')
-                    self.usuario_entry.config(state='normal')
-                    self.obs_text.config(state='normal')
-                except Exception:
-                    pass
-                try:
-                    self._calcular_diferencia()
-                except Exception:
-                    pass
+                self.btn_cerrar.config(state='normal')
+                self.btn_cerrar.pack(fill='x', pady=(0,5))
+            except Exception:
                 try:
-                    self.btn_cerrar.config(state='normal')
                     self.btn_cerrar.pack(fill='x', pady=(0,5))
                 except Exception:
-                    try:
-                        self.btn_cerrar.pack(fill='x', pady=(0,5))
-                    except Exception:
-                        pass
+                    pass
+            try:
+                # ocultar o desactivar imprimir si la caja no está cerrada
+                self.btn_imprimir.config(state='disabled')
+                self.btn_imprimir.pack_forget()
+            except Exception:
                 try:
-                    # ocultar o desactivar imprimir si la caja no está cerrada
-                    self.btn_imprimir.config(state='disabled')
                     self.btn_imprimir.pack_forget()
                 except Exception:
-                    try:
-                        self.btn_imprimir.pack_forget()
-                    except Exception:
-                        pass
-            # Guardar total teórico (usar columna total_efectivo_teorico si existe)
-            try:
-                self.total_teorico = caja[14] or total_ventas
-            except Exception:
-                self.total_teorico = total_ventas
-            
+                    pass
+        # Guardar total teórico (usar columna total_efectivo_teorico si existe)
+        try:
+            self.total_teorico = caja[14] or total_ventas
+        except Exception:
+            self.total_teorico = total_ventas
+        
     def _cerrar_caja(self):
         try:
             conteo = float(self.conteo_entry.get().replace(',', '.') or 0)
@@ -954,7 +880,6 @@ class DetalleCajaFrame(tk.Frame):
             if messagebox.askyesno("Confirmar", 
                                  "¿Está seguro de cerrar la caja? Esta acción no se puede deshacer."):
                 with get_connection() as conn:
-                    cursor = conn.cursor()
                     now = datetime.datetime.now()
                     # Calcular diferencia con la nueva fórmula:
                     ingresos = float(getattr(self, 'ingresos', 0) or 0)
@@ -966,28 +891,32 @@ class DetalleCajaFrame(tk.Frame):
                     # teor = fondo_inicial + total_ventas + ingresos - retiros
                     teorico = fondo + total_ventas + ingresos - retiros
                     diferencia = real - teorico
-                    cursor.execute("""
-                        UPDATE caja_diaria 
-                        SET estado = 'cerrada',
-                            hora_cierre = ?,
-                            usuario_cierre = ?,
-                            cajero_cierre = ?,
-                            conteo_efectivo_final = ?,
-                            transferencias_final = ?,
-                            diferencia = ?,
-                            obs_cierre = ?
-                        WHERE id = ?
-                    """, (
-                        now.strftime('%H:%M:%S'),
-                        usuario_sistema or '',
-                        cajero,
-                        conteo,
-                        transf,
-                        diferencia,
-                        obs,
-                        self.caja_id
-                    ))
-                    conn.commit()
+                    # Cierre y resumen de la caja en una sola transacción
+                    with transaction() as tx:
+                        cursor = tx.cursor()
+                        cursor.execute("""
+                            UPDATE caja_diaria 
+                            SET estado = 'cerrada',
+                                hora_cierre = ?,
+                                usuario_cierre = ?,
+                                cajero_cierre = ?,
+                                conteo_efectivo_final = ?,
+                                transferencias_final = ?,
+                                diferencia = ?,
+                                obs_cierre = ?
+                            WHERE id = ?
+                        """, (
+                            now.strftime('%H:%M:%S'),
+                            usuario_sistema or '',
+                            cajero,
+                            conteo,
+                            transf,
+                            diferencia,
+                            obs,
+                            self.caja_id
+                        ))
+                        guardar_resumenes(cursor, [self.caja_id])
+                    invalidar_snapshot(self.caja_id)
                     # Create a timestamped backup after successful close. Use best-effort call.
                     try:
                         if callable(backup_db):
@@ -1202,40 +1131,12 @@ class DetalleCajaFrame(tk.Frame):
                     movimientos_joined = ''
                 # Construir cadena con items vendidos: Producto (Cant x subtotal)
                 try:
-                    with get_connection() as conn2:
-                        cur2 = conn2.cursor()
-                        cur2.execute("""
-                            SELECT p.nombre, SUM(vi.cantidad) as cant, SUM(vi.cantidad * vi.precio_unitario) as total
-                            FROM venta_items vi
-                            JOIN tickets t ON t.id = vi.ticket_id
-                            JOIN ventas v ON v.id = t.venta_id
-                            JOIN products p ON p.id = vi.producto_id
-                            WHERE v.caja_id = ?
-                            GROUP BY p.nombre
-                        """, (self.caja_id,))
-                        items_rows = cur2.fetchall()
+                    items_rows = _productos_por_total(self._snapshot())
                     items_joined = ' | '.join(f"{r[0]} ({int(r[1])} x {format_currency(r[2])})" for r in items_rows)
                 except Exception:
                     items_joined = ''
-                # compute ingresos/retiros for export (prefer attributes; fall back to summing caja_movimiento)
-                try:
-                    ingresos_val = getattr(self, 'ingresos', None)
-                    retiros_val = getattr(self, 'retiros', None)
-                    if ingresos_val is None or retiros_val is None:
-                        try:
-                            cur2.execute("SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto ELSE 0 END),0), COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto ELSE 0 END),0) FROM caja_movimiento WHERE caja_id=?", (self.caja_id,))
-                            mv = cur2.fetchone()
-                            if mv:
-                                if ingresos_val is None:
-                                    ingresos_val = mv[0] or 0
-                                if retiros_val is None:
-                                    retiros_val = mv[1] or 0
-                        except Exception:
-                            ingresos_val = ingresos_val if ingresos_val is not None else 0
-                            retiros_val = retiros_val if retiros_val is not None else 0
-                except Exception:
-                    ingresos_val = getattr(self, 'ingresos', 0) or 0
-                    retiros_val = getattr(self, 'retiros', 0) or 0
+                # ingresos/retiros para el export (desde el snapshot de la caja)
+                ingresos_val, retiros_val = self._movimientos_totales()
 
                 row = [
                     getattr(self, 'codigo_caja', self.caja_id),
@@ -1278,27 +1179,8 @@ class DetalleCajaFrame(tk.Frame):
                         items_joined_val = items_joined
                     except Exception:
                         items_joined_val = ''
-                    # compute ingresos/retiros for fallback export
-                    try:
-                        ingresos_val = getattr(self, 'ingresos', None)
-                        retiros_val = getattr(self, 'retiros', None)
-                        if ingresos_val is None or retiros_val is None:
-                            try:
-                                with get_connection() as _conn_tmp:
-                                    _cur_tmp = _conn_tmp.cursor()
-                                    _cur_tmp.execute("SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto ELSE 0 END),0), COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto ELSE 0 END),0) FROM caja_movimiento WHERE caja_id=?", (self.caja_id,))
-                                    _mv = _cur_tmp.fetchone()
-                                    if _mv:
-                                        if ingresos_val is None:
-                                            ingresos_val = _mv[0] or 0
-                                        if retiros_val is None:
-                                            retiros_val = _mv[1] or 0
-                            except Exception:
-                                ingresos_val = ingresos_val if ingresos_val is not None else 0
-                                retiros_val = retiros_val if retiros_val is not None else 0
-                    except Exception:
-                        ingresos_val = getattr(self, 'ingresos', 0) or 0
-                        retiros_val = getattr(self, 'retiros', 0) or 0
+                    # ingresos/retiros para el export de respaldo
+                    ingresos_val, retiros_val = self._movimientos_totales()
 
                     values = [
                         str(getattr(self, 'codigo_caja', self.caja_id)),
@@ -1367,26 +1249,7 @@ class DetalleCajaFrame(tk.Frame):
                 c.drawString(50, y, f"Transferencias: {getattr(self, 'transferencias_final', self.transf_entry.get())}")
                 y -= 20
                 # Mostrar Ingresos y Retiros
-                try:
-                    _ing = getattr(self, 'ingresos', None)
-                    _ret = getattr(self, 'retiros', None)
-                    if _ing is None or _ret is None:
-                        try:
-                            with get_connection() as _conn_tmp:
-                                _cur_tmp = _conn_tmp.cursor()
-                                _cur_tmp.execute("SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto ELSE 0 END),0), COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto ELSE 0 END),0) FROM caja_movimiento WHERE caja_id=?", (self.caja_id,))
-                                _m = _cur_tmp.fetchone()
-                                if _m:
-                                    if _ing is None:
-                                        _ing = _m[0] or 0
-                                    if _ret is None:
-                                        _ret = _m[1] or 0
-                        except Exception:
-                            _ing = _ing if _ing is not None else 0
-                            _ret = _ret if _ret is not None else 0
-                except Exception:
-                    _ing = getattr(self, 'ingresos', 0) or 0
-                    _ret = getattr(self, 'retiros', 0) or 0
+                _ing, _ret = self._movimientos_totales()
                 try:
                     c.drawString(50, y, f"Ingresos: {format_currency(_ing)}")
                     y -= 20
@@ -1413,18 +1276,7 @@ class DetalleCajaFrame(tk.Frame):
                     pass
                 # incluir items vendidos
                 try:
-                    with get_connection() as conn3:
-                        ccur = conn3.cursor()
-                        ccur.execute("""
-                            SELECT p.nombre, SUM(vi.cantidad) as cant, SUM(vi.cantidad * vi.precio_unitario) as total
-                            FROM venta_items vi
-                            JOIN tickets t ON t.id = vi.ticket_id
-                            JOIN ventas v ON v.id = t.venta_id
-                            JOIN products p ON p.id = vi.producto_id
-                            WHERE v.caja_id = ?
-                            GROUP BY p.nombre
-                        """, (self.caja_id,))
-                        items_rows_pdf = ccur.fetchall()
+                    items_rows_pdf = _productos_por_total(self._snapshot())
                     if items_rows_pdf:
                         y -= 10
                         c.setFont("Helvetica-Bold", 12)
@@ -1449,22 +1301,7 @@ class DetalleCajaFrame(tk.Frame):
                     f.write(f"Fondo inicial: {getattr(self, 'fondo_inicial', self.conteo_entry.get())}\n")
                     f.write(f"Transferencias: {getattr(self, 'transferencias_final', self.transf_entry.get())}\n")
                     # Incluir Ingresos y Retiros en texto
-                    try:
-                        _ing = getattr(self, 'ingresos', None)
-                        _ret = getattr(self, 'retiros', None)
-                        if _ing is None or _ret is None:
-                            with get_connection() as _c:
-                                _cur = _c.cursor()
-                                _cur.execute("SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto ELSE 0 END),0), COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto ELSE 0 END),0) FROM caja_movimiento WHERE caja_id=?", (self.caja_id,))
-                                _r = _cur.fetchone()
-                                if _r:
-                                    if _ing is None:
-                                        _ing = _r[0] or 0
-                                    if _ret is None:
-                                        _ret = _r[1] or 0
-                    except Exception:
-                        _ing = getattr(self, 'ingresos', 0) or 0
-                        _ret = getattr(self, 'retiros', 0) or 0
+                    _ing, _ret = self._movimientos_totales()
                     try:
                         f.write(f"Ingresos: {_ing}\n")
                         f.write(f"Retiros: {-abs(float(_ret))}\n")
@@ -1487,22 +1324,11 @@ class DetalleCajaFrame(tk.Frame):
                         pass
                     # incluir items vendidos en texto
                     try:
-                        with get_connection() as conn4:
-                            tcur = conn4.cursor()
-                            tcur.execute("""
-                                SELECT p.nombre, SUM(vi.cantidad) as cant, SUM(vi.cantidad * vi.precio_unitario) as total
-                                FROM venta_items vi
-                                JOIN tickets t ON t.id = vi.ticket_id
-                                JOIN ventas v ON v.id = t.venta_id
-                                JOIN products p ON p.id = vi.producto_id
-                                WHERE v.caja_id = ?
-                                GROUP BY p.nombre
-                            """, (self.caja_id,))
-                            trows = tcur.fetchall()
-                            if trows:
-                                f.write('\nItems vendidos:\n')
-                                for r in trows:
-                                    f.write(f"({r[0]} x {int(r[1])}) = {format_currency(r[2])}\n")
+                        trows = _productos_por_total(self._snapshot())
+                        if trows:
+                            f.write('\nItems vendidos:\n')
+                            for r in trows:
+                                f.write(f"({r[0]} x {int(r[1])}) = {format_currency(r[2])}\n")
                     except Exception:
                         pass
             # abrir automaticamente
@@ -1522,262 +1348,229 @@ class DetalleCajaFrame(tk.Frame):
     def _imprimir_ticket(self):
         """Imprime el ticket de cierre de caja"""
         try:
-            with get_connection() as conn:
-                cursor = conn.cursor()
-                # Build ticket using attributes already loaded in the frame (safe fallbacks)
-                ticket = []
-                ticket.append("=" * 40)
-                ticket.append("CIERRE DE CAJA".center(40))
-                ticket.append("=" * 40)
-                ticket.append(f"Codigo caja: {getattr(self, 'codigo_caja', '')}")
-                ticket.append(f"Fecha apertura: {getattr(self, 'fecha', '')} {getattr(self, 'hora_apertura', '')}")
-                ticket.append(f"Cajero apertura: {getattr(self, 'cajero_apertura', getattr(self, 'usuario_apertura', ''))}")
-                ticket.append(f"Disciplina: {getattr(self, 'nombre_disciplina', '')}")
-                # Mostrar evento si existe
+            snap = self._snapshot()
+            # Build ticket using attributes already loaded in the frame (safe fallbacks)
+            ticket = []
+            ticket.append("=" * 40)
+            ticket.append("CIERRE DE CAJA".center(40))
+            ticket.append("=" * 40)
+            ticket.append(f"Codigo caja: {getattr(self, 'codigo_caja', '')}")
+            ticket.append(f"Fecha apertura: {getattr(self, 'fecha', '')} {getattr(self, 'hora_apertura', '')}")
+            ticket.append(f"Cajero apertura: {getattr(self, 'cajero_apertura', getattr(self, 'usuario_apertura', ''))}")
+            ticket.append(f"Disciplina: {getattr(self, 'nombre_disciplina', '')}")
+            # Mostrar evento si existe
+            try:
+                if getattr(self, 'descripcion_evento', ''):
+                    ticket.append(f"Evento: {self.descripcion_evento}")
+            except Exception:
+                pass
+            ticket.append(f"Fecha cierre: {getattr(self, 'fecha', '')} {getattr(self, 'hora_cierre', '')}")
+            ticket.append(f"Cajero cierre: {getattr(self, 'cajero_cierre', getattr(self, 'usuario_cierre', ''))}")
+            ticket.append("-" * 40)
+            
+            # Totales por método de pago
+            ticket.append("TOTALES POR MEDIO DE PAGO")
+            ticket.append("-" * 40)
+            total_general = 0
+            for metodo, _cant, total in snap.por_metodo:
+                ticket.append(f"{metodo}: {format_currency(total)}")
+                total_general += total
+            
+            ticket.append("-" * 40)
+            ticket.append(f"TOTAL: {format_currency(total_general)}")
+            ticket.append("-" * 40)
+            
+            # Información de cierre (usar atributos para robustez)
+            try:
+                ticket.append(f"Fondo inicial: {format_currency(getattr(self, 'fondo_inicial', 0))}")
+                ticket.append(f"Conteo final: {format_currency(getattr(self, 'conteo_efectivo_final', getattr(self, 'conteo_entry', '') or 0))}")
+                ticket.append(f"Transferencias: {format_currency(getattr(self, 'transferencias_final', 0))}")
+                # Ingresos / Retiros (mostrar retiros como negativo)
+                ingresos_val, retiros_val = self._movimientos_totales()
                 try:
-                    if getattr(self, 'descripcion_evento', ''):
-                        ticket.append(f"Evento: {self.descripcion_evento}")
+                    ticket.append(f"Ingresos: {format_currency(ingresos_val)}")
+                    ticket.append(f"Retiros: {format_currency(-abs(float(retiros_val)))}")
                 except Exception:
-                    pass
-                ticket.append(f"Fecha cierre: {getattr(self, 'fecha', '')} {getattr(self, 'hora_cierre', '')}")
-                ticket.append(f"Cajero cierre: {getattr(self, 'cajero_cierre', getattr(self, 'usuario_cierre', ''))}")
-                ticket.append("-" * 40)
-                
-                # Totales por método de pago
-                cursor.execute("""
-                    SELECT mp.descripcion, SUM(t.total_ticket) as total
-                    FROM ventas v
-                    JOIN tickets t ON t.venta_id = v.id
-                    LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
-                    WHERE v.caja_id = ? AND t.status != 'Anulado'
-                    GROUP BY mp.descripcion
-                """, (self.caja_id,))
-                
-                ticket.append("TOTALES POR MEDIO DE PAGO")
-                ticket.append("-" * 40)
-                total_general = 0
-                for metodo, total in cursor.fetchall():
-                    ticket.append(f"{metodo}: {format_currency(total)}")
-                    total_general += total
-                
-                ticket.append("-" * 40)
-                ticket.append(f"TOTAL: {format_currency(total_general)}")
-                ticket.append("-" * 40)
-                
-                # Información de cierre (usar atributos para robustez)
-                try:
-                    ticket.append(f"Fondo inicial: {format_currency(getattr(self, 'fondo_inicial', 0))}")
-                    ticket.append(f"Conteo final: {format_currency(getattr(self, 'conteo_efectivo_final', getattr(self, 'conteo_entry', '') or 0))}")
-                    ticket.append(f"Transferencias: {format_currency(getattr(self, 'transferencias_final', 0))}")
-                    # Ingresos / Retiros (mostrar retiros como negativo)
-                    try:
-                        ingresos_val = getattr(self, 'ingresos', None)
-                        retiros_val = getattr(self, 'retiros', None)
-                        if ingresos_val is None or retiros_val is None:
-                            cursor.execute("SELECT COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto ELSE 0 END),0), COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto ELSE 0 END),0) FROM caja_movimiento WHERE caja_id=?", (self.caja_id,))
-                            _mv = cursor.fetchone()
-                            if _mv:
-                                if ingresos_val is None:
-                                    ingresos_val = _mv[0] or 0
-                                if retiros_val is None:
-                                    retiros_val = _mv[1] or 0
-                    except Exception:
-                        ingresos_val = getattr(self, 'ingresos', 0) or 0
-                        retiros_val = getattr(self, 'retiros', 0) or 0
-                    try:
-                        ticket.append(f"Ingresos: {format_currency(ingresos_val)}")
-                        ticket.append(f"Retiros: {format_currency(-abs(float(retiros_val)))}")
-                    except Exception:
-                        ticket.append(f"Ingresos: {format_currency(getattr(self, 'ingresos', 0))}")
-                        ticket.append(f"Retiros: {format_currency(-abs(getattr(self, 'retiros', 0) or 0))}")
-                    # preferir diferencia almacenada si existe
-                    diff_val = getattr(self, 'diferencia_db', None)
-                    if diff_val is None:
-                        # intentar parsear del label (fallback)
-                        try:
-                            # label tiene formato '🧮 Diferencia: $ 0,00' o similar
-                            label = self.diff_label.cget('text')
-                            # extraer último token
-                            diff_val = label.split()[-1]
-                        except Exception:
-                            diff_val = 0
-                    # Mostrar diferencia con signo
+                    ticket.append(f"Ingresos: {format_currency(getattr(self, 'ingresos', 0))}")
+                    ticket.append(f"Retiros: {format_currency(-abs(getattr(self, 'retiros', 0) or 0))}")
+                # preferir diferencia almacenada si existe
+                diff_val = getattr(self, 'diferencia_db', None)
+                if diff_val is None:
+                    # intentar parsear del label (fallback)
                     try:
-                        dnum = float(diff_val)
+                        # label tiene formato '🧮 Diferencia: $ 0,00' o similar
+                        label = self.diff_label.cget('text')
+                        # extraer último token
+                        diff_val = label.split()[-1]
                     except Exception:
-                        try:
-                            # parsear texto con moneda
-                            dnum = float(str(diff_val).replace('$', '').replace(',', '.'))
-                        except Exception:
-                            dnum = 0.0
-                    ticket.append(f"Diferencia: {format_currency(dnum, include_sign=True)}")
-                except Exception:
-                    pass
-                # Tickets anulados (desde atributo calculado)
-                ticket.append(f"Tickets anulados: {getattr(self, 'tickets_anulados', 0)}")
-                ticket.append("=" * 40)
-                
-                # Items vendidos: Producto, Cantidad, Monto
+                        diff_val = 0
+                # Mostrar diferencia con signo
                 try:
-                    cursor.execute("""
-                        SELECT p.nombre, SUM(vi.cantidad) as cant, SUM(vi.cantidad * vi.precio_unitario) as total
-                        FROM venta_items vi
-                        JOIN tickets t ON t.id = vi.ticket_id
-                        JOIN ventas v ON v.id = t.venta_id
-                        JOIN products p ON p.id = vi.producto_id
-                        WHERE v.caja_id = ?
-                        GROUP BY p.nombre
-                        ORDER BY total DESC
-                    """, (self.caja_id,))
-                    items = cursor.fetchall()
-                    if items:
-                        ticket.append("ITEMS VENDIDOS:")
-                        ticket.append("(Producto x Cant) = Monto Total")
-                        ticket.append("-" * 40)
-                        for nombre, cant, total in items:
-                            ticket.append(f"({nombre} x {int(cant)}) = {format_currency(total)}")
+                    dnum = float(diff_val)
                 except Exception:
-                    pass
+                    try:
+                        # parsear texto con moneda
+                        dnum = float(str(diff_val).replace('$', '').replace(',', '.'))
+                    except Exception:
+                        dnum = 0.0
+                ticket.append(f"Diferencia: {format_currency(dnum, include_sign=True)}")
+            except Exception:
+                pass
+            # Tickets anulados (desde atributo calculado)
+            ticket.append(f"Tickets anulados: {getattr(self, 'tickets_anulados', 0)}")
+            ticket.append("=" * 40)
+            
+            # Items vendidos: Producto, Cantidad, Monto
+            try:
+                items = _productos_por_total(snap)
+                if items:
+                    ticket.append("ITEMS VENDIDOS:")
+                    ticket.append("(Producto x Cant) = Monto Total")
+                    ticket.append("-" * 40)
+                    for nombre, cant, total in items:
+                        ticket.append(f"({nombre} x {int(cant)}) = {format_currency(total)}")
+            except Exception:
+                pass
 
-                # Mostrar vista previa en ventana con acciones: Imprimir / Exportar a PDF
-                preview = "\n".join(ticket)
-                try:
-                    win = tk.Toplevel(self)
-                    win.title('Vista previa ticket')
-                    txt = tk.Text(win, width=60, height=30, wrap='none')
-                    txt.insert('1.0', preview)
-                    txt.config(state='disabled')
-                    txt.pack(fill='both', expand=True)
-                    btn_frame = tk.Frame(win)
-                    btn_frame.pack(fill='x', pady=6)
+            # Mostrar vista previa en ventana con acciones: Imprimir / Exportar a PDF
+            preview = "\n".join(ticket)
+            try:
+                win = tk.Toplevel(self)
+                win.title('Vista previa ticket')
+                txt = tk.Text(win, width=60, height=30, wrap='none')
+                txt.insert('1.0', preview)
+                txt.config(state='disabled')
+                txt.pack(fill='both', expand=True)
+                btn_frame = tk.Frame(win)
+                btn_frame.pack(fill='x', pady=6)
 
-                    # (Se omite control de 'no cortar' — la impresión añadirá corte automáticamente)
+                # (Se omite control de 'no cortar' — la impresión añadirá corte automáticamente)
 
-                    def do_print():
-                        # Intentar imprimir directamente a una impresora POS en Windows usando win32print (pywin32).
-                        # Si no está disponible o falla, caer al flujo anterior que genera un PDF y lo envía a imprimir.
-                        try:
-                            import sys, tempfile, os
-                            # Solo intentamos escritura directa en Windows (POS normalmente conectado/instalado allí)
-                            if sys.platform.startswith('win'):
+                def do_print():
+                    # Intentar imprimir directamente a una impresora POS en Windows usando win32print (pywin32).
+                    # Si no está disponible o falla, caer al flujo anterior que genera un PDF y lo envía a imprimir.
+                    try:
+                        import sys, tempfile, os
+                        # Solo intentamos escritura directa en Windows (POS normalmente conectado/instalado allí)
+                        if sys.platform.startswith('win'):
+                            try:
+                                import win32print
+                                # Resolver impresora seleccionada o predeterminada
+                                try:
+                                    from app_config import get_printer_name
+                                    sel = get_printer_name()
+                                    printer_name = sel if sel else win32print.GetDefaultPrinter()
+                                except Exception:
+                                    printer_name = win32print.GetDefaultPrinter()
+                                hPrinter = win32print.OpenPrinter(printer_name)
                                 try:
-                                    import win32print
-                                    # Resolver impresora seleccionada o predeterminada
+                                    # Preparar texto del ticket como bytes; al final añadiremos
+                                    # secuencias ESC/POS para forzar corte del papel.
+                                    text = "\n".join(ticket) + "\n\n"
+                                    # Probar codificaciones comunes para impresoras POS
                                     try:
-                                        from app_config import get_printer_name
-                                        sel = get_printer_name()
-                                        printer_name = sel if sel else win32print.GetDefaultPrinter()
+                                        data = text.encode('cp437', errors='replace')
                                     except Exception:
-                                        printer_name = win32print.GetDefaultPrinter()
-                                    hPrinter = win32print.OpenPrinter(printer_name)
-                                    try:
-                                        # Preparar texto del ticket como bytes; al final añadiremos
-                                        # secuencias ESC/POS para forzar corte del papel.
-                                        text = "\n".join(ticket) + "\n\n"
-                                        # Probar codificaciones comunes para impresoras POS
                                         try:
-                                            data = text.encode('cp437', errors='replace')
+                                            data = text.encode('cp1252', errors='replace')
                                         except Exception:
-                                            try:
-                                                data = text.encode('cp1252', errors='replace')
-                                            except Exception:
-                                                data = text.encode('utf-8', errors='replace')
+                                            data = text.encode('utf-8', errors='replace')
 
-                                        # Añadir secuencias comunes de corte de papel (ESC/POS)
-                                        try:
-                                            # GS V 0 (partial cut) or GS V 1 (full) — algunos drivers usan 0
-                                            cut_seqs = [b'\x1dV\x00', b'\x1dV\x01', b'\x1b\x69', b'\x1b\x6d']
-                                            # añadir nuevas líneas y luego la primera secuencia válida
-                                            data = data + b'\n\n\n'
-                                            # concatenar una secuencia de corte (no todas para evitar duplicados extremos)
-                                            data = data + cut_seqs[0]
-                                        except Exception:
-                                            pass
+                                    # Añadir secuencias comunes de corte de papel (ESC/POS)
+                                    try:
+                                        # GS V 0 (partial cut) or GS V 1 (full) — algunos drivers usan 0
+                                        cut_seqs = [b'\x1dV\x00', b'\x1dV\x01', b'\x1b\x69', b'\x1b\x6d']
+                                        # añadir nuevas líneas y luego la primera secuencia válida
+                                        data = data + b'\n\n\n'
+                                        # concatenar una secuencia de corte (no todas para evitar duplicados extremos)
+                                        data = data + cut_seqs[0]
+                                    except Exception:
+                                        pass
 
-                                        # Enviar como RAW al spooler
-                                        win32print.StartDocPrinter(hPrinter, 1, ("Ticket", None, "RAW"))
-                                        win32print.StartPagePrinter(hPrinter)
-                                        win32print.WritePrinter(hPrinter, data)
-                                        win32print.EndPagePrinter(hPrinter)
-                                        win32print.EndDocPrinter(hPrinter)
-                                        messagebox.showinfo('Imprimir', f'Enviado a impresora: {printer_name}')
-                                        return
-                                    finally:
-                                        try:
-                                            win32print.ClosePrinter(hPrinter)
-                                        except Exception:
-                                            pass
-                                except ImportError:
-                                    # pywin32 no disponible: caemos a PDF
-                                    pass
-                                except Exception as e:
-                                    # Error al usar win32print: mostrar aviso y caer a PDF
-                                    messagebox.showwarning('Imprimir', f'No se pudo imprimir directamente: {e}\nSe intentará por PDF.')
+                                    # Enviar como RAW al spooler
+                                    win32print.StartDocPrinter(hPrinter, 1, ("Ticket", None, "RAW"))
+                                    win32print.StartPagePrinter(hPrinter)
+                                    win32print.WritePrinter(hPrinter, data)
+                                    win32print.EndPagePrinter(hPrinter)
+                                    win32print.EndDocPrinter(hPrinter)
+                                    messagebox.showinfo('Imprimir', f'Enviado a impresora: {printer_name}')
+                                    return
+                                finally:
+                                    try:
+                                        win32print.ClosePrinter(hPrinter)
+                                    except Exception:
+                                        pass
+                            except ImportError:
+                                # pywin32 no disponible: caemos a PDF
+                                pass
+                            except Exception as e:
+                                # Error al usar win32print: mostrar aviso y caer a PDF
+                                messagebox.showwarning('Imprimir', f'No se pudo imprimir directamente: {e}\nSe intentará por PDF.')
 
-                            # Fallback: generar un PDF temporal y enviarlo a imprimir (método seguro)
-                            from reportlab.lib.pagesizes import A4
-                            from reportlab.pdfgen import canvas
-                            fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
-                            os.close(fd)
-                            c = canvas.Canvas(pdf_path, pagesize=A4)
-                            y = 800
-                            c.setFont('Helvetica', 10)
-                            for line in ticket:
-                                c.drawString(40, y, str(line))
-                                y -= 14
-                                if y < 60:
-                                    c.showPage()
-                                    y = 800
-                            c.save()
-                            if sys.platform.startswith('win'):
-                                os.startfile(pdf_path, 'print')
-                            else:
-                                import subprocess
-                                subprocess.Popen(['lp', pdf_path])
-                        except Exception as e:
-                            messagebox.showerror('Imprimir', f'Error al imprimir: {e}')
+                        # Fallback: generar un PDF temporal y enviarlo a imprimir (método seguro)
+                        from reportlab.lib.pagesizes import A4
+                        from reportlab.pdfgen import canvas
+                        fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+                        os.close(fd)
+                        c = canvas.Canvas(pdf_path, pagesize=A4)
+                        y = 800
+                        c.setFont('Helvetica', 10)
+                        for line in ticket:
+                            c.drawString(40, y, str(line))
+                            y -= 14
+                            if y < 60:
+                                c.showPage()
+                                y = 800
+                        c.save()
+                        if sys.platform.startswith('win'):
+                            os.startfile(pdf_path, 'print')
+                        else:
+                            import subprocess
+                            subprocess.Popen(['lp', pdf_path])
+                    except Exception as e:
+                        messagebox.showerror('Imprimir', f'Error al imprimir: {e}')
 
-                    def do_export_pdf():
-                        # Exportar a PDF: usar reportlab si está disponible
+                def do_export_pdf():
+                    # Exportar a PDF: usar reportlab si está disponible
+                    try:
+                        from reportlab.lib.pagesizes import A4
+                        from reportlab.pdfgen import canvas
+                        import tempfile, os
+                        fd, path = tempfile.mkstemp(suffix='.pdf')
+                        os.close(fd)
+                        c = canvas.Canvas(path, pagesize=A4)
+                        y = 800
+                        c.setFont('Helvetica', 10)
+                        for line in ticket:
+                            c.drawString(40, y, str(line))
+                            y -= 14
+                            if y < 60:
+                                c.showPage()
+                                y = 800
+                        c.save()
+                        # abrir el pdf generado
+                        if os.name == 'nt':
+                            os.startfile(path)
+                        else:
+                            import subprocess
+                            subprocess.Popen(['xdg-open', path])
+                    except Exception:
+                        # fallback: guardar como .txt
                         try:
-                            from reportlab.lib.pagesizes import A4
-                            from reportlab.pdfgen import canvas
-                            import tempfile, os
-                            fd, path = tempfile.mkstemp(suffix='.pdf')
-                            os.close(fd)
-                            c = canvas.Canvas(path, pagesize=A4)
-                            y = 800
-                            c.setFont('Helvetica', 10)
-                            for line in ticket:
-                                c.drawString(40, y, str(line))
-                                y -= 14
-                                if y < 60:
-                                    c.showPage()
-                                    y = 800
-                            c.save()
-                            # abrir el pdf generado
-                            if os.name == 'nt':
-                                os.startfile(path)
-                            else:
-                                import subprocess
-                                subprocess.Popen(['xdg-open', path])
-                        except Exception:
-                            # fallback: guardar como .txt
-                            try:
-                                from tkinter import filedialog as _fd
-                                fpath = _fd.asksaveasfilename(defaultextension='.txt', filetypes=[('Text','*.txt')])
-                                if fpath:
-                                    with open(fpath, 'w', encoding='utf-8') as f:
-                                        f.write(preview)
-                                    messagebox.showinfo('Exportar', f'Archivo guardado: {fpath}')
-                            except Exception as e:
-                                messagebox.showerror('Exportar', f'Error exportando: {e}')
+                            from tkinter import filedialog as _fd
+                            fpath = _fd.asksaveasfilename(defaultextension='.txt', filetypes=[('Text','*.txt')])
+                            if fpath:
+                                with open(fpath, 'w', encoding='utf-8') as f:
+                                    f.write(preview)
+                                messagebox.showinfo('Exportar', f'Archivo guardado: {fpath}')
+                        except Exception as e:
+                            messagebox.showerror('Exportar', f'Error exportando: {e}')
 
-                    tk.Button(btn_frame, text='Imprimir', command=do_print).pack(side='left', padx=6)
-                    tk.Button(btn_frame, text='Exportar a PDF', command=do_export_pdf).pack(side='left', padx=6)
-                except Exception:
-                    # Fallback simple si no se puede abrir Toplevel
-                    messagebox.showinfo('Vista previa del ticket', preview)
-                
+                tk.Button(btn_frame, text='Imprimir', command=do_print).pack(side='left', padx=6)
+                tk.Button(btn_frame, text='Exportar a PDF', command=do_export_pdf).pack(side='left', padx=6)
+            except Exception:
+                # Fallback simple si no se puede abrir Toplevel
+                messagebox.showinfo('Vista previa del ticket', preview)
+            
         except Exception as e:
             messagebox.showerror("Error", f"Error al imprimir: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Totales por caja precalculados en la tabla caja_resumen.
+
+Una caja cerrada no cambia, así que sus totales (ventas, efectivo,
+transferencias, ingresos/retiros y conteo de tickets) se guardan una vez al
+cerrarla, dentro de la misma transacción del cierre. Las cajas abiertas se
+calculan en vivo con las mismas consultas agrupadas.
+"""
+from __future__ import annotations
+
+from db_utils import transaction
+
+COLUMNAS = (
+    'total_ventas', 'ventas_efectivo', 'transferencias',
+    'ingresos', 'retiros', 'total_tickets', 'tickets_anulados',
+)
+
+_SQL_TICKETS = """
+    SELECT v.caja_id,
+           COALESCE(SUM(CASE WHEN t.status!='Anulado' THEN t.total_ticket END),0),
+           COALESCE(SUM(CASE WHEN t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'efectivo%' THEN t.total_ticket END),0),
+           COALESCE(SUM(CASE WHEN t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'transfer%' THEN t.total_ticket END),0),
+           SUM(CASE WHEN t.status!='Anulado' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN t.status='Anulado' THEN 1 ELSE 0 END)
+      FROM ventas v
+      JOIN tickets t ON t.venta_id = v.id
+      LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
+     WHERE v.caja_id IN ({ids})
+     GROUP BY v.caja_id
+"""
+
+_SQL_MOVIMIENTOS = """
+    SELECT caja_id,
+           COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto END),0),
+           COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto END),0)
+      FROM caja_movimiento
+     WHERE caja_id IN ({ids})
+     GROUP BY caja_id
+"""
+
+
+def _agregados(cursor, ids_sql: str, params=()) -> dict:
+    """caja_id -> dict(COLUMNAS) para las cajas que devuelve `ids_sql` (un SELECT de ids)."""
+    resumen = {}
+    for caja_id, in cursor.execute(ids_sql, params).fetchall():
+        resumen[caja_id] = dict.fromkeys(COLUMNAS, 0)
+    if not resumen:
+        return resumen
+    for caja_id, total, efectivo, transf, n_ok, n_anul in cursor.execute(_SQL_TICKETS.format(ids=ids_sql), params):
+        r = resumen.get(caja_id)
+        if r is not None:
+            r.update(total_ventas=total, ventas_efectivo=efectivo, transferencias=transf,
+                     total_tickets=n_ok or 0, tickets_anulados=n_anul or 0)
+    for caja_id, ingresos, retiros in cursor.execute(_SQL_MOVIMIENTOS.format(ids=ids_sql), params):
+        r = resumen.get(caja_id)
+        if r is not None:
+            r.update(ingresos=ingresos, retiros=retiros)
+    return resumen
+
+
+def _ids_sql(caja_ids):
+    ids = [int(x) for x in caja_ids]
+    return f"SELECT id FROM caja_diaria WHERE id IN ({','.join('?' * len(ids))})", ids
+
+
+def calcular_resumenes(cursor, caja_ids) -> dict:
+    """Totales en vivo (sin usar caja_resumen) para las cajas indicadas."""
+    if not caja_ids:
+        return {}
+    sql, params = _ids_sql(caja_ids)
+    return _agregados(cursor, sql, params)
+
+
+def _guardar(cursor, resumenes: dict) -> int:
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO caja_resumen (caja_id, {', '.join(COLUMNAS)}, actualizado_ts) "
+        f"VALUES (?, {', '.join('?' * len(COLUMNAS))}, datetime('now','localtime'))",
+        [(cid, *(r[c] for c in COLUMNAS)) for cid, r in resumenes.items()],
+    )
+    return len(resumenes)
+
+
+def guardar_resumenes(cursor, caja_ids) -> int:
+    """Recalcula y guarda el resumen de las cajas indicadas que estén cerradas.
+
+    Llamar dentro de la transacción que cierra la caja (o que modifica una ya
+    cerrada, p. ej. al anular un ticket o importar) para que no quede desfasado.
+    """
+    ids = [int(x) for x in caja_ids or [] if x is not None]
+    if not ids:
+        return 0
+    sql = f"SELECT id FROM caja_diaria WHERE estado='cerrada' AND id IN ({','.join('?' * len(ids))})"
+    return _guardar(cursor, _agregados(cursor, sql, ids))
+
+
+def backfill_resumenes(cursor=None) -> int:
+    """Completa caja_resumen para todas las cajas cerradas que aún no lo tengan."""
+    if cursor is None:
+        with transaction() as conn:
+            return backfill_resumenes(conn.cursor())
+    sql = ("SELECT cd.id FROM caja_diaria cd WHERE cd.estado='cerrada' "
+           "AND NOT EXISTS (SELECT 1 FROM caja_resumen r WHERE r.caja_id = cd.id)")
+    return _guardar(cursor, _agregados(cursor, sql))
+
+
+_SQL_LISTADO = """
+    SELECT cd.id, cd.codigo_caja, cd.fecha, COALESCE(cd.cajero_apertura, cd.usuario_apertura), COALESCE(cd.fondo_inicial,0),
+           r.total_ventas, r.ventas_efectivo,
+           CASE WHEN LOWER(COALESCE(cd.estado,''))='abierta' THEN r.transferencias
+                ELSE COALESCE(cd.transferencias_final, r.transferencias) END,
+           r.ingresos, r.retiros,
+           COALESCE(cd.conteo_efectivo_final,0), COALESCE(cd.diferencia,0),
+           r.total_tickets, r.tickets_anulados,
+           COALESCE(cd.estado,''), COALESCE(cd.descripcion_evento,''), cd.transferencias_final
+      FROM caja_diaria cd
+      LEFT JOIN caja_resumen r ON r.caja_id = cd.id
+"""
+
+
+def listar_cajas(cursor, fecha=None, usuario_apertura=None, limite=200) -> list:
+    """Filas del listado de cajas (formato de CajaListadoView) en un solo recorrido.
+
+    Cada fila: (id, codigo, fecha, cajero, fondo_inicial, total_ventas, ventas_efectivo,
+    transferencias, ingresos, retiros, conteo_final, diferencia, total_tickets,
+    tickets_anulados, estado, descripcion_evento). Las cajas sin resumen guardado
+    (la abierta) se completan con calcular_resumenes.
+    """
+    condiciones, params = [], []
+    if usuario_apertura:
+        condiciones.append("cd.usuario_apertura = ?")
+        params.append(usuario_apertura)
+    if fecha:
+        condiciones.append("cd.fecha = ?")
+        params.append(fecha)
+    query = _SQL_LISTADO
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    if fecha:
+        query += " ORDER BY cd.fecha DESC, cd.codigo_caja DESC"
+    else:
+        query += f" ORDER BY cd.fecha DESC LIMIT {int(limite)}"
+    rows = cursor.execute(query, params).fetchall()
+
+    vivos = calcular_resumenes(cursor, [row[0] for row in rows if row[5] is None])
+    resultado = []
+    for row in rows:
+        r = vivos.get(row[0])
+        if r is not None:
+            transf = r['transferencias']
+            if str(row[14]).lower() != 'abierta' and row[16] is not None:
+                transf = row[16]
+            row = row[:5] + (
+                r['total_ventas'], r['ventas_efectivo'], transf, r['ingresos'], r['retiros'],
+            ) + row[10:12] + (r['total_tickets'], r['tickets_anulados']) + row[14:]
+        resultado.append(row[:16])
+    return resultado
@@ -0,0 +1,214 @@
+"""Foto de una caja armada con pocas consultas agrupadas y cacheada por caja_id.
+
+El detalle de caja, los exports, el ticket de cierre y BarCanchaApp.obtener_resumen_caja
+leen todos de un CajaSnapshot en lugar de repetir sus propias consultas.
+
+Las cajas cerradas quedan en caché de forma permanente. Para la abierta, cada
+escritura que la afecta (venta, anulación, movimiento, cierre, importación)
+llama a invalidar(caja_id) después de su commit. Las que hace otra instancia de
+la app sobre la misma base llegan por monitor_cambios: vigilar_cambios() descarta
+sólo las cajas abiertas, y toda la caché cuando una caja se cerró o se reabrió.
+"""
+from __future__ import annotations
+
+import threading
+
+from db_utils import get_connection
+
+
+class CajaSnapshot:
+    """Totales y desgloses de una caja en un momento dado.
+
+    info: fila de caja_diaria (dict por nombre de columna) + nombre_disciplina.
+    por_metodo: [(metodo, cantidad_tickets, total)] sin anulados.
+    por_categoria: [(categoria, total)] sin anulados, por categoría del ticket.
+    por_producto: [(categoria, producto, cantidad, total)] sin anulados.
+    movimientos: [(tipo, monto, observacion, creado_ts)] en orden de carga.
+    """
+
+    def __init__(self, caja_id, info, por_metodo, por_categoria, por_producto, anulados, movimientos):
+        self.caja_id = caja_id
+        self.info = info
+        self.por_metodo = por_metodo
+        self.por_categoria = por_categoria
+        self.por_producto = por_producto
+        self.tickets_anulados = anulados
+        self.movimientos = movimientos
+        self.total_ventas = sum(total for _m, _c, total in por_metodo)
+        self.total_tickets = sum(cant for _m, cant, _t in por_metodo)
+        self.ingresos = sum(monto for tipo, monto, _o, _c in movimientos if tipo == 'INGRESO')
+        self.retiros = sum(monto for tipo, monto, _o, _c in movimientos if tipo == 'RETIRO')
+
+    @property
+    def estado(self) -> str:
+        return (self.info or {}).get('estado') or ''
+
+    @property
+    def cerrada(self) -> bool:
+        return self.estado == 'cerrada'
+
+    def total_metodo(self, *descripciones) -> float:
+        """Suma de los métodos de pago cuya descripción (en minúsculas) está en `descripciones`."""
+        buscados = {d.lower() for d in descripciones}
+        return sum(total for metodo, _c, total in self.por_metodo if (metodo or '').lower() in buscados)
+
+    def items_por_categoria(self) -> dict:
+        """{categoria: [(producto, cantidad)]} ordenado como en la consulta."""
+        resultado = {}
+        for cat, prod, cant, _total in self.por_producto:
+            resultado.setdefault(cat or "Sin categoría", []).append((prod, cant))
+        return resultado
+
+
+def construir_snapshot(caja_id, cursor=None) -> CajaSnapshot | None:
+    """Lee la caja con cuatro consultas (caja, tickets agrupados, productos, movimientos)."""
+    if cursor is None:
+        cursor = get_connection().cursor()
+    cursor.execute(
+        """
+        SELECT cd.*, d.descripcion AS nombre_disciplina
+          FROM caja_diaria cd
+          LEFT JOIN disciplinas d ON d.codigo = cd.disciplina
+         WHERE cd.id = ?
+        """,
+        (caja_id,),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    info = dict(zip([c[0] for c in cursor.description], row))
+
+    # Un solo recorrido de tickets agrupado por método, categoría y anulado
+    cursor.execute(
+        """
+        SELECT mp.descripcion, c.descripcion, t.status = 'Anulado', COUNT(*), COALESCE(SUM(t.total_ticket),0)
+          FROM ventas v
+          JOIN tickets t ON t.venta_id = v.id
+          LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
+          LEFT JOIN Categoria_Producto c ON c.id = t.categoria_id
+         WHERE v.caja_id = ?
+         GROUP BY 1, 2, 3
+        """,
+        (caja_id,),
+    )
+    metodos, categorias, anulados = {}, {}, 0
+    for metodo, categoria, es_anulado, cant, total in cursor.fetchall():
+        if es_anulado:
+            anulados += cant
+            continue
+        if es_anulado is None:
+            # status NULL: ni emitido ni anulado (mismo criterio que status!='Anulado')
+            continue
+        m = metodos.setdefault(metodo, [0, 0])
+        m[0] += cant
+        m[1] += total
+        categorias[categoria] = categorias.get(categoria, 0) + total
+    por_metodo = [(m, v[0], v[1]) for m, v in metodos.items()]
+    por_categoria = sorted(categorias.items(), key=lambda kv: kv[1], reverse=True)
+
+    cursor.execute(
+        """
+        SELECT c.descripcion, p.nombre, SUM(vi.cantidad), SUM(vi.cantidad * vi.precio_unitario)
+          FROM venta_items vi
+          JOIN tickets t ON t.id = vi.ticket_id
+          JOIN ventas v ON v.id = t.venta_id
+          JOIN products p ON p.id = vi.producto_id
+          LEFT JOIN Categoria_Producto c ON c.id = p.categoria_id
+         WHERE v.caja_id = ? AND t.status != 'Anulado'
+         GROUP BY c.descripcion, p.nombre
+         ORDER BY c.descripcion, p.nombre
+        """,
+        (caja_id,),
+    )
+    por_producto = cursor.fetchall()
+
+    cursor.execute(
+        "SELECT tipo, monto, observacion, creado_ts FROM caja_movimiento WHERE caja_id=? ORDER BY creado_ts",
+        (caja_id,),
+    )
+    movimientos = cursor.fetchall()
+    return CajaSnapshot(caja_id, info, por_metodo, por_categoria, por_producto, anulados, movimientos)
+
+
+_cache = {}
+# Contadores de escrituras: global (invalidar todo) y por caja
+_generacion = {None: 0}
+_lock = threading.Lock()
+
+
+def _generacion_actual(caja_id):
+    return (_generacion[None], _generacion.get(caja_id, 0))
+
+
+def get_snapshot(caja_id, refresh: bool = False) -> CajaSnapshot | None:
+    """Snapshot cacheado de la caja (lo construye si no está o si refresh=True)."""
+    if caja_id is None:
+        return None
+    caja_id = int(caja_id)
+    with _lock:
+        snap = None if refresh else _cache.get(caja_id)
+        generacion = _generacion_actual(caja_id)
+    if snap is not None:
+        return snap
+    snap = construir_snapshot(caja_id)
+    with _lock:
+        # Si hubo una escritura mientras se leía, no guardar una foto vieja
+        if snap is not None and _generacion_actual(caja_id) == generacion:
+            _cache[caja_id] = snap
+    return snap
+
+
+def vigilar_cambios() -> None:
+    """Invalida la caché cuando otra conexión escribe las tablas de las que sale la foto.
+
+    El aviso no dice qué caja cambió, pero sólo las abiertas reciben ventas y
+    movimientos: se descartan ésas. Si cambió el conjunto de cajas abiertas (se
+    cerró, reabrió o abrió una) se descarta todo.
+    """
+    global _abiertas
+    from monitor_cambios import get_monitor
+    try:
+        _abiertas = _leer_abiertas()
+    except Exception:
+        _abiertas = None
+    get_monitor().suscribir(None, ('ventas', 'tickets', 'caja_movimiento', 'caja_diaria'), _on_cambios)
+
+
+# Cajas abiertas en el último aviso (None: no se pudieron leer)
+_abiertas = None
+
+
+def _leer_abiertas() -> set:
+    cur = get_connection().cursor()
+    cur.execute("SELECT id FROM caja_diaria WHERE estado='abierta'")
+    return {int(r[0]) for r in cur.fetchall()}
+
+
+def _on_cambios(tablas) -> None:
+    global _abiertas
+    try:
+        abiertas = _leer_abiertas()
+    except Exception:
+        invalidar()
+        _abiertas = None
+        return
+    anteriores, _abiertas = _abiertas, abiertas
+    # La venta también actualiza caja_diaria (total_tickets): sólo es un cierre o
+    # una reapertura si cambió qué cajas están abiertas
+    if 'caja_diaria' in tablas and anteriores != abiertas:
+        invalidar()
+        return
+    for caja_id in abiertas:
+        invalidar(caja_id)
+
+
+def invalidar(caja_id=None) -> None:
+    """Descarta la caché de una caja (o de todas si caja_id es None). Llamar tras el commit."""
+    with _lock:
+        if caja_id is None:
+            _generacion[None] += 1
+            _cache.clear()
+            return
+        caja_id = int(caja_id)
+        _generacion[caja_id] = _generacion.get(caja_id, 0) + 1
+        _cache.pop(caja_id, None)
@@ -0,0 +1,239 @@
+"""Hilo de lectura para consultas de reportes, cancelables.
+
+Las consultas pesadas (reporte tabular, export del historial, KPIs, listado de
+cajas) se encolan acá y corren en un hilo con su propia conexión
+(db_utils.get_connection es por hilo), así la ventana del POS no se congela.
+Las filas vuelven a la UI en lotes: el hilo lector las deja en una cola que Tk
+vacía con root.after, igual que db_writer.
+
+Cancelar una consulta (porque cambiaron los filtros o se salió de la vista)
+llama a sqlite3.Connection.interrupt() si está corriendo, o la descarta si
+todavía estaba en cola. Los lotes y callbacks de una consulta cancelada no
+llegan a la UI; en su lugar, si la cancela cancelar_todo() (al cambiar de
+vista) se llama su on_cancel() para que la vista no quede esperando un
+resultado que no va a llegar. Las consultas con segundo_plano=True (p. ej. una
+exportación que pidió el usuario) no se cortan al cambiar de vista.
+"""
+from __future__ import annotations
+
+import atexit
+import queue
+import sqlite3
+import threading
+
+from db_utils import get_connection
+
+
+class Consulta:
+    """Trabajo de lectura encolado; cancelar() es seguro desde cualquier hilo."""
+
+    def __init__(self, reader, on_batch=None, on_done=None, on_error=None, on_cancel=None, segundo_plano=False):
+        self._reader = reader
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.segundo_plano = segundo_plano
+        self.cancelada = False
+        self.terminada = False
+        self.filas = 0
+
+    def cancelar(self):
+        self._reader._cancelar(self)
+
+
+class DBReader:
+    """Cola de consultas atendida por un solo hilo lector."""
+
+    def __init__(self, poll_ms: int = 25, batch_size: int = 500):
+        self._jobs: queue.Queue = queue.Queue()
+        self._done: queue.Queue = queue.Queue()
+        self._poll_ms = poll_ms
+        self.batch_size = batch_size
+        self.lotes_por_vuelta = 8
+        self._root = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # Consulta en ejecución y conexión del hilo lector (para interrupt())
+        self._actual = None
+        self._conn = None
+        self._pendientes = set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-reader', daemon=True)
+                self._thread.start()
+
+    def attach(self, root):
+        """Vincula la cola de resultados con el mainloop de Tk."""
+        self._root = root
+        self.start()
+        self._root.after(self._poll_ms, self._poll)
+
+    def consultar(self, sql, params=(), *, on_batch=None, on_done=None, on_error=None, on_cancel=None,
+                  segundo_plano=False, batch_size=None) -> Consulta:
+        """Ejecuta un SELECT y entrega las filas por lotes.
+
+        on_batch(filas, acumuladas) por cada lote, on_done(total_filas) al terminar
+        y on_error(exc) si falla; todos en el hilo de Tk. on_cancel() si la corta
+        cancelar_todo() (ver docstring del módulo).
+        """
+        consulta = Consulta(self, on_batch, on_done, on_error, on_cancel, segundo_plano)
+        self._encolar(consulta, ('sql', sql, tuple(params or ()), batch_size or self.batch_size))
+        return consulta
+
+    def ejecutar(self, fn, *args, on_done=None, on_error=None, on_progress=None, on_cancel=None,
+                 segundo_plano=False, **kwargs) -> Consulta:
+        """Ejecuta fn(cursor, *args, **kwargs) en el hilo lector; on_done(resultado) en Tk.
+
+        Con on_progress, fn recibe además progreso=callable: cada llamada
+        progreso(*valores) llega a on_progress(*valores) en el hilo de Tk.
+        on_cancel y segundo_plano: como en consultar().
+        """
+        consulta = Consulta(self, None, on_done, on_error, on_cancel, segundo_plano)
+        if on_progress is not None:
+            kwargs['progreso'] = lambda *valores: self._dispatch(consulta, on_progress, *valores)
+        self._encolar(consulta, ('fn', fn, args, kwargs))
+        return consulta
+
+    def cancelar_todo(self, incluir_segundo_plano: bool = False):
+        """Cancela la consulta en curso y las encoladas (p. ej. al cambiar de vista).
+
+        Salvo con incluir_segundo_plano, deja seguir las de segundo_plano. Llama al
+        on_cancel() de cada una desde el hilo que cancela (el de Tk).
+        """
+        with self._lock:
+            consultas = [c for c in self._pendientes if incluir_segundo_plano or not c.segundo_plano]
+        for consulta in consultas:
+            if not self._cancelar(consulta) or consulta.on_cancel is None:
+                continue
+            try:
+                consulta.on_cancel()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+    def stop(self, timeout: float = 2.0) -> bool:
+        """Cancela todo y termina el hilo; False si sigue vivo tras timeout."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return True
+        self.cancelar_todo(incluir_segundo_plano=True)
+        self._jobs.put(None)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def _encolar(self, consulta, trabajo):
+        self.start()
+        with self._lock:
+            self._pendientes.add(consulta)
+        self._jobs.put((consulta, trabajo))
+
+    def _cancelar(self, consulta) -> bool:
+        """True si la canceló esta llamada (False si ya estaba cancelada o terminada)."""
+        with self._lock:
+            if consulta.cancelada or consulta.terminada:
+                return False
+            consulta.cancelada = True
+            self._pendientes.discard(consulta)
+            # Sólo interrumpir si es la que está corriendo: interrupt() afecta a la conexión entera
+            if self._actual is consulta and self._conn is not None:
+                try:
+                    self._conn.interrupt()
+                except Exception:
+                    pass
+        return True
+
+    def _run(self):
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                break
+            consulta, trabajo = item
+            conn = get_connection()
+            with self._lock:
+                if consulta.cancelada:
+                    conn.close()
+                    continue
+                self._actual, self._conn = consulta, conn
+            # Respaldo de interrupt() para trabajos con varias sentencias
+            conn.set_progress_handler(lambda: 1 if consulta.cancelada else 0, 10000)
+            try:
+                resultado = self._ejecutar(conn, consulta, trabajo)
+            except sqlite3.OperationalError as e:
+                if not consulta.cancelada:
+                    self._dispatch(consulta, consulta.on_error, e)
+            except Exception as e:
+                self._dispatch(consulta, consulta.on_error, e)
+            else:
+                self._dispatch(consulta, consulta.on_done, resultado)
+            finally:
+                conn.set_progress_handler(None, 0)
+                with self._lock:
+                    self._actual, self._conn = None, None
+                    consulta.terminada = True
+                    self._pendientes.discard(consulta)
+                conn.close()
+
+    def _ejecutar(self, conn, consulta, trabajo):
+        cursor = conn.cursor()
+        if trabajo[0] == 'fn':
+            _tipo, fn, args, kwargs = trabajo
+            return fn(cursor, *args, **kwargs)
+        _tipo, sql, params, batch_size = trabajo
+        cursor.execute(sql, params)
+        while not consulta.cancelada:
+            filas = cursor.fetchmany(batch_size)
+            if not filas:
+                break
+            consulta.filas += len(filas)
+            if consulta.on_batch is not None:
+                self._dispatch(consulta, consulta.on_batch, filas, consulta.filas)
+        cursor.close()
+        return consulta.filas
+
+    def _dispatch(self, consulta, callback, *values):
+        if callback is None or consulta.cancelada:
+            return
+        if self._root is None:
+            try:
+                callback(*values)
+            except Exception:
+                pass
+            return
+        self._done.put((consulta, callback, values))
+
+    def _poll(self):
+        try:
+            # Pocos lotes por vuelta para que la UI siga respondiendo con resultados grandes
+            for _ in range(self.lotes_por_vuelta):
+                consulta, callback, values = self._done.get_nowait()
+                # Lotes que llegaron antes de cancelar: descartarlos
+                if consulta.cancelada:
+                    continue
+                try:
+                    callback(*values)
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+        except queue.Empty:
+            pass
+        try:
+            # Si quedaron lotes, volver enseguida (dejando procesar eventos de Tk en el medio)
+            self._root.after(1 if not self._done.empty() else self._poll_ms, self._poll)
+        except Exception:
+            # root destruido: dejar de sondear
+            self._root = None
+
+
+_reader = None
+
+
+def get_reader() -> DBReader:
+    """Instancia compartida del lector (se crea al primer uso)."""
+    global _reader
+    if _reader is None:
+        _reader = DBReader()
+        atexit.register(_reader.stop)
+    return _reader
@@ -1,16 +1,236 @@
+import os
+import pathlib
 import sqlite3
 from utils_paths import DB_PATH
 import re
 import unicodedata
+import atexit
+import threading
+import weakref
+from contextlib import contextmanager
 
 
-def get_connection():
-    """Return a SQLite connection with foreign keys enabled."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON")
+# PRAGMAs aplicados una sola vez por conexión (la conexión vive lo que vive su hilo)
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",      # ~16 MB de page cache
+    "PRAGMA mmap_size = 134217728",    # 128 MB mapeados en memoria
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+def open_connection(db_path: str = None, solo_lectura: bool = False) -> sqlite3.Connection:
+    """Abre una conexión nueva con los PRAGMAs de la app (sin cachear).
+
+    solo_lectura: abrir con mode=ro (la conexión no puede escribir la base).
+    """
+    ruta = db_path or DB_PATH
+    if solo_lectura:
+        uri = pathlib.Path(os.path.abspath(ruta)).as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(ruta, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        try:
+            conn.execute(pragma)
+        except sqlite3.DatabaseError:
+            # p. ej. WAL no disponible en algunos sistemas de archivos: seguir con el modo por defecto
+            pass
     return conn
 
 
+class _ConnectionManager:
+    """Una conexión persistente por hilo hacia DB_PATH.
+
+    Los llamadores reciben un _ConnectionHandle; cerrar el handle no cierra la
+    conexión real, sólo revierte una transacción pendiente si ya no queda
+    ningún otro handle vivo en ese hilo (igual que cerrar una conexión sin commit).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # thread ident -> (weakref al hilo, conexión) para poder cerrar todo al salir
+        self._registry = {}
+
+    def acquire(self):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            state = _ThreadState(open_connection())
+            self._local.state = state
+            with self._lock:
+                self._prune_dead_threads()
+                self._registry[threading.get_ident()] = (weakref.ref(threading.current_thread()), state.conn)
+        return _ConnectionHandle(state)
+
+    def _prune_dead_threads(self):
+        for ident, (thread_ref, conn) in list(self._registry.items()):
+            thread = thread_ref()
+            if thread is None or not thread.is_alive():
+                self._registry.pop(ident, None)
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def close_current(self):
+        """Cierra la conexión del hilo actual (se reabre en el próximo uso)."""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            return
+        self._local.state = None
+        with self._lock:
+            self._registry.pop(threading.get_ident(), None)
+        try:
+            state.conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Cierra todas las conexiones (salida de la app o antes de reemplazar el archivo .db)."""
+        with self._lock:
+            items = list(self._registry.values())
+            self._registry.clear()
+        for _thread_ref, conn in items:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+class _ThreadState:
+    __slots__ = ('conn', 'handles', 'transacciones')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.handles = 0
+        # Bloques transaction() abiertos en la conexión (para distinguirlos de una transacción implícita)
+        self.transacciones = 0
+
+
+class _ConnectionHandle:
+    """Vista de la conexión compartida con la misma interfaz que sqlite3.Connection."""
+
+    __slots__ = ('_state', '_open')
+
+    def __init__(self, state):
+        object.__setattr__(self, '_state', state)
+        object.__setattr__(self, '_open', True)
+        state.handles += 1
+
+    def __getattr__(self, name):
+        return getattr(self._state.conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._state.conn, name, value)
+
+    def __enter__(self):
+        self._state.conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._state.conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if not self._open:
+            return
+        object.__setattr__(self, '_open', False)
+        state = self._state
+        state.handles -= 1
+        if state.handles <= 0:
+            try:
+                if state.conn.in_transaction:
+                    state.conn.rollback()
+            except sqlite3.ProgrammingError:
+                # la conexión ya fue cerrada por close_all()
+                pass
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_manager = _ConnectionManager()
+atexit.register(_manager.close_all)
+
+
+def get_connection():
+    """Return the calling thread's persistent SQLite connection (WAL, foreign keys on).
+
+    close() on the result is safe and cheap: it only rolls back uncommitted work.
+    """
+    return _manager.acquire()
+
+
+def close_all_connections():
+    """Cerrar todas las conexiones persistentes (por ejemplo antes de restaurar la BD).
+
+    Llamar desde el hilo de Tk. Antes detiene el hilo lector (cancela sus consultas) y el
+    escritor (termina lo que tenga encolado), para no cerrarles la conexión a mitad de un
+    trabajo; los dos vuelven a arrancar solos con el próximo submit()/consultar(). Si alguno
+    no termina a tiempo lanza RuntimeError y no cierra nada.
+    """
+    from db_reader import get_reader
+    from db_writer import get_writer
+    if not get_reader().stop():
+        raise RuntimeError("Hay una consulta en curso que no se pudo cancelar; intentá de nuevo en unos segundos.")
+    if not get_writer().stop():
+        raise RuntimeError("Hay una escritura en curso (p. ej. una importación); esperá a que termine e intentá de nuevo.")
+    _manager.close_all()
+
+
+@contextmanager
+def transaction(immediate: bool = True):
+    """Bloque transaccional sobre la conexión del hilo.
+
+    Commit al salir, rollback ante excepción. Dentro de otro transaction() del
+    mismo hilo se anida con un SAVEPOINT. Si la conexión tiene una transacción
+    implícita pendiente (un INSERT/UPDATE sin commit fuera de transaction())
+    lanza sqlite3.ProgrammingError: anidar ahí dejaría este bloque sin confirmar,
+    a merced del commit o rollback de quien abrió esa transacción.
+    """
+    conn = get_connection()
+    state = conn._state
+    try:
+        if conn.in_transaction:
+            if not state.transacciones:
+                raise sqlite3.ProgrammingError(
+                    "La conexión tiene una transacción implícita sin confirmar: hacer commit o rollback antes de transaction()."
+                )
+            conn.execute("SAVEPOINT tx_anidada")
+            state.transacciones += 1
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO tx_anidada")
+                conn.execute("RELEASE tx_anidada")
+                raise
+            finally:
+                state.transacciones -= 1
+            conn.execute("RELEASE tx_anidada")
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        state.transacciones += 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            state.transacciones -= 1
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def get_setting(key: str) -> str | None:
     try:
         conn = get_connection(); cur = conn.cursor()
@@ -0,0 +1,124 @@
+"""Hilo único de escritura para que el mainloop de Tk no espere a SQLite.
+
+Las escrituras (ventas, anulaciones, stock, marcado de impresos) se encolan con
+submit() y se ejecutan en orden en un hilo dedicado, que usa su propia conexión
+persistente (db_utils.get_connection es por hilo). Las lecturas de la UI siguen
+en la conexión del hilo principal: con WAL no se bloquean mutuamente.
+
+Los callbacks on_done/on_error se ejecutan en el hilo de Tk: el hilo escritor
+deja el resultado en una cola que la UI vacía periódicamente con root.after.
+"""
+from __future__ import annotations
+
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class DBWriter:
+    """Cola de trabajos de escritura atendida por un solo hilo."""
+
+    def __init__(self, poll_ms: int = 25):
+        self._jobs: queue.Queue = queue.Queue()
+        self._done: queue.Queue = queue.Queue()
+        self._poll_ms = poll_ms
+        self._root = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def attach(self, root):
+        """Vincula la cola de resultados con el mainloop de Tk."""
+        self._root = root
+        self.start()
+        self._root.after(self._poll_ms, self._poll)
+
+    def submit(self, job, *args, on_done=None, on_error=None, **kwargs) -> Future:
+        """Encola job(*args, **kwargs) y devuelve un Future con su resultado.
+
+        on_done(result) / on_error(exc) se llaman en el hilo de Tk si hay una
+        UI vinculada; si no, en el hilo escritor.
+        """
+        self.start()
+        future: Future = Future()
+        self._jobs.put((future, job, args, kwargs, on_done, on_error))
+        return future
+
+    def notify(self, callback, value):
+        """Llama callback(value) en el hilo de Tk, como on_done (p. ej. progreso de un trabajo en curso)."""
+        self._dispatch(callback, value)
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """Termina el hilo después de procesar los trabajos pendientes; False si sigue vivo tras timeout."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return True
+        self._jobs.put(None)
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def _run(self):
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                # Trabajos encolados después de un stop() que no esperó lo suficiente: atenderlos
+                if not self._jobs.empty():
+                    continue
+                break
+            future, job, args, kwargs, on_done, on_error = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                if on_error is not None:
+                    self._dispatch(on_error, e)
+            else:
+                future.set_result(result)
+                if on_done is not None:
+                    self._dispatch(on_done, result)
+
+    def _dispatch(self, callback, value):
+        if self._root is None:
+            try:
+                callback(value)
+            except Exception:
+                pass
+            return
+        self._done.put((callback, value))
+
+    def _poll(self):
+        try:
+            while True:
+                callback, value = self._done.get_nowait()
+                try:
+                    callback(value)
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+        except queue.Empty:
+            pass
+        try:
+            self._root.after(self._poll_ms, self._poll)
+        except Exception:
+            # root destruido: dejar de sondear
+            self._root = None
+
+
+_writer = None
+
+
+def get_writer() -> DBWriter:
+    """Instancia compartida del escritor (se crea al primer uso)."""
+    global _writer
+    if _writer is None:
+        _writer = DBWriter()
+        atexit.register(_writer.stop)
+    return _writer
@@ -0,0 +1,222 @@
+"""Exportación de consultas a CSV / XLSX por lotes, sin pandas.
+
+Recorre el cursor con fetchmany() y escribe cada lote directamente en el
+archivo, así la memoria no depende de la cantidad de filas (un historial de
+varias temporadas se exporta igual que un día). El XLSX se arma con zipfile:
+cada hoja se escribe en streaming dentro del zip con cadenas en línea
+(inlineStr), sin tabla de strings compartidos que haya que juntar antes.
+
+Pensado para correr en el hilo lector (db_reader.ejecutar): progreso(filas)
+se llama después de cada lote. El archivo se escribe con extensión .part y se
+renombra al final; si la exportación falla o se cancela no queda uno a medias.
+"""
+from __future__ import annotations
+
+import csv
+import math
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+LOTE = 2000
+# Límite de filas de una hoja de Excel (incluye el encabezado)
+MAX_FILAS_HOJA = 1_048_576
+
+# Caracteres de control que XML 1.0 no admite
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def exportar(cursor, sql, params, destino, encabezados, formatear=None, progreso=None, lote=LOTE) -> int:
+    """Exporta según la extensión de destino (.xlsx o, si no, CSV). Devuelve las filas escritas."""
+    if str(destino).lower().endswith('.xlsx'):
+        return exportar_xlsx(cursor, sql, params, destino, encabezados, formatear, progreso, lote)
+    return exportar_csv(cursor, sql, params, destino, encabezados, formatear, progreso, lote)
+
+
+def exportar_csv(cursor, sql, params, destino, encabezados, formatear=None, progreso=None, lote=LOTE,
+                 delimitador=';') -> int:
+    """CSV separado por ';' en UTF-8 (lo que abre Excel en configuración regional es-AR)."""
+    def _escribir(tmp):
+        with open(tmp, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f, delimiter=delimitador)
+            w.writerow(encabezados)
+            total = 0
+            for filas in _lotes(cursor, sql, params, formatear, lote):
+                w.writerows(filas)
+                total += len(filas)
+                if progreso is not None:
+                    progreso(total)
+            return total
+    return _a_destino(destino, _escribir)
+
+
+def exportar_xlsx(cursor, sql, params, destino, encabezados, formatear=None, progreso=None, lote=LOTE,
+                  hoja='Datos') -> int:
+    """XLSX de solo escritura; si se supera el límite de filas de Excel sigue en otra hoja."""
+    def _escribir(tmp):
+        with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            hojas = []
+            salida = None
+            filas_hoja = 0
+            total = 0
+            try:
+                for filas in _lotes(cursor, sql, params, formatear, lote):
+                    inicio = 0
+                    while inicio < len(filas):
+                        if salida is None or filas_hoja >= MAX_FILAS_HOJA:
+                            if salida is not None:
+                                _cerrar_hoja(salida)
+                            hojas.append(hoja if not hojas else f"{hoja} {len(hojas) + 1}")
+                            salida = _abrir_hoja(zf, len(hojas), encabezados)
+                            filas_hoja = 1
+                        cupo = min(len(filas) - inicio, MAX_FILAS_HOJA - filas_hoja)
+                        salida.write(''.join(_fila_xml(f) for f in filas[inicio:inicio + cupo]).encode('utf-8'))
+                        filas_hoja += cupo
+                        inicio += cupo
+                    total += len(filas)
+                    if progreso is not None:
+                        progreso(total)
+                if salida is None:
+                    # Sin resultados: una hoja con el encabezado solo
+                    hojas.append(hoja)
+                    salida = _abrir_hoja(zf, 1, encabezados)
+            finally:
+                if salida is not None:
+                    _cerrar_hoja(salida)
+            _escribir_libro(zf, hojas)
+            return total
+    return _a_destino(destino, _escribir)
+
+
+def _lotes(cursor, sql, params, formatear, lote):
+    cursor.execute(sql, tuple(params or ()))
+    while True:
+        filas = cursor.fetchmany(lote)
+        if not filas:
+            return
+        yield [formatear(r) for r in filas] if formatear is not None else filas
+
+
+def _a_destino(destino, escribir):
+    tmp = f"{destino}.part"
+    try:
+        total = escribir(tmp)
+        os.replace(tmp, destino)
+        return total
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# --- XLSX ---------------------------------------------------------------------
+
+def _celda(valor) -> str:
+    tipo = type(valor)
+    if tipo is str:
+        # Lo más común (fechas, nombres, estados): primero y sin más chequeos
+        return _celda_texto(valor)
+    if valor is None:
+        return '<c/>'
+    if tipo is int:
+        return f'<c><v>{valor}</v></c>'
+    if tipo is float and math.isfinite(valor):
+        return f'<c><v>{valor!r}</v></c>'
+    if tipo is bool:
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    return _celda_texto(str(valor))
+
+
+def _celda_texto(texto) -> str:
+    if not texto.isprintable():
+        texto = _INVALIDOS_XML.sub('', texto)
+    espacio = ' xml:space="preserve"' if texto[:1].isspace() or texto[-1:].isspace() else ''
+    return f'<c t="inlineStr"><is><t{espacio}>{escape(texto)}</t></is></c>'
+
+
+def _fila_xml(fila) -> str:
+    return '<row>' + ''.join(_celda(v) for v in fila) + '</row>'
+
+
+def _abrir_hoja(zf, numero, encabezados):
+    salida = zf.open(f'xl/worksheets/sheet{numero}.xml', 'w', force_zip64=True)
+    encabezado = '<row>' + ''.join(_celda(v).replace('<c ', '<c s="1" ', 1) for v in encabezados) + '</row>'
+    salida.write((
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+        '</sheetView></sheetViews><sheetData>' + encabezado
+    ).encode('utf-8'))
+    return salida
+
+
+def _cerrar_hoja(salida):
+    salida.write(b'</sheetData></worksheet>')
+    salida.close()
+
+
+def _escribir_libro(zf, hojas):
+    tipos = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(hojas) + 1)
+    )
+    zf.writestr('[Content_Types].xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{tipos}</Types>'
+    ))
+    zf.writestr('_rels/.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ))
+    hojas_xml = ''.join(
+        f'<sheet name="{escape(nombre, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+        for i, nombre in enumerate(hojas, start=1)
+    )
+    zf.writestr('xl/workbook.xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets>{hojas_xml}</sheets></workbook>'
+    ))
+    rels = ''.join(
+        f'<Relationship Id="rId{i}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{i}.xml"/>'
+        for i in range(1, len(hojas) + 1)
+    )
+    estilos_id = len(hojas) + 1
+    zf.writestr('xl/_rels/workbook.xml.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'{rels}<Relationship Id="rId{estilos_id}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/></Relationships>'
+    ))
+    # Estilo 0: normal; estilo 1: negrita (encabezado)
+    zf.writestr('xl/styles.xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    ))
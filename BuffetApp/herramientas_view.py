@@ -7,12 +7,12 @@ from tkinter import messagebox
 from theme import themed_button, apply_button_style, COLORS, format_currency
 from tkinter import filedialog
 from tkinter import ttk
-from db_utils import get_connection
+from db_utils import get_connection, close_all_connections
 from app_config import (
     get_device_id, get_device_name, set_device_name, set_device_id,
     get_printer_name, set_printer_name,
 )
-from sync_utils import import_from_db
+from sync_utils import import_from_db, import_many
 from utils_paths import DB_PATH, appdata_dir
 # Importación opcional de sincronización en la nube
 try:
@@ -76,19 +76,31 @@ class HerramientasView:
                 initial_dir = os.path.join(appdata_dir(), 'import_tmp')
             except Exception:
                 initial_dir = None
-            path = filedialog.askopenfilename(
-                title="Seleccionar base de datos a importar",
+            # Se pueden elegir varias (p. ej. las de todas las cajas de un torneo): se combinan juntas
+            paths = filedialog.askopenfilenames(
+                title="Seleccionar base(s) de datos a importar",
                 filetypes=[("SQLite DB", "*.db"), ("Todos", "*.*")],
                 initialdir=(initial_dir if initial_dir and os.path.exists(initial_dir) else None)
             )
-            if not path:
+            if not paths:
                 return
-            try:
-                res = import_from_db(path, incluir_historial=True)
+            paths = list(paths)
+            from db_writer import get_writer
+
+            def _ok(res):
+                _habilitar_importar()
+                if res.get('sin_cambios'):
+                    messagebox.showinfo("Importación", "La base no cambió desde la última importación." if len(paths) == 1
+                                        else "Ninguna de las bases cambió desde la última importación.")
+                    return
+                titulo = "Importación completada (sólo lo nuevo desde la última)." if res.get('incremental') else "Importación completada."
+                if len(paths) > 1:
+                    sin_cambios = sum(1 for _, r in res.get('origenes', []) if r.get('sin_cambios'))
+                    titulo += f"\nBases combinadas: {len(paths)}" + (f" ({sin_cambios} sin cambios)" if sin_cambios else "")
                 messagebox.showinfo(
                     "Importación",
                     (
-                        "Importación completada.\n"
+                        f"{titulo}\n"
                         f"POS nuevos: {res.get('pos_nuevos')}\n"
                         f"Categorías nuevas: {res.get('categorias_nuevas')} (origen: {res.get('src_categorias')})\n"
                         f"Productos nuevos: {res.get('productos_nuevos')} (origen: {res.get('src_products')})\n"
@@ -98,9 +110,46 @@ class HerramientasView:
                         f"Items: {res.get('items_nuevos')} (origen: {res.get('src_items')})"
                     )
                 )
-            except Exception as e:
+
+            def _error(e):
+                _habilitar_importar()
                 messagebox.showerror("Importación", f"Error al importar: {e}")
 
+            def _progreso(avance):
+                hechos, total = avance
+                try:
+                    if total and btn_import.winfo_exists():
+                        # Terminada la lectura sigue la importación en sí
+                        if hechos >= total:
+                            texto = "Importando…"
+                        elif len(paths) == 1:
+                            texto = f"Leyendo origen… {hechos * 100 // total}%"
+                        else:
+                            texto = f"Leyendo bases… {hechos}/{total}"
+                        btn_import.config(text=texto)
+                except Exception:
+                    pass
+
+            # La importación corre en el hilo escritor (una sola transacción): la ventana sigue respondiendo
+            try:
+                btn_import.config(state=tk.DISABLED, text="Importando…")
+            except Exception:
+                pass
+            writer = get_writer()
+            writer.submit(
+                import_from_db if len(paths) == 1 else import_many, paths[0] if len(paths) == 1 else paths,
+                incluir_historial=True,
+                progreso=lambda hechos, total: writer.notify(_progreso, (hechos, total)),
+                on_done=_ok, on_error=_error,
+            )
+
+        def _habilitar_importar():
+            try:
+                if btn_import.winfo_exists():
+                    btn_import.config(state=tk.NORMAL, text="Importar desde .db (Sincronizar)")
+            except Exception:
+                pass
+
         btns_sync = tk.Frame(backup_win)
         btns_sync.pack(pady=6)
         btn_import = themed_button(btns_sync, text="Importar desde .db (Sincronizar)", command=_importar_db)
@@ -730,12 +779,30 @@ class HerramientasView:
             except Exception:
                 pass
             # Intentar copiar sobre DB_PATH
+            from monitor_cambios import get_monitor
+            monitor = get_monitor()
             try:
-                # Cerrar conexiones conocidas: no tenemos un pool global, confiamos en GC
+                # Cerrar todas las conexiones (también la del monitor de cambios) antes de pisar el archivo
+                monitor.pausar()
+                close_all_connections()
+                # Un -wal/-shm que quedara de la base anterior se aplicaría sobre la restaurada y la corrompería
+                for sufijo in ('-wal', '-shm'):
+                    if os.path.exists(DB_PATH + sufijo):
+                        os.remove(DB_PATH + sufijo)
                 shutil.copy2(src, DB_PATH)
+                from caja_snapshot import invalidar as invalidar_snapshot
+                invalidar_snapshot()
+                # La base puede venir de otro equipo: registrar el POS local en ella
+                try:
+                    from init_db import asegurar_pos_local
+                    asegurar_pos_local()
+                except Exception:
+                    pass
                 messagebox.showinfo('Restaurar BD', 'Restauración completada. Reiniciá la aplicación para aplicar los cambios.')
             except Exception as e:
                 messagebox.showerror('Restaurar BD', f'No se pudo restaurar la base de datos.\nDetalle: {e}\n\nCerrá la app e intentá nuevamente.')
+            finally:
+                monitor.reanudar()
         except Exception as e:
             messagebox.showerror('Restaurar BD', f'Error inesperado: {e}')
 
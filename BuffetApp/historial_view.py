@@ -1,12 +1,20 @@
+import sqlite3
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
 from init_db import log_error
-from db_utils import get_connection
+from db_utils import get_connection, transaction
+from db_reader import get_reader
+from caja_resumen import guardar_resumenes
+from ventas_diarias import reconstruir as reconstruir_ventas_diarias
+from caja_snapshot import invalidar as invalidar_snapshot
+from monitor_cambios import get_monitor
 
 class HistorialView(tk.Frame):
     def __init__(self, master):
         super().__init__(master)
+        # Exportación en curso en el hilo lector (db_reader)
+        self._consulta_export = None
         self.label_historial = tk.Label(self, text="Historial de Ventas", font=("Arial", 18))
         self.label_historial.pack(pady=10)
         # Filtros debajo del título
@@ -118,6 +126,19 @@ class HistorialView(tk.Frame):
 
         # Inicialización diferida para asegurar que los combos estén creados
         self.after(0, self._apply_initial_filters)
+        # Ventas, anulaciones y cajas de otro equipo: recargar la página actual sin tocar Actualizar
+        get_monitor().suscribir(self, ('ventas', 'tickets', 'caja_diaria'), self._on_cambios)
+
+    def _on_cambios(self, _tablas):
+        # Conservar la selección (los ítems se recrean; cada fila lleva el id del ticket como tag)
+        seleccion = self.tree.selection()
+        tags = self.tree.item(seleccion[0], 'tags') if seleccion else ()
+        self.cargar_historial(self.filtro_fecha, self.filtro_caja, self.pagina_actual)
+        if tags:
+            for iid in self.tree.get_children():
+                if self.tree.item(iid, 'tags') == tags:
+                    self.tree.selection_set(iid)
+                    break
 
     def _apply_initial_filters(self):
         caja_id = self._get_caja_abierta_id()
@@ -132,7 +153,7 @@ class HistorialView(tk.Frame):
     def actualizar_fechas_combo(self):
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT substr(fecha_hora, 1, 10) FROM ventas ORDER BY fecha_hora DESC")
+        cursor.execute("SELECT DISTINCT fecha FROM ventas WHERE fecha IS NOT NULL ORDER BY fecha DESC")
         fechas = [row[0] for row in cursor.fetchall()]
         conn.close()
         fechas_combo = ["Mostrar todo"] + fechas
@@ -309,6 +330,19 @@ class HistorialView(tk.Frame):
                 pass
             return None
 
+    # Orden estable del historial; el cursor de página es la clave de la última fila
+    _ORDEN_HISTORIAL = " ORDER BY v.fecha_hora DESC, v.id DESC, t.id DESC, vi.id DESC"
+
+    @staticmethod
+    def _versiones_conteo(cursor):
+        """Versión de ventas, tickets y caja_diaria; sin la migración 007, data_version (cualquier commit)."""
+        try:
+            return tuple(cursor.execute(
+                "SELECT tabla, version FROM cambios_tablas WHERE tabla IN ('ventas', 'tickets', 'caja_diaria') ORDER BY tabla"
+            ).fetchall())
+        except sqlite3.OperationalError:
+            return cursor.execute("PRAGMA data_version").fetchone()[0]
+
     def cargar_historial(self, fecha_filtrada=None, caja_filtrada=None, pagina=1):
         try:
             # Refrescar combos sólo si NO estamos en modo "Caja actual"
@@ -323,9 +357,9 @@ class HistorialView(tk.Frame):
             cursor = conn.cursor()
 
             base_query = """
-                FROM venta_items vi
-                LEFT JOIN tickets t ON vi.ticket_id = t.id
-                LEFT JOIN ventas v ON t.venta_id = v.id
+                FROM ventas v
+                JOIN tickets t ON t.venta_id = v.id
+                JOIN venta_items vi ON vi.ticket_id = t.id
                 LEFT JOIN products p ON vi.producto_id = p.id
                 LEFT JOIN Categoria_Producto c ON t.categoria_id = c.id
                 LEFT JOIN caja_diaria cd ON v.caja_id = cd.id
@@ -335,7 +369,8 @@ class HistorialView(tk.Frame):
             filtros = []
             params = []
             if fecha_filtrada:
-                filtros.append("substr(v.fecha_hora, 1, 10) = ?")
+                # Columna fecha indexada (idx_ventas_fecha) en lugar de substr(fecha_hora)
+                filtros.append("v.fecha = ?")
                 params.append(fecha_filtrada)
             if caja_filtrada:
                 filtros.append("v.caja_id = ?")
@@ -362,27 +397,70 @@ class HistorialView(tk.Frame):
             if self.var_ocultar_anulados.get():
                 filtros.append("t.status != 'Anulado'")
 
-            where_clause = ""
-            if filtros:
-                where_clause = " WHERE " + " AND ".join(filtros)
-
-            count_query = "SELECT COUNT(*) " + base_query + where_clause
-            cursor.execute(count_query, params)
-            total_rows = cursor.fetchone()[0]
+            # Total de filas: se cuenta una vez por combinación de filtros y se reutiliza al
+            # paginar. Si cambiaron ventas/tickets/caja_diaria (contadores de cambios_tablas,
+            # de esta u otra conexión) y entraron ventas nuevas, se suman sólo las filas con
+            # v.id mayor al último contado. Si cambiaron sin ventas nuevas hubo una edición,
+            # anulación o borrado: se cuenta todo de nuevo (también tras _despues_de_modificar).
+            # Una anulación de otro equipo junto con una venta puede dejar el total
+            # aproximado; la navegación no depende de él (usa _hay_siguiente).
+            versiones = self._versiones_conteo(cursor)
+            clave_filtros = (tuple(filtros), tuple(params))
+            where_total = (" WHERE " + " AND ".join(filtros)) if filtros else ""
+            cache = getattr(self, '_conteo_cache', None)
+            if cache is None or cache[0] != clave_filtros:
+                cache = None
+            elif cache[1] != versiones:
+                ultimo_vid = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ventas").fetchone()[0]
+                if ultimo_vid > cache[2]:
+                    where_nuevas = (where_total + " AND " if filtros else " WHERE ") + "v.id > ? AND v.id <= ?"
+                    cursor.execute("SELECT COUNT(*) " + base_query + where_nuevas, params + [cache[2], ultimo_vid])
+                    cache = (clave_filtros, versiones, ultimo_vid, cache[3] + cursor.fetchone()[0])
+                else:
+                    cache = None
+            if cache is None:
+                ultimo_vid = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ventas").fetchone()[0]
+                cursor.execute("SELECT COUNT(*) " + base_query + where_total + (" AND " if filtros else " WHERE ") + "v.id <= ?",
+                               params + [ultimo_vid])
+                cache = (clave_filtros, versiones, ultimo_vid, cursor.fetchone()[0])
+                # Filtros nuevos: los cursores de página anteriores ya no sirven
+                if getattr(self, '_clave_filtros', None) != clave_filtros:
+                    self._clave_filtros = clave_filtros
+                    self._cursores_pagina = [None]
+            self._conteo_cache = cache
+            total_rows = self._conteo_cache[3]
             self.total_paginas = max(1, (total_rows + self.filas_por_pagina - 1) // self.filas_por_pagina)
 
-            offset = (pagina - 1) * self.filas_por_pagina
+            # Keyset: la página N arranca después de la última fila de la N-1 (sin OFFSET)
+            cursores = getattr(self, '_cursores_pagina', None) or [None]
+            if pagina < 1 or pagina > len(cursores):
+                pagina = 1
+            cursor_pagina = cursores[pagina - 1]
+            filtros_pagina = list(filtros)
+            params_pagina = list(params)
+            if cursor_pagina is not None:
+                filtros_pagina.append("v.fecha_hora <= ? AND (v.fecha_hora, v.id, t.id, vi.id) < (?, ?, ?, ?)")
+                params_pagina.extend([cursor_pagina[0], *cursor_pagina])
+            where_clause = (" WHERE " + " AND ".join(filtros_pagina)) if filtros_pagina else ""
+
             select_query = (
                 "SELECT v.fecha_hora, t.identificador_ticket, p.nombre, vi.cantidad, vi.subtotal, "
-                "c.descripcion, t.status, cd.codigo_caja, cd.disciplina, t.id, v.id, mp.descripcion as metodo_pago "
-                + base_query + where_clause +
-                " ORDER BY v.fecha_hora DESC, v.id, t.categoria_id LIMIT ? OFFSET ?"
+                "c.descripcion, t.status, cd.codigo_caja, cd.disciplina, t.id, v.id, mp.descripcion as metodo_pago, vi.id "
+                + base_query + where_clause + self._ORDEN_HISTORIAL + " LIMIT ?"
             )
-            cursor.execute(select_query, params + [self.filas_por_pagina, offset])
+            # Una fila de más para saber si hay página siguiente
+            cursor.execute(select_query, params_pagina + [self.filas_por_pagina + 1])
             rows = cursor.fetchall()
             conn.close()
 
-            self.historial_rows = rows
+            self._hay_siguiente = len(rows) > self.filas_por_pagina
+            rows = rows[:self.filas_por_pagina]
+            if rows:
+                ultima = rows[-1]
+                del cursores[pagina:]
+                cursores.append((ultima[0], ultima[10], ultima[9], ultima[12]))
+            self._cursores_pagina = cursores
+            self.historial_rows = [row[:12] for row in rows]
             self.pagina_actual = pagina
             self.mostrar_pagina()
         except Exception as e:
@@ -444,7 +522,7 @@ class HistorialView(tk.Frame):
 
         self.lbl_pagina.config(text=f"{self.pagina_actual} de {self.total_paginas}")
         self.btn_prev.config(state=(tk.NORMAL if self.pagina_actual > 1 else tk.DISABLED))
-        self.btn_next.config(state=(tk.NORMAL if self.pagina_actual < self.total_paginas else tk.DISABLED))
+        self.btn_next.config(state=(tk.NORMAL if getattr(self, '_hay_siguiente', False) else tk.DISABLED))
 
     def previa(self):
         if self.pagina_actual > 1:
@@ -452,99 +530,92 @@ class HistorialView(tk.Frame):
             self.cargar_historial(self.filtro_fecha, self.filtro_caja, nueva)
 
     def siguiente(self):
-        if self.pagina_actual < self.total_paginas:
+        if getattr(self, '_hay_siguiente', False):
             nueva = self.pagina_actual + 1
             self.cargar_historial(self.filtro_fecha, self.filtro_caja, nueva)
 
+    # Columnas del Excel del historial (mismo orden que el SELECT de exportar_excel)
+    _ENCABEZADOS_EXCEL = [
+        "Fecha", "Item", "Monto Total", "Categoria", "Estado", "Caja (código)",
+        "Identificador", "Método de Pago", "Cantidad", "Disciplina",
+    ]
+
     def exportar_excel(self):
-        try:
-            import pandas as pd
-        except ImportError:
-            messagebox.showwarning(
-                "Exportar",
-                "La exportación a Excel requiere 'pandas' (no incluido en la versión ligera).\n"
-                "Opciones:\n"
-                " 1) Instalar: pip install pandas (y volver a generar el exe si querés redistribuir).\n"
-                " 2) Usar copiar datos: se generará un TSV provisional en el portapapeles."
-            )
-            try:
-                # Fallback: copiar al portapapeles datos visibles (solo página actual) en formato tabulado
-                filas = []
-                for item in self.tree.get_children():
-                    vals = self.tree.item(item, 'values')
-                    filas.append('\t'.join(str(v) for v in vals))
-                if filas:
-                    self.root.clipboard_clear()
-                    self.root.clipboard_append('\n'.join(filas))
-                    messagebox.showinfo("Exportar", "Datos de la página actual copiados al portapapeles (TSV).")
-            except Exception:
-                pass
-            return
         import os
         import datetime
+        from pathlib import Path
+        from exportador import exportar_xlsx
         # Exportar todos los datos aplicando los filtros actuales
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            query = """
-                SELECT v.fecha_hora, t.identificador_ticket, p.nombre, vi.cantidad, vi.subtotal,
-                       c.descripcion, t.status, cd.codigo_caja, cd.disciplina, mp.descripcion as metodo_pago
-                FROM venta_items vi
-                LEFT JOIN tickets t ON vi.ticket_id = t.id
-                LEFT JOIN ventas v ON t.venta_id = v.id
-                LEFT JOIN products p ON vi.producto_id = p.id
-                LEFT JOIN Categoria_Producto c ON t.categoria_id = c.id
-                LEFT JOIN caja_diaria cd ON v.caja_id = cd.id
-                LEFT JOIN metodos_pago mp ON v.metodo_pago_id = mp.id
-            """
-            filtros = []
-            params = []
-            if self.filtro_fecha:
-                filtros.append("substr(v.fecha_hora, 1, 10) = ?")
-                params.append(self.filtro_fecha)
-            if self.filtro_caja:
-                filtros.append("v.caja_id = ?")
-                params.append(self.filtro_caja)
-            if self.var_ocultar_anulados.get():
-                filtros.append("t.status != 'Anulado'")
-            if filtros:
-                query += " WHERE " + " AND ".join(filtros)
-            query += " ORDER BY v.fecha_hora DESC, v.id, t.categoria_id"
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            conn.close()
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo obtener el historial completo.\n\nDetalle: {e}")
-            return
-        df = pd.DataFrame([
-            {
-                "Fecha": r[0],
-                "Item": r[2],
-                "Monto Total": r[4],
-                "Categoria": r[5],
-                "Estado": r[6],
-                "Caja (código)": r[7],
-                "Identificador": r[1],
-                "Método de Pago": r[9],
-                "Cantidad": r[3],
-                "Disciplina": r[8],
-            }
-            for r in rows
-        ])
+        query = """
+            SELECT v.fecha_hora, p.nombre, vi.subtotal, c.descripcion, t.status,
+                   cd.codigo_caja, t.identificador_ticket, mp.descripcion as metodo_pago,
+                   vi.cantidad, cd.disciplina
+            FROM venta_items vi
+            LEFT JOIN tickets t ON vi.ticket_id = t.id
+            LEFT JOIN ventas v ON t.venta_id = v.id
+            LEFT JOIN products p ON vi.producto_id = p.id
+            LEFT JOIN Categoria_Producto c ON t.categoria_id = c.id
+            LEFT JOIN caja_diaria cd ON v.caja_id = cd.id
+            LEFT JOIN metodos_pago mp ON v.metodo_pago_id = mp.id
+        """
+        filtros = []
+        params = []
+        if self.filtro_fecha:
+            filtros.append("v.fecha = ?")
+            params.append(self.filtro_fecha)
+        if self.filtro_caja:
+            filtros.append("v.caja_id = ?")
+            params.append(self.filtro_caja)
+        if self.var_ocultar_anulados.get():
+            filtros.append("t.status != 'Anulado'")
+        if filtros:
+            query += " WHERE " + " AND ".join(filtros)
+        query += " ORDER BY v.fecha_hora DESC, v.id, t.categoria_id"
+
         fecha = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         # Carpeta Descargas del usuario
-        from pathlib import Path
         downloads = str(Path.home() / "Downloads")
         filename = os.path.join(downloads, f"historial_ventas_{fecha}.xlsx")
-        try:
-            df.to_excel(filename, index=False)
+
+        # El archivo se escribe por lotes en el hilo lector (sin pandas y sin juntar
+        # todas las filas en memoria); el botón muestra el avance y permite cancelar
+        def _restaurar_boton():
+            self._consulta_export = None
+            try:
+                self.btn_exportar.config(text="Exportar a Excel", command=self.exportar_excel)
+            except tk.TclError:
+                pass
+
+        def _cancelar():
+            if self._consulta_export is not None:
+                self._consulta_export.cancelar()
+            _restaurar_boton()
+
+        def _progreso(filas):
+            try:
+                self.btn_exportar.config(text=f"Cancelar exportación ({filas} filas)")
+            except tk.TclError:
+                pass
+
+        def _error(e):
+            _restaurar_boton()
+            messagebox.showerror("Error de exportación", f"No se pudo exportar el historial a Excel.\n\nDetalle: {e}")
+
+        def _listo(_total):
+            _restaurar_boton()
             messagebox.showinfo("Exportar a Excel", f"Historial exportado correctamente a:\n{filename}")
             try:
                 os.startfile(filename)
             except Exception:
                 pass
-        except Exception as e:
-            messagebox.showerror("Error de exportación", f"No se pudo exportar el historial a Excel.\n\nDetalle: {e}")
+
+        self.btn_exportar.config(text="Cancelar exportación", command=_cancelar)
+        self._consulta_export = get_reader().ejecutar(
+            exportar_xlsx, query, params, filename, self._ENCABEZADOS_EXCEL,
+            on_done=_listo, on_error=_error, on_progress=_progreso, on_cancel=_restaurar_boton,
+            # La pidió el usuario: sigue aunque se cambie de vista
+            segundo_plano=True,
+        )
 
     def reimprimir_ticket_seleccionado(self):
         seleccion = self.tree.selection()
@@ -619,28 +690,14 @@ class HistorialView(tk.Frame):
         ticket_id = int(self.tree.item(seleccion[0], "tags")[0])
         if not messagebox.askyesno("Anular Ticket", "¿Confirma que desea anular el ticket seleccionado?"):
             return
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            # Marcar ticket como anulado
-            cursor.execute("UPDATE tickets SET status='Anulado' WHERE id=?", (ticket_id,))
-            # Devolver el stock de los productos asociados sólo si contabiliza_stock=1
-            cursor.execute("SELECT producto_id, cantidad FROM venta_items WHERE ticket_id=?", (ticket_id,))
-            items = cursor.fetchall()
-            for prod_id, cantidad in items:
-                try:
-                    cursor.execute("SELECT COALESCE(contabiliza_stock,1) FROM products WHERE id=?", (prod_id,))
-                    row = cursor.fetchone()
-                    contabiliza = int(row[0]) if row and row[0] is not None else 1
-                except Exception:
-                    contabiliza = 1
-                if contabiliza == 1:
-                    cursor.execute("UPDATE products SET stock_actual = COALESCE(stock_actual,0) + ? WHERE id=?", (cantidad, prod_id))
-            conn.commit()
-            conn.close()
+        from sales_service import anular_ticket
+        from db_writer import get_writer
+
+        def _ok(_result):
             self.cargar_historial(self.filtro_fecha, self.filtro_caja, self.pagina_actual)
             messagebox.showinfo("Anular Ticket", "Ticket anulado y stock actualizado.")
-        except Exception as e:
+
+        def _error(e):
             import datetime, traceback
             fecha_hora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             tb = traceback.extract_tb(e.__traceback__)
@@ -653,6 +710,9 @@ class HistorialView(tk.Frame):
                 pass
             messagebox.showerror("Anular Ticket", "No se pudo anular el ticket por un error del sistema.")
 
+        # Marcar como anulado y devolver stock en el hilo escritor
+        get_writer().submit(anular_ticket, ticket_id, on_done=_ok, on_error=_error)
+
     def on_tree_double_click(self, event):
         item = self.tree.identify_row(event.y)
         col = self.tree.identify_column(event.x)
@@ -661,6 +721,23 @@ class HistorialView(tk.Frame):
         ticket_id = int(self.tree.item(item, "tags")[0])
         self.reimprimir_ticket(ticket_id)
 
+    @staticmethod
+    def _refrescar_resumen_caja(cursor, ticket_id):
+        """Actualiza caja_resumen (si está cerrada) y ventas_diarias de la caja del ticket y devuelve su id."""
+        cursor.execute("SELECT v.caja_id FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE t.id=?", (ticket_id,))
+        row = cursor.fetchone()
+        caja_id = row[0] if row else None
+        if caja_id:
+            guardar_resumenes(cursor, [caja_id])
+        reconstruir_ventas_diarias(cursor, [caja_id])
+        return caja_id
+
+    def _despues_de_modificar(self, caja_id):
+        """Tras escribir desde esta conexión: descartar conteo y snapshot cacheados."""
+        self._conteo_cache = None
+        if caja_id:
+            invalidar_snapshot(caja_id)
+
     def editar_venta(self):
         seleccion = self.tree.selection()
         if not seleccion:
@@ -689,11 +766,11 @@ class HistorialView(tk.Frame):
                 try:
                     nueva_fecha = entry_fecha.get()
                     nuevo_total = entry_total.get()
-                    conn = get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute("UPDATE tickets SET fecha_hora=?, total_ticket=? WHERE id=?", (nueva_fecha, nuevo_total, ticket_id))
-                    conn.commit()
-                    conn.close()
+                    with transaction() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute("UPDATE tickets SET fecha_hora=?, total_ticket=? WHERE id=?", (nueva_fecha, nuevo_total, ticket_id))
+                        caja_id = self._refrescar_resumen_caja(cursor, ticket_id)
+                    self._despues_de_modificar(caja_id)
                     edit_win.destroy()
                     self.cargar_historial(self.filtro_fecha, self.filtro_caja, self.pagina_actual)
                     messagebox.showinfo("Editar Ticket", "Ticket actualizado correctamente.")
@@ -733,12 +810,17 @@ class HistorialView(tk.Frame):
             confirmar = messagebox.askyesno("Confirmar eliminación", "¿Está seguro que desea eliminar el ticket seleccionado?")
             if not confirmar:
                 return
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM venta_items WHERE ticket_id=?", (ticket_id,))
-            cursor.execute("DELETE FROM tickets WHERE id=?", (ticket_id,))
-            conn.commit()
-            conn.close()
+            with transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT v.caja_id FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE t.id=?", (ticket_id,))
+                row = cursor.fetchone()
+                cursor.execute("DELETE FROM venta_items WHERE ticket_id=?", (ticket_id,))
+                cursor.execute("DELETE FROM tickets WHERE id=?", (ticket_id,))
+                caja_id = row[0] if row else None
+                if caja_id:
+                    guardar_resumenes(cursor, [caja_id])
+                reconstruir_ventas_diarias(cursor, [caja_id])
+            self._despues_de_modificar(caja_id)
             self.cargar_historial(self.filtro_fecha, self.filtro_caja, self.pagina_actual)
         except Exception as e:
             import datetime, traceback
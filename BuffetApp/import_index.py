@@ -0,0 +1,323 @@
+"""Claves naturales de la base local en memoria para deduplicar la importación.
+
+sync_utils.import_from_db resuelve por defecto el id local de cada fila
+importada con un UPDATE por tabla que busca en los índices de SQLite. Con
+import_from_db(..., indice=ImportIndex()) esas búsquedas se hacen en cambio
+contra diccionarios cargados una sola vez (una lectura secuencial por tabla):
+
+- caja_diaria: caja_uuid, y (codigo_caja, fecha, hora_apertura),
+- ventas: (caja_id, fecha_hora, total_venta),
+- tickets: (identificador_ticket, fecha_hora),
+- venta_items: firma (producto, cantidad, precio, subtotal) por ticket.
+
+Para que una temporada entera entre en poca memoria cada clave se empaqueta en
+un solo entero cuando sus partes lo permiten: fecha_hora 'YYYY-MM-DD HH:MM:SS'
+pasa a AAAAMMDDHHMMSS, los importes a diezmilésimos (la tolerancia de 0.0001 de
+las consultas) y las partes se concatenan en bits. Un ticket se guarda bajo su
+identificador (texto internado con sys.intern) con fecha_hora e id en un mismo
+entero. Lo que no entra (fechas con otro formato, cantidades con decimales)
+queda como tupla: la clave sigue siendo exacta, sólo ocupa más.
+
+Un mismo índice se puede pasar a varias importaciones seguidas: las filas que
+inserta cada una se agregan al índice. Sólo es válido mientras nadie más
+escriba esas tablas (la importación corre en el hilo escritor). Si la
+transacción de una importación falla, import_from_db/import_many lo vacían con
+reiniciar(): los ids que agregó ya no existen tras el ROLLBACK, y el próximo
+uso vuelve a cargar cada tabla desde la base.
+Ver tools/bench_import_index.py.
+"""
+from __future__ import annotations
+
+import math
+import sys
+
+_intern = sys.intern
+
+# Anchos en bits de cada parte empaquetada
+_BITS_ID = 40
+_BITS_FECHA_HORA = 47  # AAAAMMDDHHMMSS < 10**14 < 2**47
+_BITS_IMPORTE = 44
+_BITS_CANTIDAD = 20
+_LIMITE_ID = 1 << _BITS_ID
+_LIMITE_IMPORTE = 1 << _BITS_IMPORTE
+_LIMITE_CANTIDAD = 1 << _BITS_CANTIDAD
+_MASCARA_ID = _LIMITE_ID - 1
+# Firma de item: producto + 1 (0 = sin producto) en los bits altos, el resto abajo
+_BITS_RESTO_ITEM = _BITS_CANTIDAD + 2 * _BITS_IMPORTE
+_MASCARA_RESTO_ITEM = (1 << _BITS_RESTO_ITEM) - 1
+
+
+# Las mismas conversiones en SQL: al cargar y resolver, SQLite entrega las partes ya empaquetadas
+def _sql_fecha_hora(col: str) -> str:
+    return (
+        f"CASE WHEN {col} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][ T][0-9][0-9]:[0-9][0-9]:[0-9][0-9]' "
+        f"THEN CAST(substr({col}, 1, 4) || substr({col}, 6, 2) || substr({col}, 9, 2) || substr({col}, 12, 2) "
+        f"|| substr({col}, 15, 2) || substr({col}, 18, 2) AS INTEGER) ELSE {col} END"
+    )
+
+
+def _sql_importe(col: str) -> str:
+    return f"CASE WHEN typeof({col}) IN ('integer', 'real') THEN CAST(round({col} * 10000) AS INTEGER) ELSE {col} END"
+
+
+def _sql_entero(col: str) -> str:
+    return f"CASE WHEN typeof({col}) = 'real' AND {col} = CAST({col} AS INTEGER) THEN CAST({col} AS INTEGER) ELSE {col} END"
+
+
+def _texto(valor):
+    return _intern(valor) if isinstance(valor, str) else valor
+
+
+def _entero(valor):
+    """1.0 -> 1 (SQLite compara 1 = 1.0: la clave tiene que dar lo mismo)."""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def empaquetar_fecha_hora(valor):
+    """'YYYY-MM-DD HH:MM:SS' -> AAAAMMDDHHMMSS (int); otro formato -> texto internado."""
+    if valor is None:
+        return None
+    s = str(valor)
+    if len(s) == 19 and s[4] == '-' and s[7] == '-' and s[10] in ' T' and s[13] == ':' and s[16] == ':':
+        digitos = s[0:4] + s[5:7] + s[8:10] + s[11:13] + s[14:16] + s[17:19]
+        if digitos.isdigit():
+            return int(digitos)
+    return _intern(s)
+
+
+def empaquetar_importe(valor):
+    """Importe en diezmilésimos (entero, redondeo como round() de SQLite): tolerancia de 0.0001."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return int(math.copysign(math.floor(abs(valor) * 10000 + 0.5), valor))
+    return _texto(valor)
+
+
+def _clave_venta(caja_id, fh, total):
+    if (type(caja_id) is int and type(fh) is int and type(total) is int
+            and 0 <= caja_id < _LIMITE_ID and 0 <= total < _LIMITE_IMPORTE):
+        return (caja_id << _BITS_FECHA_HORA | fh) << _BITS_IMPORTE | total
+    return (caja_id, fh, total)
+
+
+def _firma(producto, cantidad, precio, subtotal):
+    if ((producto is None or type(producto) is int and 0 <= producto < _LIMITE_ID)
+            and type(cantidad) is int and 0 <= cantidad < _LIMITE_CANTIDAD
+            and type(precio) is int and 0 <= precio < _LIMITE_IMPORTE
+            and type(subtotal) is int and 0 <= subtotal < _LIMITE_IMPORTE):
+        alto = 0 if producto is None else producto + 1
+        return ((alto << _BITS_CANTIDAD | cantidad) << _BITS_IMPORTE | precio) << _BITS_IMPORTE | subtotal
+    return (producto, cantidad, precio, subtotal)
+
+
+def clave_venta(caja_id, fecha_hora, total):
+    return _clave_venta(_entero(caja_id), empaquetar_fecha_hora(fecha_hora), empaquetar_importe(total))
+
+
+def firma_item(producto_id, cantidad, precio_unitario, subtotal):
+    return _firma(_entero(producto_id), _entero(cantidad), empaquetar_importe(precio_unitario), empaquetar_importe(subtotal))
+
+
+def _producto_de(firma):
+    if isinstance(firma, int):
+        alto = firma >> _BITS_RESTO_ITEM
+        return alto - 1 if alto else None
+    return firma[0]
+
+
+def _resto_de(firma):
+    return firma & _MASCARA_RESTO_ITEM if isinstance(firma, int) else firma[1:]
+
+
+class ImportIndex:
+    """Diccionarios clave natural -> id local (el menor id, como MIN(id) en SQL)."""
+
+    def __init__(self):
+        self.cajas_uuid = {}
+        self.cajas_clave = {}
+        self.ventas = {}
+        # identificador -> fecha_hora << _BITS_ID | id, o lista de esos si se repite el identificador
+        self.tickets = {}
+        # (identificador, fecha_hora) -> id cuando fecha_hora o id no se pueden empaquetar
+        self.tickets_otros = {}
+        # ticket_id -> firma, o lista de firmas si el ticket tiene más de un item
+        self.items = {}
+        self._cargadas = set()
+
+    def reiniciar(self):
+        """Vacía el índice: la próxima búsqueda vuelve a cargar cada tabla desde la base."""
+        self.cajas_uuid.clear()
+        self.cajas_clave.clear()
+        self.ventas.clear()
+        self.tickets.clear()
+        self.tickets_otros.clear()
+        self.items.clear()
+        self._cargadas.clear()
+
+    # --- carga ----------------------------------------------------------------
+
+    def cargar(self, cur, tabla: str, desde_id: int = 0):
+        """Agrega al índice las filas de main.<tabla> con id > desde_id (todas si la tabla no estaba cargada)."""
+        if tabla not in self._cargadas:
+            desde_id = 0
+        if tabla == 'caja_diaria':
+            filas = cur.execute(
+                "SELECT id, caja_uuid, codigo_caja, fecha, hora_apertura FROM main.caja_diaria WHERE id > ? ORDER BY id",
+                (desde_id,),
+            ).fetchall()
+            for id_, uuid, codigo, fecha, hora in filas:
+                if uuid:
+                    self.cajas_uuid.setdefault(_texto(uuid), id_)
+                self.cajas_clave.setdefault((_texto(codigo), _texto(fecha), _texto(hora)), id_)
+        elif tabla == 'ventas':
+            filas = cur.execute(
+                f"SELECT id, {_sql_entero('caja_id')}, {_sql_fecha_hora('fecha_hora')}, {_sql_importe('total_venta')} "
+                "FROM main.ventas WHERE id > ? ORDER BY id",
+                (desde_id,),
+            ).fetchall()
+            ventas = self.ventas
+            for id_, caja_id, fh, total in filas:
+                ventas.setdefault(_clave_venta(caja_id, fh, total), id_)
+        elif tabla == 'tickets':
+            filas = cur.execute(
+                f"SELECT id, identificador_ticket, {_sql_fecha_hora('fecha_hora')} FROM main.tickets "
+                "WHERE id > ? AND identificador_ticket IS NOT NULL ORDER BY id",
+                (desde_id,),
+            ).fetchall()
+            for id_, identificador, fh in filas:
+                self._agregar_ticket(identificador, fh, id_)
+        elif tabla == 'venta_items':
+            filas = cur.execute(
+                f"SELECT ticket_id, {_sql_entero('producto_id')}, {_sql_entero('cantidad')}, "
+                f"{_sql_importe('precio_unitario')}, {_sql_importe('subtotal')} FROM main.venta_items WHERE rowid > ?",
+                (desde_id,),
+            ).fetchall()
+            agregar = self._agregar_item
+            for ticket_id, producto, cantidad, precio, subtotal in filas:
+                agregar(ticket_id, _firma(producto, cantidad, precio, subtotal))
+        else:
+            raise ValueError(f"Tabla sin índice de importación: {tabla}")
+        self._cargadas.add(tabla)
+
+    def _asegurar(self, cur, tabla: str):
+        if tabla not in self._cargadas:
+            self.cargar(cur, tabla)
+
+    def _agregar_ticket(self, identificador, fh, id_):
+        """fh: fecha_hora ya empaquetada."""
+        if self._buscar_ticket(identificador, fh) is not None:
+            return
+        identificador = _texto(identificador)
+        if type(fh) is not int or not 0 <= id_ < _LIMITE_ID:
+            self.tickets_otros[(identificador, _texto(fh))] = id_
+            return
+        valor = fh << _BITS_ID | id_
+        actual = self.tickets.get(identificador)
+        if actual is None:
+            self.tickets[identificador] = valor
+        elif isinstance(actual, list):
+            actual.append(valor)
+        else:
+            self.tickets[identificador] = [actual, valor]
+
+    def _agregar_item(self, ticket_id, firma):
+        actual = self.items.get(ticket_id)
+        if actual is None:
+            self.items[ticket_id] = firma
+        elif isinstance(actual, list):
+            actual.append(firma)
+        else:
+            self.items[ticket_id] = [actual, firma]
+
+    # --- búsquedas ------------------------------------------------------------
+
+    def buscar_venta(self, caja_id, fecha_hora, total):
+        return self.ventas.get(clave_venta(caja_id, fecha_hora, total))
+
+    def buscar_ticket(self, identificador, fecha_hora):
+        return self._buscar_ticket(identificador, empaquetar_fecha_hora(fecha_hora))
+
+    def _buscar_ticket(self, identificador, fh):
+        if identificador is None:
+            return None
+        if type(fh) is int:
+            actual = self.tickets.get(identificador)
+            if actual is not None:
+                for valor in (actual if isinstance(actual, list) else (actual,)):
+                    if valor >> _BITS_ID == fh:
+                        return valor & _MASCARA_ID
+        return self.tickets_otros.get((identificador, fh)) if self.tickets_otros else None
+
+    def existe_item(self, ticket_id, firma) -> bool:
+        """True si el ticket ya tiene ese item (el producto sólo cuenta si firma lo trae)."""
+        actual = self.items.get(ticket_id)
+        if actual is None:
+            return False
+        otras = actual if isinstance(actual, list) else (actual,)
+        if firma in otras:
+            return True
+        if _producto_de(firma) is not None:
+            return False
+        resto = _resto_de(firma)
+        return any(_resto_de(otra) == resto for otra in otras)
+
+    # --- resolución de las tablas imp_* de sync_utils -----------------------
+
+    def resolver(self, cur, tabla: str):
+        """Completa dst_id de las filas de imp_<tabla> que todavía no lo tienen."""
+        self._asegurar(cur, tabla)
+        if tabla == 'caja_diaria':
+            filas = cur.execute(
+                "SELECT src_id, usa_uuid, caja_uuid, codigo_caja, fecha, hora_apertura FROM imp_caja WHERE dst_id IS NULL"
+            ).fetchall()
+            pares = []
+            for src_id, usa_uuid, uuid, codigo, fecha, hora in filas:
+                if usa_uuid:
+                    dst = self.cajas_uuid.get(uuid)
+                elif codigo is None or fecha is None or hora is None:
+                    # En SQL NULL = NULL no coincide
+                    dst = None
+                else:
+                    dst = self.cajas_clave.get((codigo, fecha, hora))
+                if dst is not None:
+                    pares.append((dst, src_id))
+            cur.executemany("UPDATE imp_caja SET dst_id = ? WHERE src_id = ?", pares)
+        elif tabla == 'ventas':
+            filas = cur.execute(
+                f"SELECT src_id, {_sql_entero('caja_id')}, {_sql_fecha_hora('fecha_hora')}, {_sql_importe('total_venta')} "
+                "FROM imp_venta WHERE dst_id IS NULL"
+            ).fetchall()
+            ventas = self.ventas
+            pares = [(dst, f[0]) for f in filas if (dst := ventas.get(_clave_venta(f[1], f[2], f[3]))) is not None]
+            cur.executemany("UPDATE imp_venta SET dst_id = ? WHERE src_id = ?", pares)
+        elif tabla == 'tickets':
+            filas = cur.execute(
+                f"SELECT src_id, identificador_ticket, {_sql_fecha_hora('fecha_hora')} FROM imp_ticket WHERE dst_id IS NULL"
+            ).fetchall()
+            buscar = self._buscar_ticket
+            pares = [(dst, f[0]) for f in filas if (dst := buscar(f[1], f[2])) is not None]
+            cur.executemany("UPDATE imp_ticket SET dst_id = ? WHERE src_id = ?", pares)
+        else:
+            raise ValueError(f"Tabla sin índice de importación: {tabla}")
+
+    def insertar_items(self, cur) -> int:
+        """Inserta los items de imp_item que el ticket no tenga todavía; devuelve cuántos."""
+        self._asegurar(cur, 'venta_items')
+        nuevos = []
+        for ticket_id, producto_id, cantidad, precio, subtotal, *partes in cur.execute(
+            "SELECT ticket_id, producto_id, cantidad, precio_unitario, subtotal, "
+            f"{_sql_entero('producto_id')}, {_sql_entero('cantidad')}, {_sql_importe('precio_unitario')}, {_sql_importe('subtotal')} "
+            "FROM imp_item ORDER BY src_id"
+        ).fetchall():
+            firma = _firma(*partes)
+            if self.existe_item(ticket_id, firma):
+                continue
+            # Agregarlo ya: los repetidos dentro del mismo origen se importan una vez
+            self._agregar_item(ticket_id, firma)
+            nuevos.append((ticket_id, producto_id, cantidad, precio, subtotal))
+        cur.executemany(
+            "INSERT INTO main.venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?,?,?,?,?)",
+            nuevos,
+        )
+        return len(nuevos)
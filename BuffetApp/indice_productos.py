@@ -0,0 +1,69 @@
+"""Índice en memoria para la búsqueda rápida de la pantalla de ventas.
+
+Arreglo ordenado de claves (palabras del nombre, nombre completo sin espacios y
+código de producto, normalizados como en busqueda.palabras) y bisect: cada
+palabra tipeada se busca como prefijo de alguna clave y el resultado es la
+intersección. El catálogo del buffet entra entero en memoria, así que filtrar
+en cada tecla no consulta la base (ver tools/bench_busqueda_ventas.py).
+
+Las filas son las de ventas_view_new.cargar_productos():
+(id, nombre, precio, stock, visible, codigo_producto, ...).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+
+from busqueda import palabras
+
+
+class IndiceProductos:
+    """Prefijos de nombre/código -> ids de producto, y código exacto -> fila."""
+
+    def __init__(self, productos=()):
+        self.cargar(productos)
+
+    def cargar(self, productos):
+        pares = set()
+        self._por_codigo = {}
+        self._orden = {}
+        for pos, prod in enumerate(productos):
+            prod_id, nombre, codigo = prod[0], prod[1], prod[5]
+            self._orden[prod_id] = pos
+            partes = palabras(nombre)
+            claves = set(partes)
+            if len(partes) > 1:
+                # "cocacola" también encuentra "Coca Cola"
+                claves.add("".join(partes))
+            codigo_norm = "".join(palabras(codigo))
+            if codigo_norm:
+                claves.add(codigo_norm)
+                self._por_codigo.setdefault(codigo_norm, prod)
+            pares.update((clave, prod_id) for clave in claves)
+        pares = sorted(pares)
+        self._claves = [clave for clave, _ in pares]
+        self._ids = [prod_id for _, prod_id in pares]
+
+    def buscar(self, texto):
+        """Ids que coinciden con todas las palabras de texto, en el orden del catálogo.
+
+        Devuelve None si texto no tiene palabras (sin filtro).
+        """
+        consulta = palabras(texto)
+        if not consulta:
+            return None
+        resultado = None
+        # Las palabras más largas primero: suelen dejar menos candidatos
+        for palabra in sorted(set(consulta), key=len, reverse=True):
+            ids = set()
+            i = bisect_left(self._claves, palabra)
+            while i < len(self._claves) and self._claves[i].startswith(palabra):
+                ids.add(self._ids[i])
+                i += 1
+            resultado = ids if resultado is None else resultado & ids
+            if not resultado:
+                return []
+        return sorted(resultado, key=self._orden.__getitem__)
+
+    def por_codigo(self, texto):
+        """Fila del producto cuyo código es exactamente texto (lector de códigos), o None."""
+        return self._por_codigo.get("".join(palabras(texto)))
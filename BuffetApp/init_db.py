@@ -1,13 +1,25 @@
 # archivo: init_db.py
+"""Esquema de la base y migraciones versionadas con PRAGMA user_version.
+
+Cada migración se registra en MIGRACIONES con su número; init_db() aplica
+sólo las pendientes, todas en una misma transacción, y deja user_version en
+la última. Con la base al día el arranque se reduce a leer ese pragma.
+
+Para cambiar el esquema agregar una función _migracion_NNN_* al final de la
+lista (nunca editar ni reordenar las ya publicadas).
+"""
 import sqlite3
-from db_utils import get_connection
+from db_utils import get_connection, transaction
 from app_config import get_device_id, get_device_name
 
-def init_db():
-    
-    conn = get_connection()
-    c = conn.cursor()
 
+def _migracion_001_esquema_base(c):
+    """Tablas, índices, triggers y datos iniciales.
+
+    Es idempotente a propósito: las bases anteriores al versionado (user_version=0)
+    ya tienen parte del esquema y pasan por acá una única vez para completarlo y
+    normalizar datos heredados.
+    """
     # Métodos de pago
     c.execute('''
     CREATE TABLE IF NOT EXISTS metodos_pago (
@@ -231,7 +243,7 @@ def init_db():
     # which prevented multiple ingresos/retiros per caja. If an old index
     # exists, migrate data to a new table without that UNIQUE constraint.
     try:
-        cur = conn.cursor()
+        cur = c
         # detect an index that enforces uniqueness on caja_movimiento(caja_id, tipo)
         cur.execute("PRAGMA index_list('caja_movimiento')")
         indexes = cur.fetchall()
@@ -261,7 +273,6 @@ def init_db():
             cur.execute("INSERT INTO caja_movimiento_new (id, caja_id, tipo, monto, observacion, creado_ts) SELECT id, caja_id, tipo, monto, observacion, creado_ts FROM caja_movimiento")
             cur.execute("DROP TABLE caja_movimiento")
             cur.execute("ALTER TABLE caja_movimiento_new RENAME TO caja_movimiento")
-            conn.commit()
     except Exception:
         # if migration fails, continue silently (we prefer not to break install)
         pass
@@ -317,7 +328,6 @@ def init_db():
         SET ingresos = (SELECT COALESCE(SUM(monto),0) FROM caja_movimiento WHERE caja_id = caja_diaria.id AND tipo='INGRESO'),
             retiros  = (SELECT COALESCE(SUM(monto),0) FROM caja_movimiento WHERE caja_id = caja_diaria.id AND tipo='RETIRO')
         ''')
-        conn.commit()
     except Exception:
         # Do not fail install if triggers cannot be created
         pass
@@ -510,8 +520,9 @@ def init_db():
         c.execute("INSERT INTO usuarios (usuario, password, rol, activo) VALUES (?, ?, ?, 1)", ("admin", "admin123", "administrador"))
         c.execute("INSERT INTO usuarios (usuario, password, rol, activo) VALUES (?, ?, ?, 1)", ("cajero", "cajero123", "cajero"))
 
-    conn.commit()
-    
+
+def _migracion_002_pos_y_cajas(c):
+    """Settings, puntos de venta (POS del equipo) y plantillas de caja."""
     # --- POS y Settings para identificar dispositivo/Punto de Venta ---
     try:
         # Tabla settings KV simple (si no existiera)
@@ -569,30 +580,7 @@ def init_db():
                 pass
 
         # Crear/asegurar POS local basado en config (device_id/device_name)
-        device_id = get_device_id()
-        device_name = get_device_name()
-        # Buscar pos por device_id; si no existe, crearlo
-        c.execute("SELECT id, pos_uuid FROM pos WHERE device_id=?", (device_id,))
-        row = c.fetchone()
-        if not row:
-            import uuid, platform
-            pos_uuid = str(uuid.uuid4())
-            hostname = platform.node() or "Equipo"
-            c.execute(
-                "INSERT INTO pos (pos_uuid, nombre, device_id, hostname) VALUES (?, ?, ?, ?)",
-                (pos_uuid, device_name or hostname, device_id, hostname)
-            )
-            # Guardar referencia en settings
-            try:
-                c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('device_pos_uuid', ?)", (pos_uuid,))
-            except Exception:
-                pass
-        else:
-            # Alinear nombre si cambió desde config
-            try:
-                c.execute("UPDATE pos SET nombre=? WHERE device_id=?", (device_name, device_id))
-            except Exception:
-                pass
+        asegurar_pos_local(c)
     except Exception:
         # No romper la inicialización ante errores de POS/Settings
         pass
@@ -627,11 +615,309 @@ def init_db():
                 c.execute('''
                     UPDATE pos_cajas SET predeterminada=CASE WHEN id=(SELECT id FROM pos_cajas ORDER BY id LIMIT 1) THEN 1 ELSE 0 END
                 ''')
-        conn.commit()
     except Exception:
         pass
-    conn.close()
-    print("Base de datos inicializada.")
+
+
+def _migracion_003_caja_resumen(c):
+    """Totales precalculados de cajas cerradas (ver caja_resumen.py) y su backfill.
+
+    El backfill va con su propio SQL (el de caja_resumen.py al publicarse esta
+    migración): una migración no puede depender de código que después cambie.
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS caja_resumen (
+        caja_id INTEGER PRIMARY KEY REFERENCES caja_diaria(id),
+        total_ventas REAL NOT NULL DEFAULT 0,
+        ventas_efectivo REAL NOT NULL DEFAULT 0,
+        transferencias REAL NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0,
+        retiros REAL NOT NULL DEFAULT 0,
+        total_tickets INTEGER NOT NULL DEFAULT 0,
+        tickets_anulados INTEGER NOT NULL DEFAULT 0,
+        actualizado_ts TEXT
+    )
+    ''')
+    # El listado de cajas ordena y filtra por fecha
+    c.execute("CREATE INDEX IF NOT EXISTS idx_caja_diaria_fecha ON caja_diaria(fecha)")
+    c.execute('''
+    INSERT OR REPLACE INTO caja_resumen (caja_id, total_ventas, ventas_efectivo, transferencias, ingresos, retiros,
+                                         total_tickets, tickets_anulados, actualizado_ts)
+    SELECT cd.id, COALESCE(t.total, 0), COALESCE(t.efectivo, 0), COALESCE(t.transf, 0),
+           COALESCE(m.ingresos, 0), COALESCE(m.retiros, 0), COALESCE(t.n_ok, 0), COALESCE(t.n_anul, 0),
+           datetime('now','localtime')
+      FROM caja_diaria cd
+      LEFT JOIN (
+        SELECT v.caja_id,
+               COALESCE(SUM(CASE WHEN t.status!='Anulado' THEN t.total_ticket END),0) AS total,
+               COALESCE(SUM(CASE WHEN t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'efectivo%' THEN t.total_ticket END),0) AS efectivo,
+               COALESCE(SUM(CASE WHEN t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'transfer%' THEN t.total_ticket END),0) AS transf,
+               SUM(CASE WHEN t.status!='Anulado' THEN 1 ELSE 0 END) AS n_ok,
+               SUM(CASE WHEN t.status='Anulado' THEN 1 ELSE 0 END) AS n_anul
+          FROM ventas v
+          JOIN tickets t ON t.venta_id = v.id
+          LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
+         GROUP BY v.caja_id
+      ) t ON t.caja_id = cd.id
+      LEFT JOIN (
+        SELECT caja_id,
+               COALESCE(SUM(CASE WHEN tipo='INGRESO' THEN monto END),0) AS ingresos,
+               COALESCE(SUM(CASE WHEN tipo='RETIRO' THEN monto END),0) AS retiros
+          FROM caja_movimiento
+         GROUP BY caja_id
+      ) m ON m.caja_id = cd.id
+     WHERE cd.estado='cerrada'
+       AND NOT EXISTS (SELECT 1 FROM caja_resumen r WHERE r.caja_id = cd.id)
+    ''')
+
+
+def _migracion_004_fecha_ventas_tickets(c):
+    """Columna fecha (YYYY-MM-DD) indexada en ventas y tickets.
+
+    Los filtros por día comparaban substr()/date() sobre fecha_hora y recorrían
+    toda la tabla; con la columna indexada pasan a ser búsquedas por índice.
+    SalesService la escribe al vender; los triggers la completan en cualquier
+    otro INSERT (importación, scripts) y al editar fecha_hora.
+    """
+    for tabla in ('ventas', 'tickets'):
+        c.execute(f"PRAGMA table_info({tabla})")
+        if 'fecha' not in [row[1] for row in c.fetchall()]:
+            c.execute(f"ALTER TABLE {tabla} ADD COLUMN fecha TEXT")
+        c.execute(f"UPDATE {tabla} SET fecha = substr(fecha_hora, 1, 10) WHERE fecha IS NOT substr(fecha_hora, 1, 10)")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_fecha ON {tabla}(fecha)")
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fecha_ins AFTER INSERT ON {tabla}
+        WHEN NEW.fecha IS NOT substr(NEW.fecha_hora, 1, 10)
+        BEGIN
+            UPDATE {tabla} SET fecha = substr(NEW.fecha_hora, 1, 10) WHERE id = NEW.id;
+        END
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fecha_upd AFTER UPDATE OF fecha_hora ON {tabla}
+        WHEN NEW.fecha IS NOT substr(NEW.fecha_hora, 1, 10)
+        BEGIN
+            UPDATE {tabla} SET fecha = substr(NEW.fecha_hora, 1, 10) WHERE id = NEW.id;
+        END
+        ''')
+
+
+def _migracion_005_ventas_diarias(c):
+    """Rollup por día/caja/producto/método para el dashboard (ver ventas_diarias.py).
+
+    Se llena con su propio SQL (el de ventas_diarias.reconstruir() al publicarse).
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS ventas_diarias (
+        fecha TEXT NOT NULL,
+        caja_id INTEGER NOT NULL DEFAULT 0,
+        disciplina TEXT NOT NULL DEFAULT '',
+        producto_id INTEGER NOT NULL DEFAULT 0,
+        metodo_pago_id INTEGER NOT NULL DEFAULT 0,
+        unidades INTEGER NOT NULL DEFAULT 0,
+        importe REAL NOT NULL DEFAULT 0,
+        anulados INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, caja_id, disciplina, producto_id, metodo_pago_id)
+    )
+    ''')
+    # KPIs por caja
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ventas_diarias_caja ON ventas_diarias(caja_id)")
+    c.execute("DELETE FROM ventas_diarias")
+    c.execute('''
+    INSERT INTO ventas_diarias (fecha, caja_id, disciplina, producto_id, metodo_pago_id, unidades, importe, anulados)
+    SELECT COALESCE(t.fecha, substr(t.fecha_hora, 1, 10), ''), COALESCE(v.caja_id, 0), COALESCE(cd.disciplina, ''),
+           COALESCE(t.producto_id, 0), COALESCE(v.metodo_pago_id, 0),
+           SUM(CASE WHEN t.status!='Anulado' THEN 1 ELSE 0 END),
+           COALESCE(SUM(CASE WHEN t.status!='Anulado' THEN t.total_ticket END), 0),
+           SUM(CASE WHEN t.status='Anulado' THEN 1 ELSE 0 END)
+      FROM tickets t
+      JOIN ventas v ON v.id = t.venta_id
+      LEFT JOIN caja_diaria cd ON cd.id = v.caja_id
+     GROUP BY 1, 2, 3, 4, 5
+    ''')
+
+
+def _migracion_006_busqueda_fts(c):
+    """Índices FTS5 de productos y de identificadores de ticket (ver busqueda.py).
+
+    Tablas de contenido externo sincronizadas por triggers; unicode61 con
+    remove_diacritics para que la búsqueda no distinga acentos. Si el SQLite
+    no trae FTS5 no se crean y busqueda.py usa LIKE.
+    """
+    # Para que el filtro por producto de los reportes arranque desde los productos encontrados
+    c.execute("CREATE INDEX IF NOT EXISTS idx_venta_items_producto_id ON venta_items(producto_id)")
+    try:
+        c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            nombre, codigo_producto,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+        )
+        ''')
+        c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+            identificador_ticket,
+            content='tickets', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3',
+            columnsize=0, detail=none
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 no disponible, la búsqueda usará LIKE: {e}")
+        return
+    for tabla, columnas in (('products', ('nombre', 'codigo_producto')), ('tickets', ('identificador_ticket',))):
+        nuevos = ', '.join(f'NEW.{col}' for col in columnas)
+        viejos = ', '.join(f'OLD.{col}' for col in columnas)
+        lista = ', '.join(columnas)
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_ins AFTER INSERT ON {tabla} BEGIN
+            INSERT INTO {tabla}_fts(rowid, {lista}) VALUES (NEW.id, {nuevos});
+        END
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_del AFTER DELETE ON {tabla} BEGIN
+            INSERT INTO {tabla}_fts({tabla}_fts, rowid, {lista}) VALUES ('delete', OLD.id, {viejos});
+        END
+        ''')
+        # Sólo cuando cambia el texto indexado (anular o imprimir un ticket no toca el índice)
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_upd AFTER UPDATE OF {lista} ON {tabla} BEGIN
+            INSERT INTO {tabla}_fts({tabla}_fts, rowid, {lista}) VALUES ('delete', OLD.id, {viejos});
+            INSERT INTO {tabla}_fts(rowid, {lista}) VALUES (NEW.id, {nuevos});
+        END
+        ''')
+        c.execute(f"INSERT INTO {tabla}_fts({tabla}_fts) VALUES ('rebuild')")
+
+
+def _migracion_007_cambios_tablas(c):
+    """Contador de cambios por tabla para monitor_cambios.py.
+
+    Un trigger por INSERT/UPDATE/DELETE suma 1 a la fila de la tabla; así otra
+    instancia de la app que ve cambiar PRAGMA data_version sabe qué tablas
+    recargar sin consultarlas. La lista de tablas queda fija acá (es la de
+    monitor_cambios.TABLAS_MONITOREADAS al publicarse): sumar una tabla al
+    monitor requiere una migración nueva con sus triggers.
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS cambios_tablas (
+        tabla TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    for tabla in ('products', 'ventas', 'tickets', 'caja_diaria', 'caja_movimiento'):
+        c.execute("INSERT OR IGNORE INTO cambios_tablas (tabla, version) VALUES (?, 0)", (tabla,))
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cambios_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+                UPDATE cambios_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+            END
+            ''')
+
+
+
+def _migracion_008_indices_importacion(c):
+    """Índices sobre las claves naturales que usa sync_utils.import_from_db.
+
+    La importación busca tickets por (identificador_ticket, fecha_hora) y ventas
+    por (caja_id, fecha_hora); sin estos índices cada búsqueda recorre la tabla.
+    """
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_identificador_fecha_hora ON tickets(identificador_ticket, fecha_hora)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ventas_caja_fecha_hora ON ventas(caja_id, fecha_hora)")
+
+
+def _migracion_009_import_watermarks(c):
+    """Marcas de agua de la importación incremental (sync_utils.import_from_db).
+
+    Por equipo de origen y tabla del historial: último id ya importado que no
+    puede cambiar, la fecha/hora de esa fila (para reconocer que el origen es la
+    misma base) y la huella sha256 del último archivo importado.
+    """
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS import_watermarks (
+        pos_uuid TEXT NOT NULL,
+        tabla TEXT NOT NULL,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        last_fecha_hora TEXT,
+        src_fingerprint TEXT,
+        PRIMARY KEY (pos_uuid, tabla)
+    ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_import_watermarks_fingerprint ON import_watermarks(src_fingerprint)")
+
+def asegurar_pos_local(c=None):
+    """Crea (o renombra) la fila de pos correspondiente al device_id de este equipo.
+
+    Lo aplica la migración 002; hace falta volver a llamarla cuando la base viene
+    de otro equipo (p. ej. al restaurar un backup), porque ahí ya está al día.
+    """
+    if c is None:
+        with transaction() as conn:
+            return asegurar_pos_local(conn.cursor())
+    device_id = get_device_id()
+    device_name = get_device_name()
+    # Buscar pos por device_id; si no existe, crearlo
+    c.execute("SELECT id, pos_uuid FROM pos WHERE device_id=?", (device_id,))
+    row = c.fetchone()
+    if not row:
+        import uuid, platform
+        pos_uuid = str(uuid.uuid4())
+        hostname = platform.node() or "Equipo"
+        c.execute(
+            "INSERT INTO pos (pos_uuid, nombre, device_id, hostname) VALUES (?, ?, ?, ?)",
+            (pos_uuid, device_name or hostname, device_id, hostname)
+        )
+        # Guardar referencia en settings
+        try:
+            c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('device_pos_uuid', ?)", (pos_uuid,))
+        except Exception:
+            pass
+    else:
+        # Alinear nombre si cambió desde config
+        try:
+            c.execute("UPDATE pos SET nombre=? WHERE device_id=?", (device_name, device_id))
+        except Exception:
+            pass
+
+
+# Registro ordenado: (user_version que deja aplicada, función)
+MIGRACIONES = [
+    (1, _migracion_001_esquema_base),
+    (2, _migracion_002_pos_y_cajas),
+    (3, _migracion_003_caja_resumen),
+    (4, _migracion_004_fecha_ventas_tickets),
+    (5, _migracion_005_ventas_diarias),
+    (6, _migracion_006_busqueda_fts),
+    (7, _migracion_007_cambios_tablas),
+    (8, _migracion_008_indices_importacion),
+    (9, _migracion_009_import_watermarks),
+]
+ULTIMA_VERSION = MIGRACIONES[-1][0]
+
+
+def schema_version(conn=None) -> int:
+    """user_version actual de la base."""
+    if conn is None:
+        conn = get_connection()
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def init_db():
+    """Aplica las migraciones pendientes. Con la base al día es una sola lectura de pragma."""
+    if schema_version() >= ULTIMA_VERSION:
+        return
+    # BEGIN IMMEDIATE: si otro proceso está migrando, esperar y volver a leer la versión
+    with transaction() as conn:
+        c = conn.cursor()
+        version = schema_version(conn)
+        aplicadas = []
+        for numero, migracion in MIGRACIONES:
+            if numero > version:
+                migracion(c)
+                aplicadas.append(numero)
+        if aplicadas:
+            # user_version se escribe dentro de la misma transacción que las migraciones
+            c.execute(f"PRAGMA user_version = {int(aplicadas[-1])}")
+    if aplicadas:
+        print(f"Base de datos inicializada (migraciones {aplicadas[0]}..{aplicadas[-1]}).")
 
 # Función para registrar errores
 def log_error(fecha_hora, modulo, mensaje):
@@ -5,11 +5,14 @@ from tkinter import simpledialog, messagebox
 # Núcleo ligero importado al inicio; vistas pesadas se importan lazy dentro de métodos
 from init_db import init_db, log_error
 from app_config import get_config
-from utils_paths import CONFIG_PATH, DB_PATH, resource_path
+from utils_paths import CONFIG_PATH, resource_path
 from db_utils import get_connection
 import sqlite3
 import uuid
 from db_utils import get_current_pos_uuid
+from db_writer import get_writer
+from db_reader import get_reader
+from monitor_cambios import get_monitor
 
 
 
@@ -22,29 +25,23 @@ class BarCanchaApp:
 
     def marcar_tickets_impresos(self, ticket_ids):
         """Marca como 'Impreso' los tickets indicados.
-        Acepta lista de IDs (int) y realiza un UPDATE en bloque.
+        Acepta lista de IDs (int); el UPDATE en bloque corre en el hilo escritor.
         """
-        try:
-            if not ticket_ids:
-                return
-            ids = [int(x) for x in ticket_ids if str(x).isdigit()]
-            if not ids:
-                return
-            placeholders = ",".join(["?"] * len(ids))
-            with get_connection() as conn:
-                cur = conn.cursor()
-                cur.execute(f"UPDATE tickets SET status='Impreso' WHERE id IN ({placeholders})", ids)
-                conn.commit()
-        except Exception as e:
-            # No bloquear el flujo por errores de marcado; loguear si hay logger
+        if not ticket_ids:
+            return
+        from sales_service import marcar_tickets_impresos
+
+        def _on_error(e):
+            # No bloquear el flujo por errores de marcado; loguear
             try:
                 fecha_hora = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 log_error(fecha_hora, 'marcar_tickets_impresos', f'Error: {e}')
             except Exception:
                 pass
+        get_writer().submit(marcar_tickets_impresos, list(ticket_ids), on_error=_on_error)
 
     def __init__(self, root):
-        import json, os, threading
+        import json, os
         self.root = root
         # Confirmación al cerrar la aplicación desde la 'X'
         try:
@@ -79,15 +76,23 @@ class BarCanchaApp:
         except Exception as e:
             print(f"No se pudo cargar un icono: {e}")
 
-        # Inicializar DB y migraciones de POS/Settings (idempotente)
-        # Si la DB ya existe, correr en segundo plano para no bloquear el arranque
+        # Escrituras a SQLite en un hilo dedicado; los resultados vuelven al mainloop
+        get_writer().attach(self.root)
+        # Consultas de reportes en un hilo lector, cancelables
+        get_reader().attach(self.root)
+
+        # Migraciones pendientes según PRAGMA user_version; con la base al día es
+        # una sola lectura, así que corre antes del login y no en paralelo con él
         try:
-            if not os.path.exists(DB_PATH):
-                init_db()
-            else:
-                threading.Thread(target=init_db, daemon=True).start()
+            init_db()
         except Exception:
             pass
+        # Avisa a las vistas de lo que escriben otros equipos sobre la misma base (usa la tabla
+        # cambios_tablas de las migraciones, por eso después de init_db)
+        get_monitor().attach(self.root)
+        # La caché de caja_snapshot también se entera de esas escrituras
+        from caja_snapshot import vigilar_cambios
+        vigilar_cambios()
 
         # Leer/crear config en AppData
         if not os.path.exists(CONFIG_PATH):
@@ -397,6 +402,8 @@ class BarCanchaApp:
                 messagebox.showerror("Error", f"No se pudo guardar el movimiento: {e}")
                 return
             conn.commit(); conn.close()
+            from caja_snapshot import invalidar
+            invalidar(caja_id)
             win.destroy()
             messagebox.showinfo("Caja", f"{tipo.capitalize()} registrado.")
             self.actualizar_menu_caja()
@@ -832,11 +839,15 @@ class BarCanchaApp:
             if messagebox.askyesno("Cerrar", "¿Cerrar todas las cajas abiertas?" ):
                 import datetime
                 now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                conn = get_connection()
-                cur = conn.cursor()
-                cur.execute("UPDATE caja_diaria SET estado='cerrada', hora_cierre=?, cierre_dt=? WHERE estado='abierta'", (now.split(' ')[1], now))
-                conn.commit()
-                conn.close()
+                from db_utils import transaction
+                from caja_resumen import guardar_resumenes
+                with transaction() as conn:
+                    cur = conn.cursor()
+                    ids = [r[0] for r in cur.execute("SELECT id FROM caja_diaria WHERE estado='abierta'").fetchall()]
+                    cur.execute("UPDATE caja_diaria SET estado='cerrada', hora_cierre=?, cierre_dt=? WHERE estado='abierta'", (now.split(' ')[1], now))
+                    guardar_resumenes(cur, ids)
+                from caja_snapshot import invalidar
+                invalidar()
                 self.caja_abierta_id = None
                 win.destroy()
 
@@ -862,6 +873,8 @@ class BarCanchaApp:
                 pass
 
     def ocultar_frames(self):
+        # Al cambiar de pantalla, cortar las consultas de la vista que se deja
+        get_reader().cancelar_todo()
         if getattr(self, 'menu_view', None):
             try:
                 self.menu_view.pack_forget()
@@ -1042,134 +1055,40 @@ class BarCanchaApp:
 
     def obtener_resumen_caja(self, caja_id):
         """Recopila datos resumidos filtrando por la caja indicada."""
-
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT cd.codigo_caja, COALESCE(d.descripcion, cd.disciplina) AS disciplina,
-                   cd.usuario_apertura, cd.fecha, cd.hora_apertura, cd.fondo_inicial, cd.estado, COALESCE(cd.descripcion_evento, '')
-              FROM caja_diaria cd
-              LEFT JOIN disciplinas d ON d.codigo = cd.disciplina
-             WHERE cd.id=?
-            """,
-            (caja_id,),
-        )
-        info = cursor.fetchone()
-        if info:
-            codigo_caja, disciplina, usuario_apertura, fecha, hora_apertura, fondo_inicial, estado, descripcion_evento = info
-        else:
-            codigo_caja = disciplina = usuario_apertura = fecha = hora_apertura = estado = ''
-            fondo_inicial = 0
-            descripcion_evento = ''
-
-        cursor.execute("SELECT tipo, monto, observacion FROM caja_movimiento WHERE caja_id=?", (caja_id,))
-        ingresos = retiros = 0
+        from caja_snapshot import get_snapshot
+        snap = get_snapshot(caja_id)
+        info = snap.info if snap else {}
+        fondo_inicial = info.get('fondo_inicial') or 0
         obs_ing = obs_ret = ''
-        for tipo, monto, obs in cursor.fetchall():
+        for tipo, _monto, obs, _creado in (snap.movimientos if snap else []):
             if tipo == 'INGRESO':
-                ingresos = monto
                 obs_ing = obs or ''
             elif tipo == 'RETIRO':
-                retiros = monto
                 obs_ret = obs or ''
-
-        cursor.execute(
-            """
-            SELECT COALESCE(SUM(t.total_ticket),0)
-              FROM tickets t JOIN ventas v ON v.id = t.venta_id
-             WHERE v.caja_id=? AND t.status!='Anulado'
-            """,
-            (caja_id,),
-        )
-        total_ventas = cursor.fetchone()[0] or 0
-        cursor.execute(
-            """
-            SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id
-             WHERE v.caja_id=? AND t.status!='Anulado'
-            """,
-            (caja_id,),
-        )
-        total_tickets = cursor.fetchone()[0] or 0
-        cursor.execute(
-            """
-            SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id
-             WHERE v.caja_id=? AND t.status='Anulado'
-            """,
-            (caja_id,),
-        )
-        tickets_anulados = cursor.fetchone()[0] or 0
-
-        cursor.execute(
-            """
-            SELECT c.descripcion, COALESCE(SUM(t.total_ticket),0)
-              FROM tickets t
-              JOIN ventas v ON v.id = t.venta_id
-              LEFT JOIN Categoria_Producto c ON c.id = t.categoria_id
-             WHERE v.caja_id=? AND t.status!='Anulado'
-             GROUP BY c.descripcion
-             ORDER BY c.descripcion
-            """,
-            (caja_id,),
-        )
-        por_categoria = cursor.fetchall()
-
-        # Productos vendidos agrupados para mostrar resumen
-        cursor.execute(
-            """
-            SELECT c.descripcion, p.nombre, SUM(vi.cantidad) AS cant
-              FROM venta_items vi
-              JOIN tickets t ON t.id = vi.ticket_id
-              JOIN ventas v ON v.id = t.venta_id
-              JOIN products p ON p.id = vi.producto_id
-              LEFT JOIN Categoria_Producto c ON p.categoria_id = c.id
-             WHERE v.caja_id=? AND t.status!='Anulado'
-             GROUP BY c.descripcion, p.nombre
-             ORDER BY c.descripcion, p.nombre
-            """,
-            (caja_id,),
-        )
-        rows_items = cursor.fetchall()
-        items_por_categoria = {}
-        for cat, prod, cant in rows_items:
-            cat = cat or "Sin categoría"
-            items_por_categoria.setdefault(cat, []).append((prod, cant))
-
-        # Cantidad de ventas por método de pago
-        cursor.execute(
-            """
-            SELECT mp.descripcion, COUNT(*), COALESCE(SUM(t.total_ticket),0)
-              FROM ventas v
-              JOIN tickets t ON t.venta_id = v.id
-              LEFT JOIN metodos_pago mp ON mp.id = v.metodo_pago_id
-             WHERE v.caja_id=? AND t.status!='Anulado'
-             GROUP BY mp.descripcion
-            """,
-            (caja_id,),
-        )
-        metodos_pago = cursor.fetchall()
-        conn.close()
+        total_ventas = snap.total_ventas if snap else 0
+        ingresos = snap.ingresos if snap else 0
+        retiros = snap.retiros if snap else 0
         total_teorico = fondo_inicial + total_ventas + ingresos - retiros
         return {
-            'codigo': codigo_caja,
-            'disciplina': disciplina,
-            'descripcion_evento': descripcion_evento,
-            'usuario_apertura': usuario_apertura,
-            'fecha': fecha,
-            'hora_apertura': hora_apertura,
+            'codigo': info.get('codigo_caja') or '',
+            'disciplina': info.get('nombre_disciplina') or info.get('disciplina') or '',
+            'descripcion_evento': info.get('descripcion_evento') or '',
+            'usuario_apertura': info.get('usuario_apertura') or '',
+            'fecha': info.get('fecha') or '',
+            'hora_apertura': info.get('hora_apertura') or '',
             'fondo_inicial': fondo_inicial,
             'total_ventas': total_ventas,
-            'total_tickets': total_tickets,
-            'por_categoria': por_categoria,
-            'items_por_categoria': items_por_categoria,
-            'metodos_pago': metodos_pago,
-            'tickets_anulados': tickets_anulados,
+            'total_tickets': snap.total_tickets if snap else 0,
+            'por_categoria': sorted(snap.por_categoria, key=lambda kv: kv[0] or '') if snap else [],
+            'items_por_categoria': snap.items_por_categoria() if snap else {},
+            'metodos_pago': list(snap.por_metodo) if snap else [],
+            'tickets_anulados': snap.tickets_anulados if snap else 0,
             'ingresos': ingresos,
             'retiros': retiros,
             'obs_ingreso': obs_ing,
             'obs_retiro': obs_ret,
             'total_teorico': total_teorico,
-            'estado': estado
+            'estado': info.get('estado') or ''
         }
     def mostrar_historial(self):
         if not self.historial_view:
@@ -1208,6 +1127,12 @@ class BarCanchaApp:
         except Exception:
             from TicketCajaActual_view import TicketCajaActualView
         self.ocultar_frames()
+        # Se crea de nuevo cada vez: destruir la anterior (y su suscripción al monitor)
+        if getattr(self, 'tickets_caja_view', None):
+            try:
+                self.tickets_caja_view.destroy()
+            except Exception:
+                pass
         self.tickets_caja_view = TicketCajaActualView(self.root, controller=self)
         self.tickets_caja_view.pack(fill=tk.BOTH, expand=True)
         self.mostrar_pie_caja(self.tickets_caja_view)
@@ -1274,164 +1199,23 @@ class BarCanchaApp:
             self.ajustes_view = AjustesView(self.root, self)
         self.ajustes_view.pack(fill=tk.BOTH, expand=True)
 
-    def on_cobrar(self, carrito, metodo_pago="Efectivo"):
-        # Guardar la venta en la base de datos
+    def on_cobrar(self, carrito, metodo_pago="Efectivo", on_done=None):
+        """Guarda la venta (venta, tickets, items y stock en una sola transacción).
+
+        La escritura corre en el hilo escritor. Con on_done, retorna enseguida y
+        on_done(resultado) se llama en el mainloop (None si falló); sin on_done
+        espera el resultado y lo devuelve como antes.
+        """
         if not carrito:
             return
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            total = sum(item[2]*item[3] for item in carrito)
-            fecha_hora = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            # Obtener o crear método de pago y su id
-            metodo_id = None
-            try:
-                # si se pasó un id numérico, usarlo directamente
-                if isinstance(metodo_pago, int) or (isinstance(metodo_pago, str) and metodo_pago.isdigit()):
-                    metodo_id = int(metodo_pago)
-                    cursor.execute("SELECT id FROM metodos_pago WHERE id = ?", (metodo_id,))
-                    if not cursor.fetchone():
-                        metodo_id = None
-                else:
-                    # buscar por descripción
-                    cursor.execute("SELECT id FROM metodos_pago WHERE descripcion = ?", (metodo_pago,))
-                    row = cursor.fetchone()
-                    if row:
-                        metodo_id = row[0]
-            except Exception:
-                metodo_id = None
-            if metodo_id is None:
-                # si no existe, crear nuevo registro usando la descripcion si es string
-                if isinstance(metodo_pago, str):
-                    cursor.execute("INSERT INTO metodos_pago (descripcion) VALUES (?)", (metodo_pago,))
-                    metodo_id = cursor.lastrowid
-                else:
-                    # fallback: usar 1 (Efectivo) si existe
-                    cursor.execute("SELECT id FROM metodos_pago WHERE descripcion LIKE 'Efectivo' LIMIT 1")
-                    row = cursor.fetchone()
-                    metodo_id = row[0] if row else None
-
-            # Insertar venta
-            cursor.execute(
-                "INSERT INTO ventas (fecha_hora, total_venta, metodo_pago_id, caja_id) VALUES (?, ?, ?, ?)",
-                (fecha_hora, total, metodo_id, getattr(self, 'caja_abierta_id', None)),
-            )
-            venta_id = cursor.lastrowid
-            # Persistir la venta inmediatamente para evitar perder el registro si
-            # falla la inserción posterior de tickets/venta_items (p. ej. por FK)
-            conn.commit()
-
-            # Crear un ticket por cada unidad vendida (un ticket por item x cantidad)
-            prod_ids = [item[0] for item in carrito]
-            # Obtener datos necesarios de products: codigo_producto, categoria_id, stock_actual, contabiliza_stock
-            try:
-                cursor.execute(
-                    f"SELECT id, codigo_producto, categoria_id, stock_actual, COALESCE(contabiliza_stock,1) FROM products WHERE id IN ({','.join('?' for _ in prod_ids)})",
-                    prod_ids,
-                )
-                prod_rows = cursor.fetchall()
-                prod_info = {r[0]: {'codigo': r[1], 'categoria': r[2], 'stock': r[3], 'contabiliza': int(r[4])} for r in prod_rows}
-            except Exception:
-                cursor.execute(
-                    f"SELECT id, codigo_producto, categoria_id, stock_actual FROM products WHERE id IN ({','.join('?' for _ in prod_ids)})",
-                    prod_ids,
-                )
-                prod_rows = cursor.fetchall()
-                prod_info = {r[0]: {'codigo': r[1], 'categoria': r[2], 'stock': r[3], 'contabiliza': 1} for r in prod_rows}
-
-            # Para la secuencia por caja: si hay caja abierta, usaremos y actualizaremos total_tickets en caja_diaria
-            def next_ticket_seq():
-                caja_id = getattr(self, 'caja_abierta_id', None)
-                if caja_id:
-                    cursor.execute("UPDATE caja_diaria SET total_tickets = COALESCE(total_tickets,0)+1 WHERE id=?", (caja_id,))
-                    cursor.execute("SELECT total_tickets FROM caja_diaria WHERE id=?", (caja_id,))
-                    return cursor.fetchone()[0]
-                else:
-                    # fallback: use ticket autoincrement (will be available after insert) — but we need a seq before insert
-                    # Use a per-sale incrementing counter
-                    nonlocal_ticket_seq = getattr(self, '_temp_ticket_seq', 0) + 1
-                    self._temp_ticket_seq = nonlocal_ticket_seq
-                    return nonlocal_ticket_seq
-
-            # Insertar tickets y items; si alguna inserción falla, registrar y continuar
-            for prod_id, nombre, precio, cantidad in carrito:
-                info = prod_info.get(prod_id, {})
-                codigo = info.get('codigo') or str(prod_id)
-                categoria_id = info.get('categoria')
-                stock_actual = info.get('stock')
-                for _ in range(int(cantidad)):
-                    try:
-                        seq = next_ticket_seq()
-                        date_str = datetime.datetime.now().strftime('%d%m%Y')
-                        identificador = f"{codigo}-{date_str}-{seq}"
-                        # Insertar ticket por unidad
-                        cursor.execute(
-                            "INSERT INTO tickets (venta_id, categoria_id, producto_id, fecha_hora, total_ticket, identificador_ticket) VALUES (?, ?, ?, ?, ?, ?)",
-                            (venta_id, categoria_id, prod_id, fecha_hora, precio, identificador),
-                        )
-                        ticket_id = cursor.lastrowid
-                        # Insertar un item con cantidad=1
-                        cursor.execute(
-                            "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?)",
-                            (ticket_id, prod_id, 1, precio, precio),
-                        )
-                        # Actualizar stock sólo si contabiliza_stock=1
-                        try:
-                            if int(info.get('contabiliza', 1)) == 1:
-                                cursor.execute("UPDATE products SET stock_actual = stock_actual - 1 WHERE id = ?", (prod_id,))
-                                stock_actual = (stock_actual - 1) if stock_actual is not None else stock_actual
-                        except Exception:
-                            # no crítico; continuar
-                            pass
-                    except Exception as e:
-                        # Registrar el error y continuar con el siguiente item en lugar de abortar toda la venta
-                        try:
-                            import traceback
-                            traceback.print_exc()
-                        except Exception:
-                            pass
-                        # continue to next unit
-                        continue
-            # Asegurar que cualquier ticket/venta_items escritos se persistan
-            try:
-                conn.commit()
-            except Exception:
-                pass
-
-            # Collect tickets info to return for printing
-            tickets_info = []
-            try:
-                cursor.execute("SELECT id, identificador_ticket, producto_id, total_ticket FROM tickets WHERE venta_id=? ORDER BY id", (venta_id,))
-                for t in cursor.fetchall():
-                    tid, identificador, pid, total_ticket = t
-                    # obtener nombre producto
-                    cursor.execute("SELECT nombre FROM products WHERE id=?", (pid,))
-                    rowp = cursor.fetchone()
-                    nombre_prod = rowp[0] if rowp else ''
-                    codigo_caja = None
-                    if getattr(self, 'caja_abierta_id', None):
-                        cursor.execute("SELECT codigo_caja FROM caja_diaria WHERE id=?", (getattr(self, 'caja_abierta_id', None),))
-                        rc = cursor.fetchone()
-                        codigo_caja = rc[0] if rc else None
-                    tickets_info.append({
-                        'ticket_id': tid,
-                        'identificador': identificador,
-                        'producto_id': pid,
-                        'producto_nombre': nombre_prod,
-                        'total_ticket': total_ticket,
-                        'codigo_caja': codigo_caja,
-                    })
-            except Exception:
-                tickets_info = []
-            conn.close()
-            # Mostrar descripción del método de pago al usuario
-            try:
-                cursor = get_connection().cursor()
-                cursor.execute("SELECT descripcion FROM metodos_pago WHERE id=?", (metodo_id,))
-                row = cursor.fetchone()
-                descripcion_mp = row[0] if row else str(metodo_pago)
-            except Exception:
-                descripcion_mp = str(metodo_pago)
+        from sales_service import SalesService
+        if getattr(self, '_sales_service', None) is None:
+            self._sales_service = SalesService()
+        self._sales_service.caja_id = getattr(self, 'caja_abierta_id', None)
+
+        def _ok(result):
+            # Mostrar descripción del método de pago al usuario (ya resuelta durante el cobro)
+            descripcion_mp = result.get('metodo_pago') or str(metodo_pago)
             messagebox.showinfo("Venta registrada", f"Venta guardada correctamente.\nMétodo de pago: {descripcion_mp}")
             # Refrescar pie global con ventas al momento
             try:
@@ -1447,10 +1231,27 @@ class BarCanchaApp:
                     self.mostrar_pie_caja(current_parent)
             except Exception:
                 pass
-            return {'venta_id': venta_id, 'tickets': tickets_info}
-        except Exception as e:
+            return {'venta_id': result['venta_id'], 'tickets': result['tickets']}
+
+        def _error(e):
             messagebox.showerror("Error al guardar venta", str(e))
 
+        # Copia del carrito: la vista puede limpiarlo antes de que termine la escritura
+        carrito = [list(item) for item in carrito]
+        if on_done is not None:
+            get_writer().submit(
+                self._sales_service.checkout, carrito, metodo_pago,
+                on_done=lambda result: on_done(_ok(result)),
+                on_error=lambda e: (_error(e), on_done(None)),
+            )
+            return None
+        try:
+            result = get_writer().submit(self._sales_service.checkout, carrito, metodo_pago).result()
+        except Exception as e:
+            _error(e)
+            return None
+        return _ok(result)
+
     
     def abrir_caja_window(self):
         import datetime
@@ -1816,32 +1617,42 @@ class BarCanchaApp:
                 # visible = 0 si "ocultar" está activo; 1 si no
                 visible_final = 0 if checks[pid].get() else 1
                 cambios.append((val_to_save, visible_final, precio_val, contab, pid))
-            conn = get_connection()
-            cursor = conn.cursor()
-            for val, visible, precio, contab, pid in cambios:
+            def _guardar(cambios):
+                # Corre en el hilo escritor
+                from db_utils import transaction
+                with transaction() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.executemany(
+                            "UPDATE products SET stock_actual=?, visible=?, precio_venta=?, contabiliza_stock=? WHERE id=?",
+                            cambios,
+                        )
+                    except sqlite3.OperationalError:
+                        # BD vieja sin contabiliza_stock
+                        cursor.executemany(
+                            "UPDATE products SET stock_actual=?, visible=?, precio_venta=? WHERE id=?",
+                            [(val, visible, precio, pid) for val, visible, precio, _contab, pid in cambios],
+                        )
+
+            def _ok(_result):
+                messagebox.showinfo("Stock", "Stock y precios actualizados correctamente.")
                 try:
-                    cursor.execute(
-                        "UPDATE products SET stock_actual=?, visible=?, precio_venta=?, contabiliza_stock=? WHERE id=?",
-                        (val, visible, precio, contab, pid),
-                    )
+                    stock_win.grab_release()
                 except Exception:
-                    cursor.execute(
-                        "UPDATE products SET stock_actual=?, visible=?, precio_venta=? WHERE id=?",
-                        (val, visible, precio, pid),
-                    )
-            conn.commit()
-            conn.close()
-            messagebox.showinfo("Stock", "Stock y precios actualizados correctamente.")
-            try:
-                stock_win.grab_release()
-            except Exception:
-                pass
-            stock_win.destroy()
-            # Refrescar productos en Ventas si está abierta
-            try:
-                self.refrescar_ventas_productos()
-            except Exception:
-                pass
+                    pass
+                stock_win.destroy()
+                # Refrescar productos en Ventas si está abierta
+                try:
+                    self.refrescar_ventas_productos()
+                except Exception:
+                    pass
+
+            def _error(e):
+                btn_guardar.config(state=tk.NORMAL)
+                messagebox.showerror("Stock", f"No se pudieron guardar los cambios: {e}")
+
+            btn_guardar.config(state=tk.DISABLED)
+            get_writer().submit(_guardar, cambios, on_done=_ok, on_error=_error)
         btn_guardar = tk.Button(stock_win, text="Guardar Cambios", command=guardar_stock, bg="#388e3c", fg="white", font=("Arial", 12), width=18)
         btn_guardar.pack(pady=10)
         def cancelar_stock():
@@ -1993,7 +1804,7 @@ class BarCanchaApp:
         conn = get_connection(); c = conn.cursor()
         c.execute("""SELECT COALESCE(SUM(total_ticket),0)
                         FROM tickets
-                        WHERE date(fecha_hora)=? AND status!='Anulado'""", (fecha_yyyy_mm_dd,))
+                        WHERE fecha=? AND status!='Anulado'""", (fecha_yyyy_mm_dd,))
         total = c.fetchone()[0] or 0
         conn.close()
         return float(total)               
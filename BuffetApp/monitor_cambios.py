@@ -0,0 +1,178 @@
+"""Aviso de cambios en la base hechos por otras conexiones (otra instancia de la app, el hilo escritor).
+
+Cuando dos equipos comparten barcancha.db (p. ej. la PC de administración
+revisando cajas mientras la caja vende) las vistas no se enteraban de lo que
+escribía el otro. MonitorCambios consulta cada segundo, en el hilo de Tk,
+PRAGMA data_version sobre una conexión propia de solo lectura: el valor sólo
+cambia cuando otra conexión hizo commit, así que la consulta normal cuesta
+microsegundos y no lee tablas. Antes de reemplazar el archivo .db (restaurar
+un backup) hay que pausar() el monitor, para que no quede abierta esa conexión
+ni sus -wal/-shm, y reanudar() después.
+
+Cuando cambia, lee cambios_tablas (contadores por tabla que mantienen los
+triggers de la migración 007) y avisa a cada vista sólo por las tablas que le
+interesan. Una vista oculta no recibe el aviso en el momento: se le guarda y
+se entrega cuando vuelve a estar a la vista, así no recarga en segundo plano.
+
+    get_monitor().suscribir(vista, ('products',), vista._on_cambios)
+
+callback(tablas) recibe el conjunto de tablas que cambiaron. La suscripción se
+descarta sola cuando el widget se destruye. Con widget=None (cachés que no son
+de una vista, p. ej. caja_snapshot) el aviso llega siempre en el momento.
+"""
+from __future__ import annotations
+
+import atexit
+import sqlite3
+
+from db_utils import open_connection
+
+# Tablas con contador en cambios_tablas: las de init_db._migracion_007_cambios_tablas (agregar una
+# requiere una migración nueva con sus triggers)
+TABLAS_MONITOREADAS = ('products', 'ventas', 'tickets', 'caja_diaria', 'caja_movimiento')
+
+
+class _Suscripcion:
+    def __init__(self, widget, tablas, callback):
+        self.widget = widget
+        self.tablas = frozenset(tablas)
+        self.callback = callback
+        # Cambios que llegaron con la vista oculta
+        self.pendientes = set()
+
+
+class MonitorCambios:
+    """Sondea PRAGMA data_version y reparte los cambios por tabla a las vistas suscriptas."""
+
+    def __init__(self, intervalo_ms: int = 1000):
+        self.intervalo_ms = intervalo_ms
+        self._root = None
+        self._conn = None
+        self._data_version = None
+        self._versiones = {}
+        self._suscripciones = []
+        self._after_id = None
+
+    def attach(self, root):
+        """Empieza a sondear desde el mainloop de Tk."""
+        self._root = root
+        try:
+            self._conn = open_connection(solo_lectura=True)
+            self._data_version = self._leer_data_version()
+            self._versiones = self._leer_versiones()
+        except sqlite3.Error as e:
+            print(f"Monitor de cambios deshabilitado: {e}")
+            self._conn = None
+            return
+        self._after_id = self._root.after(self.intervalo_ms, self._poll)
+
+    def suscribir(self, widget, tablas, callback):
+        """Llama callback(tablas_cambiadas) cuando cambie alguna de tablas y widget esté a la vista.
+
+        widget=None: avisar siempre, sin esperar a ninguna vista.
+        """
+        self._suscripciones.append(_Suscripcion(widget, tablas, callback))
+
+    def desuscribir(self, widget):
+        self._suscripciones = [s for s in self._suscripciones if s.widget is not widget]
+
+    def pausar(self):
+        """Cierra la conexión y deja de sondear hasta reanudar() (p. ej. mientras se restaura la base)."""
+        if self._after_id is not None and self._root is not None:
+            try:
+                self._root.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = None
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def reanudar(self):
+        """Vuelve a abrir la base y a sondear; los cambios previos a la pausa no se avisan."""
+        if self._root is not None and self._conn is None:
+            self.attach(self._root)
+
+    def stop(self):
+        self.pausar()
+        self._root = None
+
+    def revisar(self):
+        """Una vuelta del sondeo: detecta cambios y entrega los pendientes."""
+        cambiadas = set()
+        try:
+            data_version = self._leer_data_version()
+            if data_version != self._data_version:
+                self._data_version = data_version
+                versiones = self._leer_versiones()
+                if versiones is None:
+                    # Base sin la migración 007: no se sabe qué cambió
+                    cambiadas = set(TABLAS_MONITOREADAS)
+                else:
+                    cambiadas = {t for t, v in versiones.items() if self._versiones.get(t) != v}
+                    self._versiones = versiones
+        except sqlite3.Error:
+            # Base ocupada o bloqueada: se reintenta en la próxima vuelta
+            return
+        self._entregar(cambiadas)
+
+    def _entregar(self, cambiadas):
+        vivas = []
+        for sus in self._suscripciones:
+            if sus.widget is not None:
+                try:
+                    if not sus.widget.winfo_exists():
+                        continue
+                except Exception:
+                    continue
+            vivas.append(sus)
+            sus.pendientes |= sus.tablas & cambiadas
+            if not sus.pendientes:
+                continue
+            try:
+                visible = sus.widget is None or sus.widget.winfo_ismapped()
+            except Exception:
+                visible = False
+            if not visible:
+                continue
+            tablas, sus.pendientes = sus.pendientes, set()
+            try:
+                sus.callback(tablas)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+        self._suscripciones = vivas
+
+    def _leer_data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _leer_versiones(self):
+        try:
+            return dict(self._conn.execute("SELECT tabla, version FROM cambios_tablas").fetchall())
+        except sqlite3.OperationalError:
+            return None
+
+    def _poll(self):
+        if self._root is None or self._conn is None:
+            return
+        self.revisar()
+        try:
+            self._after_id = self._root.after(self.intervalo_ms, self._poll)
+        except Exception:
+            # root destruido: dejar de sondear
+            self._root = None
+
+
+_monitor = None
+
+
+def get_monitor() -> MonitorCambios:
+    """Instancia compartida del monitor (se crea al primer uso)."""
+    global _monitor
+    if _monitor is None:
+        _monitor = MonitorCambios()
+        atexit.register(_monitor.stop)
+    return _monitor
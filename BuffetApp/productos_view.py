@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import messagebox
 from db_utils import get_connection, generate_unique_product_code
+from virtual_treeview import VirtualTreeview
 from theme import (
     TITLE_FONT,
     TEXT_FONT,
@@ -35,12 +36,15 @@ class ProductosView(tk.Frame):
 
         self.frame_tabla = tk.Frame(self)
         self.frame_tabla.pack(pady=10, padx=60, fill="x")
-        self.tree = ttk.Treeview(
+        # Tabla virtual: sólo las filas visibles son ítems de Tk; el orden por columna lo resuelve SQL
+        self.tree = VirtualTreeview(
             self.frame_tabla,
             columns=("id", "codigo", "nombre", "precio", "precio_compra", "stock", "categoria", "visible"),
             show="headings",
             height=12,
             style="App.Treeview",
+            etiquetas=lambda fila: (f"cat_{fila[6] if fila[6] else 'Sin categoría'}",),
+            on_sort=lambda _col, _desc: self.cargar_productos(),
         )
         self.tree.heading("codigo", text="Código")
         self.tree.heading("nombre", text="Descripción")
@@ -96,8 +100,18 @@ class ProductosView(tk.Frame):
         conn.close()
         self.categorias = {str(cid): desc for cid, desc in cats}
 
+    # Columna de la tabla -> expresión SQL para ordenar
+    _ORDEN_SQL = {
+        "id": "p.id", "codigo": "p.codigo_producto", "nombre": "p.nombre", "precio": "p.precio_venta",
+        "precio_compra": "p.precio_compra", "stock": "p.stock_actual", "categoria": "c.descripcion",
+        "visible": "p.visible",
+    }
+
     def cargar_productos(self):
-        self.tree.delete(*self.tree.get_children())
+        orden = self.tree.orden
+        order_by = None
+        if orden and orden[0] in self._ORDEN_SQL:
+            order_by = f"{self._ORDEN_SQL[orden[0]]} {'DESC' if orden[1] else 'ASC'}, p.id"
         conn = get_connection()
         cursor = conn.cursor()
         try:
@@ -114,8 +128,7 @@ class ProductosView(tk.Frame):
                        CAST(COALESCE(p.orden_visual, p.id) AS INTEGER) AS orden_visual
                 FROM products p
                 LEFT JOIN Categoria_Producto c ON p.categoria_id = c.id
-                ORDER BY CAST(COALESCE(p.orden_visual, p.id) AS INTEGER)
-            """)
+                ORDER BY """ + (order_by or "CAST(COALESCE(p.orden_visual, p.id) AS INTEGER)"))
         except Exception:
             cursor.execute("""
                 SELECT p.id, p.codigo_producto, p.nombre, p.precio_venta,
@@ -123,20 +136,21 @@ class ProductosView(tk.Frame):
                        p.visible, 1 AS contabiliza_stock, p.id AS orden_visual
                 FROM products p
                 LEFT JOIN Categoria_Producto c ON p.categoria_id = c.id
-                ORDER BY p.id
-            """)
+                ORDER BY """ + (order_by or "p.id"))
         productos = cursor.fetchall()
         conn.close()
+        filas = []
+        tags_configurados = set()
         for pid, codigo, nombre, precio, precio_compra, stock, categoria, visible, contabiliza, _ov in productos:
             cat = categoria if categoria else 'Sin categoría'
-            color = self.colores_categoria.get(cat, '#EAF1FB')
-            tag = f'cat_{cat}'
-            if not self.tree.tag_has(tag):
-                self.tree.tag_configure(tag, background=color)
+            if cat not in tags_configurados:
+                tags_configurados.add(cat)
+                self.tree.tag_configure(f'cat_{cat}', background=self.colores_categoria.get(cat, '#EAF1FB'))
             extra = ' (No cont.)' if int(contabiliza or 1) == 0 else ''
             nombre_txt = (nombre or '') + extra
             vis_txt = 'Sí' if int(visible or 0) > 0 else 'No'
-            self.tree.insert("", tk.END, values=(pid, (codigo or '').upper(), nombre_txt, precio, precio_compra, stock, categoria, vis_txt), tags=(tag,))
+            filas.append((pid, (codigo or '').upper(), nombre_txt, precio, precio_compra, stock, categoria, vis_txt))
+        self.tree.set_filas(filas)
 
         self.producto_seleccionado = None
         self.btn_editar.config(state='disabled')
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from db_utils import get_connection
+from db_reader import get_reader
 
 class ReportesKPIView(tk.Frame):
     """
@@ -14,6 +15,9 @@ class ReportesKPIView(tk.Frame):
     """
     def __init__(self, master, *args, **kwargs):
         super().__init__(master, *args, **kwargs)
+        # Consultas en curso en el hilo lector (se cancelan al pedir otra)
+        self._consulta_kpis = None
+        self._consulta_grafico = None
         self._build_ui()
 
     def _build_ui(self):
@@ -130,86 +134,103 @@ class ReportesKPIView(tk.Frame):
         caja_id = self._get_selected_caja_id()
         if not caja_id:
             return
-        # KPIs
-        with get_connection() as conn:
-            cur = conn.cursor()
-            # Ventas totales y conteos
-            cur.execute("SELECT COALESCE(SUM(total_venta),0), COUNT(DISTINCT id) FROM ventas WHERE caja_id=?", (caja_id,))
-            total, ventas_count = cur.fetchone()
-            cur.execute("SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=?", (caja_id,))
-            tickets_count = cur.fetchone()[0]
-            cur.execute("""
-                SELECT COALESCE(SUM(vi.cantidad),0)
-                FROM venta_items vi
-                JOIN tickets t ON t.id=vi.ticket_id
-                JOIN ventas v ON v.id=t.venta_id
-                WHERE v.caja_id=?
-            """, (caja_id,))
-            items_count = cur.fetchone()[0]
-            prom = (total / ventas_count) if ventas_count else 0
-            self.lbl_total.config(text=f"Total Ventas: {total:.2f}")
-            self.lbl_tickets.config(text=f"Tickets: {tickets_count}")
-            self.lbl_prom.config(text=f"Ticket Promedio: {prom:.2f}")
-            self.lbl_items.config(text=f"Items Vendidos: {items_count}")
+        # Las consultas corren en el hilo lector; al elegir otra caja se cancela la anterior
+        if self._consulta_kpis is not None:
+            self._consulta_kpis.cancelar()
+        self.lbl_total.config(text="Total Ventas: ...")
+        self._consulta_kpis = get_reader().ejecutar(
+            self._consultar_kpis, caja_id,
+            on_done=self._mostrar_kpis,
+            on_error=lambda e: setattr(self, '_consulta_kpis', None),
+            on_cancel=lambda: setattr(self, '_consulta_kpis', None),
+        )
+        # Actualizar gráfico de línea (no depende de caja seleccionada)
+        self._load_line_chart()
+
+    @staticmethod
+    def _consultar_kpis(cur, caja_id):
+        """KPIs de la caja: salen del rollup ventas_diarias (filas por día/producto/método), salvo
+        la cantidad de ventas, que se cuenta sobre el índice de ventas por caja."""
+        cur.execute("""
+            SELECT COALESCE(SUM(importe),0), COALESCE(SUM(unidades),0), COALESCE(SUM(anulados),0)
+            FROM ventas_diarias
+            WHERE caja_id=?
+        """, (caja_id,))
+        totales = cur.fetchone()
+        # Ticket Promedio es por venta (una venta puede emitir varios tickets)
+        cur.execute("SELECT COUNT(*) FROM ventas WHERE caja_id=?", (caja_id,))
+        totales += (cur.fetchone()[0],)
 
-            # Ranking productos
+        # Ranking productos
+        cur.execute("""
+            SELECT COALESCE(p.nombre,'(sin nombre)'), SUM(vd.unidades) as cant
+            FROM ventas_diarias vd
+            LEFT JOIN products p ON p.id=vd.producto_id
+            WHERE vd.caja_id=?
+            GROUP BY vd.producto_id
+            HAVING cant > 0
+            ORDER BY cant DESC, p.nombre ASC
+            LIMIT 50
+        """, (caja_id,))
+        rank_rows = cur.fetchall() or []
+
+        # Métodos de pago
+        try:
             cur.execute("""
-                SELECT COALESCE(p.nombre,'(sin nombre)'), SUM(vi.cantidad) as cant
-                FROM venta_items vi
-                JOIN tickets t ON t.id=vi.ticket_id
-                JOIN ventas v ON v.id=t.venta_id
-                LEFT JOIN products p ON p.id=vi.producto_id
-                WHERE v.caja_id=?
-                GROUP BY vi.producto_id
-                ORDER BY cant DESC, p.nombre ASC
-                LIMIT 50
+                SELECT COALESCE(mp.descripcion,'(sin método)'), COALESCE(SUM(vd.importe),0)
+                FROM ventas_diarias vd
+                LEFT JOIN metodos_pago mp ON mp.id=vd.metodo_pago_id
+                WHERE vd.caja_id=?
+                GROUP BY vd.metodo_pago_id
+                ORDER BY 2 DESC
             """, (caja_id,))
-            rank_rows = cur.fetchall() or []
-            for i in self.tree_rank.get_children():
-                self.tree_rank.delete(i)
-            for r in rank_rows:
-                self.tree_rank.insert("", tk.END, values=r)
+            mp_rows = cur.fetchall() or []
+        except Exception:
+            mp_rows = []
 
-            # Métodos de pago
-            try:
-                cur.execute("""
-                    SELECT COALESCE(mp.descripcion,'(sin método)'), COALESCE(SUM(v.total_venta),0)
-                    FROM ventas v
-                    LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id
-                    WHERE v.caja_id=?
-                    GROUP BY v.metodo_pago_id
-                    ORDER BY 2 DESC
-                """, (caja_id,))
-                mp_rows = cur.fetchall() or []
-            except Exception:
-                mp_rows = []
-            for i in self.tree_mp.get_children():
-                self.tree_mp.delete(i)
-            for r in mp_rows:
-                self.tree_mp.insert("", tk.END, values=(r[0], f"{(r[1] or 0):.2f}"))
+        # Diferencia de cierre (si existe)
+        cierre = None
+        try:
+            cur.execute("SELECT diferencia, total_efectivo_teorico, conteo_efectivo_final FROM caja_diaria WHERE id=?", (caja_id,))
+            cierre = cur.fetchone()
+        except Exception:
+            pass
+        return totales, rank_rows, mp_rows, cierre
 
-            # Diferencia de cierre (si existe)
-            diff_txt = "-"
-            try:
-                cur.execute("SELECT diferencia, total_efectivo_teorico, conteo_efectivo_final FROM caja_diaria WHERE id=?", (caja_id,))
-                row = cur.fetchone()
-                if row:
-                    dif, teor, contado = row
-                    partes = []
-                    if dif is not None:
-                        partes.append(f"Dif: {dif:.2f}")
-                    if teor is not None:
-                        partes.append(f"Teórico: {teor:.2f}")
-                    if contado is not None:
-                        partes.append(f"Contado: {contado:.2f}")
-                    if partes:
-                        diff_txt = " | ".join(partes)
-            except Exception:
-                pass
-            self.lbl_diff.config(text=f"Diferencia cierre: {diff_txt}")
+    def _mostrar_kpis(self, resultado):
+        self._consulta_kpis = None
+        (total, tickets_count, anulados, ventas_count), rank_rows, mp_rows, cierre = resultado
+        prom = (total / ventas_count) if ventas_count else 0
+        self.lbl_total.config(text=f"Total Ventas: {total:.2f}")
+        self.lbl_tickets.config(text=f"Tickets: {tickets_count}" + (f" ({anulados} anul.)" if anulados else ""))
+        self.lbl_prom.config(text=f"Ticket Promedio: {prom:.2f}")
+        # Un ticket por unidad vendida: tickets emitidos == ítems vendidos
+        self.lbl_items.config(text=f"Items Vendidos: {tickets_count}")
+
+        for i in self.tree_rank.get_children():
+            self.tree_rank.delete(i)
+        for r in rank_rows:
+            self.tree_rank.insert("", tk.END, values=r)
+
+        for i in self.tree_mp.get_children():
+            self.tree_mp.delete(i)
+        for r in mp_rows:
+            self.tree_mp.insert("", tk.END, values=(r[0], f"{(r[1] or 0):.2f}"))
+
+        diff_txt = "-"
+        if cierre:
+            dif, teor, contado = cierre
+            partes = []
+            if dif is not None:
+                partes.append(f"Dif: {dif:.2f}")
+            if teor is not None:
+                partes.append(f"Teórico: {teor:.2f}")
+            if contado is not None:
+                partes.append(f"Contado: {contado:.2f}")
+            if partes:
+                diff_txt = " | ".join(partes)
+        self.lbl_diff.config(text=f"Diferencia cierre: {diff_txt}")
 
-        # Actualizar gráfico de línea (no depende de caja seleccionada)
-        self._load_line_chart()
     def _load_disciplinas_for_chart(self):
         try:
             with get_connection() as conn:
@@ -234,7 +255,7 @@ class ReportesKPIView(tk.Frame):
             pass
 
     def _load_line_chart(self):
-        # Obtener totales por caja (agrupados por fecha) con filtro de disciplina opcional
+        # Totales por día desde ventas_diarias (sólo ventas con caja), con filtro de disciplina opcional
         disc_desc = None
         try:
             disc_desc = self.cmb_disc.get()
@@ -243,23 +264,28 @@ class ReportesKPIView(tk.Frame):
         disc_code = None
         if disc_desc and disc_desc != "(Todas)":
             disc_code = self._disc_map.get(disc_desc)
-        try:
-            with get_connection() as conn:
-                cur = conn.cursor()
-                sql = (
-                    "SELECT fecha, COALESCE(SUM(total_venta),0) as total_dia "
-                    "FROM caja_diaria cd "
-                    "JOIN ventas v ON v.caja_id = cd.id "
-                    "WHERE 1=1 "
-                )
-                params = []
-                if disc_code:
-                    sql += " AND cd.disciplina = ?"; params.append(disc_code)
-                sql += " GROUP BY fecha ORDER BY fecha"
-                cur.execute(sql, params)
-                rows = cur.fetchall() or []
-        except Exception:
-            rows = []
+        sql = (
+            "SELECT fecha, COALESCE(SUM(importe),0) as total_dia "
+            "FROM ventas_diarias "
+            "WHERE caja_id != 0 "
+        )
+        params = []
+        if disc_code:
+            sql += " AND disciplina = ?"; params.append(disc_code)
+        sql += " GROUP BY fecha ORDER BY fecha"
+        if self._consulta_grafico is not None:
+            self._consulta_grafico.cancelar()
+        rows = []
+        self._consulta_grafico = get_reader().consultar(
+            sql, params,
+            on_batch=lambda filas, _n: rows.extend(filas),
+            on_done=lambda _n: self._dibujar_linea(rows),
+            on_error=lambda e: self._dibujar_linea([]),
+            on_cancel=lambda: setattr(self, '_consulta_grafico', None),
+        )
+
+    def _dibujar_linea(self, rows):
+        self._consulta_grafico = None
         # Dibujar línea
         self.canvas.delete("all")
         if not rows:
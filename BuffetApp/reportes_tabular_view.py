@@ -1,18 +1,32 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import csv
 import datetime as dt
 from db_utils import get_connection
+from db_reader import get_reader
+from exportador import exportar
+from busqueda import filtro_productos, filtro_tickets
+from virtual_treeview import VirtualTreeview
 
 class ReportesTabularView(tk.Frame):
     """
     Explorador de ventas con filtros + tabla + exportación CSV (compatible Excel).
-    Filtros: fecha desde/hasta, disciplina, método de pago, estado ticket, producto contiene.
+    Filtros: fecha desde/hasta, disciplina, método de pago, estado ticket, producto o ticket.
     Resultados: una fila por ítem de venta.
     """
     def __init__(self, master, *args, **kwargs):
         super().__init__(master, *args, **kwargs)
+        # Consulta en curso en el hilo lector (se cancela al buscar de nuevo) y SQL
+        # de la búsqueda actual (sin ORDER BY), que se pagina por keyset al desplazarse:
+        # cada página arranca después de la clave de orden de la última fila recibida
+        self._consulta = None
+        self._sql = None
+        self._params = []
+        self._orden = None
+        self._ultima_clave = None
+        self._pedir_mas_pendiente = False
+        self._ultima_busqueda = None
         self._build_ui()
+        self.bind("<Destroy>", lambda e: self._cancelar_busqueda() if e.widget is self else None)
 
     def _build_ui(self):
         self.columnconfigure(0, weight=1)
@@ -49,8 +63,8 @@ class ReportesTabularView(tk.Frame):
         self.cmb_estado.current(0)
         self.cmb_estado.grid(row=1, column=4, sticky="we", padx=4)
 
-        # Producto (contiene)
-        ttk.Label(filtros, text="Producto contiene").grid(row=0, column=5, sticky="w", padx=4, pady=4)
+        # Producto o identificador de ticket (índice FTS, ver busqueda.py)
+        ttk.Label(filtros, text="Producto / ticket").grid(row=0, column=5, sticky="w", padx=4, pady=4)
         self.var_prod = tk.StringVar()
         ttk.Entry(filtros, textvariable=self.var_prod).grid(row=1, column=5, sticky="we", padx=4)
 
@@ -59,11 +73,16 @@ class ReportesTabularView(tk.Frame):
         btns.grid(row=1, column=7, sticky="e", padx=4)
         ttk.Button(btns, text="Buscar", command=self.buscar).pack(side=tk.LEFT, padx=(0,6))
         ttk.Button(btns, text="Exportar CSV", command=self.exportar_csv).pack(side=tk.LEFT)
+        self.btn_cancelar = ttk.Button(btns, text="Cancelar", command=self._cancelar_busqueda, state="disabled")
+        self.btn_cancelar.pack(side=tk.LEFT, padx=(6,0))
+        self.lbl_estado = ttk.Label(filtros, text="")
+        self.lbl_estado.grid(row=2, column=0, columnspan=8, sticky="w", padx=4, pady=(2,4))
 
         # Tabla
-        self.tree = ttk.Treeview(self, columns=(
+        # Tabla virtual: sólo las filas visibles son ítems de Tk; orden por SQL al tocar un encabezado
+        self.tree = VirtualTreeview(self, columns=(
             "fecha", "caja", "venta_id", "ticket_id", "producto", "cantidad", "precio", "subtotal", "metodo_pago"
-        ), show="headings", height=18)
+        ), show="headings", height=18, on_fetch_more=self._pedir_pagina, on_sort=self._ordenar)
         headers = [
             ("fecha", "Fecha/Hora"), ("caja", "Caja"), ("venta_id", "Venta"), ("ticket_id", "Ticket"),
             ("producto", "Producto"), ("cantidad", "Cant."), ("precio", "Precio"), ("subtotal", "Subtotal"), ("metodo_pago", "Método Pago")
@@ -103,6 +122,17 @@ class ReportesTabularView(tk.Frame):
         self.cmb_mp.current(0)
         self._mp_map = {r[1]: r[0] for r in rows}
 
+    # Columna de la tabla -> (expresión SQL para ordenar, posición en el SELECT); el orden lo resuelve SQLite
+    _ORDEN_SQL = {
+        "fecha": ("v.fecha_hora", 0), "caja": ("cd.codigo_caja", 1), "venta_id": ("v.id", 2), "ticket_id": ("t.id", 3),
+        "producto": ("p.nombre", 4), "cantidad": ("vi.cantidad", 5), "precio": ("vi.precio_unitario", 6),
+        "subtotal": ("vi.subtotal", 7), "metodo_pago": ("mp.descripcion", 8),
+    }
+    # Desempate estable del orden (vi.id es la última columna del SELECT)
+    _DESEMPATE = "v.id DESC, t.id DESC, vi.id DESC"
+    # Filas por página: se piden más al acercarse al final de la tabla
+    PAGINA = 1000
+
     def buscar(self):
         # Construir SQL con filtros opcionales
         fdesde = self.var_fdesde.get().strip()
@@ -113,7 +143,7 @@ class ReportesTabularView(tk.Frame):
         estado = self.cmb_estado.get().strip()
 
         sql = (
-            "SELECT v.fecha_hora, cd.codigo_caja, v.id, t.id, p.nombre, vi.cantidad, vi.precio_unitario, vi.subtotal, mp.descripcion "
+            "SELECT v.fecha_hora, cd.codigo_caja, v.id, t.id, p.nombre, vi.cantidad, vi.precio_unitario, vi.subtotal, mp.descripcion, vi.id "
             "FROM venta_items vi "
             "JOIN tickets t ON t.id = vi.ticket_id "
             "JOIN ventas v ON v.id = t.venta_id "
@@ -126,9 +156,9 @@ class ReportesTabularView(tk.Frame):
         params = []
         # Rango de fechas
         if fdesde:
-            sql += " AND date(v.fecha_hora) >= ?"; params.append(fdesde)
+            sql += " AND v.fecha >= ?"; params.append(fdesde)
         if fhasta:
-            sql += " AND date(v.fecha_hora) <= ?"; params.append(fhasta)
+            sql += " AND v.fecha <= ?"; params.append(fhasta)
         # Disciplina
         if disc_desc and disc_desc != "(Todas)":
             disc_code = self._disc_map.get(disc_desc)
@@ -142,52 +172,161 @@ class ReportesTabularView(tk.Frame):
         # Estado ticket
         if estado and estado != "(Todos)":
             sql += " AND t.status = ?"; params.append(estado)
-        # Producto contiene
+        # Producto (nombre o código) o identificador de ticket, por el índice FTS
         if prod_like:
-            sql += " AND p.nombre LIKE ?"; params.append(f"%{prod_like}%")
-        # Orden
-        sql += " ORDER BY v.fecha_hora DESC, v.id DESC, t.id DESC"
+            cond_prod, params_prod = filtro_productos(prod_like, "vi.producto_id")
+            cond_tick, params_tick = filtro_tickets(prod_like, "vi.ticket_id")
+            sql += f" AND ({cond_prod} OR {cond_tick})"; params += params_prod + params_tick
+        # Orden: columna elegida en el encabezado (o fecha desc) + desempate estable
+        orden = self.tree.orden
+        if orden and orden[0] in self._ORDEN_SQL:
+            expr, posicion = self._ORDEN_SQL[orden[0]]
+            descendente = bool(orden[1])
+        else:
+            (expr, posicion), descendente = self._ORDEN_SQL["fecha"], True
 
-        try:
-            with get_connection() as conn:
-                cur = conn.cursor()
-                cur.execute(sql, params)
-                rows = cur.fetchall() or []
-        except Exception as e:
-            messagebox.showerror("Reportes", f"Error consultando datos.\n{e}")
+        self._cancelar_busqueda()
+        self._sql, self._params = sql, params
+        self._orden = (expr, posicion, descendente)
+        self._ultima_clave = None
+        self._ultima_busqueda = (sql + self._order_by(), params)
+        self._pedir_mas_pendiente = False
+        self.tree.set_filas([], completo=False)
+        self.lbl_estado.config(text="Buscando...")
+
+    def _ordenar(self, _columna, _descendente):
+        if self._sql is not None:
+            self.buscar()
+
+    def _pedir_pagina(self):
+        """Trae la página siguiente en el hilo lector (la tabla la pide al desplazarse)."""
+        if self._sql is None:
+            return
+        if self._consulta is not None:
+            # Todavía llega la página anterior: pedir la siguiente cuando termine
+            self._pedir_mas_pendiente = True
             return
+        sql, params = self._sql, list(self._params)
+        if self._ultima_clave is not None:
+            condicion, params_clave = self._despues_de(self._ultima_clave)
+            sql += f" AND {condicion}"
+            params += params_clave
+        self.btn_cancelar.config(state="normal")
+        self._consulta = get_reader().consultar(
+            sql + self._order_by() + " LIMIT ?", [*params, self.PAGINA],
+            batch_size=self.PAGINA,
+            on_batch=self._agregar_filas,
+            on_done=self._pagina_terminada,
+            on_error=self._busqueda_fallida,
+            on_cancel=self._pagina_cancelada,
+        )
+
+    def _order_by(self):
+        expr, _posicion, descendente = self._orden
+        return f" ORDER BY {expr} {'DESC' if descendente else 'ASC'}, {self._DESEMPATE}"
+
+    def _despues_de(self, clave):
+        """Condición (y parámetros) de las filas que van después de clave = (valor, v.id, t.id, vi.id).
+
+        SQLite ordena los NULL primero en ASC y últimos en DESC; = y < no los comparan,
+        así que se tratan aparte.
+        """
+        expr, _posicion, descendente = self._orden
+        valor, ids = clave[0], list(clave[1:])
+        empate = "(v.id, t.id, vi.id) < (?, ?, ?)"
+        if valor is None:
+            if descendente:
+                return f"({expr} IS NULL AND {empate})", ids
+            return f"({expr} IS NOT NULL OR {empate})", ids
+        if descendente:
+            return f"({expr} < ? OR {expr} IS NULL OR ({expr} = ? AND {empate}))", [valor, valor, *ids]
+        return f"({expr} > ? OR ({expr} = ? AND {empate}))", [valor, valor, *ids]
 
-        # Volcar a la tabla
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for r in rows:
-            # Ajustes de formato simples
-            fecha = r[0]
-            caja = r[1] or ""
-            venta_id = r[2]; ticket_id = r[3]
-            prod = r[4] or ""
-            cant = r[5] or 0
-            precio = r[6] or 0
-            subtotal = r[7] or 0
-            mp = r[8] or ""
-            self.tree.insert("", tk.END, values=(fecha, caja, venta_id, ticket_id, prod, cant, precio, subtotal, mp))
+    def _cancelar_busqueda(self):
+        if self._consulta is not None:
+            self._consulta.cancelar()
+            self._consulta = None
+            try:
+                self.btn_cancelar.config(state="disabled")
+                self.lbl_estado.config(text=f"Búsqueda cancelada ({len(self.tree.filas())} filas).")
+            except tk.TclError:
+                pass
+        # Sin consulta activa la tabla no pide más páginas
+        self._sql = None
+
+    def _pagina_terminada(self, filas_pagina):
+        self._consulta = None
+        self.btn_cancelar.config(state="disabled")
+        completo = filas_pagina < self.PAGINA
+        total = len(self.tree.filas())
+        self.lbl_estado.config(text=f"{total} filas." if completo else f"{total} filas cargadas (se cargan más al desplazar).")
+        if completo:
+            self.tree.agregar_filas([], completo=True)
+        elif self._pedir_mas_pendiente:
+            self._pedir_mas_pendiente = False
+            self._pedir_pagina()
+
+    def _pagina_cancelada(self):
+        """La cortó el cambio de vista: la búsqueda sigue y la página se vuelve a pedir al desplazarse."""
+        self._consulta = None
+        self._pedir_mas_pendiente = False
+        try:
+            self.btn_cancelar.config(state="disabled")
+            self.lbl_estado.config(text=f"{len(self.tree.filas())} filas cargadas (se cargan más al desplazar).")
+        except tk.TclError:
+            pass
+
+    def _busqueda_fallida(self, e):
+        self._consulta = None
+        self._sql = None
+        self.btn_cancelar.config(state="disabled")
+        self.lbl_estado.config(text="")
+        messagebox.showerror("Reportes", f"Error consultando datos.\n{e}")
+
+    def _agregar_filas(self, rows, _acumuladas):
+        # Clave de orden de la última fila: la próxima página sigue desde ahí
+        if rows:
+            ultima = rows[-1]
+            self._ultima_clave = (ultima[self._orden[1]], ultima[2], ultima[3], ultima[9])
+        # Ajustes de formato simples; la tabla guarda tuplas y sólo dibuja las visibles
+        self.tree.agregar_filas(
+            [self._formatear(r) for r in rows],
+            completo=len(rows) < self.PAGINA,
+        )
+
+    _ENCABEZADOS_CSV = ["Fecha/Hora", "Caja", "Venta", "Ticket", "Producto", "Cantidad", "Precio", "Subtotal", "Método Pago"]
+
+    @staticmethod
+    def _formatear(r):
+        return (r[0], r[1] or "", r[2], r[3], r[4] or "", r[5] or 0, r[6] or 0, r[7] or 0, r[8] or "")
 
     def exportar_csv(self):
-        if not self.tree.get_children():
+        # Exporta la búsqueda completa (no sólo las páginas ya cargadas en la tabla),
+        # por lotes en el hilo lector: CSV o, si se elige .xlsx, planilla de Excel
+        if self._ultima_busqueda is None or not self.tree.filas():
             messagebox.showwarning("Exportar", "No hay datos para exportar.")
             return
         path = filedialog.asksaveasfilename(
             title="Guardar como", defaultextension=".csv",
-            filetypes=(("CSV", "*.csv"), ("Todos", "*.*"))
+            filetypes=(("CSV", "*.csv"), ("Excel", "*.xlsx"), ("Todos", "*.*"))
         )
         if not path:
             return
-        try:
-            with open(path, "w", newline="", encoding="utf-8") as f:
-                w = csv.writer(f, delimiter=';')
-                w.writerow(["Fecha/Hora", "Caja", "Venta", "Ticket", "Producto", "Cantidad", "Precio", "Subtotal", "Método Pago"])
-                for iid in self.tree.get_children():
-                    w.writerow(self.tree.item(iid, "values"))
-            messagebox.showinfo("Exportar", "Exportación completada.")
-        except Exception as e:
-            messagebox.showerror("Exportar", f"No se pudo exportar el archivo.\n{e}")
+        sql, params = self._ultima_busqueda
+
+        def _progreso(filas):
+            try:
+                self.lbl_estado.config(text=f"Exportando... {filas} filas")
+            except tk.TclError:
+                pass
+
+        self.lbl_estado.config(text="Exportando...")
+        get_reader().ejecutar(
+            exportar, sql, params, path, self._ENCABEZADOS_CSV, self._formatear,
+            on_done=lambda total: (self.lbl_estado.config(text=f"Exportación completada ({total} filas)."),
+                                   messagebox.showinfo("Exportar", "Exportación completada.")),
+            on_error=lambda e: messagebox.showerror("Exportar", f"No se pudo exportar el archivo.\n{e}"),
+            on_progress=_progreso,
+            # La pidió el usuario: sigue aunque se cambie de vista
+            segundo_plano=True,
+        )
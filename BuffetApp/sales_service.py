@@ -0,0 +1,283 @@
+"""Servicio de ventas sin dependencias de UI.
+
+Registra un carrito completo (venta, tickets por unidad, venta_items y descuento
+de stock) en una única transacción usando executemany y un UPDATE de stock
+agrupado por producto. En esa misma transacción se suma al rollup ventas_diarias.
+"""
+from __future__ import annotations
+
+import datetime
+import sqlite3
+
+import caja_snapshot
+import ventas_diarias
+from caja_resumen import guardar_resumenes
+from db_utils import transaction
+
+
+class TicketSequence:
+    """Numeración de identificador_ticket reservada en bloques contiguos.
+
+    Con caja abierta el contador es caja_diaria.total_tickets; sin caja se usa
+    la clave 'ticket_seq_sin_caja' de settings. reserve() debe llamarse dentro
+    de la transacción que inserta los tickets: si esa transacción se revierte
+    (o el proceso muere antes del commit) el contador vuelve atrás con ella,
+    por lo que la numeración queda sin huecos.
+    """
+
+    SIN_CAJA_KEY = 'ticket_seq_sin_caja'
+
+    def __init__(self, caja_id=None):
+        self.caja_id = caja_id
+
+    def reserve(self, cursor, cantidad: int) -> range:
+        """Reserva `cantidad` números con un solo statement y devuelve el rango."""
+        cantidad = int(cantidad)
+        if cantidad <= 0:
+            return range(0)
+        if self.caja_id:
+            ultimo = self._reserve_caja(cursor, cantidad)
+        else:
+            ultimo = self._reserve_sin_caja(cursor, cantidad)
+        return range(ultimo - cantidad + 1, ultimo + 1)
+
+    def _reserve_caja(self, cursor, cantidad):
+        try:
+            cursor.execute(
+                "UPDATE caja_diaria SET total_tickets = COALESCE(total_tickets,0)+? WHERE id=? RETURNING total_tickets",
+                (cantidad, self.caja_id),
+            )
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            # SQLite < 3.35 sin RETURNING: mismo efecto con UPDATE + SELECT
+            cursor.execute("UPDATE caja_diaria SET total_tickets = COALESCE(total_tickets,0)+? WHERE id=?", (cantidad, self.caja_id))
+            cursor.execute("SELECT total_tickets FROM caja_diaria WHERE id=?", (self.caja_id,))
+            row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"No existe la caja id={self.caja_id}")
+        return int(row[0])
+
+    def _reserve_sin_caja(self, cursor, cantidad):
+        try:
+            cursor.execute(
+                """
+                INSERT INTO settings (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(settings.value AS INTEGER) + ? AS TEXT)
+                RETURNING CAST(value AS INTEGER)
+                """,
+                (self.SIN_CAJA_KEY, str(cantidad), cantidad),
+            )
+            row = cursor.fetchone()
+        except sqlite3.OperationalError:
+            cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, '0')", (self.SIN_CAJA_KEY,))
+            cursor.execute(
+                "UPDATE settings SET value = CAST(CAST(value AS INTEGER) + ? AS TEXT) WHERE key=?",
+                (cantidad, self.SIN_CAJA_KEY),
+            )
+            cursor.execute("SELECT CAST(value AS INTEGER) FROM settings WHERE key=?", (self.SIN_CAJA_KEY,))
+            row = cursor.fetchone()
+        return int(row[0])
+
+
+class SalesService:
+    """Cobro de carritos sin Tk.
+
+    cart: lista de [producto_id, nombre, precio, cantidad] (formato de VentasViewNew.carrito).
+    """
+
+    def __init__(self, caja_id=None):
+        self._ticket_seq = TicketSequence(caja_id)
+
+    @property
+    def caja_id(self):
+        return self._ticket_seq.caja_id
+
+    @caja_id.setter
+    def caja_id(self, value):
+        self._ticket_seq.caja_id = value
+
+    def checkout(self, cart, metodo_pago="Efectivo") -> dict:
+        """Guarda la venta completa de forma atómica.
+
+        Devuelve {'venta_id': int, 'tickets': [...]} con la misma forma que
+        consume VentasViewNew._cobrar para imprimir. Si algo falla no queda
+        nada escrito y se propaga la excepción.
+        """
+        if not cart:
+            return {'venta_id': None, 'tickets': []}
+        total = sum(item[2] * item[3] for item in cart)
+        now = datetime.datetime.now()
+        fecha_hora = now.strftime("%Y-%m-%d %H:%M:%S")
+        fecha = fecha_hora[:10]
+        date_str = now.strftime('%d%m%Y')
+
+        # Tomar el lock de escritura desde el inicio: la venta entera es una sola transacción
+        with transaction() as conn:
+            cursor = conn.cursor()
+            metodo_id, metodo_desc = self._resolver_metodo_pago(cursor, metodo_pago)
+            cursor.execute(
+                "INSERT INTO ventas (fecha_hora, fecha, total_venta, metodo_pago_id, caja_id) VALUES (?, ?, ?, ?, ?)",
+                (fecha_hora, fecha, total, metodo_id, self.caja_id),
+            )
+            venta_id = cursor.lastrowid
+
+            prod_info = self._cargar_productos(cursor, [item[0] for item in cart])
+
+            # Un ticket por unidad vendida; los números se reservan en bloque para todo el carrito
+            seqs = iter(self._ticket_seq.reserve(cursor, sum(int(item[3]) for item in cart)))
+            ticket_rows = []
+            for prod_id, _nombre, precio, cantidad in cart:
+                info = prod_info.get(prod_id, {})
+                codigo = info.get('codigo') or str(prod_id)
+                for _ in range(int(cantidad)):
+                    seq = next(seqs)
+                    ticket_rows.append((
+                        venta_id, info.get('categoria'), prod_id, fecha_hora, fecha, precio,
+                        f"{codigo}-{date_str}-{seq}",
+                    ))
+            cursor.executemany(
+                "INSERT INTO tickets (venta_id, categoria_id, producto_id, fecha_hora, fecha, total_ticket, identificador_ticket) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ticket_rows,
+            )
+            # Con el lock de escritura tomado los ids AUTOINCREMENT del lote son contiguos:
+            # se derivan del último rowid en lugar de volver a leer los tickets.
+            ultimo_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            ticket_ids = range(ultimo_id - len(ticket_rows) + 1, ultimo_id + 1)
+            # Un item con cantidad=1 por ticket
+            cursor.executemany(
+                "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?, ?, 1, ?, ?)",
+                [(tid, row[2], row[5], row[5]) for tid, row in zip(ticket_ids, ticket_rows)],
+            )
+            # Stock: un UPDATE por producto (sólo si contabiliza_stock=1)
+            unidades_por_producto = {}
+            for prod_id, _nombre, _precio, cantidad in cart:
+                if int(prod_info.get(prod_id, {}).get('contabiliza', 1)) == 1:
+                    unidades_por_producto[prod_id] = unidades_por_producto.get(prod_id, 0) + int(cantidad)
+            cursor.executemany(
+                "UPDATE products SET stock_actual = stock_actual - ? WHERE id = ?",
+                [(cant, pid) for pid, cant in unidades_por_producto.items()],
+            )
+            codigo_caja = disciplina = None
+            if self.caja_id:
+                cursor.execute("SELECT codigo_caja, disciplina FROM caja_diaria WHERE id=?", (self.caja_id,))
+                rc = cursor.fetchone()
+                if rc:
+                    codigo_caja, disciplina = rc
+            # Rollup diario: un UPSERT por producto del carrito
+            por_producto = {}
+            for prod_id, _nombre, precio, cantidad in cart:
+                acum = por_producto.setdefault(prod_id, [0, 0])
+                acum[0] += int(cantidad)
+                acum[1] += precio * int(cantidad)
+            ventas_diarias.registrar_venta(
+                cursor, fecha, self.caja_id, disciplina, metodo_id,
+                [(pid, unidades, importe) for pid, (unidades, importe) in por_producto.items()],
+            )
+
+        if self.caja_id:
+            caja_snapshot.invalidar(self.caja_id)
+
+        # Info para imprimir armada con lo que ya está en memoria (sin consultas por ticket)
+        tickets_info = [
+            {
+                'ticket_id': tid,
+                'identificador': row[6],
+                'producto_id': row[2],
+                'producto_nombre': prod_info.get(row[2], {}).get('nombre') or '',
+                'total_ticket': row[5],
+                'codigo_caja': codigo_caja,
+            }
+            for tid, row in zip(ticket_ids, ticket_rows)
+        ]
+        return {
+            'venta_id': venta_id,
+            'metodo_pago_id': metodo_id,
+            'metodo_pago': metodo_desc,
+            'tickets': tickets_info,
+        }
+
+    def _resolver_metodo_pago(self, cursor, metodo_pago):
+        """Obtener (o crear) el método de pago a partir de un id o una descripción.
+
+        Devuelve (id, descripcion).
+        """
+        row = None
+        try:
+            # si se pasó un id numérico, usarlo directamente
+            if isinstance(metodo_pago, int) or (isinstance(metodo_pago, str) and metodo_pago.isdigit()):
+                cursor.execute("SELECT id, descripcion FROM metodos_pago WHERE id = ?", (int(metodo_pago),))
+            else:
+                cursor.execute("SELECT id, descripcion FROM metodos_pago WHERE descripcion = ?", (metodo_pago,))
+            row = cursor.fetchone()
+        except Exception:
+            row = None
+        if row:
+            return row[0], row[1]
+        if isinstance(metodo_pago, str):
+            cursor.execute("INSERT INTO metodos_pago (descripcion) VALUES (?)", (metodo_pago,))
+            return cursor.lastrowid, metodo_pago
+        # fallback: usar Efectivo si existe
+        cursor.execute("SELECT id, descripcion FROM metodos_pago WHERE descripcion LIKE 'Efectivo' LIMIT 1")
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else (None, str(metodo_pago))
+
+    @staticmethod
+    def _cargar_productos(cursor, prod_ids):
+        placeholders = ','.join('?' for _ in prod_ids)
+        try:
+            cursor.execute(
+                f"SELECT id, codigo_producto, categoria_id, nombre, COALESCE(contabiliza_stock,1) FROM products WHERE id IN ({placeholders})",
+                prod_ids,
+            )
+            return {r[0]: {'codigo': r[1], 'categoria': r[2], 'nombre': r[3], 'contabiliza': int(r[4])} for r in cursor.fetchall()}
+        except Exception:
+            # BD vieja sin contabiliza_stock
+            cursor.execute(
+                f"SELECT id, codigo_producto, categoria_id, nombre FROM products WHERE id IN ({placeholders})",
+                prod_ids,
+            )
+            return {r[0]: {'codigo': r[1], 'categoria': r[2], 'nombre': r[3], 'contabiliza': 1} for r in cursor.fetchall()}
+
+
+def anular_ticket(ticket_id: int) -> None:
+    """Marca el ticket como Anulado y devuelve su stock (sólo si contabiliza_stock=1).
+
+    Un ticket ya anulado no se vuelve a procesar (no devuelve stock dos veces).
+    """
+    caja_id = None
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE tickets SET status='Anulado' WHERE id=? AND status IS NOT 'Anulado'", (ticket_id,))
+        if cursor.rowcount == 0:
+            return
+        ventas_diarias.registrar_anulacion(cursor, ticket_id)
+        cursor.execute(
+            """
+            UPDATE products
+               SET stock_actual = COALESCE(stock_actual,0) + (
+                       SELECT SUM(vi.cantidad) FROM venta_items vi
+                        WHERE vi.ticket_id=? AND vi.producto_id=products.id)
+             WHERE id IN (SELECT producto_id FROM venta_items WHERE ticket_id=?)
+               AND COALESCE(contabiliza_stock,1)=1
+            """,
+            (ticket_id, ticket_id),
+        )
+        # Si la caja del ticket ya estaba cerrada, mantener su resumen al día
+        cursor.execute("SELECT v.caja_id FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE t.id=?", (ticket_id,))
+        row = cursor.fetchone()
+        caja_id = row[0] if row else None
+        if caja_id:
+            guardar_resumenes(cursor, [caja_id])
+    if caja_id:
+        caja_snapshot.invalidar(caja_id)
+
+
+def marcar_tickets_impresos(ticket_ids) -> int:
+    """UPDATE en bloque de status='Impreso'. Devuelve la cantidad de tickets marcados."""
+    ids = [int(x) for x in (ticket_ids or []) if str(x).isdigit()]
+    if not ids:
+        return 0
+    placeholders = ",".join(["?"] * len(ids))
+    with transaction() as conn:
+        cur = conn.execute(f"UPDATE tickets SET status='Impreso' WHERE id IN ({placeholders})", ids)
+        return cur.rowcount
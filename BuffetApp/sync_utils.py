@@ -1,39 +1,365 @@
 """Sincronización offline: importar datos de otra base (solo cajas/ventas).
 
 Estrategia:
-- Usar ATTACH DATABASE para leer desde archivo origen.
+- Usar ATTACH DATABASE (solo lectura) para leer desde archivo origen.
 - Sincronizar tabla pos por pos_uuid (INSERT OR IGNORE para no duplicar).
-- Mapear pos_id/pos_uuid a la base local.
+- Mapear categorías, métodos de pago y productos a la base local por descripción/código/nombre.
 - Importar caja_diaria por caja_uuid (si existe la columna) o por (codigo_caja, fecha, hora_apertura) como fallback débil.
 - Importar ventas, tickets y venta_items referenciando IDs re-mapeados.
 
+Todo se resuelve por conjuntos: cada tabla del origen se vuelca a una tabla
+temporal imp_* con las columnas ya normalizadas y los ids locales de sus
+referencias; el id local de cada fila se busca con un UPDATE contra la clave
+natural indexada (migración 008) y las faltantes se insertan con un único
+INSERT ... SELECT. Dentro del origen, filas con la misma clave natural se
+importan una vez y todas apuntan a la misma fila local, igual que cuando se
+importaba fila por fila. Ver tools/bench_import.py.
+
+Con indice=ImportIndex() (import_index.py) las búsquedas de cajas, ventas,
+tickets e items se resuelven en cambio contra las claves locales cargadas en
+memoria una vez (ver tools/bench_import_index.py).
+
+Importación incremental: import_watermarks (migración 009) guarda por equipo
+de origen (pos_uuid) y tabla del historial hasta qué id ya se importó todo lo
+que no puede cambiar (filas de cajas cerradas). La siguiente importación del
+mismo equipo sólo lee las filas posteriores, más las anteriores que ellas
+referencian. Si el archivo tiene la misma huella (sha256) que el último
+importado, se devuelve sin abrirlo. Si la fila de la marca ya no es la misma
+(el origen se reemplazó por otra base) o con completo=True se lee todo.
+
+Lectura del origen: en un medio extraíble (pendrive, CD) se adjunta directo
+con mode=ro&immutable=1, sin copiarlo; si no, se toma una instantánea
+consistente con la API de backup de SQLite (incluye lo que esté en el -wal)
+en appdata/import_tmp, que se borra al terminar. Las que hayan quedado de
+importaciones interrumpidas se borran pasadas _RETENCION_TEMP_HORAS.
+
+Cada importación tiene dos pasos: _normalizar sólo lee el origen y arma
+norm_* (estados, claves de descripciones y productos, columnas de caja, filas
+dentro de la ventana incremental) y _aplicar los mapea y escribe en la base
+local. import_from_db hace los dos en la misma conexión (norm_* son vistas
+temporales); import_many normaliza varios orígenes en paralelo, cada uno a su
+base intermedia en import_tmp, y los aplica juntos en una sola transacción
+(ver tools/bench_import_many.py).
+
 Se evita sincronizar products y categorías para no pisar catálogos.
 """
 from __future__ import annotations
 
 import os
+import re
+import time
+import uuid
+import threading
+import hashlib
+import pathlib
 import sqlite3
-from typing import Optional
 import shutil
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-from db_utils import get_connection
+from caja_resumen import guardar_resumenes
+from ventas_diarias import reconstruir as reconstruir_ventas_diarias
+from caja_snapshot import invalidar as invalidar_snapshot
+from db_utils import get_connection, open_connection, transaction
 from utils_paths import appdata_dir, DB_PATH
 
+# Tablas temporales del motor de importación (se borran al terminar)
+_TABLAS_TEMP = ('imp_pos', 'imp_categoria', 'imp_metodo_pago', 'imp_producto', 'imp_clave_producto',
+                'imp_caja', 'imp_venta', 'imp_ticket', 'imp_item')
+
+# Tablas del historial con marca de agua, en orden de importación, y la clave que se guarda
+# de la fila de la marca para reconocer que el origen sigue siendo la misma base
+_TABLAS_INCREMENTALES = {
+    'caja_diaria': "fecha || ' ' || hora_apertura",
+    'ventas': "fecha_hora",
+    'tickets': "fecha_hora",
+    'venta_items': None,
+}
+
+# Origen ya normalizado (ver _normalizar): vistas temporales sobre src en import_from_db,
+# tablas de la base intermedia de cada origen en import_many
+_TABLAS_NORM = ('norm_pos', 'norm_categoria', 'norm_metodo_pago', 'norm_producto',
+                'norm_caja', 'norm_venta', 'norm_ticket', 'norm_item')
+
+# Instantáneas del origen en import_tmp: páginas copiadas por paso de backup (progreso) y
+# cuánto se conservan las que quedaron de una importación interrumpida
+_PAGINAS_POR_PASO = 1024
+_RETENCION_TEMP_HORAS = 24
+# Sólo archivos creados por import_from_db (import_tmp es también la carpeta inicial del diálogo)
+_PATRON_TEMP = re.compile(r'^import_\d{8}_\d{6}(_[0-9a-f]{8})?\.db(-wal|-shm|-journal)?$')
+
+# Columnas de caja_diaria que se copian del origen
+_COLUMNAS_CAJA = (
+    'caja_uuid', 'pos_uuid', 'codigo_caja', 'disciplina', 'fecha', 'usuario_apertura', 'hora_apertura',
+    'fondo_inicial', 'observaciones_apertura', 'estado', 'hora_cierre', 'usuario_cierre', 'apertura_dt', 'cierre_dt',
+    'total_ventas', 'total_efectivo_teorico', 'conteo_efectivo_final', 'transferencias_final', 'ingresos', 'retiros',
+    'diferencia', 'total_tickets', 'obs_cierre',
+)
+
+
+def _log(msg: str):
+    # Simple logger a archivo en AppData
+    try:
+        log_dir = appdata_dir()
+        with open(os.path.join(log_dir, 'import_logs.txt'), 'a', encoding='utf-8') as lf:
+            lf.write(f"{datetime.datetime.now().isoformat()} - {msg}\n")
+    except Exception:
+        pass
+
 
-def import_from_db(origen_db_path: str, incluir_historial: bool = True) -> dict:
-    """Importa datos desde otra base SQLite sin usar ATTACH.
+# Normalizadores (se registran como funciones SQL en la conexión de la importación)
+def _clave(val):
+    """Clave de comparación de descripciones/códigos/nombres: sin espacios extremos y en minúsculas."""
+    return str(val).strip().lower() if val is not None else ''
 
-    Estrategia: copiar el archivo origen a una ruta temporal (para evitar locks), abrir dos conexiones
-    (src read-only y dst local), leer filas desde src y escribir en dst con deduplicación.
+
+def _normalize_ticket_status(val):
+    try:
+        if val is None:
+            return 'No impreso'
+        s = str(val).strip()
+        if s == '':
+            return 'No impreso'
+        sl = s.lower()
+        if sl in ('anulado', 'anulada'):
+            return 'Anulado'
+        if sl in ('impreso', 'impresa', 'printed'):
+            return 'Impreso'
+        # Si es numérico y >0, considerar impreso
+        if sl.isdigit():
+            return 'Impreso' if int(sl) > 0 else 'No impreso'
+        # fallback: mantener valor si no es vacío
+        return s
+    except Exception:
+        return 'No impreso'
+
+
+def _normalize_venta_status(val):
+    try:
+        if val is None:
+            return 'OK'
+        s = str(val).strip()
+        if s == '':
+            return 'OK'
+        return s
+    except Exception:
+        return 'OK'
+
+
+def _uri_solo_lectura(path: str, inmutable: bool = False) -> str:
+    uri = pathlib.Path(os.path.abspath(path)).as_uri() + '?mode=ro'
+    return uri + '&immutable=1' if inmutable else uri
+
+
+def _en_medio_extraible(path: str) -> bool:
+    """True si el archivo está en un pendrive/CD (nadie lo escribe mientras se importa)."""
+    ruta = os.path.abspath(path)
+    if os.name == 'nt':
+        try:
+            import ctypes
+            unidad = os.path.splitdrive(ruta)[0] + '\\'
+            # DRIVE_REMOVABLE = 2, DRIVE_CDROM = 5
+            return ctypes.windll.kernel32.GetDriveTypeW(unidad) in (2, 5)
+        except Exception:
+            return False
+    return ruta.startswith(('/media/', '/run/media/', '/Volumes/'))
+
+
+def _limpiar_temporales(tmp_dir: str, horas: float = _RETENCION_TEMP_HORAS):
+    """Borra las instantáneas de import_tmp con más de `horas` (de importaciones que no terminaron)."""
+    limite = time.time() - horas * 3600
+    try:
+        nombres = os.listdir(tmp_dir)
+    except OSError:
+        return
+    for nombre in nombres:
+        if not _PATRON_TEMP.match(nombre):
+            continue
+        ruta = os.path.join(tmp_dir, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+                _log(f"Temporal de importación vencido borrado: {nombre}")
+        except OSError:
+            pass
+
+
+def _instantanea(origen: str, destino: str, progreso=None):
+    """Copia consistente del origen en destino con la API de backup, de a _PAGINAS_POR_PASO páginas.
+
+    progreso(copiadas, total) se llama después de cada paso.
     """
-    if not origen_db_path or not os.path.exists(origen_db_path):
-        raise FileNotFoundError("No se encontró la base de datos origen")
-    # Evitar importar la misma base en uso
-    if os.path.abspath(origen_db_path) == os.path.abspath(DB_PATH):
-        raise ValueError("No se puede importar la misma base de datos en uso.")
+    def _paso(status, restantes, total):
+        if progreso is not None:
+            try:
+                progreso(total - restantes, total)
+            except Exception:
+                pass
+
+    src = sqlite3.connect(_uri_solo_lectura(origen), uri=True)
+    try:
+        dst = sqlite3.connect(destino)
+        try:
+            src.backup(dst, pages=_PAGINAS_POR_PASO, progress=_paso)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+def _tablas_origen(cur) -> set:
+    return {r[0] for r in cur.execute("SELECT name FROM src.sqlite_master WHERE type='table'").fetchall()}
+
+
+def _columnas(cur, esquema: str, tabla: str) -> set:
+    return {r[1] for r in cur.execute(f"PRAGMA {esquema}.table_info({tabla})").fetchall()}
+
+
+def _contar(cur, tabla: str) -> int:
+    return int(cur.execute(f"SELECT COUNT(*) FROM src.{tabla}").fetchone()[0])
 
-    resumen = {
+
+def _huella_archivo(path: str) -> str:
+    """sha256 del archivo y de su -wal si lo tiene (cambios todavía sin pasar al archivo principal)."""
+    h = hashlib.sha256()
+    for parte in (path, path + '-wal'):
+        if not os.path.exists(parte):
+            continue
+        with open(parte, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+    return h.hexdigest()
+
+
+def _pos_origen(cur, tablas: set):
+    """pos_uuid del equipo que generó la base origen (None si no se puede saber)."""
+    if 'settings' in tablas:
+        try:
+            row = cur.execute("SELECT value FROM src.settings WHERE key = 'device_pos_uuid'").fetchone()
+            if row and row[0]:
+                return row[0]
+        except sqlite3.Error:
+            pass
+    if 'pos' in tablas:
+        filas = cur.execute("SELECT pos_uuid FROM src.pos LIMIT 2").fetchall()
+        if len(filas) == 1:
+            return filas[0][0]
+    return None
+
+
+def _ya_importado(app, huella: str) -> bool:
+    """True si un archivo con esta huella ya se importó completo (app: conexión a la base local).
+
+    _guardar_marcas sólo guarda la huella cuando quedaron en la base todas las filas leídas.
+    """
+    try:
+        return app.execute("SELECT 1 FROM import_watermarks WHERE src_fingerprint = ? LIMIT 1", (huella,)).fetchone() is not None
+    except sqlite3.Error as e:
+        _log(f"No se pudieron leer las marcas de importación: {e}")
+        return False
+
+
+def _leer_marcas(cur, app, pos_uuid: str, tablas: set):
+    """({tabla: last_id}, {tabla: last_fecha_hora}) del equipo; vacíos si no hay o si el origen
+    ya no coincide con la marca. app: conexión a la base local (donde están las marcas)."""
+    marcas, claves = {}, {}
+    for tabla, last_id, last_fecha_hora in app.execute(
+        "SELECT tabla, last_id, last_fecha_hora FROM import_watermarks WHERE pos_uuid = ?", (pos_uuid,)
+    ).fetchall():
+        clave = _TABLAS_INCREMENTALES.get(tabla)
+        if tabla not in _TABLAS_INCREMENTALES or tabla not in tablas:
+            continue
+        if clave and last_fecha_hora is not None:
+            row = cur.execute(f"SELECT {clave} FROM src.{tabla} WHERE rowid = ?", (last_id,)).fetchone()
+            if not row or row[0] != last_fecha_hora:
+                _log(f"El origen {pos_uuid} no coincide con la marca de {tabla} (id {last_id}): se importa completo")
+                return {}, {}
+        marcas[tabla] = int(last_id or 0)
+        claves[tabla] = last_fecha_hora
+    return marcas, claves
+
+
+def _ventanas(marcas: dict) -> dict:
+    """Condición WHERE por tabla del historial: filas pasada la marca, más las anteriores referenciadas
+    por filas nuevas (p. ej. un item nuevo de un ticket ya importado). Vacío si no hay marcas.
+
+    Los ids van como literales (enteros leídos de import_watermarks) porque las vistas no llevan parámetros.
+    """
+    if not any(marcas.values()):
+        return {}
+    desde = {tabla: int(marcas.get(tabla, 0)) for tabla in _TABLAS_INCREMENTALES}
+    items = f"vi.rowid > {desde['venta_items']}"
+    tickets = f"t.id > {desde['tickets']} OR t.id IN (SELECT ticket_id FROM src.venta_items vi WHERE {items})"
+    ventas = f"v.id > {desde['ventas']} OR v.id IN (SELECT venta_id FROM src.tickets t WHERE {tickets})"
+    cajas = f"c.id > {desde['caja_diaria']} OR c.id IN (SELECT caja_id FROM src.ventas v WHERE {ventas})"
+    return {'caja_diaria': f"({cajas})", 'ventas': f"({ventas})", 'tickets': f"({tickets})", 'venta_items': f"({items})"}
+
+
+def _filtro(ventanas: dict, tabla: str) -> str:
+    """WHERE de la ventana incremental de la tabla ('' si se lee todo)."""
+    return f"WHERE {ventanas[tabla]}" if tabla in ventanas else ""
+
+
+def _guardar_marcas(cur, esquema: str, info: dict, huella: str):
+    """Avanza la marca de cada tabla hasta antes de la primera fila leída que todavía puede cambiar
+    (caja abierta) o que no quedó en la base local, así la próxima vez se vuelve a leer desde ahí.
+
+    Una fila quedó si su dst_id apunta a una fila que existe en main (los items, si existe su
+    ticket). La huella sólo se guarda si quedaron todas las leídas: si no, la próxima importación
+    del mismo archivo no podría dar sin_cambios y perder esas filas para siempre.
+    """
+    inestable = {
+        'caja_diaria': ("norm_caja", "clave_marca", "imp_caja",
+                        "i.dst_id IS NULL OR NOT EXISTS (SELECT 1 FROM main.caja_diaria d WHERE d.id = i.dst_id)",
+                        "i.estado <> 'cerrada'"),
+        'ventas': ("norm_venta", "fecha_hora", "imp_venta",
+                   "i.dst_id IS NULL OR NOT EXISTS (SELECT 1 FROM main.ventas d WHERE d.id = i.dst_id)",
+                   "i.caja_abierta"),
+        'tickets': ("norm_ticket", "fecha_hora", "imp_ticket",
+                    "i.dst_id IS NULL OR NOT EXISTS (SELECT 1 FROM main.tickets d WHERE d.id = i.dst_id)",
+                    "i.caja_abierta"),
+        'venta_items': ("norm_item", "NULL", "imp_item",
+                        "i.src_id IS NULL OR NOT EXISTS (SELECT 1 FROM main.tickets d WHERE d.id = i.ticket_id)",
+                        "i.caja_abierta"),
+    }
+    marcas = []
+    completa = True
+    for tabla, (norm, clave, temp, perdida, abierta) in inestable.items():
+        if tabla not in info['tablas']:
+            continue
+        desde = info['marcas'][tabla]
+        primera_perdida = cur.execute(
+            f"SELECT MIN(s.src_id) FROM {esquema}.{norm} s LEFT JOIN {temp} i ON i.src_id = s.src_id "
+            f"WHERE s.src_id > ? AND ({perdida})",
+            (desde,),
+        ).fetchone()[0]
+        primera_abierta = cur.execute(
+            f"SELECT MIN(s.src_id) FROM {esquema}.{norm} s JOIN {temp} i ON i.src_id = s.src_id "
+            f"WHERE s.src_id > ? AND {abierta}",
+            (desde,),
+        ).fetchone()[0]
+        if primera_perdida is not None:
+            completa = False
+            _log(f"Filas de {tabla} del origen {info['pos_uuid']} sin importar desde src_id {primera_perdida}")
+        primera = min((p for p in (primera_perdida, primera_abierta) if p is not None), default=None)
+        row = cur.execute(
+            f"SELECT src_id, {clave} FROM {esquema}.{norm} WHERE src_id > ? AND src_id < ? ORDER BY src_id DESC LIMIT 1",
+            (desde, primera if primera is not None else 1 << 62),
+        ).fetchone()
+        marcas.append((tabla,) + (row if row else (desde, info['claves'].get(tabla))))
+    if not completa:
+        # Ninguna fila del equipo puede seguir reconociendo este archivo (ni uno anterior) como importado
+        cur.execute("UPDATE main.import_watermarks SET src_fingerprint = NULL WHERE pos_uuid = ?", (info['pos_uuid'],))
+    for tabla, last_id, last_fecha_hora in marcas:
+        cur.execute(
+            "INSERT OR REPLACE INTO main.import_watermarks (pos_uuid, tabla, last_id, last_fecha_hora, src_fingerprint) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (info['pos_uuid'], tabla, last_id, last_fecha_hora, huella if completa else None),
+        )
+
+
+def _resumen_vacio() -> dict:
+    return {
         "pos_nuevos": 0,
         "categorias_nuevas": 0,
         "productos_nuevos": 0,
@@ -49,573 +375,803 @@ def import_from_db(origen_db_path: str, incluir_historial: bool = True) -> dict:
         "src_ventas": 0,
         "src_tickets": 0,
         "src_items": 0,
+        # sin_cambios: misma huella que la última importación (no se abrió el origen)
+        "sin_cambios": False,
+        # incremental: se leyó sólo lo posterior a las marcas de agua del equipo origen
+        "incremental": False,
     }
 
-    # Copia temporal del origen
-    ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+def _validar_origen(origen_db_path: str):
+    if not origen_db_path or not os.path.exists(origen_db_path):
+        raise FileNotFoundError("No se encontró la base de datos origen")
+    # Evitar importar la misma base en uso
+    if os.path.abspath(origen_db_path) == os.path.abspath(DB_PATH):
+        raise ValueError("No se puede importar la misma base de datos en uso.")
+
+
+def _abrir_inmutable(origen_db_path: str, inmutable) -> bool:
+    """Decide si el origen se puede adjuntar con immutable=1 (ver import_from_db)."""
+    if inmutable is None:
+        inmutable = _en_medio_extraible(origen_db_path)
+    # immutable=1 no lee el -wal ni recupera un -journal pendiente
+    if inmutable and any(os.path.exists(origen_db_path + s) for s in ('-wal', '-journal')):
+        _log("El origen tiene -wal/-journal: no se abre inmutable")
+        return False
+    return bool(inmutable)
+
+
+def _adjuntar_inmutable(conn, origen_db_path: str) -> bool:
+    """ATTACH ... AS src con immutable=1; False (sin nada adjuntado) si no se pudo."""
+    adjuntada = False
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (_uri_solo_lectura(origen_db_path, inmutable=True),))
+        adjuntada = True
+        conn.execute("SELECT COUNT(*) FROM src.sqlite_master").fetchone()
+        return True
+    except sqlite3.Error as e:
+        _log(f"No se pudo abrir el origen inmutable ({e})")
+        if adjuntada:
+            conn.execute("DETACH DATABASE src")
+        return False
+
+
+def _registrar_funciones(conn):
+    for nombre, fn in (('_clave', _clave), ('_estado_ticket', _normalize_ticket_status),
+                       ('_estado_venta', _normalize_venta_status)):
+        conn.create_function(nombre, 1, fn, deterministic=True)
+
+
+def _ruta_temporal() -> str:
+    """Ruta nueva en import_tmp para una instantánea o una base intermedia (ver _PATRON_TEMP)."""
     tmp_dir = os.path.join(appdata_dir(), 'import_tmp')
     os.makedirs(tmp_dir, exist_ok=True)
-    tmp_src = os.path.join(tmp_dir, f"import_{ts}.db")
-    shutil.copy2(origen_db_path, tmp_src)
+    ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(tmp_dir, f"import_{ts}_{uuid.uuid4().hex[:8]}.db")
 
-    src_conn = None
-    dst_conn = None
-    # Simple logger a archivo en AppData
-    def _log(msg: str):
+
+def _borrar_temporal(ruta: str):
+    try:
+        for parte in (ruta, ruta + '-wal', ruta + '-shm', ruta + '-journal'):
+            if os.path.exists(parte):
+                os.remove(parte)
+    except Exception as e:
+        _log(f"No se pudo borrar el temporal {ruta} (se borra pasadas {_RETENCION_TEMP_HORAS} h): {e}")
+
+
+def _limpiar_conexion(conn, esquemas):
+    """Borra las tablas/vistas temporales de la importación y desadjunta los esquemas."""
+    for nombre in _TABLAS_NORM:
         try:
-            log_dir = appdata_dir()
-            with open(os.path.join(log_dir, 'import_logs.txt'), 'a', encoding='utf-8') as lf:
-                lf.write(f"{datetime.datetime.now().isoformat()} - {msg}\n")
+            conn.execute(f"DROP VIEW IF EXISTS temp.{nombre}")
         except Exception:
             pass
-    # Normalizadores de estado
-    def _normalize_ticket_status(val):
+    for tabla in _TABLAS_TEMP:
         try:
-            if val is None:
-                return 'No impreso'
-            s = str(val).strip()
-            if s == '':
-                return 'No impreso'
-            sl = s.lower()
-            if sl in ('anulado', 'anulada'):
-                return 'Anulado'
-            if sl in ('impreso', 'impresa', 'printed'):
-                return 'Impreso'
-            # Si es numérico y >0, considerar impreso
-            if sl.isdigit():
-                return 'Impreso' if int(sl) > 0 else 'No impreso'
-            # fallback: mantener valor si no es vacío
-            return s
+            conn.execute(f"DROP TABLE IF EXISTS temp.{tabla}")
         except Exception:
-            return 'No impreso'
-
-    def _normalize_venta_status(val):
-        try:
-            if val is None:
-                return 'OK'
-            s = str(val).strip()
-            if s == '':
-                return 'OK'
-            return s
-        except Exception:
-            return 'OK'
-    try:
-        # Abrir conexiones
+            pass
+    for esquema in esquemas:
         try:
-            src_conn = sqlite3.connect(f"file:{tmp_src}?mode=ro", uri=True)
-        except Exception:
-            src_conn = sqlite3.connect(tmp_src)
-        src_conn.row_factory = sqlite3.Row
-        src_conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(f"DETACH DATABASE {esquema}")
+        except Exception as e:
+            _log(f"No se pudo desadjuntar la base {esquema}: {e}")
 
-        dst_conn = get_connection()
-        dst_conn.execute("PRAGMA busy_timeout=5000")
-        dst_cur = dst_conn.cursor()
 
-        src_cur = src_conn.cursor()
+def import_from_db(origen_db_path: str, incluir_historial: bool = True, indice=None, completo: bool = False,
+                   inmutable=None, progreso=None) -> dict:
+    """Importa datos desde otra base SQLite adjuntándola en solo lectura.
 
-        # 1) Importar POS si existe
-        try:
-            r = src_cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pos'").fetchone()
-            if r:
-                rows = src_cur.execute("SELECT pos_uuid, nombre, device_id, hostname, created_at FROM pos").fetchall()
-                resumen["src_pos"] = len(rows)
-                for row in rows:
-                    try:
-                        dst_cur.execute(
-                            "INSERT OR IGNORE INTO pos (pos_uuid, nombre, device_id, hostname, created_at) VALUES (?, ?, ?, ?, ?)",
-                            (row[0], row[1], row[2], row[3], row[4])
-                        )
-                        if dst_cur.rowcount == 1:
-                            resumen["pos_nuevos"] += 1
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+    Estrategia: adjuntar el origen (o una instantánea suya, para no leer un archivo que otro
+    proceso está escribiendo) con ATTACH en modo solo lectura a la conexión local y volcar cada
+    tabla con INSERT ... SELECT dentro de una sola transacción (ver docstring del módulo).
 
-        # 2) Importar CATEGORÍAS primero
-        src_cat_id_to_dst: dict[int,int] = {}
-        try:
-            r = src_cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='Categoria_Producto'").fetchone()
-            if r:
-                # Detectar nombre de columna en origen: 'descripcion' o 'nombre'
-                cat_cols = {c[1] for c in src_cur.execute("PRAGMA table_info(Categoria_Producto)").fetchall()}
-                src_cat_name_col = 'descripcion' if 'descripcion' in cat_cols else ('nombre' if 'nombre' in cat_cols else None)
-                if src_cat_name_col:
-                    src_cats = src_cur.execute(f"SELECT id, {src_cat_name_col} FROM Categoria_Producto").fetchall()
-                    resumen["src_categorias"] = len(src_cats)
-                    # Mapa destino por descripcion
-                    dst_cats = {}
-                    try:
-                        for did, ddesc in dst_cur.execute("SELECT id, descripcion FROM Categoria_Producto").fetchall():
-                            dst_cats[(ddesc or '').strip().lower()] = int(did)
-                    except Exception:
-                        dst_cats = {}
-                    for sid, sdesc in src_cats:
-                        key = (sdesc or '').strip().lower()
-                        if not key:
-                            continue
-                        if key in dst_cats:
-                            src_cat_id_to_dst[int(sid)] = dst_cats[key]
-                        else:
-                            try:
-                                dst_cur.execute("INSERT INTO Categoria_Producto (descripcion) VALUES (?)", (sdesc,))
-                                new_id = int(dst_cur.lastrowid)
-                                dst_cats[key] = new_id
-                                src_cat_id_to_dst[int(sid)] = new_id
-                                resumen["categorias_nuevas"] += 1
-                            except Exception as e:
-                                _log(f"Error creando categoria '{sdesc}': {e}")
-                                # no asignar
-                else:
-                    _log("Categoria_Producto sin columna de nombre reconocida (descripcion/nombre)")
-        except Exception as e:
-            _log(f"Error importando categorias: {e}")
+    indice: ImportIndex opcional para deduplicar en memoria en lugar de con consultas.
+    completo: ignorar las marcas de agua y leer todo el historial del origen.
+    inmutable: True adjunta el origen sin copiarlo (immutable=1), False siempre toma una
+        instantánea; None lo decide según si está en un medio extraíble.
+    progreso: progreso(copiadas, total) en páginas mientras se toma la instantánea
+        (se llama desde el hilo que importa).
+    """
+    _validar_origen(origen_db_path)
+    resumen = _resumen_vacio()
 
-        # 3) Importar/asegurar MÉTODOS DE PAGO antes de ventas/tickets
-        mp_desc_to_dst: dict[str,int] = {}
-        mp_src_to_dst: dict[int,int] = {}
+    huella = _huella_archivo(origen_db_path)
+    if incluir_historial and not completo:
+        conn = get_connection()
         try:
-            # Index destino actual de métodos de pago por descripción (lower)
-            for mid, mdesc in dst_cur.execute("SELECT id, descripcion FROM metodos_pago").fetchall():
-                key = (mdesc or '').strip().lower()
-                if key:
-                    mp_desc_to_dst[key] = int(mid)
-            # Traer métodos del origen
-            src_mps = src_cur.execute("SELECT id, descripcion FROM metodos_pago").fetchall()
-            for sid, sdesc in src_mps:
-                k = (sdesc or '').strip().lower()
-                if not k:
-                    continue
-                if k in mp_desc_to_dst:
-                    mp_src_to_dst[int(sid)] = mp_desc_to_dst[k]
-                else:
-                    try:
-                        dst_cur.execute("INSERT INTO metodos_pago (descripcion) VALUES (?)", (sdesc,))
-                        new_id = int(dst_cur.lastrowid)
-                        mp_desc_to_dst[k] = new_id
-                        mp_src_to_dst[int(sid)] = new_id
-                    except Exception as e:
-                        _log(f"Error creando metodo_pago '{sdesc}': {e}")
-                        # no mapear
-        except Exception as e:
-            _log(f"Error importando metodos de pago: {e}")
+            ya = _ya_importado(conn, huella)
+        finally:
+            conn.close()
+        if ya:
+            _log("La base origen no cambió desde la última importación")
+            resumen["sin_cambios"] = True
+            return resumen
 
-        # 4) Importar/asegurar PRODUCTOS antes de ventas/tickets
-        prod_code_to_local: dict[str,int] = {}
-        local_prod_name_to_id: dict[str,int] = {}
-        local_prod_to_cat: dict[int, Optional[int]] = {}
-        src_prod_map: dict[int,int] = {}
-        try:
-            # Index destino actual
-            for pid, code, nombre, cat_id in dst_cur.execute("SELECT id, codigo_producto, nombre, categoria_id FROM products").fetchall():
-                if code:
-                    prod_code_to_local[(code or '').strip().lower()] = int(pid)
-                local_prod_name_to_id[(nombre or '').strip().lower()] = int(pid)
-                local_prod_to_cat[int(pid)] = cat_id
-            # Leer productos de origen
-            src_products = src_cur.execute("SELECT id, codigo_producto, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, categoria_id, visible, color FROM products").fetchall()
-            resumen["src_products"] = len(src_products)
-        except Exception as e:
-            _log(f"Error preparando índices de productos: {e}")
-            src_products = []
-        for prow in src_products:
+    conn = get_connection()
+    adjuntada = False
+    tmp_src = None
+    try:
+        _registrar_funciones(conn)
+        # ATTACH no puede ir dentro de una transacción: antes de BEGIN
+        if _abrir_inmutable(origen_db_path, inmutable):
+            adjuntada = _adjuntar_inmutable(conn, origen_db_path)
+        if not adjuntada:
+            tmp_src = _ruta_temporal()
+            _limpiar_temporales(os.path.dirname(tmp_src))
             try:
-                (sid, code, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, src_cat_id, visible, color) = prow
-                key_code = (code or '').strip().lower()
-                key_name = (nombre or '').strip().lower()
-                dst_id = None
-                if key_code and key_code in prod_code_to_local:
-                    dst_id = prod_code_to_local[key_code]
-                elif key_name and key_name in local_prod_name_to_id:
-                    dst_id = local_prod_name_to_id[key_name]
-                if dst_id is None:
-                    # Resolver categoría destino
-                    dst_cat_id = src_cat_id_to_dst.get(int(src_cat_id)) if src_cat_id is not None else None
-                    try:
-                        dst_cur.execute(
-                            "INSERT INTO products (codigo_producto, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, categoria_id, visible, color) VALUES (?,?,?,?,?,?,?,?,?)",
-                            (code, nombre, precio_compra or 0, precio_venta or 0, stock_actual or 0, (stock_minimo or 3), dst_cat_id, (visible if visible is not None else 1), color)
-                        )
-                        dst_id = int(dst_cur.lastrowid)
-                        resumen['productos_nuevos'] += 1
-                        # actualizar índices locales
-                        if key_code:
-                            prod_code_to_local[key_code] = dst_id
-                        if key_name:
-                            local_prod_name_to_id[key_name] = dst_id
-                        local_prod_to_cat[dst_id] = dst_cat_id
-                    except Exception as e:
-                        _log(f"Error creando producto '{nombre}' (code={code}): {e}")
-                        dst_id = None
-                if dst_id is not None:
-                    src_prod_map[int(sid)] = int(dst_id)
-            except Exception as e:
-                _log(f"Error procesando producto sid={prow[0]}: {e}")
-                pass
-
-    # 5) Importar cajas (caja_diaria)
-        # Detectar columnas
-        src_cols = {c[1] for c in src_cur.execute("PRAGMA table_info(caja_diaria)").fetchall()}
-        tiene_caja_uuid = 'caja_uuid' in src_cols
-        tiene_pos_uuid = 'pos_uuid' in src_cols
-        # Detectar columnas en destino
+                _instantanea(origen_db_path, tmp_src, progreso)
+            except sqlite3.Error as e:
+                # Fallback: copia del archivo (con su -wal, que la huella también incluye)
+                _log(f"Backup del origen falló ({e}), se copia el archivo")
+                _borrar_temporal(tmp_src)
+                shutil.copy2(origen_db_path, tmp_src)
+                if os.path.exists(origen_db_path + '-wal'):
+                    shutil.copy2(origen_db_path + '-wal', tmp_src + '-wal')
+            try:
+                conn.execute("ATTACH DATABASE ? AS src", (_uri_solo_lectura(tmp_src),))
+            except sqlite3.OperationalError:
+                # SQLite sin URIs: adjuntar por ruta (es una copia temporal, igual no se escribe)
+                conn.execute("ATTACH DATABASE ? AS src", (tmp_src,))
+            adjuntada = True
         try:
-            dst_cols = {c[1] for c in dst_cur.execute("PRAGMA table_info(caja_diaria)").fetchall()}
-        except Exception:
-            dst_cols = set()
-        dst_tiene_caja_uuid = 'caja_uuid' in dst_cols
-        dst_tiene_pos_uuid = 'pos_uuid' in dst_cols
-        caja_map = {}
-
+            with transaction() as tx:
+                cur = tx.cursor()
+                # Origen normalizado como vistas temporales sobre src (sin copiarlo otra vez)
+                info = _normalizar(cur, cur, incluir_historial, completo, materializar=False)
+                cajas = _aplicar(cur, 'temp', info, resumen, incluir_historial, indice, huella)
+                _actualizar_resumenes(cur, cajas)
+        except BaseException:
+            # El ROLLBACK deshizo las filas que el índice ya tiene agregadas
+            if indice is not None:
+                indice.reiniciar()
+            raise
+        invalidar_snapshot()
+    finally:
+        _limpiar_conexion(conn, ('src',) if adjuntada else ())
         try:
-            src_cajas = src_cur.execute("SELECT * FROM caja_diaria").fetchall()
-            resumen["src_cajas"] = len(src_cajas)
-            _log(f"caja_diaria origen: {len(src_cajas)} filas, cols: {sorted(list(src_cols))}")
+            conn.close()
         except Exception:
-            src_cajas = []
+            pass
+        if tmp_src:
+            _borrar_temporal(tmp_src)
 
-        for r in src_cajas:
-            try:
-                # helpers
-                def getv(name, default=None):
-                    try:
-                        return r[name]
-                    except Exception:
-                        return default
-
-                src_id = getv('id')
-                values = {
-                    'caja_uuid': getv('caja_uuid'),
-                    'pos_uuid': getv('pos_uuid'),
-                    'codigo_caja': getv('codigo_caja'),
-                    'disciplina': getv('disciplina'),
-                    'fecha': getv('fecha'),
-                    'usuario_apertura': getv('usuario_apertura'),
-                    'hora_apertura': getv('hora_apertura'),
-                    'fondo_inicial': getv('fondo_inicial', 0),
-                    'observaciones_apertura': getv('observaciones_apertura'),
-                    'estado': getv('estado'),
-                    'hora_cierre': getv('hora_cierre'),
-                    'usuario_cierre': getv('usuario_cierre'),
-                    'apertura_dt': getv('apertura_dt'),
-                    'cierre_dt': getv('cierre_dt'),
-                    'total_ventas': getv('total_ventas'),
-                    'total_efectivo_teorico': getv('total_efectivo_teorico'),
-                    'conteo_efectivo_final': getv('conteo_efectivo_final'),
-                    'transferencias_final': getv('transferencias_final'),
-                    'ingresos': getv('ingresos'),
-                    'retiros': getv('retiros'),
-                    'diferencia': getv('diferencia'),
-                    'total_tickets': getv('total_tickets'),
-                    'obs_cierre': getv('obs_cierre'),
-                }
-
-                # Normalización de valores mínimos
-                # fecha/hora: si faltan, intentar parsear de apertura_dt (YYYY-MM-DD HH:MM:SS)
-                if not values['fecha'] and values['apertura_dt']:
-                    try:
-                        values['fecha'] = str(values['apertura_dt']).split(' ')[0]
-                    except Exception:
-                        pass
-                if not values['hora_apertura'] and values['apertura_dt']:
-                    try:
-                        values['hora_apertura'] = str(values['apertura_dt']).split(' ')[1]
-                    except Exception:
-                        pass
-                if not values['hora_apertura']:
-                    values['hora_apertura'] = '00:00:00'
-                if not values['usuario_apertura']:
-                    values['usuario_apertura'] = ''
-                # estado: asegurar valor permitido por CHECK
-                try:
-                    st = (values['estado'] or '').strip().lower()
-                    if st not in ('abierta','cerrada'):
-                        st = 'abierta'
-                    values['estado'] = st
-                except Exception:
-                    values['estado'] = 'abierta'
-
-                if tiene_caja_uuid and tiene_pos_uuid and dst_tiene_caja_uuid and dst_tiene_pos_uuid and values['caja_uuid']:
-                    # Insert por UUID
-                    try:
-                        dst_cur.execute(
-                            """
-                            INSERT OR IGNORE INTO caja_diaria (
-                                caja_uuid, pos_uuid, codigo_caja, disciplina, fecha, usuario_apertura, hora_apertura,
-                                fondo_inicial, observaciones_apertura, estado, hora_cierre, usuario_cierre, apertura_dt, cierre_dt,
-                                total_ventas, total_efectivo_teorico, conteo_efectivo_final, transferencias_final, ingresos, retiros,
-                                diferencia, total_tickets, obs_cierre
-                            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                            """,
-                            (
-                                values['caja_uuid'], values['pos_uuid'], values['codigo_caja'], values['disciplina'], values['fecha'],
-                                values['usuario_apertura'], values['hora_apertura'], values['fondo_inicial'], values['observaciones_apertura'], values['estado'],
-                                values['hora_cierre'], values['usuario_cierre'], values['apertura_dt'], values['cierre_dt'], values['total_ventas'],
-                                values['total_efectivo_teorico'], values['conteo_efectivo_final'], values['transferencias_final'], values['ingresos'], values['retiros'],
-                                values['diferencia'], values['total_tickets'], values['obs_cierre']
-                            )
-                        )
-                        if dst_cur.rowcount == 1:
-                            resumen['cajas_nuevas'] += 1
-                    except Exception as e:
-                        _log(f"Error insert caja UUID {values.get('caja_uuid')}: {e}")
-                        pass
-                    # Obtener id local por UUID
-                    dst_id = None
-                    try:
-                        dst_id = dst_cur.execute("SELECT id FROM caja_diaria WHERE caja_uuid=?", (values['caja_uuid'],)).fetchone()
-                        dst_id = dst_id[0] if dst_id else None
-                    except Exception:
-                        dst_id = None
-                else:
-                    # Fallback: dedupe por (codigo_caja, fecha, hora_apertura)
-                    try:
-                        exists = dst_cur.execute(
-                            "SELECT id FROM caja_diaria WHERE codigo_caja=? AND fecha=? AND hora_apertura=? LIMIT 1",
-                            (values['codigo_caja'], values['fecha'], values['hora_apertura'])
-                        ).fetchone()
-                        if not exists:
-                            dst_cur.execute(
-                                """
-                                INSERT INTO caja_diaria (
-                                    codigo_caja, disciplina, fecha, usuario_apertura, hora_apertura,
-                                    fondo_inicial, observaciones_apertura, estado, hora_cierre, usuario_cierre, apertura_dt, cierre_dt,
-                                    total_ventas, total_efectivo_teorico, conteo_efectivo_final, transferencias_final, ingresos, retiros,
-                                    diferencia, total_tickets, obs_cierre
-                                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                                """,
-                                (
-                                    values['codigo_caja'], values['disciplina'], values['fecha'], values['usuario_apertura'], values['hora_apertura'],
-                                    values['fondo_inicial'], values['observaciones_apertura'], values['estado'], values['hora_cierre'], values['usuario_cierre'], values['apertura_dt'], values['cierre_dt'],
-                                    values['total_ventas'], values['total_efectivo_teorico'], values['conteo_efectivo_final'], values['transferencias_final'], values['ingresos'], values['retiros'],
-                                    values['diferencia'], values['total_tickets'], values['obs_cierre']
-                                )
-                            )
-                            resumen['cajas_nuevas'] += 1
-                            dst_id = int(dst_cur.lastrowid)
-                        else:
-                            dst_id = int(exists[0])
-                    except Exception as e:
-                        _log(f"Error insert caja triple {values.get('codigo_caja')} {values.get('fecha')} {values.get('hora_apertura')}: {e}")
-                        pass
-                    # Obtener id local por triple clave
-                    dst_id = None
-                    try:
-                        dst_id = dst_cur.execute(
-                            "SELECT id FROM caja_diaria WHERE codigo_caja=? AND fecha=? AND hora_apertura=? LIMIT 1",
-                            (values['codigo_caja'], values['fecha'], values['hora_apertura'])
-                        ).fetchone()
-                        dst_id = dst_id[0] if dst_id else None
-                    except Exception:
-                        dst_id = None
-
-                if src_id is not None and dst_id is not None:
-                    caja_map[int(src_id)] = int(dst_id)
-            except Exception as e:
-                _log(f"Error procesando caja src_id={getv('id')}: {e}")
-                pass
+    return resumen
 
-        if incluir_historial:
-            # Ya hicimos categorías y productos arriba, tenemos src_prod_map y local_prod_to_cat disponibles
 
-            # 6) Importar ventas
-            venta_map = {}
-            try:
-                # Traer metodo_pago_id si existe en origen
-                src_cols_v = {c[1] for c in src_cur.execute("PRAGMA table_info(ventas)").fetchall()}
-                if 'metodo_pago_id' in src_cols_v:
-                    src_ventas = src_cur.execute("SELECT id, fecha_hora, total_venta, status, activo, caja_id, metodo_pago_id FROM ventas").fetchall()
-                else:
-                    src_ventas = src_cur.execute("SELECT id, fecha_hora, total_venta, status, activo, caja_id, NULL as metodo_pago_id FROM ventas").fetchall()
-                resumen["src_ventas"] = len(src_ventas)
-            except Exception:
-                src_ventas = []
-            for v in src_ventas:
-                try:
-                    sid, fecha_hora, total_venta, status, activo, src_caja_id, src_mp_id = v
-                    dst_caja_id = caja_map.get(int(src_caja_id))
-                    if not dst_caja_id:
-                        continue
-                    # Normalizar status venta
-                    status = _normalize_venta_status(status)
-                    # Mapear método de pago si está
-                    metodo_pago_id = None
-                    if src_mp_id is not None and 'mp_src_to_dst' in locals():
-                        metodo_pago_id = mp_src_to_dst.get(int(src_mp_id))
-                    # buscar existente
-                    row = dst_cur.execute(
-                        "SELECT id FROM ventas WHERE fecha_hora=? AND ABS(total_venta-?)<0.0001 AND caja_id=? LIMIT 1",
-                        (fecha_hora, total_venta, dst_caja_id)
-                    ).fetchone()
-                    if row:
-                        dst_id = int(row[0])
-                        # Completar datos faltantes si corresponde
-                        try:
-                            cur_row = dst_cur.execute("SELECT status, metodo_pago_id FROM ventas WHERE id=?", (dst_id,)).fetchone()
-                            cur_status = cur_row[0] if cur_row else None
-                            cur_mp = cur_row[1] if cur_row else None
-                            # Setear método de pago si está vacío en destino y tenemos uno válido
-                            if cur_mp is None and metodo_pago_id is not None:
-                                dst_cur.execute("UPDATE ventas SET metodo_pago_id=? WHERE id=?", (metodo_pago_id, dst_id))
-                            # Normalizar status si está vacío en destino
-                            if (cur_status is None or str(cur_status).strip() == '') and status:
-                                dst_cur.execute("UPDATE ventas SET status=? WHERE id=?", (status, dst_id))
-                        except Exception as e:
-                            _log(f"Warning: no se pudo actualizar venta existente id={dst_id}: {e}")
-                    else:
-                        if metodo_pago_id is not None:
-                            dst_cur.execute(
-                                "INSERT INTO ventas (fecha_hora, total_venta, status, activo, metodo_pago_id, caja_id) VALUES (?,?,?,?,?,?)",
-                                (fecha_hora, total_venta, status, activo, metodo_pago_id, dst_caja_id)
-                            )
-                        else:
-                            dst_cur.execute(
-                                "INSERT INTO ventas (fecha_hora, total_venta, status, activo, metodo_pago_id, caja_id) VALUES (?,?,?,?,NULL,?)",
-                                (fecha_hora, total_venta, status, activo, dst_caja_id)
-                            )
-                        dst_id = int(dst_cur.lastrowid)
-                        resumen['ventas_nuevas'] += 1
-                    venta_map[int(sid)] = dst_id
-                except Exception as e:
-                    _log(f"Error insert venta sid={sid}: {e}")
-                    pass
+def import_many(origenes, incluir_historial: bool = True, indice=None, completo: bool = False,
+                inmutable=None, max_workers=None, progreso=None) -> dict:
+    """Combina varias bases (p. ej. las de todas las cajas de un torneo) en una sola transacción.
 
-            # 7) Importar tickets
-            ticket_map = {}
-            try:
-                src_tickets = src_cur.execute("SELECT id, venta_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket FROM tickets").fetchall()
-                resumen["src_tickets"] = len(src_tickets)
-            except Exception:
-                src_tickets = []
-            for t in src_tickets:
-                try:
-                    sid, src_venta_id, src_prod_id, fecha_hora, status, total_ticket, ident = t
-                    dst_venta_id = venta_map.get(int(src_venta_id))
-                    if not dst_venta_id:
-                        continue
-                    # Normalizar status ticket
-                    status = _normalize_ticket_status(status)
-                    dst_prod_id = None
-                    dst_cat_id = None
-                    if src_prod_id is not None and 'src_prod_map' in locals():
-                        dst_prod_id = src_prod_map.get(int(src_prod_id))
-                        if dst_prod_id is not None:
-                            # Si el producto local no tiene categoría, dejar NULL (no 0)
-                            dst_cat_id = local_prod_to_cat.get(dst_prod_id)
-                            if not dst_cat_id:
-                                dst_cat_id = None
-                            else:
-                                # Validar que la categoría existe en la tabla local; si no, dejar NULL
-                                try:
-                                    exists = dst_cur.execute("SELECT 1 FROM Categoria_Producto WHERE id=?", (dst_cat_id,)).fetchone()
-                                    if not exists:
-                                        dst_cat_id = None
-                                except Exception:
-                                    dst_cat_id = None
-                    # dedupe por identificador + fecha_hora
-                    row = dst_cur.execute(
-                        "SELECT id FROM tickets WHERE identificador_ticket=? AND fecha_hora=? LIMIT 1",
-                        (ident, fecha_hora)
-                    ).fetchone()
-                    if row:
-                        dst_id = int(row[0])
-                        # Si ya existía, intentar actualizar status si está vacío o 'No impreso' y en origen viene algo
-                        try:
-                            cur_row = dst_cur.execute("SELECT status FROM tickets WHERE id=?", (dst_id,)).fetchone()
-                            cur_status = cur_row[0] if cur_row else None
-                            if (cur_status is None or str(cur_status).strip() in ('', 'No impreso')) and (status and str(status).strip() != ''):
-                                dst_cur.execute("UPDATE tickets SET status=? WHERE id=?", (status, dst_id))
-                        except Exception as e:
-                            _log(f"Warning: no se pudo actualizar ticket existente id={dst_id}: {e}")
-                    else:
-                        dst_cur.execute(
-                            "INSERT INTO tickets (venta_id, categoria_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket) VALUES (?,?,?,?,?,?,?)",
-                            (dst_venta_id, dst_cat_id, dst_prod_id, fecha_hora, status, total_ticket, ident)
-                        )
-                        dst_id = int(dst_cur.lastrowid)
-                        resumen['tickets_nuevos'] += 1
-                    ticket_map[int(sid)] = dst_id
-                except Exception as e:
-                    try:
-                        _log(
-                            f"Error insert ticket sid={sid}: {e} | venta_id_dst={locals().get('dst_venta_id')} "
-                            f"prod_id_dst={locals().get('dst_prod_id')} cat_id_dst={locals().get('dst_cat_id')} ident={locals().get('ident')} fecha={locals().get('fecha_hora')}"
-                        )
-                    except Exception:
-                        _log(f"Error insert ticket sid={sid}: {e}")
-                    pass
-
-            # 6) Importar items
+    Cada origen se lee y normaliza en un pool de hilos (_preparar_origen: huella, marcas de agua,
+    estados, claves de descripciones y productos) a una base intermedia en import_tmp; después
+    el hilo que llama (el escritor) las adjunta y las aplica en orden con _aplicar, todas dentro
+    de la misma transacción: si una falla no queda ninguna a medias.
+
+    Devuelve el resumen de import_from_db sumado, más "origenes": [(ruta, resumen), ...] en el
+    orden recibido. sin_cambios es True sólo si no cambió ninguno.
+    progreso(listos, total): orígenes ya normalizados (se llama desde los hilos del pool).
+    """
+    rutas = list(dict.fromkeys(os.path.abspath(r) for r in origenes))
+    if not rutas:
+        raise ValueError("No se indicó ninguna base para importar.")
+    for ruta in rutas:
+        _validar_origen(ruta)
+    conn = get_connection()
+    try:
+        limite = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except (AttributeError, sqlite3.Error):
+        limite = 10
+    if len(rutas) > limite:
+        conn.close()
+        raise ValueError(f"Se pueden combinar hasta {limite} bases por vez.")
+    _limpiar_temporales(os.path.dirname(_ruta_temporal()))
+
+    listos = [0]
+    lock = threading.Lock()
+
+    def _preparar(ruta):
+        preparado = _preparar_origen(ruta, incluir_historial, completo, inmutable)
+        with lock:
+            listos[0] += 1
+            hechos = listos[0]
+        if progreso is not None:
             try:
-                src_items = src_cur.execute("SELECT ticket_id, producto_id, cantidad, precio_unitario, subtotal FROM venta_items").fetchall()
-                resumen["src_items"] = len(src_items)
+                progreso(hechos, len(rutas))
             except Exception:
-                src_items = []
-            for it in src_items:
+                pass
+        return preparado
+
+    preparados = []
+    adjuntas = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or min(len(rutas), os.cpu_count() or 4)) as pool:
+            futuros = [pool.submit(_preparar, ruta) for ruta in rutas]
+            errores = []
+            for futuro in futuros:
                 try:
-                    src_ticket_id, src_prod_id, cantidad, precio_unitario, subtotal = it
-                    dst_ticket_id = ticket_map.get(int(src_ticket_id))
-                    if not dst_ticket_id:
-                        continue
-                    dst_prod_id = None
-                    if src_prod_id is not None and 'src_prod_map' in locals():
-                        dst_prod_id = src_prod_map.get(int(src_prod_id))
-                    # dedupe: comparar por valores
-                    row = None
-                    try:
-                        if dst_prod_id is not None:
-                            row = dst_cur.execute(
-                                """
-                                SELECT 1 FROM venta_items 
-                                 WHERE ticket_id=? AND cantidad=? 
-                                   AND ABS(precio_unitario-?)<0.0001 AND ABS(subtotal-?)<0.0001
-                                   AND producto_id=?
-                                 LIMIT 1
-                                """,
-                                (dst_ticket_id, cantidad, precio_unitario, subtotal, dst_prod_id)
-                            ).fetchone()
-                        else:
-                            row = dst_cur.execute(
-                                """
-                                SELECT 1 FROM venta_items 
-                                 WHERE ticket_id=? AND cantidad=? 
-                                   AND ABS(precio_unitario-?)<0.0001 AND ABS(subtotal-?)<0.0001
-                                 LIMIT 1
-                                """,
-                                (dst_ticket_id, cantidad, precio_unitario, subtotal)
-                            ).fetchone()
-                    except Exception:
-                        row = None
-                    if row:
-                        continue
-                    dst_cur.execute(
-                        "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?,?,?,?,?)",
-                        (dst_ticket_id, dst_prod_id, cantidad, precio_unitario, subtotal)
-                    )
-                    resumen['items_nuevos'] += 1
+                    preparados.append(futuro.result())
                 except Exception as e:
-                    _log(f"Error insert item ticket_id={src_ticket_id}: {e}")
-                    pass
+                    errores.append(e)
+            if errores:
+                raise errores[0]
 
-        # commit final
-        dst_conn.commit()
+        resumen = _resumen_vacio()
+        resumen["origenes"] = []
+        _registrar_funciones(conn)
+        # ATTACH no puede ir dentro de una transacción: todas antes de BEGIN
+        for i, preparado in enumerate(preparados):
+            if preparado['intermedia']:
+                conn.execute(f"ATTACH DATABASE ? AS stg{i}", (_uri_solo_lectura(preparado['intermedia']),))
+                adjuntas.append(f"stg{i}")
+        try:
+            with transaction() as tx:
+                cur = tx.cursor()
+                cajas = set()
+                for i, preparado in enumerate(preparados):
+                    parcial = _resumen_vacio()
+                    if preparado['intermedia']:
+                        cajas |= _aplicar(cur, f"stg{i}", preparado['info'], parcial, incluir_historial, indice,
+                                          preparado['huella'])
+                    else:
+                        parcial["sin_cambios"] = True
+                    resumen["origenes"].append((preparado['ruta'], parcial))
+                    for clave, valor in parcial.items():
+                        if not isinstance(valor, bool):
+                            resumen[clave] += valor
+                _actualizar_resumenes(cur, cajas)
+        except BaseException:
+            if indice is not None:
+                indice.reiniciar()
+            raise
+        parciales = [p for _, p in resumen["origenes"]]
+        resumen["sin_cambios"] = all(p["sin_cambios"] for p in parciales)
+        resumen["incremental"] = any(p["incremental"] for p in parciales)
+        invalidar_snapshot()
     finally:
-        # limpiar
+        _limpiar_conexion(conn, adjuntas)
         try:
-            if src_conn:
-                src_conn.close()
+            conn.close()
         except Exception:
             pass
+        for preparado in preparados:
+            if preparado['intermedia']:
+                _borrar_temporal(preparado['intermedia'])
+    return resumen
+
+
+def _preparar_origen(ruta: str, incluir_historial: bool, completo: bool, inmutable) -> dict:
+    """Lee un origen y deja sus filas normalizadas (norm_*) en una base intermedia de import_tmp.
+
+    Corre en un hilo del pool de import_many: no escribe la base local, sólo lee sus marcas.
+    Todo se lee dentro de una transacción, así el origen se ve consistente aunque otro proceso
+    lo esté escribiendo. Devuelve {'ruta', 'huella', 'intermedia' (None si no cambió), 'info'}.
+    """
+    preparado = {'ruta': ruta, 'huella': _huella_archivo(ruta), 'intermedia': None, 'info': None}
+    app = open_connection()
+    try:
+        if incluir_historial and not completo and _ya_importado(app, preparado['huella']):
+            _log(f"La base origen {ruta} no cambió desde la última importación")
+            return preparado
+        intermedia = _ruta_temporal()
+        stg = sqlite3.connect(intermedia, isolation_level=None)
         try:
-            if dst_conn:
-                dst_conn.close()
-        except Exception:
-            pass
+            # Archivo descartable: sin diario ni fsync
+            stg.execute("PRAGMA journal_mode = OFF")
+            stg.execute("PRAGMA synchronous = OFF")
+            _registrar_funciones(stg)
+            if not (_abrir_inmutable(ruta, inmutable) and _adjuntar_inmutable(stg, ruta)):
+                try:
+                    stg.execute("ATTACH DATABASE ? AS src", (_uri_solo_lectura(ruta),))
+                except sqlite3.OperationalError:
+                    stg.execute("ATTACH DATABASE ? AS src", (ruta,))
+            stg.execute("BEGIN")
+            preparado['info'] = _normalizar(stg.cursor(), app, incluir_historial, completo, materializar=True)
+            stg.execute("COMMIT")
+            stg.execute("DETACH DATABASE src")
+        except BaseException:
+            stg.close()
+            _borrar_temporal(intermedia)
+            raise
+        stg.close()
+        preparado['intermedia'] = intermedia
+        return preparado
+    finally:
+        app.close()
+
+
+def _normalizar(cur, app, incluir_historial: bool, completo: bool, materializar: bool) -> dict:
+    """Arma norm_* con las filas de src.* ya normalizadas y sólo con lo que hay que leer.
+
+    Sólo lee el origen (y las marcas de agua con app, conexión a la base local): con
+    materializar=True crea tablas en la base de cur (la intermedia de _preparar_origen), si no
+    vistas temporales. Devuelve lo que _aplicar necesita saber del origen.
+    """
+    tablas = _tablas_origen(cur)
+    info = {'tablas': tablas, 'pos_uuid': None, 'col_categoria': None, 'incremental': False,
+            'marcas': dict.fromkeys(_TABLAS_INCREMENTALES, 0), 'claves': {}, 'conteos': {}}
+    conteos = info['conteos']
+
+    def _crear(nombre, select):
+        if materializar:
+            cur.execute(f"CREATE TABLE main.{nombre} AS {select}")
+        else:
+            cur.execute(f"CREATE TEMP VIEW {nombre} AS {select}")
+        return int(cur.execute(f"SELECT COUNT(*) FROM {nombre}").fetchone()[0])
+
+    # Marcas de agua del equipo origen (sólo para el historial)
+    if incluir_historial:
+        info['pos_uuid'] = _pos_origen(cur, tablas)
+    marcas = {}
+    if info['pos_uuid'] and not completo:
         try:
-            if os.path.exists(tmp_src):
-                os.remove(tmp_src)
-        except Exception:
-            pass
+            marcas, info['claves'] = _leer_marcas(cur, app, info['pos_uuid'], tablas)
+        except sqlite3.Error as e:
+            _log(f"No se pudieron validar las marcas de {info['pos_uuid']}: {e}")
+    ventanas = _ventanas(marcas)
+    info['marcas'].update(marcas)
+    info['incremental'] = bool(ventanas)
 
-    return resumen
+    if 'pos' in tablas:
+        conteos["src_pos"] = _crear('norm_pos', "SELECT pos_uuid, nombre, device_id, hostname, created_at FROM src.pos")
+
+    if 'Categoria_Producto' in tablas:
+        # Detectar nombre de columna en origen: 'descripcion' o 'nombre'
+        cat_cols = _columnas(cur, 'src', 'Categoria_Producto')
+        col = 'descripcion' if 'descripcion' in cat_cols else ('nombre' if 'nombre' in cat_cols else None)
+        if col:
+            info['col_categoria'] = col
+            conteos["src_categorias"] = _crear(
+                'norm_categoria', f"SELECT id AS src_id, _clave({col}) AS clave, {col} AS descripcion FROM src.Categoria_Producto"
+            )
+        else:
+            _log("Categoria_Producto sin columna de nombre reconocida (descripcion/nombre)")
+
+    if 'metodos_pago' in tablas:
+        _crear('norm_metodo_pago', "SELECT id AS src_id, _clave(descripcion) AS clave, descripcion FROM src.metodos_pago")
+
+    if 'products' in tablas:
+        cols = _columnas(cur, 'src', 'products')
+        expr = {c: (f"p.{c}" if c in cols else "NULL") for c in ('codigo_producto', 'precio_compra', 'stock_actual', 'stock_minimo', 'visible', 'color')}
+        conteos["src_products"] = _crear('norm_producto', f'''
+        SELECT p.id AS src_id, _clave({expr['codigo_producto']}) AS clave_codigo, _clave(p.nombre) AS clave_nombre,
+               {expr['codigo_producto']} AS codigo_producto, p.nombre AS nombre,
+               CASE WHEN {expr['precio_compra']} THEN {expr['precio_compra']} ELSE 0 END AS precio_compra,
+               CASE WHEN p.precio_venta THEN p.precio_venta ELSE 0 END AS precio_venta,
+               CASE WHEN {expr['stock_actual']} THEN {expr['stock_actual']} ELSE 0 END AS stock_actual,
+               CASE WHEN {expr['stock_minimo']} THEN {expr['stock_minimo']} ELSE 3 END AS stock_minimo,
+               p.categoria_id AS categoria_id, COALESCE({expr['visible']}, 1) AS visible, {expr['color']} AS color
+          FROM src.products p
+        ''')
+
+    if 'caja_diaria' in tablas:
+        conteos["src_cajas"] = _crear('norm_caja', _select_cajas(cur, ventanas))
+
+    if incluir_historial:
+        if 'ventas' in tablas:
+            mp = "v.metodo_pago_id" if 'metodo_pago_id' in _columnas(cur, 'src', 'ventas') else "NULL"
+            conteos["src_ventas"] = _crear('norm_venta', f'''
+            SELECT v.id AS src_id, v.caja_id AS caja_id, v.fecha_hora AS fecha_hora, v.total_venta AS total_venta,
+                   _estado_venta(v.status) AS status, v.activo AS activo, {mp} AS metodo_pago_id
+              FROM src.ventas v
+            {_filtro(ventanas, 'ventas')}
+            ''')
+        if 'tickets' in tablas:
+            conteos["src_tickets"] = _crear('norm_ticket', f'''
+            SELECT t.id AS src_id, t.venta_id AS venta_id, t.producto_id AS producto_id, t.fecha_hora AS fecha_hora,
+                   _estado_ticket(t.status) AS status, t.total_ticket AS total_ticket,
+                   t.identificador_ticket AS identificador_ticket
+              FROM src.tickets t
+            {_filtro(ventanas, 'tickets')}
+            ''')
+        if 'venta_items' in tablas:
+            conteos["src_items"] = _crear('norm_item', f'''
+            SELECT vi.rowid AS src_id, vi.ticket_id AS ticket_id, vi.producto_id AS producto_id, vi.cantidad AS cantidad,
+                   vi.precio_unitario AS precio_unitario, vi.subtotal AS subtotal
+              FROM src.venta_items vi
+            {_filtro(ventanas, 'venta_items')}
+            ''')
+    return info
+
+
+def _select_cajas(cur, ventanas: dict) -> str:
+    """SELECT de norm_caja: columnas de _COLUMNAS_CAJA con valores mínimos normalizados."""
+    cols = _columnas(cur, 'src', 'caja_diaria')
+    _log(f"caja_diaria origen: {_contar(cur, 'caja_diaria')} filas, cols: {sorted(cols)}")
+    expr = {c: (f"c.{c}" if c in cols else "NULL") for c in _COLUMNAS_CAJA}
+    if 'fondo_inicial' not in cols:
+        expr['fondo_inicial'] = "0"
+    tiene_uuid = 'caja_uuid' in cols and 'pos_uuid' in cols
+    # Clave de la fila para las marcas de agua, tal como está en el origen (ver _leer_marcas)
+    clave_marca = "c.fecha || ' ' || c.hora_apertura" if {'fecha', 'hora_apertura'} <= cols else "NULL"
+    ap = expr['apertura_dt']
+    # Normalización de valores mínimos: fecha/hora desde apertura_dt (YYYY-MM-DD HH:MM:SS) si faltan,
+    # usuario vacío y estado permitido por el CHECK
+    expr['fecha'] = (
+        f"CASE WHEN COALESCE({expr['fecha']}, '') = '' AND COALESCE({ap}, '') <> '' "
+        f"THEN CASE WHEN instr({ap}, ' ') > 0 THEN substr({ap}, 1, instr({ap}, ' ') - 1) ELSE {ap} END "
+        f"ELSE {expr['fecha']} END"
+    )
+    expr['hora_apertura'] = (
+        f"COALESCE(NULLIF(CASE WHEN COALESCE({expr['hora_apertura']}, '') = '' AND instr(COALESCE({ap}, ''), ' ') > 0 "
+        f"THEN substr({ap}, instr({ap}, ' ') + 1) ELSE {expr['hora_apertura']} END, ''), '00:00:00')"
+    )
+    expr['usuario_apertura'] = f"COALESCE({expr['usuario_apertura']}, '')"
+    expr['estado'] = f"CASE WHEN _clave({expr['estado']}) IN ('abierta', 'cerrada') THEN _clave({expr['estado']}) ELSE 'abierta' END"
+    usa_uuid = f"(COALESCE({expr['caja_uuid']}, '') <> '')" if tiene_uuid else "0"
+    columnas = ', '.join(f"{expr[c]} AS {c}" for c in _COLUMNAS_CAJA)
+    return (
+        f"SELECT c.id AS src_id, {usa_uuid} AS usa_uuid, {columnas}, {clave_marca} AS clave_marca "
+        f"FROM src.caja_diaria c {_filtro(ventanas, 'caja_diaria')}"
+    )
+
+
+def _aplicar(cur, esquema: str, info: dict, resumen: dict, incluir_historial: bool, indice=None, huella=None) -> set:
+    """Vuelca {esquema}.norm_* (ver _normalizar) sobre main.*, dentro de la transacción del llamador.
+
+    huella: sha256 del origen, se guarda con las marcas de agua (con completo=True las marcas
+    no se usaron para leer, pero igual se actualizan para la próxima).
+    Devuelve los ids locales de las cajas que recibieron datos.
+    """
+    for tabla in _TABLAS_TEMP:
+        cur.execute(f"DROP TABLE IF EXISTS temp.{tabla}")
+    tablas = info['tablas']
+    resumen.update(info['conteos'])
+    resumen["incremental"] = info['incremental']
+
+    def _hay(tabla):
+        return esquema if tabla in tablas else None
+
+    # 1) Importar POS si existe
+    if 'pos' in tablas:
+        try:
+            cur.execute(
+                "INSERT OR IGNORE INTO main.pos (pos_uuid, nombre, device_id, hostname, created_at) "
+                f"SELECT pos_uuid, nombre, device_id, hostname, created_at FROM {esquema}.norm_pos"
+            )
+            resumen["pos_nuevos"] = max(0, cur.rowcount)
+        except sqlite3.Error as e:
+            _log(f"Error importando pos: {e}")
+
+    # 2) Importar CATEGORÍAS primero
+    resumen["categorias_nuevas"] = _mapear_descripciones(
+        cur, 'imp_categoria', 'Categoria_Producto', esquema if info['col_categoria'] else None, 'norm_categoria'
+    )
+
+    # 3) Importar/asegurar MÉTODOS DE PAGO antes de ventas/tickets
+    _mapear_descripciones(cur, 'imp_metodo_pago', 'metodos_pago', _hay('metodos_pago'), 'norm_metodo_pago')
+
+    # 4) Importar/asegurar PRODUCTOS antes de ventas/tickets
+    resumen["productos_nuevos"] = _mapear_productos(cur, _hay('products'))
+
+    # 5) Importar cajas (caja_diaria)
+    # (con marcas de agua, los src_* de historial cuentan sólo las filas leídas)
+    resumen["cajas_nuevas"] = _importar_cajas(cur, _hay('caja_diaria'), indice)
+
+    if incluir_historial:
+        # 6) Ventas, 7) tickets y 8) items, cada uno sobre los ids ya re-mapeados del anterior
+        resumen["ventas_nuevas"] = _importar_ventas(cur, _hay('ventas'), indice)
+        resumen["tickets_nuevos"] = _importar_tickets(cur, _hay('tickets'), indice)
+        resumen["items_nuevos"] = _importar_items(cur, _hay('venta_items'), indice)
+        if info['pos_uuid']:
+            try:
+                _guardar_marcas(cur, esquema, info, huella)
+            except sqlite3.Error as e:
+                _log(f"Error guardando marcas de importación de {info['pos_uuid']}: {e}")
+
+    return {r[0] for r in cur.execute("SELECT dst_id FROM imp_caja WHERE dst_id IS NOT NULL").fetchall()}
+
+
+def _actualizar_resumenes(cur, cajas: set):
+    """Resumen de las cajas cerradas que recibieron datos y ventas_diarias de sus fechas."""
+    try:
+        guardar_resumenes(cur, cajas)
+    except Exception as e:
+        _log(f"Error actualizando caja_resumen: {e}")
+    try:
+        reconstruir_ventas_diarias(cur, cajas)
+    except Exception as e:
+        _log(f"Error actualizando ventas_diarias: {e}")
+
+
+def _ultimo_id(cur, tabla: str) -> int:
+    return cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM main.{tabla}").fetchone()[0]
+
+
+def _resolver(cur, indice, tabla: str, sql: str):
+    """Completa dst_id en imp_*: con el UPDATE de sql, o en memoria si hay ImportIndex."""
+    if indice is None:
+        cur.execute(sql)
+    else:
+        indice.resolver(cur, tabla)
+
+
+def _mapear_descripciones(cur, temp: str, tabla: str, esquema, norm: str) -> int:
+    """temp(src_id, clave, descripcion, dst_id) para una tabla de descripciones; crea las que faltan.
+
+    Lee {esquema}.{norm} (None: el origen no tiene la tabla o la columna de descripción).
+    Devuelve cuántas filas nuevas se insertaron en main.<tabla>.
+    """
+    cur.execute(f"CREATE TEMP TABLE {temp} (src_id INTEGER PRIMARY KEY, clave TEXT, descripcion TEXT, dst_id INTEGER)")
+    if esquema is None:
+        return 0
+    cur.execute(f"INSERT INTO {temp} (src_id, clave, descripcion) SELECT src_id, clave, descripcion FROM {esquema}.{norm} WHERE clave <> ''")
+    resolver = (
+        f"UPDATE {temp} SET dst_id = (SELECT MAX(d.id) FROM main.{tabla} d WHERE _clave(d.descripcion) = {temp}.clave) "
+        "WHERE dst_id IS NULL"
+    )
+    cur.execute(resolver)
+    # Una por descripción: las demás filas del origen con la misma quedan mapeadas a esa
+    cur.execute(
+        f"INSERT OR IGNORE INTO main.{tabla} (descripcion) SELECT descripcion FROM {temp} i "
+        f"WHERE dst_id IS NULL AND src_id = (SELECT MIN(src_id) FROM {temp} j WHERE j.clave = i.clave) ORDER BY src_id"
+    )
+    nuevas = max(0, cur.rowcount)
+    if nuevas:
+        cur.execute(resolver)
+    return nuevas
+
+
+def _mapear_productos(cur, esquema) -> int:
+    """imp_producto(src_id -> dst_id) por código y si no por nombre; inserta los que no están."""
+    cur.execute('''
+    CREATE TEMP TABLE imp_producto (
+        src_id INTEGER PRIMARY KEY, clave_codigo TEXT, clave_nombre TEXT,
+        codigo_producto, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, categoria_id, visible, color,
+        dst_id INTEGER
+    )
+    ''')
+    if esquema is None:
+        return 0
+    cur.execute(f'''
+    INSERT INTO imp_producto
+    SELECT p.src_id, p.clave_codigo, p.clave_nombre, p.codigo_producto, p.nombre, p.precio_compra, p.precio_venta,
+           p.stock_actual, p.stock_minimo, c.dst_id, p.visible, p.color, NULL
+      FROM {esquema}.norm_producto p
+      LEFT JOIN imp_categoria c ON c.src_id = p.categoria_id
+    ''')
+    # Claves de los productos locales (la última gana, como al indexarlos en un dict)
+    cur.execute("CREATE TEMP TABLE imp_clave_producto (id INTEGER PRIMARY KEY, codigo TEXT, nombre TEXT)")
+    cur.execute("CREATE INDEX temp.idx_imp_clave_producto_codigo ON imp_clave_producto(codigo)")
+    cur.execute("CREATE INDEX temp.idx_imp_clave_producto_nombre ON imp_clave_producto(nombre)")
+    cur.execute("INSERT INTO imp_clave_producto SELECT id, _clave(codigo_producto), _clave(nombre) FROM main.products")
+    resolver = '''
+    UPDATE imp_producto SET dst_id = COALESCE(
+        (SELECT MAX(k.id) FROM imp_clave_producto k WHERE imp_producto.clave_codigo <> '' AND k.codigo = imp_producto.clave_codigo),
+        (SELECT MAX(k.id) FROM imp_clave_producto k WHERE imp_producto.clave_nombre <> '' AND k.nombre = imp_producto.clave_nombre)
+    ) WHERE dst_id IS NULL
+    '''
+    cur.execute(resolver)
+    ultimo = _ultimo_id(cur, 'products')
+    # Uno por código/nombre nuevo: los siguientes del origen con el mismo código o nombre van a ese
+    cur.execute('''
+    INSERT OR IGNORE INTO main.products (codigo_producto, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, categoria_id, visible, color)
+    SELECT codigo_producto, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, categoria_id, visible, color
+      FROM imp_producto i
+     WHERE dst_id IS NULL
+       AND NOT EXISTS (
+           SELECT 1 FROM imp_producto j
+            WHERE j.dst_id IS NULL AND j.src_id < i.src_id
+              AND ((i.clave_codigo <> '' AND j.clave_codigo = i.clave_codigo)
+                   OR (i.clave_nombre <> '' AND j.clave_nombre = i.clave_nombre)))
+     ORDER BY src_id
+    ''')
+    nuevos = max(0, cur.rowcount)
+    if nuevos:
+        cur.execute("INSERT INTO imp_clave_producto SELECT id, _clave(codigo_producto), _clave(nombre) FROM main.products WHERE id > ?", (ultimo,))
+        cur.execute(resolver)
+    return nuevos
+
+
+def _importar_cajas(cur, esquema, indice=None) -> int:
+    """imp_caja(src_id -> dst_id): por caja_uuid, o por (codigo_caja, fecha, hora_apertura) si no tiene."""
+    columnas = ', '.join(_COLUMNAS_CAJA)
+    cur.execute(f"CREATE TEMP TABLE imp_caja (src_id INTEGER PRIMARY KEY, usa_uuid INTEGER, {columnas}, dst_id INTEGER)")
+    if esquema is None:
+        return 0
+    cur.execute(f"INSERT INTO imp_caja (src_id, usa_uuid, {columnas}) SELECT src_id, usa_uuid, {columnas} FROM {esquema}.norm_caja")
+    nuevas = 0
+    ultimo = _ultimo_id(cur, 'caja_diaria')
+    # Por UUID
+    cur.execute(
+        f"INSERT OR IGNORE INTO main.caja_diaria ({columnas}) SELECT {columnas} FROM imp_caja WHERE usa_uuid ORDER BY src_id"
+    )
+    nuevas += max(0, cur.rowcount)
+    # Fallback: dedupe por (codigo_caja, fecha, hora_apertura)
+    sin_uuid = [c for c in _COLUMNAS_CAJA if c not in ('caja_uuid', 'pos_uuid')]
+    cur.execute(f'''
+    INSERT OR IGNORE INTO main.caja_diaria ({', '.join(sin_uuid)})
+    SELECT {', '.join(sin_uuid)} FROM imp_caja i
+     WHERE NOT usa_uuid
+       AND NOT EXISTS (SELECT 1 FROM main.caja_diaria d
+                        WHERE d.codigo_caja = i.codigo_caja AND d.fecha = i.fecha AND d.hora_apertura = i.hora_apertura)
+       AND NOT EXISTS (SELECT 1 FROM imp_caja j
+                        WHERE NOT j.usa_uuid AND j.src_id < i.src_id
+                          AND j.codigo_caja = i.codigo_caja AND j.fecha = i.fecha AND j.hora_apertura = i.hora_apertura)
+     ORDER BY src_id
+    ''')
+    nuevas += max(0, cur.rowcount)
+    if indice is not None:
+        indice.cargar(cur, 'caja_diaria', desde_id=ultimo)
+    _resolver(cur, indice, 'caja_diaria', '''
+    UPDATE imp_caja SET dst_id = CASE WHEN usa_uuid
+        THEN (SELECT d.id FROM main.caja_diaria d WHERE d.caja_uuid = imp_caja.caja_uuid)
+        ELSE (SELECT MIN(d.id) FROM main.caja_diaria d
+               WHERE d.codigo_caja = imp_caja.codigo_caja AND d.fecha = imp_caja.fecha AND d.hora_apertura = imp_caja.hora_apertura)
+    END
+    ''')
+    omitidas = cur.execute("SELECT COUNT(*) FROM imp_caja WHERE dst_id IS NULL").fetchone()[0]
+    if omitidas:
+        _log(f"{omitidas} cajas del origen no se pudieron importar ni encontrar (se omiten con sus ventas)")
+    return nuevas
+
+
+def _importar_ventas(cur, esquema, indice=None) -> int:
+    """imp_venta(src_id -> dst_id) por (caja, fecha_hora, total); completa método de pago y status vacíos."""
+    cur.execute('''
+    CREATE TEMP TABLE imp_venta (
+        src_id INTEGER PRIMARY KEY, caja_id INTEGER, fecha_hora, total_venta, status, activo, metodo_pago_id,
+        caja_abierta INTEGER, dst_id INTEGER
+    )
+    ''')
+    if esquema is None:
+        return 0
+    # Sólo las ventas de cajas importadas/encontradas
+    cur.execute(f'''
+    INSERT INTO imp_venta (src_id, caja_id, fecha_hora, total_venta, status, activo, metodo_pago_id, caja_abierta)
+    SELECT v.src_id, c.dst_id, v.fecha_hora, v.total_venta, v.status, v.activo, m.dst_id, c.estado <> 'cerrada'
+      FROM {esquema}.norm_venta v
+      JOIN imp_caja c ON c.src_id = v.caja_id AND c.dst_id IS NOT NULL
+      LEFT JOIN imp_metodo_pago m ON m.src_id = v.metodo_pago_id
+    ''')
+    cur.execute("CREATE INDEX temp.idx_imp_venta_clave ON imp_venta(caja_id, fecha_hora)")
+    # Buscar existente (idx_ventas_caja_fecha_hora)
+    resolver = '''
+    UPDATE imp_venta SET dst_id = (
+        SELECT MIN(d.id) FROM main.ventas d
+         WHERE d.caja_id = imp_venta.caja_id AND d.fecha_hora = imp_venta.fecha_hora
+           AND ABS(d.total_venta - imp_venta.total_venta) < 0.0001)
+     WHERE dst_id IS NULL
+    '''
+    _resolver(cur, indice, 'ventas', resolver)
+    ultimo = _ultimo_id(cur, 'ventas')
+    cur.execute('''
+    INSERT OR IGNORE INTO main.ventas (fecha_hora, total_venta, status, activo, metodo_pago_id, caja_id)
+    SELECT fecha_hora, total_venta, status, activo, metodo_pago_id, caja_id FROM imp_venta i
+     WHERE dst_id IS NULL
+       AND NOT EXISTS (SELECT 1 FROM imp_venta j
+                        WHERE j.caja_id = i.caja_id AND j.fecha_hora = i.fecha_hora AND j.dst_id IS NULL
+                          AND ABS(j.total_venta - i.total_venta) < 0.0001 AND j.src_id < i.src_id)
+     ORDER BY src_id
+    ''')
+    nuevas = max(0, cur.rowcount)
+    if indice is not None:
+        indice.cargar(cur, 'ventas', desde_id=ultimo)
+    _resolver(cur, indice, 'ventas', resolver)
+    cur.execute("CREATE INDEX temp.idx_imp_venta_dst ON imp_venta(dst_id)")
+    # Completar datos faltantes si corresponde: método de pago vacío en destino, status vacío
+    cur.execute('''
+    UPDATE main.ventas SET metodo_pago_id = (
+        SELECT i.metodo_pago_id FROM imp_venta i WHERE i.dst_id = ventas.id AND i.metodo_pago_id IS NOT NULL ORDER BY i.src_id LIMIT 1)
+     WHERE metodo_pago_id IS NULL AND id IN (SELECT dst_id FROM imp_venta WHERE metodo_pago_id IS NOT NULL)
+    ''')
+    cur.execute('''
+    UPDATE main.ventas SET status = (SELECT i.status FROM imp_venta i WHERE i.dst_id = ventas.id ORDER BY i.src_id LIMIT 1)
+     WHERE (status IS NULL OR trim(status) = '') AND id IN (SELECT dst_id FROM imp_venta)
+    ''')
+    omitidas = cur.execute("SELECT COUNT(*) FROM imp_venta WHERE dst_id IS NULL").fetchone()[0]
+    if omitidas:
+        _log(f"{omitidas} ventas del origen no se pudieron insertar (se omiten con sus tickets)")
+    return nuevas
+
+
+def _importar_tickets(cur, esquema, indice=None) -> int:
+    """imp_ticket(src_id -> dst_id) por (identificador_ticket, fecha_hora); completa status sin imprimir."""
+    cur.execute('''
+    CREATE TEMP TABLE imp_ticket (
+        src_id INTEGER PRIMARY KEY, venta_id INTEGER, categoria_id INTEGER, producto_id INTEGER,
+        fecha_hora, status, total_ticket, identificador_ticket, caja_abierta INTEGER, dst_id INTEGER
+    )
+    ''')
+    if esquema is None:
+        return 0
+    # Categoría: la del producto local, si existe (si no, NULL)
+    cur.execute(f'''
+    INSERT INTO imp_ticket (src_id, venta_id, categoria_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket,
+                            caja_abierta)
+    SELECT t.src_id, v.dst_id, cat.id, p.dst_id, t.fecha_hora, t.status, t.total_ticket, t.identificador_ticket,
+           v.caja_abierta
+      FROM {esquema}.norm_ticket t
+      JOIN imp_venta v ON v.src_id = t.venta_id AND v.dst_id IS NOT NULL
+      LEFT JOIN imp_producto p ON p.src_id = t.producto_id
+      LEFT JOIN main.products lp ON lp.id = p.dst_id
+      LEFT JOIN main.Categoria_Producto cat ON cat.id = lp.categoria_id
+    ''')
+    cur.execute("CREATE INDEX temp.idx_imp_ticket_clave ON imp_ticket(identificador_ticket, fecha_hora)")
+    # dedupe por identificador + fecha_hora (idx_tickets_identificador_fecha_hora)
+    resolver = '''
+    UPDATE imp_ticket SET dst_id = (
+        SELECT MIN(d.id) FROM main.tickets d
+         WHERE d.identificador_ticket = imp_ticket.identificador_ticket AND d.fecha_hora = imp_ticket.fecha_hora)
+     WHERE dst_id IS NULL
+    '''
+    _resolver(cur, indice, 'tickets', resolver)
+    ultimo = _ultimo_id(cur, 'tickets')
+    cur.execute('''
+    INSERT OR IGNORE INTO main.tickets (venta_id, categoria_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket)
+    SELECT venta_id, categoria_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket FROM imp_ticket i
+     WHERE dst_id IS NULL AND identificador_ticket IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM imp_ticket j
+                        WHERE j.identificador_ticket = i.identificador_ticket AND j.fecha_hora = i.fecha_hora
+                          AND j.dst_id IS NULL AND j.src_id < i.src_id)
+     ORDER BY src_id
+    ''')
+    nuevos = max(0, cur.rowcount)
+    if indice is not None:
+        indice.cargar(cur, 'tickets', desde_id=ultimo)
+    _resolver(cur, indice, 'tickets', resolver)
+    # Sin identificador no hay clave para buscarlos: se insertan siempre, uno por uno para saber su id
+    sin_clave = cur.execute(
+        "SELECT src_id, venta_id, categoria_id, producto_id, fecha_hora, status, total_ticket FROM imp_ticket "
+        "WHERE identificador_ticket IS NULL ORDER BY src_id"
+    ).fetchall()
+    for src_id, *valores in sin_clave:
+        try:
+            cur.execute(
+                "INSERT INTO main.tickets (venta_id, categoria_id, producto_id, fecha_hora, status, total_ticket) VALUES (?,?,?,?,?,?)",
+                valores,
+            )
+        except sqlite3.IntegrityError as e:
+            _log(f"Error insert ticket sid={src_id}: {e}")
+            continue
+        cur.execute("UPDATE imp_ticket SET dst_id = ? WHERE src_id = ?", (cur.lastrowid, src_id))
+        nuevos += 1
+    cur.execute("CREATE INDEX temp.idx_imp_ticket_dst ON imp_ticket(dst_id)")
+    # Si ya existía con status vacío o 'No impreso', tomar el del origen (el primero que diga otra cosa)
+    cur.execute('''
+    UPDATE main.tickets SET status = (
+        SELECT i.status FROM imp_ticket i WHERE i.dst_id = tickets.id ORDER BY i.status = 'No impreso', i.src_id LIMIT 1)
+     WHERE (status IS NULL OR trim(status) IN ('', 'No impreso'))
+       AND id IN (SELECT dst_id FROM imp_ticket)
+    ''')
+    omitidos = cur.execute("SELECT COUNT(*) FROM imp_ticket WHERE dst_id IS NULL").fetchone()[0]
+    if omitidos:
+        _log(f"{omitidos} tickets del origen no se pudieron insertar (se omiten con sus items)")
+    return nuevos
+
+
+def _importar_items(cur, esquema, indice=None) -> int:
+    """Inserta los venta_items que no estén ya (mismo ticket, cantidad, precio, subtotal y producto)."""
+    cur.execute('''
+    CREATE TEMP TABLE imp_item (
+        src_id INTEGER PRIMARY KEY, ticket_id INTEGER, producto_id INTEGER, cantidad, precio_unitario, subtotal,
+        caja_abierta INTEGER
+    )
+    ''')
+    if esquema is None:
+        return 0
+    cur.execute(f'''
+    INSERT INTO imp_item
+    SELECT vi.src_id, t.dst_id, p.dst_id, vi.cantidad, vi.precio_unitario, vi.subtotal, t.caja_abierta
+      FROM {esquema}.norm_item vi
+      JOIN imp_ticket t ON t.src_id = vi.ticket_id AND t.dst_id IS NOT NULL
+      LEFT JOIN imp_producto p ON p.src_id = vi.producto_id
+    ''')
+    if indice is not None:
+        return indice.insertar_items(cur)
+    cur.execute("CREATE INDEX temp.idx_imp_item_ticket ON imp_item(ticket_id)")
+    # dedupe: comparar por valores (el producto sólo si se pudo mapear)
+    cur.execute('''
+    INSERT INTO main.venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal)
+    SELECT ticket_id, producto_id, cantidad, precio_unitario, subtotal FROM imp_item i
+     WHERE NOT EXISTS (SELECT 1 FROM main.venta_items d
+                        WHERE d.ticket_id = i.ticket_id AND d.cantidad = i.cantidad
+                          AND ABS(d.precio_unitario - i.precio_unitario) < 0.0001 AND ABS(d.subtotal - i.subtotal) < 0.0001
+                          AND (i.producto_id IS NULL OR d.producto_id = i.producto_id))
+       AND NOT EXISTS (SELECT 1 FROM imp_item j
+                        WHERE j.ticket_id = i.ticket_id AND j.src_id < i.src_id AND j.cantidad = i.cantidad
+                          AND ABS(j.precio_unitario - i.precio_unitario) < 0.0001 AND ABS(j.subtotal - i.subtotal) < 0.0001
+                          AND (i.producto_id IS NULL OR j.producto_id = i.producto_id))
+     ORDER BY src_id
+    ''')
+    return max(0, cur.rowcount)
@@ -0,0 +1,81 @@
+"""Rollup de ventas por día en la tabla ventas_diarias.
+
+Una fila por (fecha, caja, disciplina, producto, método de pago) con unidades e
+importe de los tickets no anulados y la cantidad de anulados. La venta y la
+anulación la actualizan dentro de su propia transacción; el resto de las
+escrituras (edición/borrado desde el historial, importación) reconstruyen las
+cajas afectadas con reconstruir(). El dashboard de KPIs lee sólo de acá.
+
+Las claves nulas se guardan como 0 / '' para que el UPSERT (ON CONFLICT) las
+agrupe: en SQLite dos NULL nunca chocan en una clave única.
+"""
+from __future__ import annotations
+
+from db_utils import transaction
+
+_SQL_UPSERT = """
+    INSERT INTO ventas_diarias (fecha, caja_id, disciplina, producto_id, metodo_pago_id, unidades, importe, anulados)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (fecha, caja_id, disciplina, producto_id, metodo_pago_id) DO UPDATE SET
+        unidades = unidades + excluded.unidades,
+        importe = importe + excluded.importe,
+        anulados = anulados + excluded.anulados
+"""
+
+_SQL_RECONSTRUIR = """
+    INSERT INTO ventas_diarias (fecha, caja_id, disciplina, producto_id, metodo_pago_id, unidades, importe, anulados)
+    SELECT COALESCE(t.fecha, substr(t.fecha_hora, 1, 10), ''), COALESCE(v.caja_id, 0), COALESCE(cd.disciplina, ''),
+           COALESCE(t.producto_id, 0), COALESCE(v.metodo_pago_id, 0),
+           SUM(CASE WHEN t.status!='Anulado' THEN 1 ELSE 0 END),
+           COALESCE(SUM(CASE WHEN t.status!='Anulado' THEN t.total_ticket END), 0),
+           SUM(CASE WHEN t.status='Anulado' THEN 1 ELSE 0 END)
+      FROM tickets t
+      JOIN ventas v ON v.id = t.venta_id
+      LEFT JOIN caja_diaria cd ON cd.id = v.caja_id
+     {where}
+     GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def registrar_venta(cursor, fecha, caja_id, disciplina, metodo_pago_id, items) -> None:
+    """Suma una venta al rollup. items: [(producto_id, unidades, importe)]."""
+    cursor.executemany(
+        _SQL_UPSERT,
+        [(fecha, caja_id or 0, disciplina or '', prod_id or 0, metodo_pago_id or 0, unidades, importe, 0)
+         for prod_id, unidades, importe in items],
+    )
+
+
+def registrar_anulacion(cursor, ticket_id) -> None:
+    """Pasa un ticket (recién anulado) de unidades/importe a anulados."""
+    cursor.execute(
+        """
+        SELECT COALESCE(t.fecha, substr(t.fecha_hora, 1, 10), ''), COALESCE(v.caja_id, 0), COALESCE(cd.disciplina, ''),
+               COALESCE(t.producto_id, 0), COALESCE(v.metodo_pago_id, 0), COALESCE(t.total_ticket, 0)
+          FROM tickets t
+          JOIN ventas v ON v.id = t.venta_id
+          LEFT JOIN caja_diaria cd ON cd.id = v.caja_id
+         WHERE t.id = ?
+        """,
+        (ticket_id,),
+    )
+    row = cursor.fetchone()
+    if row:
+        cursor.execute(_SQL_UPSERT, (*row[:5], -1, -row[5], 1))
+
+
+def reconstruir(cursor=None, caja_ids=None) -> None:
+    """Rearma el rollup desde tickets: todo, o sólo las cajas indicadas (0 = ventas sin caja)."""
+    if cursor is None:
+        with transaction() as conn:
+            return reconstruir(conn.cursor(), caja_ids)
+    if caja_ids is None:
+        cursor.execute("DELETE FROM ventas_diarias")
+        cursor.execute(_SQL_RECONSTRUIR.format(where=""))
+        return
+    ids = sorted({int(x or 0) for x in caja_ids})
+    if not ids:
+        return
+    marcas = ','.join('?' * len(ids))
+    cursor.execute(f"DELETE FROM ventas_diarias WHERE caja_id IN ({marcas})", ids)
+    cursor.execute(_SQL_RECONSTRUIR.format(where=f"WHERE COALESCE(v.caja_id, 0) IN ({marcas})"), ids)
@@ -1,7 +1,10 @@
+import inspect
 import tkinter as tk
 from tkinter import messagebox
 from db_utils import get_connection
 from theme import FONT_FAMILY, CART
+from indice_productos import IndiceProductos
+from monitor_cambios import get_monitor
 try:
     from theme import SALES_GRID as _SALES_GRID
 except Exception:
@@ -52,14 +55,38 @@ class VentasViewNew(tk.Frame):
         # Controller opcional para abrir vistas externas (menú principal, tickets, stock, etc.) ya extraído arriba
         self.productos = cargar_productos()
         self.stock_dict = {prod[0]: prod[3] for prod in self.productos}
-        self.carrito = []  # [id, nombre, precio, cantidad]
+        self._prod_por_id = {prod[0]: prod for prod in self.productos}
+        # Índice de prefijos para la búsqueda rápida (se rearma al recargar productos)
+        self._indice = IndiceProductos(self.productos)
+        # id -> [id, nombre, precio, cantidad], en el orden en que se agregaron
+        self.carrito = {}
+        # id -> fila del carrito; las filas se reutilizan y total se lleva al día con cada cambio
+        self._filas_carrito = {}
+        self.total = 0
         self.imprimir_ticket_var = tk.BooleanVar(value=True)
         self.modo_orden = tk.BooleanVar(value=False)
         self.productos_ordenados = None  # lista temporal cuando se activa Ordenar
+        # Grilla con ventana: pool de tarjetas reutilizables, productos a mostrar y primera fila visible
+        self._pool = []
+        self._tarjetas = {}
+        self._lista = None
+        self._productos_src = []
+        self._offset_filas = 0
+        self._filas_completas = 4
         self._build_layout()
         self._draw_productos()
         self._draw_carrito()
         self._bind_shortcuts()
+        # Stock y precios cambiados desde otro equipo (o por la venta recién guardada)
+        get_monitor().suscribir(self, ('products',), self._on_cambios)
+
+    def _on_cambios(self, _tablas):
+        if getattr(self, '_cobro_en_curso', False):
+            # La base ya puede tener descontada la venta y el carrito todavía no se vació:
+            # recargar cuando termine el cobro
+            self._recargar_pendiente = True
+            return
+        self._actualizar_productos()
 
     def _build_layout(self):
         self.config(bg="#F3F4F6")
@@ -119,49 +146,44 @@ class VentasViewNew(tk.Frame):
 
         # Cerrar caja
         tk.Button(top_actions, text="Cerrar caja", command=lambda: getattr(self.controller, 'cerrar_caja_window', lambda: None)(), bg="#E5E7EB", font=(FONT_FAMILY, 10)).pack(side="left", padx=8)
-        # Panel productos con scrollbar (canvas + frame interno)
+        # Búsqueda rápida: filtra las tarjetas en cada tecla; Enter con un código exacto (o un
+        # único resultado) lo agrega al carrito. Un lector de códigos tipo teclado escribe acá
+        # aunque el foco esté en otro lado (ver _capturar_tecla)
+        search_bar = tk.Frame(self.left_container, bg="#F8FAFC")
+        search_bar.pack(fill="x", padx=8, pady=(0,4))
+        tk.Label(search_bar, text="Buscar:", font=(FONT_FAMILY, 11), bg="#F8FAFC").pack(side="left")
+        self.var_busqueda = tk.StringVar()
+        self.entry_busqueda = tk.Entry(search_bar, textvariable=self.var_busqueda, font=(FONT_FAMILY, 14))
+        self.entry_busqueda.pack(side="left", fill="x", expand=True, padx=(6,0))
+        self.var_busqueda.trace_add('write', lambda *a: self._aplicar_filtro(desplazar=True))
+        self.entry_busqueda.bind('<Return>', self._on_enter_busqueda)
+        self.entry_busqueda.bind('<KP_Enter>', self._on_enter_busqueda)
+        self.entry_busqueda.bind('<Escape>', lambda e: self.var_busqueda.set(''))
+        # Panel productos: grilla con ventana. Sólo hay tarjetas para las filas que entran en
+        # el panel; al desplazarse se reasignan a otros productos (ver _render_grilla), así el
+        # arranque y la memoria no crecen con el catálogo
         canvas_frame = tk.Frame(self.left_container, bg="#F8FAFC")
         canvas_frame.pack(fill="both", expand=True)
-        self.panel_canvas = tk.Canvas(canvas_frame, bg="#F8FAFC", highlightthickness=0)
-        vscroll = tk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.panel_canvas.yview)
-        self.panel_canvas.configure(yscrollcommand=vscroll.set)
-        vscroll.pack(side="right", fill="y")
-        self.panel_canvas.pack(side="left", fill="both", expand=True)
-        # frame interno donde dibujaremos las tarjetas
-        self.panel_productos = tk.Frame(self.panel_canvas, bg="#F8FAFC")
-        self.panel_canvas.create_window((0, 0), window=self.panel_productos, anchor="nw")
-        # actualizar scrollregion cuando cambie el frame
-        def _on_frame_config(event):
-            self.panel_canvas.configure(scrollregion=self.panel_canvas.bbox("all"))
-        self.panel_productos.bind('<Configure>', _on_frame_config)
-        # permitir scroll con rueda del mouse
-        def _on_mousewheel(event):
-            # cross-platform delta normalization
-            delta = 0
-            try:
-                if event.delta:
-                    delta = -1 if event.delta > 0 else 1
-            except Exception:
-                if event.num == 4:
-                    delta = -1
-                elif event.num == 5:
-                    delta = 1
-            self.panel_canvas.yview_scroll(delta, "units")
-        # vincular al canvas para capturar eventos mientras el mouse esté sobre la zona
-        self.panel_canvas.bind_all('<MouseWheel>', _on_mousewheel)
-        self.panel_canvas.bind_all('<Button-4>', _on_mousewheel)
-        self.panel_canvas.bind_all('<Button-5>', _on_mousewheel)
+        self.vscroll_productos = tk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self._scroll_grilla)
+        self.vscroll_productos.pack(side="right", fill="y")
+        self.panel_productos = tk.Frame(canvas_frame, bg="#F8FAFC")
+        self.panel_productos.pack(side="left", fill="both", expand=True)
+        # Las tarjetas no agrandan el panel: su alto lo da la ventana y define cuántas filas entran
+        self.panel_productos.grid_propagate(False)
+        self.panel_productos.bind('<Configure>', self._on_panel_config)
+        # permitir scroll con rueda del mouse (sólo con el puntero sobre la grilla)
+        self._rueda_sobre(canvas_frame, self._on_rueda_productos)
         # Panel carrito
         self.panel_carrito = tk.Frame(self, bg="#FFFFFF", bd=1, relief="solid")
         self.panel_carrito.grid(row=0, column=1, sticky="nsew", padx=(8,16), pady=16)
 
-    def _draw_productos(self):
-        # Limpiar todas las tarjetas actuales antes de redibujar
-        for w in self.panel_productos.winfo_children():
-            try:
-                w.destroy()
-            except Exception:
-                pass
+    def _draw_productos(self, reconstruir=False):
+        """Sincroniza la grilla con la lista de productos sin recrear tarjetas.
+
+        Las tarjetas del pool se reutilizan entre redibujos: sólo se reconfiguran
+        los labels que cambiaron (nombre, precio, stock, tecla) y no se mueven de
+        celda. reconstruir=True descarta el pool y lo vuelve a crear.
+        """
         # Medidas y espaciados (configurables desde theme.SALES_GRID)
         if _SALES_GRID and isinstance(_SALES_GRID, dict):
             self.card_width = int(_SALES_GRID.get('card_width', 260))
@@ -175,124 +197,329 @@ class VentasViewNew(tk.Frame):
             self.card_padx = 8
             self.card_pady = 10
             self.max_cols = 3
-        self.botones_funcion = []
-        self._cards = []
-        # Igualar ancho al original (card_width) para las 3 columnas, sin expansión extra
-        min_col_w = self.card_width + self.card_padx * 2
-        for c in range(self.max_cols):
-            # uniform mantiene las 3 columnas con el mismo ancho base; weight=0 evita que se expandan
-            self.panel_productos.grid_columnconfigure(c, weight=0, uniform='prod', minsize=min_col_w)
+        medidas = (self.card_width, self.card_height, self.card_padx, self.card_pady, self.max_cols)
+        if reconstruir or medidas != getattr(self, '_medidas_grilla', None):
+            for card in self._pool:
+                try:
+                    card.destroy()
+                except Exception:
+                    pass
+            self._pool = []
+            self._tarjetas = {}
+            self._medidas_grilla = medidas
+            # Igualar ancho al original (card_width) para las 3 columnas, sin expansión extra
+            min_col_w = self.card_width + self.card_padx * 2
+            for c in range(self.max_cols):
+                # uniform mantiene las 3 columnas con el mismo ancho base; weight=0 evita que se expandan
+                self.panel_productos.grid_columnconfigure(c, weight=0, uniform='prod', minsize=min_col_w)
 
         # Fuente de productos: en modo ordenar usar lista temporal
         productos_src = self.productos_ordenados if (self.modo_orden.get() and isinstance(self.productos_ordenados, list)) else self.productos
-        # dibujar todos los productos; el canvas proveerá scroll si no entran
-        for idx, prod in enumerate(productos_src):
-            # Manejar filas con/sin columna contabiliza_stock
-            try:
-                prod_id, nombre, precio, stock, _visible, _codigo, contabiliza, orden_visual = prod
-            except Exception:
-                prod_id, nombre, precio, stock, _visible, _codigo = prod
-                contabiliza = 1
-                orden_visual = idx + 1
-            tecla = f"F{idx+1}"
-            fila = idx // self.max_cols
-            col = idx % self.max_cols
-            card = tk.Frame(self.panel_productos, bg="#FFFFFF", bd=2, relief="groove", width=self.card_width, height=self.card_height)
-            card.grid(row=fila, column=col, padx=self.card_padx, pady=self.card_pady, sticky="nsew")
-            card.grid_propagate(False)
-            name_lbl = tk.Label(
-                card,
-                text=nombre,
-                font=(FONT_FAMILY, 16, "bold"),
-                bg="#FFFFFF",
-                anchor="w",
-                justify="left"
-            )
-            name_lbl.pack(side="top", anchor="w", padx=16, pady=(10,0))
-            price_lbl = tk.Label(card, text=f"$ {precio:,.0f}", font=(FONT_FAMILY, 14), fg="#059669", bg="#FFFFFF")
-            price_lbl.pack(side="top", anchor="w", padx=16)
-            # Mostrar stock sólo si contabiliza_stock=1
-            stock_lbl = None
-            try:
-                mostrar_stock = int(contabiliza) == 1
-            except Exception:
-                mostrar_stock = True
-            if mostrar_stock:
-                display_stock = self.stock_dict.get(prod_id, 0)
-                stock_lbl = tk.Label(card, text=f"Stock: {display_stock}", font=(FONT_FAMILY, 11), fg="#475569", bg="#FFFFFF")
-                stock_lbl.pack(side="top", anchor="w", padx=16)
-            # (El botón "Agregar" fue removido; la tarjeta es clicable)
-            tecla_lbl = tk.Label(card, text=tecla, font=(FONT_FAMILY,10), fg="#475569", bg="#FFFFFF")
-            tecla_lbl.pack(side="right", padx=8, pady=10)
-            # Estilizar la tarjeta para que parezca un botón
+        self._productos_src = productos_src
+        # Guardar referencia por si se quiere usar más adelante
+        self.botones_funcion = [lambda e=None, p=prod: self._agregar_al_carrito(p) for prod in productos_src]
+        # Elegir qué productos se ven (búsqueda) y asignarlos a las tarjetas
+        self._aplicar_filtro()
+
+    def _refrescar_tarjetas(self, prod_ids):
+        """Actualiza sólo las tarjetas de esos productos (p. ej. el stock tras agregar o vender)."""
+        for prod_id in set(prod_ids):
+            card = self._tarjetas.get(prod_id)
+            if card is not None:
+                self._actualizar_tarjeta(card, card._idx, card._prod, len(self._productos_src))
+
+    def _render_grilla(self):
+        """Asigna los productos de las filas visibles a las tarjetas del pool.
+
+        El pool tiene una fila más de las que entran completas (la última queda
+        recortada). Cada tarjeta queda fija en su celda; al desplazarse sólo cambia
+        el producto que muestra.
+        """
+        lista = self._lista
+        if lista is None:
+            return
+        cols = self.max_cols
+        filas_total = -(-len(lista) // cols)
+        visibles = self._filas_completas
+        self._offset_filas = max(0, min(self._offset_filas, filas_total - visibles))
+        inicio = self._offset_filas * cols
+        tam = (visibles + 1) * cols
+        ventana = lista[inicio:inicio + tam]
+        # El pool sólo crece hasta lo que entra en el panel; si se achicó la ventana, sobran
+        while len(self._pool) > tam:
             try:
-                card.config(relief='raised', bd=2, highlightthickness=0, cursor='hand2')
+                self._pool.pop().destroy()
             except Exception:
                 pass
+        while len(self._pool) < len(ventana):
+            self._pool.append(self._crear_tarjeta(len(self._pool)))
+        self._tarjetas = {}
+        total = len(self._productos_src)
+        for k, card in enumerate(self._pool):
+            if k < len(ventana):
+                idx, prod = ventana[k]
+                self._actualizar_tarjeta(card, idx, prod, total)
+                self._tarjetas[prod[0]] = card
+                if not card.winfo_manager():
+                    card.grid()
+            elif card.winfo_manager():
+                card.grid_remove()
+        if filas_total <= visibles:
+            self.vscroll_productos.set(0.0, 1.0)
+        else:
+            self.vscroll_productos.set(self._offset_filas / filas_total, (self._offset_filas + visibles) / filas_total)
 
-            # Animación visual: cambio de fondo al hover y al click
-            def _on_click(e, p=prod, widget=card):
-                try:
-                    # Animación simple al click (cambiar fondo y restaurar después)
-                    orig = getattr(widget, '_orig_bg', widget.cget('bg'))
-                    widget.config(bg='#E6EEF8')
-                    self.after(120, lambda w=widget, o=orig: (w.config(bg=o) if (hasattr(w, 'winfo_exists') and w.winfo_exists()) else None))
-                except Exception:
-                    pass
-                # Agregar producto
-                try:
-                    self._agregar_al_carrito(p)
-                except Exception:
-                    pass
+    def _on_panel_config(self, event):
+        # Cuántas filas completas entran: define el tamaño del pool
+        alto_fila = getattr(self, 'card_height', 110) + 2 * getattr(self, 'card_pady', 10)
+        filas = max(1, event.height // alto_fila)
+        if filas != self._filas_completas:
+            self._filas_completas = filas
+            self._render_grilla()
+
+    def _scroll_grilla(self, *args):
+        """command de la barra de desplazamiento (mismo protocolo que yview)."""
+        if not args or self._lista is None:
+            return
+        if args[0] == 'moveto':
+            filas_total = -(-len(self._lista) // self.max_cols)
+            self._offset_filas = int(round(float(args[1]) * filas_total))
+        elif args[0] == 'scroll':
+            paso = int(args[1])
+            self._offset_filas += paso * (self._filas_completas if args[2].startswith('page') else 1)
+        self._render_grilla()
+
+    _SECUENCIAS_RUEDA = ('<MouseWheel>', '<Button-4>', '<Button-5>')
 
-            # Bind only click on the card and its children. Removed Enter/Leave hover handlers to avoid resizes/flicker.
+    def _rueda_sobre(self, widget, handler):
+        """La rueda del mouse va a handler sólo mientras el puntero está sobre widget (o sus hijos).
+
+        Tk entrega la rueda al widget con foco, no al que está bajo el puntero: por eso
+        bind_all, pero sólo entre <Enter> y <Leave>, y se suelta también al ocultar la vista.
+        """
+        def _entrar(_event):
+            for secuencia in self._SECUENCIAS_RUEDA:
+                widget.bind_all(secuencia, handler)
+            self._rueda_activa = widget
+
+        def _salir(event):
+            # <Leave> también llega al pasar a un hijo: seguir si el puntero sigue adentro
             try:
-                card.unbind('<Enter>')
-                card.unbind('<Leave>')
+                debajo = widget.winfo_containing(event.x_root, event.y_root)
             except Exception:
-                pass
+                debajo = None
+            if debajo is not None and (str(debajo) == str(widget) or str(debajo).startswith(str(widget) + '.')):
+                return
+            self._soltar_rueda(widget)
+
+        widget.bind('<Enter>', _entrar, add='+')
+        widget.bind('<Leave>', _salir, add='+')
+
+    def _soltar_rueda(self, widget=None):
+        if getattr(self, '_rueda_activa', None) is None or (widget is not None and self._rueda_activa is not widget):
+            return
+        self._rueda_activa = None
+        for secuencia in self._SECUENCIAS_RUEDA:
             try:
-                if not self.modo_orden.get():
-                    card.bind('<Button-1>', _on_click)
-            except Exception:
+                self.unbind_all(secuencia)
+            except tk.TclError:
                 pass
-            bindables = [name_lbl, price_lbl, tecla_lbl]
-            if stock_lbl is not None:
-                bindables.insert(2, stock_lbl)
-            for w in bindables:
-                try:
-                    w.unbind('<Enter>')
-                    w.unbind('<Leave>')
-                except Exception:
-                    pass
-                try:
-                    if not self.modo_orden.get():
-                        w.bind('<Button-1>', lambda e, p=prod, widget=card: _on_click(e, p, widget))
-                except Exception:
-                    pass
-            # Controles de orden en modo ordenar
-            if self.modo_orden.get():
-                ctrl = tk.Frame(card, bg="#FFFFFF")
-                ctrl.pack(side="bottom", fill="x", padx=12, pady=6)
-                # ← mueve a la izquierda (índice-1), → mueve a la derecha (índice+1)
-                btn_up = tk.Button(ctrl, text="←", width=3, command=lambda i=idx: self._mover_por_indice(i, -1))
-                btn_dn = tk.Button(ctrl, text="→", width=3, command=lambda i=idx: self._mover_por_indice(i, 1))
-                btn_up.pack(side="left", padx=2)
-                btn_dn.pack(side="left", padx=2)
-                # Deshabilitar flechas inválidas (al inicio/fin)
-                try:
-                    total_items = len(productos_src)
-                    if idx == 0:
-                        btn_up.configure(state='disabled')
-                    if idx == total_items - 1:
-                        btn_dn.configure(state='disabled')
-                except Exception:
-                    pass
 
-            # Guardar referencia por si se quiere usar más adelante
-            self.botones_funcion.append(lambda e=None, p=prod: self._agregar_al_carrito(p))
-            card._idx = idx
-            self._cards.append(card)
+    def _on_rueda_productos(self, event):
+        if not self.winfo_ismapped():
+            return
+        # cross-platform delta normalization
+        delta = 0
+        if getattr(event, 'num', None) == 4:
+            delta = -1
+        elif getattr(event, 'num', None) == 5:
+            delta = 1
+        elif event.delta:
+            delta = -1 if event.delta > 0 else 1
+        if delta:
+            self._scroll_grilla('scroll', delta, 'units')
+
+    def _asegurar_visible(self, pos):
+        """Desplaza la grilla para que se vea la posición pos de la lista mostrada."""
+        fila = pos // self.max_cols
+        if fila < self._offset_filas:
+            self._offset_filas = fila
+        elif fila >= self._offset_filas + self._filas_completas:
+            self._offset_filas = fila - self._filas_completas + 1
+        else:
+            return
+        self._render_grilla()
+
+    def _crear_tarjeta(self, slot):
+        """Tarjeta del pool, fija en la celda slot; el producto se lo asigna _actualizar_tarjeta."""
+        card = tk.Frame(self.panel_productos, bg="#FFFFFF", bd=2, relief="groove", width=self.card_width, height=self.card_height)
+        card.grid(row=slot // self.max_cols, column=slot % self.max_cols, padx=self.card_padx, pady=self.card_pady, sticky="nsew")
+        card.grid_propagate(False)
+        card._prod = None
+        card._idx = None
+        card._estado = {}
+        card._lbl_nombre = tk.Label(card, font=(FONT_FAMILY, 16, "bold"), bg="#FFFFFF", anchor="w", justify="left")
+        card._lbl_nombre.pack(side="top", anchor="w", padx=16, pady=(10,0))
+        card._lbl_precio = tk.Label(card, font=(FONT_FAMILY, 14), fg="#059669", bg="#FFFFFF")
+        card._lbl_precio.pack(side="top", anchor="w", padx=16)
+        # El stock se crea (y muestra) sólo si el producto contabiliza stock
+        card._lbl_stock = None
+        card._ctrl = None
+        # (El botón "Agregar" fue removido; la tarjeta es clicable)
+        card._lbl_tecla = tk.Label(card, font=(FONT_FAMILY,10), fg="#475569", bg="#FFFFFF")
+        card._lbl_tecla.pack(side="right", padx=8, pady=10)
+        # Estilizar la tarjeta para que parezca un botón
+        try:
+            card.config(relief='raised', bd=2, highlightthickness=0, cursor='hand2')
+        except Exception:
+            pass
+        # Click en la tarjeta y sus labels: el producto se toma de la tarjeta al momento del click
+        for w in (card, card._lbl_nombre, card._lbl_precio, card._lbl_tecla):
+            w.bind('<Button-1>', lambda e, c=card: self._on_click_tarjeta(c))
+        return card
+
+    def _on_click_tarjeta(self, card):
+        if self.modo_orden.get():
+            return
+        try:
+            # Animación simple al click (cambiar fondo y restaurar después)
+            orig = getattr(card, '_orig_bg', card.cget('bg'))
+            card.config(bg='#E6EEF8')
+            self.after(120, lambda w=card, o=orig: (w.config(bg=o) if (hasattr(w, 'winfo_exists') and w.winfo_exists()) else None))
+        except Exception:
+            pass
+        # Agregar producto
+        try:
+            self._agregar_al_carrito(card._prod)
+        except Exception:
+            pass
+
+    def _actualizar_tarjeta(self, card, idx, prod, total):
+        """Reconfigura sólo lo que cambió respecto del último dibujo de la tarjeta."""
+        # Manejar filas con/sin columna contabiliza_stock
+        try:
+            prod_id, nombre, precio, stock, _visible, _codigo, contabiliza, orden_visual = prod
+        except Exception:
+            prod_id, nombre, precio, stock, _visible, _codigo = prod
+            contabiliza = 1
+        card._prod = prod
+        card._idx = idx
+        # Mostrar stock sólo si contabiliza_stock=1
+        try:
+            mostrar_stock = int(contabiliza) == 1
+        except Exception:
+            mostrar_stock = True
+        modo_orden = bool(self.modo_orden.get())
+        nuevo = {
+            'nombre': nombre,
+            'precio': f"$ {precio:,.0f}",
+            'stock': f"Stock: {self.stock_dict.get(prod_id, 0)}" if mostrar_stock else None,
+            'tecla': f"F{idx+1}",
+            'orden': (idx == 0, idx == total - 1) if modo_orden else None,
+        }
+        estado = card._estado
+        if estado.get('nombre') != nuevo['nombre']:
+            card._lbl_nombre.config(text=nombre)
+        if estado.get('precio') != nuevo['precio']:
+            card._lbl_precio.config(text=nuevo['precio'])
+        if estado.get('tecla') != nuevo['tecla']:
+            card._lbl_tecla.config(text=nuevo['tecla'])
+        if 'stock' not in estado or estado['stock'] != nuevo['stock']:
+            self._actualizar_stock_tarjeta(card, nuevo['stock'])
+        if 'orden' not in estado or estado['orden'] != nuevo['orden']:
+            self._actualizar_controles_orden(card, nuevo['orden'])
+        card._estado = nuevo
+
+    def _actualizar_stock_tarjeta(self, card, texto):
+        if texto is None:
+            if card._lbl_stock is not None:
+                card._lbl_stock.pack_forget()
+            return
+        if card._lbl_stock is None:
+            card._lbl_stock = tk.Label(card, font=(FONT_FAMILY, 11), fg="#475569", bg="#FFFFFF")
+            card._lbl_stock.bind('<Button-1>', lambda e, c=card: self._on_click_tarjeta(c))
+        card._lbl_stock.config(text=texto)
+        if not card._lbl_stock.winfo_manager():
+            card._lbl_stock.pack(side="top", anchor="w", padx=16, after=card._lbl_precio)
+
+    def _actualizar_controles_orden(self, card, orden):
+        """Flechas del modo ordenar: orden es (es_primero, es_ultimo) o None fuera de ese modo."""
+        if orden is None:
+            if card._ctrl is not None:
+                card._ctrl.pack_forget()
+            return
+        if card._ctrl is None:
+            ctrl = tk.Frame(card, bg="#FFFFFF")
+            # ← mueve a la izquierda (índice-1), → mueve a la derecha (índice+1)
+            ctrl._btn_up = tk.Button(ctrl, text="←", width=3, command=lambda c=card: self._mover_por_indice(c._idx, -1))
+            ctrl._btn_dn = tk.Button(ctrl, text="→", width=3, command=lambda c=card: self._mover_por_indice(c._idx, 1))
+            ctrl._btn_up.pack(side="left", padx=2)
+            ctrl._btn_dn.pack(side="left", padx=2)
+            card._ctrl = ctrl
+        if not card._ctrl.winfo_manager():
+            card._ctrl.pack(side="bottom", fill="x", padx=12, pady=6)
+        # Deshabilitar flechas inválidas (al inicio/fin)
+        primero, ultimo = orden
+        card._ctrl._btn_up.configure(state='disabled' if primero else 'normal')
+        card._ctrl._btn_dn.configure(state='disabled' if ultimo else 'normal')
+
+    def _aplicar_filtro(self, desplazar=False):
+        """Arma la lista de productos a mostrar según la búsqueda y redibuja la ventana visible."""
+        # En modo ordenar se ven todas (las flechas mueven por índice)
+        texto = '' if self.modo_orden.get() else self.var_busqueda.get()
+        ids = self._indice.buscar(texto)
+        if ids is None:
+            self._lista = list(enumerate(self._productos_src))
+        else:
+            visibles = set(ids)
+            self._lista = [(idx, prod) for idx, prod in enumerate(self._productos_src) if prod[0] in visibles]
+        if desplazar:
+            self._offset_filas = 0
+        self._render_grilla()
+
+    def _on_enter_busqueda(self, event=None):
+        # Ctrl+Enter es cobrar (binding del master): no agregar nada
+        if event is not None and event.state & 0x0004:
+            return None
+        texto = self.var_busqueda.get()
+        prod = self._indice.por_codigo(texto)
+        if prod is None:
+            ids = self._indice.buscar(texto)
+            if ids and len(ids) == 1:
+                prod = next((p for p in self.productos if p[0] == ids[0]), None)
+        if prod is not None:
+            # Limpiar antes de agregar: _agregar_al_carrito redibuja y aplica el filtro vacío
+            self.var_busqueda.set('')
+            self._agregar_al_carrito(prod)
+        else:
+            # Código desconocido o búsqueda ambigua: dejar el texto seleccionado para el próximo escaneo
+            self.bell()
+            self.entry_busqueda.select_range(0, 'end')
+        return 'break'
+
+    def _capturar_tecla(self, event):
+        """Lleva al buscador lo que se tipea (o escanea) sin foco en un campo de texto."""
+        try:
+            if not self.winfo_ismapped() or self.modo_orden.get():
+                return None
+            foco = self.focus_get()
+            # Los botones y casillas ya procesaron la tecla en su binding de clase (espacio = clic)
+            if foco is not None and foco.winfo_class() in (
+                'Entry', 'TEntry', 'Text', 'Spinbox', 'TSpinbox', 'TCombobox', 'Listbox',
+                'Button', 'TButton', 'Checkbutton', 'TCheckbutton', 'Radiobutton', 'TRadiobutton',
+            ):
+                return None
+        except Exception:
+            return None
+        # Sin Ctrl (los atajos siguen funcionando); F1-F12 no traen caracter. Un espacio
+        # fuera del buscador no empieza una búsqueda
+        if event.keysym == 'space':
+            return None
+        if event.char and event.char.isprintable() and not (event.state & 0x0004):
+            self.entry_busqueda.focus_set()
+            self.entry_busqueda.insert('end', event.char)
+            return 'break'
+        return None
 
     def _mover_por_indice(self, idx_from, delta):
         """En modo ordenar, mover producto en memoria y redibujar."""
@@ -309,6 +536,7 @@ class VentasViewNew(tk.Frame):
                 self.productos_ordenados[idx_to], self.productos_ordenados[idx_from]
             )
             self._draw_productos()
+            self._asegurar_visible(idx_to)
         except Exception:
             pass
 
@@ -373,13 +601,62 @@ class VentasViewNew(tk.Frame):
             except Exception:
                 pass
 
-    def recargar_productos(self):
+    def _actualizar_productos(self):
+        """Relee los productos y redibuja sólo las tarjetas cuyo precio o stock cambió.
+
+        Las ventas (propias o de otro equipo) sólo tocan stock: no hace falta
+        reconstruir índice ni grilla. Si cambió el conjunto, el orden, un nombre o
+        un código, o se está ordenando a mano, se recarga todo.
+        """
+        try:
+            nuevos = cargar_productos()
+        except Exception:
+            return
+        if self.modo_orden.get() or len(nuevos) != len(self.productos) or any(
+            (n[0], n[1], n[5]) != (v[0], v[1], v[5]) for n, v in zip(nuevos, self.productos)
+        ):
+            self.recargar_productos(nuevos)
+            return
+        cambiados = {n[0]: n for n, v in zip(nuevos, self.productos) if n != v}
+        if not cambiados:
+            return
+        self.productos = nuevos
+        self._prod_por_id.update(cambiados)
+        # _productos_src, _lista y botones_funcion guardan las tuplas viejas: reemplazarlas por id
+        self._productos_src = [cambiados.get(p[0], p) for p in self._productos_src]
+        if self._lista is not None:
+            self._lista = [(idx, cambiados.get(p[0], p)) for idx, p in self._lista]
+        self.botones_funcion = [lambda e=None, p=prod: self._agregar_al_carrito(p) for prod in self._productos_src]
+        for pid, prod in cambiados.items():
+            s = prod[3]
+            item = self.carrito.get(pid)
+            if item is not None and self._contabiliza(pid) == 1:
+                try:
+                    s -= item[3]
+                except Exception:
+                    pass
+            self.stock_dict[pid] = s
+            card = self._tarjetas.get(pid)
+            if card is not None:
+                card._prod = prod
+        self._refrescar_tarjetas(cambiados)
+
+    def recargar_productos(self, productos=None):
         """Recargar listado de productos desde la DB y redibujar únicamente las tarjetas."""
-        self.productos = cargar_productos()
-        # actualizar stock dict con los nuevos valores (mantener existencias en cache si no hay valor)
+        self.productos = cargar_productos() if productos is None else productos
+        self._prod_por_id = {prod[0]: prod for prod in self.productos}
+        # actualizar stock dict con los nuevos valores (mantener existencias en cache si no hay valor).
+        # Lo que está en el carrito todavía no se guardó: sigue reservado sobre el stock de la base
         new_stock = {prod[0]: prod[3] for prod in self.productos}
         for pid, s in new_stock.items():
+            item = self.carrito.get(pid)
+            if item is not None and self._contabiliza(pid) == 1:
+                try:
+                    s -= item[3]
+                except Exception:
+                    pass
             self.stock_dict[pid] = s
+        self._indice.cargar(self.productos)
         self._draw_productos()
 
     def _draw_carrito(self):
@@ -413,6 +690,7 @@ class VentasViewNew(tk.Frame):
         items_canvas.grid(row=1, column=0, sticky="nsew")
         items_vscroll.grid(row=1, column=2, sticky="ns")
         self.items_frame = tk.Frame(items_canvas, bg="#FFFFFF")
+        self._filas_carrito = {}
         items_window = items_canvas.create_window((0, 0), window=self.items_frame, anchor="nw")
 
         def _on_canvas_config(e):
@@ -433,18 +711,16 @@ class VentasViewNew(tk.Frame):
 
         def _on_items_mousewheel(event):
             delta = 0
-            try:
-                if event.delta:
-                    delta = -1 if event.delta > 0 else 1
-            except Exception:
-                if getattr(event, 'num', None) == 4:
-                    delta = -1
-                elif getattr(event, 'num', None) == 5:
-                    delta = 1
-            items_canvas.yview_scroll(delta, "units")
+            if getattr(event, 'num', None) == 4:
+                delta = -1
+            elif getattr(event, 'num', None) == 5:
+                delta = 1
+            elif event.delta:
+                delta = -1 if event.delta > 0 else 1
+            if delta:
+                items_canvas.yview_scroll(delta, "units")
 
-        items_canvas.bind('<Enter>', lambda e: items_canvas.bind_all('<MouseWheel>', _on_items_mousewheel))
-        items_canvas.bind('<Leave>', lambda e: items_canvas.unbind_all('<MouseWheel>'))
+        self._rueda_sobre(items_canvas, _on_items_mousewheel)
 
         # Colocar Total, checkbox y botones en la parte inferior del panel de carrito
         self.label_total = tk.Label(self.panel_carrito, text="Total: $0", font=CART['total_font'], bg="#FFFFFF", fg="#1E293B")
@@ -472,34 +748,100 @@ class VentasViewNew(tk.Frame):
         self._actualizar_carrito()
 
     def _actualizar_carrito(self):
-        for widget in self.items_frame.winfo_children():
-            widget.destroy()
-        self.total = 0
-        for idx, item in enumerate(self.carrito):
-            prod_id, nombre, precio, cantidad = item
-            subtotal = cantidad * precio
-            self.total += subtotal
-            # Usar grid para asegurar alineación: nombre | qty controls | subtotal
-            row = tk.Frame(self.items_frame, bg="#F8FAFC" if idx%2==0 else "#FFFFFF")
-            row.pack(fill="x")
-            row.grid_columnconfigure(0, weight=1)
-            row.grid_columnconfigure(1, weight=0)
-            row.grid_columnconfigure(2, weight=0)
-            # Nombre a la izquierda y expandible
-            lbl_name = tk.Label(row, text=nombre, font=CART['item_font'], bg=row['bg'], anchor="w")
-            lbl_name.grid(row=0, column=0, sticky="we", padx=8)
-            # Contenedor de cantidad y botones (columna 1)
-            qty_frame = tk.Frame(row, bg=row['bg'])
-            qty_frame.grid(row=0, column=1, sticky="e", padx=8)
-            # Quiet +/- buttons: flat, no border, background matches row to avoid gray fill
-            tk.Button(qty_frame, text="-", command=lambda i=idx: self._restar_item(i), width=3, font=CART['qty_button_font'], relief='flat', bd=0, highlightthickness=0, bg=row['bg'], activebackground=row['bg']).pack(side="left", padx=1, pady=1)
-            tk.Label(qty_frame, text=str(cantidad), width=4, anchor="center", bg=row['bg'], font=CART['qty_button_font']).pack(side="left", padx=2)
-            tk.Button(qty_frame, text="+", command=lambda i=idx: self._sumar_item(i), width=3, font=CART['qty_button_font'], relief='flat', bd=0, highlightthickness=0, bg=row['bg'], activebackground=row['bg']).pack(side="left", padx=1, pady=1)
-            # Subtotal a la derecha (columna 2)
-            lbl_sub = tk.Label(row, text=f"$ {subtotal:,.0f}", font=CART['subtotal_font'], bg=row['bg'], anchor="e", width=12)
-            lbl_sub.grid(row=0, column=2, sticky="e", padx=8)
+        """Sincroniza todas las filas con el carrito (al armar el panel, cancelar o cobrar)."""
+        for prod_id in [pid for pid in self._filas_carrito if pid not in self.carrito]:
+            self._sincronizar_fila_carrito(prod_id)
+        for prod_id in self.carrito:
+            self._sincronizar_fila_carrito(prod_id)
+        self._rayar_filas_carrito()
+        self.total = sum(item[2] * item[3] for item in self.carrito.values())
+        self.label_total.config(text=f"Total: $ {self.total:,.0f}")
+
+    def _actualizar_item_carrito(self, prod_id):
+        """Refleja en su fila el cambio de un ítem del carrito y ajusta el total.
+
+        Un toque en +, - o en una tarjeta no depende del largo del carrito; sólo
+        quitar un ítem rehace el rayado de las filas que le siguen.
+        """
+        if self._sincronizar_fila_carrito(prod_id):
+            self._rayar_filas_carrito()
         self.label_total.config(text=f"Total: $ {self.total:,.0f}")
 
+    def _sincronizar_fila_carrito(self, prod_id):
+        """Crea, reconfigura o destruye la fila del ítem. Devuelve True si la fila se quitó."""
+        fila = self._filas_carrito.get(prod_id)
+        item = self.carrito.get(prod_id)
+        if item is None:
+            if fila is None:
+                return False
+            self._filas_carrito.pop(prod_id)
+            self.total -= fila._subtotal
+            fila.destroy()
+            return True
+        if fila is None:
+            fila = self._crear_fila_carrito(prod_id, len(self._filas_carrito))
+            self._filas_carrito[prod_id] = fila
+        _prod_id, _nombre, precio, cantidad = item
+        subtotal = cantidad * precio
+        if fila._cantidad != cantidad:
+            fila._lbl_cant.config(text=str(cantidad))
+            fila._cantidad = cantidad
+        if fila._subtotal != subtotal:
+            fila._lbl_sub.config(text=f"$ {subtotal:,.0f}")
+            self.total += subtotal - fila._subtotal
+            fila._subtotal = subtotal
+        return False
+
+    def _crear_fila_carrito(self, prod_id, idx):
+        nombre = self.carrito[prod_id][1]
+        # Usar grid para asegurar alineación: nombre | qty controls | subtotal
+        row = tk.Frame(self.items_frame, bg="#F8FAFC" if idx%2==0 else "#FFFFFF")
+        row.pack(fill="x")
+        row.grid_columnconfigure(0, weight=1)
+        row.grid_columnconfigure(1, weight=0)
+        row.grid_columnconfigure(2, weight=0)
+        # Nombre a la izquierda y expandible
+        lbl_name = tk.Label(row, text=nombre, font=CART['item_font'], bg=row['bg'], anchor="w")
+        lbl_name.grid(row=0, column=0, sticky="we", padx=8)
+        # Contenedor de cantidad y botones (columna 1)
+        qty_frame = tk.Frame(row, bg=row['bg'])
+        qty_frame.grid(row=0, column=1, sticky="e", padx=8)
+        # Quiet +/- buttons: flat, no border, background matches row to avoid gray fill
+        btn_menos = tk.Button(qty_frame, text="-", command=lambda p=prod_id: self._restar_item(p), width=3, font=CART['qty_button_font'], relief='flat', bd=0, highlightthickness=0, bg=row['bg'], activebackground=row['bg'])
+        btn_menos.pack(side="left", padx=1, pady=1)
+        row._lbl_cant = tk.Label(qty_frame, text="", width=4, anchor="center", bg=row['bg'], font=CART['qty_button_font'])
+        row._lbl_cant.pack(side="left", padx=2)
+        btn_mas = tk.Button(qty_frame, text="+", command=lambda p=prod_id: self._sumar_item(p), width=3, font=CART['qty_button_font'], relief='flat', bd=0, highlightthickness=0, bg=row['bg'], activebackground=row['bg'])
+        btn_mas.pack(side="left", padx=1, pady=1)
+        # Subtotal a la derecha (columna 2)
+        row._lbl_sub = tk.Label(row, text="$ 0", font=CART['subtotal_font'], bg=row['bg'], anchor="e", width=12)
+        row._lbl_sub.grid(row=0, column=2, sticky="e", padx=8)
+        row._cantidad = None
+        row._subtotal = 0
+        row._fondo = row['bg']
+        row._con_fondo = (row, lbl_name, qty_frame, row._lbl_cant, row._lbl_sub)
+        row._botones = (btn_menos, btn_mas)
+        return row
+
+    def _rayar_filas_carrito(self):
+        # Reconfigura sólo las filas cuyo color cambió
+        for idx, row in enumerate(self._filas_carrito.values()):
+            fondo = "#F8FAFC" if idx%2==0 else "#FFFFFF"
+            if row._fondo != fondo:
+                for w in row._con_fondo:
+                    w.config(bg=fondo)
+                for b in row._botones:
+                    b.config(bg=fondo, activebackground=fondo)
+                row._fondo = fondo
+
+    def _contabiliza(self, prod_id):
+        """1 si el producto descuenta stock (también si no se encuentra), 0 si no."""
+        try:
+            prod = self._prod_por_id.get(prod_id)
+            return int(prod[6]) if prod is not None else 1
+        except Exception:
+            return 1
+
     def _get_stock(self, prod_id):
         """Return stock as int or 999 for infinite; safe-cast values from stock_dict."""
         val = self.stock_dict.get(prod_id, 0)
@@ -522,7 +864,7 @@ class VentasViewNew(tk.Frame):
         if contabiliza == 1 and stock_val == 0:
             messagebox.showwarning("Sin stock", f"No hay stock disponible para {prod[1]}")
             return
-        existente = next((item for item in self.carrito if item[0] == prod_id), None)
+        existente = self.carrito.get(prod_id)
         if existente:
             # permitir cuando no contabiliza o haya al menos 1 unidad disponible
             if contabiliza == 0 or stock_val > 0:
@@ -531,70 +873,57 @@ class VentasViewNew(tk.Frame):
                 messagebox.showwarning("Stock insuficiente", f"No hay más stock disponible para {prod[1]}")
                 return
         else:
-            self.carrito.append([prod[0], prod[1], prod[2], 1])  # id, nombre, precio, cantidad
+            self.carrito[prod_id] = [prod[0], prod[1], prod[2], 1]  # id, nombre, precio, cantidad
         # sólo decrementar si contabiliza
         if contabiliza == 1:
             self.stock_dict[prod_id] -= 1
             # Si justo quedó en 5, avisar
             if self.stock_dict[prod_id] == 5:
                 messagebox.showwarning("Stock bajo", f"Solo quedan 5 unidades de {prod[1]}")
-        self._draw_productos()
-        self._actualizar_carrito()
+        self._refrescar_tarjetas((prod_id,))
+        self._actualizar_item_carrito(prod_id)
 
-    def _sumar_item(self, idx):
-        prod_id = self.carrito[idx][0]
+    def _sumar_item(self, prod_id):
+        item = self.carrito.get(prod_id)
+        if item is None:
+            return
         stock_val = self._get_stock(prod_id)
         # Si no contabiliza, permitir sumar sin chequear stock; si contabiliza, requerir stock > 0
-        contabiliza = 1
-        try:
-            # buscar el producto actual
-            prod = next((p for p in self.productos if p[0] == prod_id), None)
-            if prod is not None:
-                contabiliza = int(prod[6])
-        except Exception:
-            contabiliza = 1
+        contabiliza = self._contabiliza(prod_id)
         if contabiliza == 0 or (isinstance(stock_val, int) and stock_val > 0):
             # aumentar cantidad en carrito
-            self.carrito[idx][3] += 1
+            item[3] += 1
             # decrementar stock real sólo si contabiliza
             if contabiliza == 1:
                 self.stock_dict[prod_id] -= 1
                 if self.stock_dict[prod_id] == 5:
-                    messagebox.showwarning("Stock bajo", f"Solo quedan 5 unidades de {self.carrito[idx][1]}")
-            self._draw_productos()
-            self._actualizar_carrito()
+                    messagebox.showwarning("Stock bajo", f"Solo quedan 5 unidades de {item[1]}")
+            self._refrescar_tarjetas((prod_id,))
+            self._actualizar_item_carrito(prod_id)
         else:
             messagebox.showwarning("Stock insuficiente", "No hay más stock disponible para este producto.")
 
-    def _restar_item(self, idx):
-        prod_id = self.carrito[idx][0]
-        self.carrito[idx][3] -= 1
-    # devolver stock sólo si contabiliza
-        try:
-            prod = next((p for p in self.productos if p[0] == prod_id), None)
-            contabiliza = int(prod[6]) if prod is not None else 1
-        except Exception:
-            contabiliza = 1
-        if contabiliza == 1:
+    def _restar_item(self, prod_id):
+        item = self.carrito.get(prod_id)
+        if item is None:
+            return
+        item[3] -= 1
+        # devolver stock sólo si contabiliza
+        if self._contabiliza(prod_id) == 1:
             self.stock_dict[prod_id] += 1
-        if self.carrito[idx][3] == 0:
-            self.carrito.pop(idx)
-        self._draw_productos()
-        self._actualizar_carrito()
+        if item[3] == 0:
+            del self.carrito[prod_id]
+        self._refrescar_tarjetas((prod_id,))
+        self._actualizar_item_carrito(prod_id)
 
     def _cancelar(self):
         # Devolver stock de los productos en el carrito
-        for item in self.carrito:
-            prod_id, _, _, cantidad = item
-            try:
-                prod = next((p for p in self.productos if p[0] == prod_id), None)
-                contabiliza = int(prod[6]) if prod is not None else 1
-            except Exception:
-                contabiliza = 1
-            if contabiliza == 1:
+        for prod_id, _, _, cantidad in self.carrito.values():
+            if self._contabiliza(prod_id) == 1:
                 self.stock_dict[prod_id] += cantidad
+        # Sólo cambió el stock de lo que estaba en el carrito
+        self._refrescar_tarjetas(list(self.carrito))
         self.carrito.clear()
-        self._draw_productos()
         self._actualizar_carrito()
 
     def _cobrar(self):
@@ -612,8 +941,29 @@ class VentasViewNew(tk.Frame):
         metodo = dlg.result
         if not metodo:
             return
-        # Guardar venta en la base de datos y obtener info de tickets
-        result = self.cobrar_callback(self.carrito, metodo)
+        if getattr(self, '_cobro_en_curso', False):
+            return
+        # Guardar venta en la base de datos (en el hilo escritor) y continuar al recibir la info de tickets
+        self._cobro_en_curso = True
+        carrito = [list(item) for item in self.carrito.values()]
+        try:
+            acepta_on_done = 'on_done' in inspect.signature(self.cobrar_callback).parameters
+        except (TypeError, ValueError):
+            acepta_on_done = False
+        if acepta_on_done:
+            self.cobrar_callback(carrito, metodo, on_done=lambda result: self._on_cobro_finalizado(result, carrito))
+        else:
+            self._on_cobro_finalizado(self.cobrar_callback(carrito, metodo), carrito)
+
+    def _on_cobro_finalizado(self, result, carrito):
+        """Imprime los tickets de la venta guardada y quita del carrito lo que se cobró.
+
+        result es None si la venta no se pudo guardar: en ese caso se conserva el carrito.
+        """
+        self._cobro_en_curso = False
+        if result is None:
+            self._recargar_si_pendiente()
+            return
         # Si la callback devolvió info y el checkbox está activo, imprimir por item
         if self.imprimir_ticket_var.get():
             try:
@@ -635,7 +985,7 @@ class VentasViewNew(tk.Frame):
                         except Exception:
                             # fallback: intentar el callback genérico si existe
                             try:
-                                self.imprimir_ticket_callback(self.carrito)
+                                self.imprimir_ticket_callback(carrito)
                             except Exception:
                                 pass
                     # Marcar como Impreso los tickets que salieron correctamente
@@ -647,14 +997,29 @@ class VentasViewNew(tk.Frame):
                 else:
                     # si no se devolvió info, llamar al callback genérico
                     try:
-                        self.imprimir_ticket_callback(self.carrito)
+                        self.imprimir_ticket_callback(carrito)
                     except Exception:
                         pass
             except Exception:
                 pass
-        self.carrito.clear()
-        self._draw_productos()
+        # Sólo las tarjetas de lo vendido (su stock ya se descontó al agregarlas al carrito)
+        self._refrescar_tarjetas([item[0] for item in carrito])
+        # Quitar sólo lo cobrado: lo que se agregó mientras se guardaba la venta queda en el carrito
+        for prod_id, _nombre, _precio, cantidad in carrito:
+            item = self.carrito.get(prod_id)
+            if item is None:
+                continue
+            item[3] -= cantidad
+            if item[3] <= 0:
+                del self.carrito[prod_id]
         self._actualizar_carrito()
+        self._recargar_si_pendiente()
+
+    def _recargar_si_pendiente(self):
+        # Cambios de productos que llegaron durante el cobro (ver _on_cambios)
+        if getattr(self, '_recargar_pendiente', False):
+            self._recargar_pendiente = False
+            self._actualizar_productos()
 
     @staticmethod
     def imprimir_ticket_por_item_win32_static(fecha, nombre_item, ticket_id=None, identificador_ticket=None, codigo_caja=None, disciplina=None):
@@ -784,3 +1149,29 @@ class VentasViewNew(tk.Frame):
             self.master.bind(f'<F{idx+1}>', lambda e, i=idx: self._agregar_al_carrito(self.productos[i]))
         self.master.bind('<Control-Return>', lambda e: self._cobrar())
         self.master.bind('<Control-BackSpace>', lambda e: self._cancelar())
+        # <Key> en la ventana (el foco puede estar en cualquier widget), sumado a los bindings que
+        # ya tenga y sólo mientras la vista está a la vista
+        self._key_funcid = None
+        self.bind('<Map>', lambda e: self._activar_captura() if e.widget is self else None, add='+')
+        self.bind('<Unmap>', lambda e: self._al_ocultar() if e.widget is self else None, add='+')
+        self.bind('<Destroy>', lambda e: self._al_ocultar() if e.widget is self else None, add='+')
+        if self.winfo_ismapped():
+            self._activar_captura()
+
+    def _activar_captura(self):
+        if self._key_funcid is None:
+            self._key_funcid = self.master.bind('<Key>', self._capturar_tecla, add='+')
+
+    def _al_ocultar(self):
+        self._soltar_rueda()
+        funcid, self._key_funcid = self._key_funcid, None
+        if funcid is None:
+            return
+        # unbind(secuencia, funcid) borra todos los bindings de la secuencia (Python < 3.13):
+        # sacar sólo la línea de este callback del script
+        try:
+            script = self.master.bind('<Key>')
+            self.master.bind('<Key>', '\n'.join(l for l in script.split('\n') if funcid not in l))
+            self.master.deletecommand(funcid)
+        except tk.TclError:
+            pass
@@ -0,0 +1,333 @@
+"""Treeview virtual: guarda las filas en una lista y sólo materializa las visibles.
+
+Un Treeview común crea un ítem de Tk por fila; con una temporada entera eso son
+decenas de miles de ítems y cientos de MB. VirtualTreeview mantiene un pool fijo
+de ítems (filas visibles + margen) y al desplazarse sólo les cambia los valores.
+
+- set_filas()/agregar_filas() cargan el almacén (tuplas ya formateadas).
+- Si se pasa on_fetch_more, se llama al acercarse al final de lo cargado
+  mientras la fuente no esté completa (paginado por SQL).
+- Si se pasa on_sort(columna, descendente), el clic en el encabezado lo llama
+  para que la vista vuelva a consultar con otro ORDER BY: no se reordena acá.
+- selection()/item() devuelven ids virtuales ("r<índice>") estables aunque la
+  fila seleccionada quede fuera de la ventana, así el código que hacía
+  tree.item(tree.selection()[0], 'values') sigue funcionando.
+
+La barra de desplazamiento se conecta igual que con un Treeview
+(command=tree.yview y tree.configure(yscrollcommand=barra.set)).
+"""
+from __future__ import annotations
+
+import tkinter as tk
+from tkinter import ttk
+
+_PREFIJO = 'r'
+
+
+class VirtualTreeview(ttk.Treeview):
+    """ttk.Treeview (selección simple) respaldado por una lista de filas."""
+
+    def __init__(self, master=None, *, margen: int = 5, etiquetas=None, on_fetch_more=None, on_sort=None, **kw):
+        self._yscroll = kw.pop('yscrollcommand', None) or kw.pop('yscroll', None)
+        kw['selectmode'] = 'browse'
+        super().__init__(master, **kw)
+        self._filas = []
+        self._offset = 0
+        # Offset con el que se llenó el pool por última vez (None: pool inválido)
+        self._offset_render = None
+        self._visibles = int(kw.get('height') or 10)
+        self._margen = margen
+        self._pool = []
+        self._sel = None
+        self._etiquetas = etiquetas
+        self._on_fetch_more = on_fetch_more
+        self._completo = True
+        self._pidiendo = False
+        self._on_sort = on_sort
+        self._orden = None
+        self._titulos = {}
+        self._render_pendiente = False
+        for evento in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.bind(evento, self._rueda, add='+')
+        for tecla in ('<Up>', '<Down>', '<Prior>', '<Next>', '<Home>', '<End>'):
+            self.bind(tecla, self._tecla, add='+')
+        self.bind('<Configure>', self._ajustar_alto, add='+')
+
+    # --- almacén de filas ---------------------------------------------------
+
+    def set_filas(self, filas, completo: bool = True, conservar: bool = False):
+        """Reemplaza todas las filas (vuelve al principio y limpia la selección).
+
+        Con conservar=True (recarga por cambios de otro equipo) mantiene el
+        desplazamiento, y la selección si la misma fila sigue estando.
+        """
+        anterior = None
+        if conservar:
+            self._sincronizar_seleccion()
+            if self._sel is not None:
+                anterior = self._filas[self._sel]
+        self._filas = list(filas)
+        self._offset_render = None
+        self._sel = None
+        if conservar:
+            if anterior is not None:
+                try:
+                    self._sel = self._filas.index(anterior)
+                except ValueError:
+                    pass
+        else:
+            self._offset = 0
+        self._completo = completo
+        self._pidiendo = False
+        self._render()
+
+    def agregar_filas(self, filas, completo=None):
+        """Agrega filas al final (lotes de una consulta o la página siguiente)."""
+        self._filas.extend(filas)
+        if completo is not None:
+            self._completo = completo
+        self._pidiendo = False
+        self._render()
+
+    def limpiar(self):
+        self.set_filas([])
+
+    def filas(self) -> list:
+        return self._filas
+
+    def fila_seleccionada(self):
+        sel = self.selection()
+        return self._filas[self._indice(sel[0])] if sel else None
+
+    @property
+    def orden(self):
+        """(columna, descendente) del último clic en un encabezado, o None."""
+        return self._orden
+
+    # --- API de Treeview sobre ids virtuales --------------------------------
+
+    def configure(self, cnf=None, **kw):
+        consumido = False
+        for clave in ('yscrollcommand', 'yscroll'):
+            if clave in kw:
+                self._yscroll = kw.pop(clave)
+                consumido = True
+        if consumido:
+            self._actualizar_barra()
+            if cnf is None and not kw:
+                return None
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    def heading(self, column, option=None, **kw):
+        if 'text' in kw:
+            self._titulos[column] = kw['text']
+        if self._on_sort is not None and column != '#0' and option is None and kw and 'command' not in kw:
+            kw['command'] = lambda c=column: self._click_orden(c)
+        return super().heading(column, option, **kw)
+
+    def insert(self, parent, index, iid=None, **kw):
+        """Compatibilidad con Treeview: agrega una fila al almacén (las tags salen de `etiquetas`)."""
+        fila = tuple(kw.get('values', ()))
+        if index in ('end', tk.END):
+            self._filas.append(fila)
+            idx = len(self._filas) - 1
+        else:
+            idx = int(index)
+            self._filas.insert(idx, fila)
+        self._programar_render()
+        return f"{_PREFIJO}{idx}"
+
+    def get_children(self, item=None):
+        if item:
+            return ()
+        return tuple(f"{_PREFIJO}{i}" for i in range(len(self._filas)))
+
+    def delete(self, *items):
+        borrar = {self._indice(i) for i in items} - {None}
+        if not borrar:
+            return
+        if len(borrar) == len(self._filas):
+            self.limpiar()
+            return
+        self._filas = [f for i, f in enumerate(self._filas) if i not in borrar]
+        self._offset_render = None
+        self._sel = None
+        self._render()
+
+    def selection(self):
+        self._sincronizar_seleccion()
+        return (f"{_PREFIJO}{self._sel}",) if self._sel is not None else ()
+
+    def selection_set(self, *items):
+        ids = items[0] if len(items) == 1 and isinstance(items[0], (list, tuple)) else items
+        self._sel = self._indice(ids[0]) if ids else None
+        self.see(ids[0]) if ids else self._render()
+
+    def see(self, item):
+        idx = self._indice(item)
+        if idx is None:
+            return super().see(item)
+        if idx < self._offset:
+            self._offset = idx
+        elif idx >= self._offset + self._visibles:
+            self._offset = idx - self._visibles + 1
+        self._render()
+
+    def item(self, item, option=None, **kw):
+        idx = self._indice(item)
+        if idx is None:
+            return super().item(item, option, **kw)
+        if kw:
+            if 'values' in kw:
+                self._filas[idx] = tuple(kw['values'])
+                self._render()
+            return None
+        fila = self._filas[idx]
+        datos = {'text': '', 'image': '', 'values': tuple(fila), 'open': 0, 'tags': self._tags(fila)}
+        return datos[option] if option is not None else datos
+
+    def identify_row(self, y):
+        iid = super().identify_row(y)
+        if iid in self._pool:
+            return f"{_PREFIJO}{self._offset + self._pool.index(iid)}"
+        return iid
+
+    def yview(self, *args):
+        total = len(self._filas)
+        if not args:
+            return self._fracciones()
+        if args[0] == 'moveto':
+            self._offset = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            paso = int(args[1])
+            self._offset += paso * (self._visibles if args[2].startswith('page') else 1)
+        self._render()
+
+    def yview_moveto(self, fraction):
+        self.yview('moveto', fraction)
+
+    def yview_scroll(self, number, what):
+        self.yview('scroll', number, what)
+
+    # --- render ---------------------------------------------------------------
+
+    def _sincronizar_seleccion(self):
+        """Toma en _sel lo que el usuario haya seleccionado con el mouse en el pool."""
+        base = self._offset_render
+        if base is None:
+            return
+        tk_sel = super().selection()
+        if tk_sel:
+            if tk_sel[0] in self._pool:
+                idx = base + self._pool.index(tk_sel[0])
+                if idx < len(self._filas):
+                    self._sel = idx
+        elif self._sel is not None and base <= self._sel < base + len(self._pool):
+            # Estaba a la vista y Tk ya no la tiene seleccionada: el usuario la quitó
+            self._sel = None
+
+    def _indice(self, item):
+        if isinstance(item, str) and item.startswith(_PREFIJO) and item[1:].isdigit():
+            idx = int(item[1:])
+            return idx if idx < len(self._filas) else None
+        return None
+
+    def _tags(self, fila):
+        if self._etiquetas is None:
+            return ()
+        return tuple(self._etiquetas(fila) or ())
+
+    def _fracciones(self):
+        total = len(self._filas)
+        if total <= self._visibles:
+            return (0.0, 1.0)
+        return (self._offset / total, min(1.0, (self._offset + self._visibles) / total))
+
+    def _actualizar_barra(self):
+        if self._yscroll is not None:
+            primero, ultimo = self._fracciones()
+            try:
+                self._yscroll(primero, ultimo)
+            except tk.TclError:
+                pass
+
+    def _programar_render(self):
+        if not self._render_pendiente:
+            self._render_pendiente = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        self._render_pendiente = False
+        self._sincronizar_seleccion()
+        total = len(self._filas)
+        self._offset = max(0, min(self._offset, total - self._visibles))
+        ventana = self._filas[self._offset:self._offset + self._visibles + self._margen]
+        # Ajustar el pool al tamaño de la ventana (sólo crece hasta visibles + margen)
+        while len(self._pool) < len(ventana):
+            self._pool.append(super().insert('', 'end', iid=f"v{len(self._pool)}"))
+        while len(self._pool) > len(ventana):
+            super().delete(self._pool.pop())
+        for iid, fila in zip(self._pool, ventana):
+            super().item(iid, values=fila, tags=self._tags(fila))
+        # Reflejar en Tk la fila seleccionada si está en la ventana
+        objetivo = ()
+        if self._sel is not None and self._offset <= self._sel < self._offset + len(self._pool):
+            objetivo = (self._pool[self._sel - self._offset],)
+        if tuple(super().selection()) != objetivo:
+            super().selection_set(objetivo)
+        self._offset_render = self._offset
+        self.tk.call(self._w, 'yview', 'moveto', 0)
+        self._actualizar_barra()
+        # Pedir más filas al acercarse al final de lo cargado
+        if (self._on_fetch_more is not None and not self._completo and not self._pidiendo
+                and self._offset + self._visibles + self._margen >= total):
+            self._pidiendo = True
+            self.after_idle(self._on_fetch_more)
+
+    def _ajustar_alto(self, event):
+        if not self._pool:
+            return
+        caja = self.bbox(self._pool[0])
+        if not caja or caja[3] <= 0:
+            return
+        visibles = max(1, (event.height - caja[1]) // caja[3])
+        if visibles != self._visibles:
+            self._visibles = visibles
+            self._render()
+
+    # --- eventos ----------------------------------------------------------------
+
+    def _rueda(self, event):
+        if event.num == 4:
+            paso = -3
+        elif event.num == 5:
+            paso = 3
+        else:
+            paso = -3 if event.delta > 0 else 3
+        self.yview('scroll', paso, 'units')
+        return 'break'
+
+    def _tecla(self, event):
+        total = len(self._filas)
+        if not total:
+            return 'break'
+        self._sincronizar_seleccion()
+        actual = self._sel if self._sel is not None else self._offset - 1
+        destino = {
+            'Up': actual - 1, 'Down': actual + 1,
+            'Prior': actual - self._visibles, 'Next': actual + self._visibles,
+            'Home': 0, 'End': total - 1,
+        }.get(event.keysym, actual)
+        self._sel = max(0, min(destino, total - 1))
+        self.see(f"{_PREFIJO}{self._sel}")
+        return 'break'
+
+    def _click_orden(self, columna):
+        descendente = bool(self._orden and self._orden[0] == columna and not self._orden[1])
+        self._orden = (columna, descendente)
+        for col, texto in self._titulos.items():
+            flecha = (' ▼' if descendente else ' ▲') if col == columna else ''
+            super().heading(col, text=texto + flecha)
+        self._on_sort(columna, descendente)
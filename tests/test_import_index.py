@@ -0,0 +1,95 @@
+"""Reintento de una importación con el mismo ImportIndex después de un ROLLBACK.
+
+Usa una base temporal (no toca la de AppData), sembrada como en tools/bench_import.py.
+
+Uso:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='test_import_index_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'tools'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection  # noqa: E402
+from import_index import ImportIndex  # noqa: E402
+import sync_utils  # noqa: E402
+from bench_import import _sembrar, _borrar_historial  # noqa: E402
+
+N_TICKETS = 60
+TICKETS_POR_CAJA = 20
+
+
+class ReintentoTrasFallo(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+        cls.n_cajas, cls.n_tickets = _sembrar(N_TICKETS, TICKETS_POR_CAJA)
+        cls.origenes = []
+        conn = get_connection()
+        try:
+            for nombre in ('caja_a.db', 'caja_b.db'):
+                ruta = os.path.join(os.environ['LOCALAPPDATA'], nombre)
+                conn.execute("VACUUM INTO ?", (ruta,))
+                cls.origenes.append(ruta)
+        finally:
+            conn.close()
+
+    def setUp(self):
+        _borrar_historial()
+
+    def _fallar_una_vez(self):
+        """El próximo _actualizar_resumenes (ya dentro de la transacción) falla."""
+        original = sync_utils._actualizar_resumenes
+
+        def _fallar(cur, cajas):
+            sync_utils._actualizar_resumenes = original
+            raise RuntimeError("falla simulada")
+
+        sync_utils._actualizar_resumenes = _fallar
+        self.addCleanup(setattr, sync_utils, '_actualizar_resumenes', original)
+
+    def _contar(self, tabla):
+        conn = get_connection()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _verificar_todo_importado(self, res):
+        self.assertEqual(res['cajas_nuevas'], self.n_cajas)
+        self.assertEqual(res['ventas_nuevas'], self.n_tickets)
+        self.assertEqual(res['tickets_nuevos'], self.n_tickets)
+        self.assertEqual(res['items_nuevos'], self.n_tickets)
+        self.assertEqual(self._contar('tickets'), self.n_tickets)
+        self.assertEqual(self._contar('venta_items'), self.n_tickets)
+
+    def test_import_from_db(self):
+        indice = ImportIndex()
+        self._fallar_una_vez()
+        with self.assertRaises(RuntimeError):
+            sync_utils.import_from_db(self.origenes[0], indice=indice)
+        self.assertEqual(self._contar('tickets'), 0)
+
+        self._verificar_todo_importado(sync_utils.import_from_db(self.origenes[0], indice=indice))
+
+    def test_import_many(self):
+        indice = ImportIndex()
+        self._fallar_una_vez()
+        with self.assertRaises(RuntimeError):
+            sync_utils.import_many(self.origenes, indice=indice)
+        self.assertEqual(self._contar('tickets'), 0)
+
+        # Los dos orígenes son la misma base: el segundo no agrega nada
+        self._verificar_todo_importado(sync_utils.import_many(self.origenes, indice=indice))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Marcas de agua de la importación: qué se vuelve a leer del origen y qué no.
+
+Usa una base temporal (no toca la de AppData), sembrada como en tools/bench_import.py.
+
+Uso:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='test_import_marcas_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'tools'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection, open_connection  # noqa: E402
+from sync_utils import import_from_db  # noqa: E402
+from bench_import import _sembrar, _borrar_historial, _agregar_caja  # noqa: E402
+
+N_TICKETS = 40
+TICKETS_POR_CAJA = 10
+
+
+class MarcasDeAgua(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+        _borrar_historial()
+        cls.n_cajas, cls.n_tickets = _sembrar(N_TICKETS, TICKETS_POR_CAJA)
+        cls.dir = tempfile.mkdtemp(prefix='origenes_', dir=os.environ['LOCALAPPDATA'])
+        cls.base = os.path.join(cls.dir, 'base.db')
+        conn = get_connection()
+        try:
+            conn.execute("VACUUM INTO ?", (cls.base,))
+        finally:
+            conn.close()
+
+    def setUp(self):
+        # Cada prueba parte de la base local vacía y de una copia propia del origen, ya importada
+        _borrar_historial()
+        self.origen = os.path.join(self.dir, f'{self._testMethodName}.db')
+        shutil.copy2(self.base, self.origen)
+        res = import_from_db(self.origen)
+        self.assertFalse(res['incremental'])
+        self.assertEqual(res['tickets_nuevos'], self.n_tickets)
+
+    def _origen(self, sql, params=()):
+        src = open_connection(self.origen)
+        try:
+            with src:
+                return src.execute(sql, params).lastrowid
+        finally:
+            src.close()
+
+    def _agregar_tickets(self, caja_id, desde, cantidad):
+        for j in range(desde, desde + cantidad):
+            fecha_hora = f"2031-01-01 18:00:{j:02d}"
+            venta_id = self._origen(
+                "INSERT INTO ventas (fecha_hora, total_venta, metodo_pago_id, caja_id) VALUES (?, 1000, 1, ?)",
+                (fecha_hora, caja_id),
+            )
+            ticket_id = self._origen(
+                "INSERT INTO tickets (venta_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket) "
+                "VALUES (?, 1, ?, 'Impreso', 1000, ?)",
+                (venta_id, fecha_hora, f"A{j:07d}"),
+            )
+            self._origen(
+                "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?, 1, 1, 1000, 1000)",
+                (ticket_id,),
+            )
+
+    def _contar(self, tabla):
+        conn = get_connection()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_mismo_archivo_sin_cambios(self):
+        res = import_from_db(self.origen)
+        self.assertTrue(res['sin_cambios'])
+        self.assertEqual(res['tickets_nuevos'], 0)
+
+    def test_caja_cerrada_nueva_se_lee_sola(self):
+        _agregar_caja(self.origen, 5)
+        res = import_from_db(self.origen)
+        self.assertFalse(res['sin_cambios'])
+        self.assertTrue(res['incremental'])
+        self.assertEqual((res['src_cajas'], res['src_ventas'], res['src_tickets'], res['src_items']), (1, 5, 5, 5))
+        self.assertEqual((res['cajas_nuevas'], res['tickets_nuevos'], res['items_nuevos']), (1, 5, 5))
+        self.assertEqual(self._contar('tickets'), self.n_tickets + 5)
+
+    def test_caja_abierta_se_vuelve_a_leer(self):
+        conn = get_connection()
+        try:
+            pos_uuid = conn.execute("SELECT pos_uuid FROM pos LIMIT 1").fetchone()[0]
+        finally:
+            conn.close()
+        caja_id = self._origen(
+            "INSERT INTO caja_diaria (caja_uuid, pos_uuid, codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+            "VALUES ('caja-abierta-test', ?, 'BAR-ABIERTA', 'BAR', '2031-01-01', '18:00:00', 5000, 'abierta')",
+            (pos_uuid,),
+        )
+        self._agregar_tickets(caja_id, 0, 3)
+        res = import_from_db(self.origen)
+        self.assertEqual((res['cajas_nuevas'], res['tickets_nuevos']), (1, 3))
+
+        # Las filas de la caja abierta quedan antes de la marca: se leen otra vez, sin duplicarse
+        self._agregar_tickets(caja_id, 3, 2)
+        res = import_from_db(self.origen)
+        self.assertTrue(res['incremental'])
+        self.assertEqual((res['src_cajas'], res['src_tickets']), (1, 5))
+        self.assertEqual((res['cajas_nuevas'], res['tickets_nuevos']), (0, 2))
+        self.assertEqual(self._contar('tickets'), self.n_tickets + 5)
+
+    def test_marca_que_no_coincide_lee_todo(self):
+        # El ticket de la marca cambió en el origen (p. ej. se restauró otra base del mismo equipo)
+        self._origen("UPDATE tickets SET fecha_hora = '1999-01-01 00:00:00' WHERE id = (SELECT MAX(id) FROM tickets)")
+        res = import_from_db(self.origen)
+        self.assertFalse(res['sin_cambios'])
+        self.assertFalse(res['incremental'])
+        self.assertEqual((res['src_cajas'], res['src_tickets']), (self.n_cajas, self.n_tickets))
+
+
+if __name__ == '__main__':
+    unittest.main()
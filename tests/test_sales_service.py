@@ -0,0 +1,171 @@
+"""Cobro atómico, numeración sin huecos y anulación de SalesService.
+
+Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python -m unittest discover tests
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='test_sales_service_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection  # noqa: E402
+import sales_service  # noqa: E402
+from sales_service import SalesService, TicketSequence, anular_ticket  # noqa: E402
+
+
+class CobroYAnulacion(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+        conn = get_connection()
+        try:
+            cls.productos = conn.execute(
+                "SELECT id, nombre, precio_venta, codigo_producto FROM products ORDER BY id LIMIT 2"
+            ).fetchall()
+            conn.execute("UPDATE products SET stock_actual = 100, contabiliza_stock = 1 WHERE id IN (?, ?)",
+                         (cls.productos[0][0], cls.productos[1][0]))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def setUp(self):
+        conn = get_connection()
+        try:
+            # Una sola caja abierta a la vez: cada prueba arranca con la suya (total_tickets=0)
+            conn.execute("UPDATE caja_diaria SET estado='cerrada' WHERE estado='abierta'")
+            cur = conn.execute(
+                "INSERT INTO caja_diaria (codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+                "VALUES ('TEST', 'BAR', date('now'), time('now'), 0, 'abierta')"
+            )
+            self.caja_id = cur.lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+        self.service = SalesService(self.caja_id)
+        (p1, n1, pr1, _c1), (p2, n2, pr2, _c2) = self.productos
+        self.carrito = [[p1, n1, pr1, 2], [p2, n2, pr2, 1]]
+
+    def _estado(self):
+        """Lo que un cobro escribe: filas, stock, contador de la caja y rollup."""
+        conn = get_connection()
+        try:
+            contar = lambda tabla: conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            stock = conn.execute(
+                "SELECT id, stock_actual FROM products WHERE id IN (?, ?) ORDER BY id",
+                (self.productos[0][0], self.productos[1][0]),
+            ).fetchall()
+            total_tickets = conn.execute(
+                "SELECT COALESCE(total_tickets, 0) FROM caja_diaria WHERE id=?", (self.caja_id,)
+            ).fetchone()[0]
+            rollup = conn.execute(
+                "SELECT COALESCE(SUM(unidades), 0), COALESCE(SUM(anulados), 0) FROM ventas_diarias"
+            ).fetchone()
+            return {
+                'ventas': contar('ventas'),
+                'tickets': contar('tickets'),
+                'venta_items': contar('venta_items'),
+                'stock': dict(stock),
+                'total_tickets': total_tickets,
+                'rollup': tuple(rollup),
+            }
+        finally:
+            conn.close()
+
+    def test_falla_a_mitad_del_cobro_no_escribe_nada(self):
+        antes = self._estado()
+        original = sales_service.ventas_diarias.registrar_venta
+
+        def _fallar(*args, **kwargs):
+            raise RuntimeError("falla simulada")
+
+        # registrar_venta corre al final: ventas, tickets, items y stock ya se escribieron
+        sales_service.ventas_diarias.registrar_venta = _fallar
+        self.addCleanup(setattr, sales_service.ventas_diarias, 'registrar_venta', original)
+        with self.assertRaises(RuntimeError):
+            self.service.checkout(self.carrito, 'Efectivo')
+        self.assertEqual(self._estado(), antes)
+
+        # La numeración no quedó con huecos: el próximo cobro arranca en 1
+        sales_service.ventas_diarias.registrar_venta = original
+        result = self.service.checkout(self.carrito, 'Efectivo')
+        self.assertEqual([t['identificador'].rsplit('-', 1)[1] for t in result['tickets']], ['1', '2', '3'])
+
+    def test_cobro_escribe_todo_el_carrito(self):
+        antes = self._estado()
+        result = self.service.checkout(self.carrito, 'Efectivo')
+        despues = self._estado()
+        self.assertEqual(despues['ventas'], antes['ventas'] + 1)
+        self.assertEqual(despues['tickets'], antes['tickets'] + 3)
+        self.assertEqual(despues['venta_items'], antes['venta_items'] + 3)
+        self.assertEqual(despues['total_tickets'], 3)
+        self.assertEqual(despues['rollup'][0], antes['rollup'][0] + 3)
+        (p1, *_r1), (p2, *_r2) = self.productos
+        self.assertEqual(despues['stock'][p1], antes['stock'][p1] - 2)
+        self.assertEqual(despues['stock'][p2], antes['stock'][p2] - 1)
+
+        # Un ticket por unidad: {codigo}-{ddmmaaaa}-{n} con n correlativo dentro de la caja
+        hoy = datetime.datetime.now().strftime('%d%m%Y')
+        codigos = {pid: (codigo or str(pid)) for pid, _n, _p, codigo in self.productos}
+        esperados = [f"{codigos[p1]}-{hoy}-1", f"{codigos[p1]}-{hoy}-2", f"{codigos[p2]}-{hoy}-3"]
+        self.assertEqual([t['identificador'] for t in result['tickets']], esperados)
+        conn = get_connection()
+        try:
+            guardados = [r[0] for r in conn.execute(
+                "SELECT identificador_ticket FROM tickets WHERE venta_id=? ORDER BY id", (result['venta_id'],)
+            )]
+        finally:
+            conn.close()
+        self.assertEqual(guardados, esperados)
+
+        # El segundo cobro sigue la numeración
+        result = self.service.checkout(self.carrito[:1], 'Efectivo')
+        self.assertEqual([t['identificador'] for t in result['tickets']],
+                         [f"{codigos[p1]}-{hoy}-4", f"{codigos[p1]}-{hoy}-5"])
+
+    def test_numeracion_sin_caja(self):
+        seq = TicketSequence(None)
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            primero = seq.reserve(cur, 2)
+            segundo = seq.reserve(cur, 3)
+            conn.rollback()
+            tras_rollback = seq.reserve(cur, 1)
+            conn.rollback()
+        finally:
+            conn.close()
+        self.assertEqual(list(segundo), list(range(primero[-1] + 1, primero[-1] + 4)))
+        self.assertEqual(tras_rollback[0], primero[0])
+
+    def test_anular_dos_veces_devuelve_stock_una_vez(self):
+        result = self.service.checkout(self.carrito, 'Efectivo')
+        ticket = result['tickets'][0]
+        antes = self._estado()
+
+        anular_ticket(ticket['ticket_id'])
+        anulado = self._estado()
+        self.assertEqual(anulado['stock'][ticket['producto_id']], antes['stock'][ticket['producto_id']] + 1)
+        self.assertEqual(anulado['rollup'], (antes['rollup'][0] - 1, antes['rollup'][1] + 1))
+
+        anular_ticket(ticket['ticket_id'])
+        self.assertEqual(self._estado(), anulado)
+        conn = get_connection()
+        try:
+            status = conn.execute("SELECT status FROM tickets WHERE id=?", (ticket['ticket_id'],)).fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(status, 'Anulado')
+
+
+if __name__ == '__main__':
+    unittest.main()
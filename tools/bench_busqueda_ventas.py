@@ -0,0 +1,65 @@
+"""Benchmark del índice de búsqueda rápida de la pantalla de ventas.
+
+Arma IndiceProductos con un catálogo sintético y mide cada tecla de varias
+búsquedas tipeadas de a una letra (lo que hace VentasViewNew en cada cambio
+del buscador), más el rearmado del índice al recargar productos.
+No toca la base.
+
+Uso:
+    python tools/bench_busqueda_ventas.py [productos]
+"""
+import os
+import sys
+import time
+import random
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from indice_productos import IndiceProductos  # noqa: E402
+
+BASES = ['Hamburguesa', 'Choripán', 'Gaseosa', 'Agua', 'Café', 'Pancho', 'Empanada', 'Cerveza',
+         'Papas fritas', 'Tostado', 'Medialuna', 'Alfajor', 'Jugo', 'Pizza', 'Milanesa']
+VARIANTES = ['', 'grande', 'chica', 'con queso', 'sin sal', 'light', 'doble', 'especial', 'de carne', 'de pollo']
+BUSQUEDAS = ['hamburguesa doble', 'cafe', 'papas', 'empanada de pollo', 'cerv', 'zzz', 'c q']
+
+
+def _catalogo(n):
+    rnd = random.Random(7)
+    productos = []
+    for i in range(n):
+        nombre = f"{BASES[i % len(BASES)]} {VARIANTES[rnd.randrange(len(VARIANTES))]}".strip()
+        codigo = f"{779000000000 + i:013d}" if i % 2 else nombre[:4].upper() + str(i)
+        productos.append((i + 1, nombre, 1000, 10, 1, codigo, 1, i + 1))
+    return productos
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    productos = _catalogo(n)
+    t0 = time.perf_counter()
+    indice = IndiceProductos(productos)
+    print(f"índice de {n} productos: {(time.perf_counter() - t0) * 1000:.2f} ms")
+
+    tiempos = []
+    for _ in range(20):
+        for busqueda in BUSQUEDAS:
+            for i in range(1, len(busqueda) + 1):
+                t0 = time.perf_counter()
+                indice.buscar(busqueda[:i])
+                tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    print(f"por tecla: mediana {statistics.median(tiempos):.3f} ms | p95 {tiempos[int(len(tiempos) * 0.95)]:.3f} ms"
+          f" | máx {tiempos[-1]:.3f} ms | n={len(tiempos)}")
+
+    codigo = productos[1][5]
+    assert indice.por_codigo(codigo)[0] == productos[1][0]
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        indice.por_codigo(codigo)
+    print(f"código exacto: {(time.perf_counter() - t0):.3f} ms por búsqueda")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark del listado de cajas: subconsultas correlacionadas vs. caja_resumen.
+
+Siembra una temporada de cajas (299 cerradas + 1 abierta) con tickets en
+efectivo/transferencia, algunos anulados y movimientos, y compara la consulta
+anterior de CajaListadoView.cargar_cajas con caja_resumen.listar_cajas.
+Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python tools/bench_caja_listado.py [cajas] [tickets_por_caja]
+"""
+import os
+import sys
+import tempfile
+import time
+import random
+import statistics
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_caja_listado_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection, transaction  # noqa: E402
+from caja_resumen import listar_cajas, backfill_resumenes  # noqa: E402
+
+# Consulta previa de CajaListadoView.cargar_cajas (ocho subconsultas por fila)
+SQL_ANTERIOR = (
+    "SELECT cd.id, cd.codigo_caja, cd.fecha, COALESCE(cd.cajero_apertura, cd.usuario_apertura) as cajero_apertura, COALESCE(cd.fondo_inicial,0),"
+    " (SELECT COALESCE(SUM(t.total_ticket),0) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=cd.id AND t.status!='Anulado') as total_ventas,"
+    " (SELECT COALESCE(SUM(t.total_ticket),0) FROM tickets t JOIN ventas v ON v.id=t.venta_id LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id WHERE v.caja_id=cd.id AND t.status!='Anulado' AND (LOWER(mp.descripcion) LIKE 'efectivo%' OR LOWER(mp.descripcion)='efectivo')) as ventas_efectivo,"
+    " CASE WHEN LOWER(COALESCE(cd.estado,''))='abierta' THEN ("
+    "   SELECT COALESCE(SUM(t.total_ticket),0) FROM tickets t JOIN ventas v ON v.id=t.venta_id"
+    "     LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id"
+    "    WHERE v.caja_id=cd.id AND t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'transfer%')"
+    " ELSE COALESCE(cd.transferencias_final, ("
+    "   SELECT COALESCE(SUM(t.total_ticket),0) FROM tickets t JOIN ventas v ON v.id=t.venta_id"
+    "     LEFT JOIN metodos_pago mp ON mp.id=v.metodo_pago_id"
+    "    WHERE v.caja_id=cd.id AND t.status!='Anulado' AND LOWER(mp.descripcion) LIKE 'transfer%')) END AS transferencias_final,"
+    " (SELECT COALESCE(SUM(m.monto),0) FROM caja_movimiento m WHERE m.caja_id=cd.id AND m.tipo='INGRESO') as ingresos,"
+    " (SELECT COALESCE(SUM(m.monto),0) FROM caja_movimiento m WHERE m.caja_id=cd.id AND m.tipo='RETIRO') as retiros,"
+    " COALESCE(cd.conteo_efectivo_final,0),"
+    " COALESCE(cd.diferencia,0),"
+    " (SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=cd.id AND t.status!='Anulado') as total_tickets,"
+    " (SELECT COUNT(*) FROM tickets t JOIN ventas v ON v.id=t.venta_id WHERE v.caja_id=cd.id AND t.status='Anulado') as tickets_anulados,"
+    " COALESCE(cd.estado, ''), COALESCE(cd.descripcion_evento, '')"
+    " FROM caja_diaria cd ORDER BY cd.fecha DESC LIMIT 200"
+)
+
+
+def _sembrar(n_cajas, tickets_por_caja):
+    rnd = random.Random(7)
+    with transaction() as conn:
+        cur = conn.cursor()
+        metodos = [r[0] for r in cur.execute("SELECT id FROM metodos_pago ORDER BY id").fetchall()]
+        productos = [r[0] for r in cur.execute("SELECT id FROM products").fetchall()]
+        for i in range(n_cajas):
+            abierta = i == n_cajas - 1
+            fecha = f"2025-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}"
+            cur.execute(
+                "INSERT INTO caja_diaria (codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+                "VALUES (?, 'BAR', ?, '18:00:00', 5000, ?)",
+                (f"BAR-{i:04d}", fecha, 'abierta' if abierta else 'cerrada'),
+            )
+            caja_id = cur.lastrowid
+            for _ in range(tickets_por_caja // 3):
+                cur.execute(
+                    "INSERT INTO ventas (fecha_hora, total_venta, metodo_pago_id, caja_id) VALUES (?, 0, ?, ?)",
+                    (f"{fecha} 19:00:00", rnd.choice(metodos), caja_id),
+                )
+                venta_id = cur.lastrowid
+                cur.executemany(
+                    "INSERT INTO tickets (venta_id, producto_id, fecha_hora, status, total_ticket) VALUES (?, ?, ?, ?, ?)",
+                    [(venta_id, rnd.choice(productos), f"{fecha} 19:00:00",
+                      'Anulado' if rnd.random() < 0.03 else 'Impreso', rnd.choice((1000, 1500, 2000, 3000)))
+                     for _ in range(3)],
+                )
+            cur.executemany(
+                "INSERT INTO caja_movimiento (caja_id, tipo, monto) VALUES (?, ?, ?)",
+                [(caja_id, 'INGRESO', 2000), (caja_id, 'RETIRO', 1500), (caja_id, 'RETIRO', 500)],
+            )
+
+
+def _medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    n_cajas = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    tickets_por_caja = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    init_db()
+    _sembrar(n_cajas, tickets_por_caja)
+    t0 = time.perf_counter()
+    backfill_resumenes()
+    print(f"backfill de {n_cajas - 1} cajas cerradas: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    cur = get_connection().cursor()
+    anterior = cur.execute(SQL_ANTERIOR).fetchall()
+    nuevo = listar_cajas(cur)
+    assert [r[:16] for r in anterior] == nuevo, "los totales no coinciden"
+
+    repeticiones = 20
+    print(f"{'subconsultas':>14}: mediana {_medir(lambda: cur.execute(SQL_ANTERIOR).fetchall(), repeticiones):8.2f} ms")
+    print(f"{'caja_resumen':>14}: mediana {_medir(lambda: listar_cajas(cur), repeticiones):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark de cobro: venta de 1 unidad vs. venta de 50 unidades.
+
+Mide el tiempo desde que se llama a SalesService.checkout hasta tener la info
+de tickets lista para imprimir. Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python tools/bench_checkout.py [repeticiones]
+"""
+import os
+import sys
+import tempfile
+import time
+import statistics
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_checkout_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection  # noqa: E402
+from sales_service import SalesService  # noqa: E402
+
+
+def _abrir_caja() -> int:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO caja_diaria (codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+        "VALUES ('BENCH', 'BAR', date('now'), time('now'), 0, 'abierta')"
+    )
+    caja_id = cur.lastrowid
+    # stock holgado para no quedar negativos durante el benchmark
+    cur.execute("UPDATE products SET stock_actual = 1000000")
+    conn.commit()
+    conn.close()
+    return caja_id
+
+
+def _medir(service, carrito, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        result = service.checkout(carrito, 'Efectivo')
+        tiempos.append((time.perf_counter() - t0) * 1000)
+        assert len(result['tickets']) == sum(item[3] for item in carrito)
+    return tiempos
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    init_db()
+    service = SalesService(_abrir_caja())
+    conn = get_connection()
+    productos = conn.execute("SELECT id, nombre, precio_venta FROM products ORDER BY id LIMIT 5").fetchall()
+    conn.close()
+
+    carrito_1 = [[productos[0][0], productos[0][1], productos[0][2], 1]]
+    # 50 unidades repartidas en 5 productos
+    carrito_50 = [[pid, nombre, precio, 10] for pid, nombre, precio in productos]
+
+    _medir(service, carrito_1, 3)  # calentamiento
+    for nombre, carrito in (("1 unidad", carrito_1), ("50 unidades", carrito_50)):
+        tiempos = _medir(service, carrito, repeticiones)
+        print(f"{nombre:>12}: mediana {statistics.median(tiempos):7.2f} ms | "
+              f"p95 {sorted(tiempos)[int(len(tiempos) * 0.95) - 1]:7.2f} ms | n={repeticiones}")
+
+
+if __name__ == '__main__':
+    main()
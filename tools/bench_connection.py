@@ -0,0 +1,57 @@
+"""Micro-benchmark: costo de abrir conexión por llamada vs. conexión persistente.
+
+Compara el patrón anterior de get_connection() (sqlite3.connect + PRAGMA
+foreign_keys en cada llamada) con la conexión persistente por hilo de
+db_utils, ejecutando una consulta trivial como hacen las vistas al refrescar.
+
+Uso:
+    python tools/bench_connection.py [iteraciones]
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_conn_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection  # noqa: E402
+from utils_paths import DB_PATH  # noqa: E402
+
+
+def _conexion_por_llamada():
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("SELECT id, descripcion FROM metodos_pago").fetchall()
+    conn.close()
+
+
+def _conexion_persistente():
+    conn = get_connection()
+    conn.execute("SELECT id, descripcion FROM metodos_pago").fetchall()
+    conn.close()
+
+
+def _medir(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / n
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    init_db()
+    _conexion_persistente()  # abre y configura la conexión del hilo
+    antes = _medir(_conexion_por_llamada, n)
+    despues = _medir(_conexion_persistente, n)
+    print(f"connect() por llamada : {antes:8.1f} us/consulta")
+    print(f"conexión persistente  : {despues:8.1f} us/consulta")
+    print(f"ahorro                : {antes / despues:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Benchmark de la exportación del historial: fetchall + lista en memoria vs. exportador.
+
+Siembra N ítems de venta (un ticket por ítem) y exporta la consulta del
+historial a CSV y XLSX con exportador, midiendo tiempo y pico de memoria
+(tracemalloc). Como referencia mide lo que hacía HistorialView antes de
+llegar a pandas: fetchall() y armar una fila dict por ítem (el DataFrame y
+to_excel suman todavía más encima). Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python tools/bench_export.py [items]
+"""
+import os
+import sys
+import tempfile
+import time
+import random
+import tracemalloc
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_export_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection, transaction  # noqa: E402
+from exportador import exportar_csv, exportar_xlsx  # noqa: E402
+
+# Consulta de HistorialView.exportar_excel (sin filtros: historial completo)
+SQL = """
+    SELECT v.fecha_hora, p.nombre, vi.subtotal, c.descripcion, t.status,
+           cd.codigo_caja, t.identificador_ticket, mp.descripcion as metodo_pago,
+           vi.cantidad, cd.disciplina
+    FROM venta_items vi
+    LEFT JOIN tickets t ON vi.ticket_id = t.id
+    LEFT JOIN ventas v ON t.venta_id = v.id
+    LEFT JOIN products p ON vi.producto_id = p.id
+    LEFT JOIN Categoria_Producto c ON t.categoria_id = c.id
+    LEFT JOIN caja_diaria cd ON v.caja_id = cd.id
+    LEFT JOIN metodos_pago mp ON v.metodo_pago_id = mp.id
+    ORDER BY v.fecha_hora DESC, v.id, t.categoria_id
+"""
+ENCABEZADOS = ["Fecha", "Item", "Monto Total", "Categoria", "Estado", "Caja (código)",
+               "Identificador", "Método de Pago", "Cantidad", "Disciplina"]
+
+
+def _sembrar(n_items):
+    rnd = random.Random(7)
+    with transaction() as conn:
+        cur = conn.cursor()
+        metodos = [r[0] for r in cur.execute("SELECT id FROM metodos_pago ORDER BY id").fetchall()]
+        productos = [r[0] for r in cur.execute("SELECT id FROM products").fetchall()]
+        n_cajas = max(1, n_items // 1500)
+        for i in range(n_cajas):
+            fecha = f"2025-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}"
+            cur.execute(
+                "INSERT INTO caja_diaria (codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+                "VALUES (?, 'BAR', ?, '18:00:00', 5000, 'cerrada')",
+                (f"BAR-{i:04d}", fecha),
+            )
+            caja_id = cur.lastrowid
+            por_caja = n_items // n_cajas + (1 if i < n_items % n_cajas else 0)
+            for j in range(0, por_caja, 3):
+                cur.execute(
+                    "INSERT INTO ventas (fecha_hora, total_venta, metodo_pago_id, caja_id) VALUES (?, 0, ?, ?)",
+                    (f"{fecha} 19:{j // 60 % 60:02d}:{j % 60:02d}", rnd.choice(metodos), caja_id),
+                )
+                venta_id = cur.lastrowid
+                for k in range(min(3, por_caja - j)):
+                    prod = rnd.choice(productos)
+                    precio = rnd.choice((1000, 1500, 2000, 3000))
+                    cur.execute(
+                        "INSERT INTO tickets (venta_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (venta_id, prod, f"{fecha} 19:00:00", 'Anulado' if rnd.random() < 0.03 else 'Impreso',
+                         precio, f"BAR-{i:04d}-{j + k:05d}"),
+                    )
+                    cur.execute(
+                        "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) "
+                        "VALUES (?, ?, 1, ?, ?)",
+                        (cur.lastrowid, prod, precio, precio),
+                    )
+
+
+def _anterior(cur):
+    rows = cur.execute(SQL).fetchall()
+    return [dict(zip(ENCABEZADOS, r)) for r in rows]
+
+
+def _medir(nombre, fn):
+    # Tiempo sin tracemalloc (lo hace varias veces más lento); el pico en otra pasada
+    t0 = time.perf_counter()
+    resultado = fn()
+    segundos = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    _actual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nombre:>22}: {segundos:7.2f} s   pico {pico / 1e6:8.1f} MB")
+    return resultado
+
+
+def main():
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    init_db()
+    t0 = time.perf_counter()
+    _sembrar(n_items)
+    print(f"siembra de {n_items} ítems: {time.perf_counter() - t0:.1f} s")
+
+    salida = tempfile.mkdtemp(prefix='bench_export_out_')
+    cur = get_connection().cursor()
+    filas = _medir("fetchall + dicts", lambda: len(_anterior(cur)))
+    csv_path = os.path.join(salida, 'historial.csv')
+    xlsx_path = os.path.join(salida, 'historial.xlsx')
+    n_csv = _medir("exportar_csv", lambda: exportar_csv(cur, SQL, (), csv_path, ENCABEZADOS))
+    n_xlsx = _medir("exportar_xlsx", lambda: exportar_xlsx(cur, SQL, (), xlsx_path, ENCABEZADOS))
+    assert filas == n_csv == n_xlsx == n_items, (filas, n_csv, n_xlsx)
+
+    # El XLSX tiene que ser XML válido con encabezado + una fila por ítem
+    with zipfile.ZipFile(xlsx_path) as zf:
+        assert zf.testzip() is None
+        with zf.open('xl/worksheets/sheet1.xml') as hoja:
+            filas_xml = 0
+            for _evento, elem in iterparse(hoja):
+                if elem.tag.endswith('}row'):
+                    filas_xml += 1
+                    elem.clear()
+    assert filas_xml == n_items + 1, filas_xml
+    print(f"csv {os.path.getsize(csv_path) / 1e6:.1f} MB, xlsx {os.path.getsize(xlsx_path) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
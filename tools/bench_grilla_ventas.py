@@ -0,0 +1,108 @@
+"""Benchmark del redibujo de la grilla de productos de VentasViewNew.
+
+Crea la pantalla de ventas con N productos (base temporal) y mide:
+- armado inicial de la pantalla y cantidad de tarjetas (el pool depende del
+  alto del panel, no de N: probar con 200 y 2000),
+- reconstruir: destruir y volver a crear el pool de tarjetas,
+- redibujo sin cambios (diff),
+- refresco post-venta de las tarjetas vendidas,
+- desplazar una fila y una página (reasignar el pool a otros productos),
+- una flecha del modo ordenar,
+- recargar_productos con un precio cambiado en la base.
+Cada medición incluye update_idletasks() para contar también la geometría.
+Necesita display (Tk); no toca la base de AppData.
+
+Uso:
+    python tools/bench_grilla_ventas.py [productos] [repeticiones]
+"""
+import os
+import sys
+import tempfile
+import time
+import statistics
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_grilla_ventas_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+import tkinter as tk  # noqa: E402
+
+from init_db import init_db  # noqa: E402
+from db_utils import transaction  # noqa: E402
+
+
+def _sembrar(n):
+    with transaction() as conn:
+        cur = conn.cursor()
+        existentes = cur.execute("SELECT COUNT(*) FROM products WHERE visible=1").fetchone()[0]
+        cur.executemany(
+            "INSERT INTO products (codigo_producto, nombre, precio_compra, precio_venta, stock_actual, visible) "
+            "VALUES (?, ?, 500, ?, 50, 1)",
+            [(f"B{i:03d}", f"Producto {i}", 1000 + i * 10) for i in range(max(0, n - existentes))],
+        )
+
+
+def _medir(root, fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        root.update_idletasks()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos), max(tiempos)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    init_db()
+    _sembrar(n)
+    from ventas_view_new import VentasViewNew
+
+    root = tk.Tk()
+    root.geometry("1400x900")
+    t0 = time.perf_counter()
+    view = VentasViewNew(root, cobrar_callback=lambda *a, **k: None, imprimir_ticket_callback=lambda *a: None)
+    view.pack(fill=tk.BOTH, expand=True)
+    root.update()
+    armado = (time.perf_counter() - t0) * 1000
+    print(f"{len(view.productos)} productos, {len(view._pool)} tarjetas en el pool, armado {armado:.1f} ms")
+
+    vendidos = [p[0] for p in view.productos[:3]]
+
+    def _post_venta():
+        for pid in vendidos:
+            view.stock_dict[pid] -= 1
+        view._refrescar_tarjetas(vendidos)
+
+    def _cambiar_precio_y_recargar():
+        with transaction() as conn:
+            conn.execute("UPDATE products SET precio_venta = precio_venta + 1 WHERE id=?", (vendidos[0],))
+        view.recargar_productos()
+
+    casos = [
+        ("reconstruir (antes)", lambda: view._draw_productos(reconstruir=True)),
+        ("redibujo sin cambios", view._draw_productos),
+        ("post-venta (3 tarjetas)", _post_venta),
+        ("recargar (1 precio)", _cambiar_precio_y_recargar),
+        ("desplazar 1 fila", lambda: view._scroll_grilla('scroll', 1, 'units')),
+        ("desplazar 1 página", lambda: view._scroll_grilla('scroll', 1, 'pages')),
+    ]
+    for nombre, fn in casos:
+        mediana, maximo = _medir(root, fn, repeticiones)
+        print(f"{nombre:>24}: mediana {mediana:8.2f} ms | máx {maximo:8.2f} ms")
+
+    # Modo ordenar: una flecha intercambia dos tarjetas
+    view._scroll_grilla('moveto', 0)
+    view.productos_ordenados = list(view.productos)
+    view.modo_orden.set(True)
+    view._draw_productos()
+    root.update_idletasks()
+    mediana, maximo = _medir(root, lambda: view._mover_por_indice(5, 1), repeticiones)
+    print(f"{'flecha modo ordenar':>24}: mediana {mediana:8.2f} ms | máx {maximo:8.2f} ms")
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Benchmark de la importación offline (sync_utils.import_from_db).
+
+Siembra una temporada en la base temporal (cajas cerradas con caja_uuid, una
+venta por ticket, un item por ticket), la copia con VACUUM INTO como base de
+otro equipo, borra el historial local y mide:
+- importación completa (todo nuevo),
+- reimportación completa de la misma base (todo duplicado: sólo búsquedas por clave),
+  leyendo de una instantánea (API de backup) y del origen inmutable, sin copiarlo,
+- reimportación sin cambios (misma huella: no se abre el origen),
+- importación incremental tras agregar una caja nueva en el origen (sólo se
+  lee lo posterior a las marcas de agua).
+Verifica que la primera inserte todo, las reimportaciones nada y la
+incremental sólo lo agregado.
+Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python tools/bench_import.py [tickets] [tickets_por_caja]
+"""
+import os
+import sys
+import tempfile
+import time
+import random
+import uuid
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_import_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection, transaction, open_connection  # noqa: E402
+from sync_utils import import_from_db  # noqa: E402
+
+
+def _sembrar(n_tickets, tickets_por_caja):
+    rnd = random.Random(7)
+    with transaction() as conn:
+        cur = conn.cursor()
+        pos_uuid = cur.execute("SELECT pos_uuid FROM pos LIMIT 1").fetchone()[0]
+        metodos = [r[0] for r in cur.execute("SELECT id FROM metodos_pago ORDER BY id").fetchall()]
+        productos = [r[0] for r in cur.execute("SELECT id FROM products").fetchall()]
+        n_cajas = max(1, n_tickets // tickets_por_caja)
+        numero = 0
+        for i in range(n_cajas):
+            fecha = f"{2024 + i // 336}-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}"
+            cur.execute(
+                "INSERT INTO caja_diaria (caja_uuid, pos_uuid, codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+                "VALUES (?, ?, ?, 'BAR', ?, '18:00:00', 5000, 'cerrada')",
+                (str(uuid.uuid4()), pos_uuid, f"BAR-{i:04d}", fecha),
+            )
+            caja_id = cur.lastrowid
+            for j in range(tickets_por_caja):
+                numero += 1
+                fecha_hora = f"{fecha} {18 + j // 3600 % 6:02d}:{j // 60 % 60:02d}:{j % 60:02d}"
+                precio = rnd.choice((1000, 1500, 2000, 3000))
+                cur.execute(
+                    "INSERT INTO ventas (fecha_hora, total_venta, metodo_pago_id, caja_id) VALUES (?, ?, ?, ?)",
+                    (fecha_hora, precio, rnd.choice(metodos), caja_id),
+                )
+                cur.execute(
+                    "INSERT INTO tickets (venta_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (cur.lastrowid, rnd.choice(productos), fecha_hora,
+                     'Anulado' if rnd.random() < 0.03 else 'Impreso', precio, f"T{numero:07d}"),
+                )
+                cur.execute(
+                    "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) "
+                    "SELECT id, producto_id, 1, total_ticket, total_ticket FROM tickets WHERE id = ?",
+                    (cur.lastrowid,),
+                )
+    return n_cajas, numero
+
+
+def _borrar_historial():
+    with transaction() as conn:
+        for tabla in ('venta_items', 'tickets', 'ventas', 'caja_movimiento', 'caja_resumen', 'ventas_diarias', 'caja_diaria',
+                      'import_watermarks'):
+            conn.execute(f"DELETE FROM {tabla}")
+
+
+def _importar(origen, completo=False, inmutable=None):
+    t0 = time.perf_counter()
+    res = import_from_db(origen, incluir_historial=True, completo=completo, inmutable=inmutable)
+    return (time.perf_counter() - t0) * 1000, res
+
+
+def _agregar_caja(origen, n_tickets):
+    """Una caja cerrada nueva en el origen, con n_tickets ventas/tickets/items."""
+    src = open_connection(origen)
+    try:
+        with src:
+            pos_uuid = src.execute("SELECT pos_uuid FROM pos LIMIT 1").fetchone()[0]
+            caja_id = src.execute(
+                "INSERT INTO caja_diaria (caja_uuid, pos_uuid, codigo_caja, disciplina, fecha, hora_apertura, fondo_inicial, estado) "
+                "VALUES (?, ?, 'BAR-NUEVA', 'BAR', '2030-01-01', '18:00:00', 5000, 'cerrada')",
+                (str(uuid.uuid4()), pos_uuid),
+            ).lastrowid
+            for j in range(n_tickets):
+                fecha_hora = f"2030-01-01 {18 + j // 3600 % 6:02d}:{j // 60 % 60:02d}:{j % 60:02d}"
+                venta_id = src.execute(
+                    "INSERT INTO ventas (fecha_hora, total_venta, metodo_pago_id, caja_id) VALUES (?, 1000, 1, ?)",
+                    (fecha_hora, caja_id),
+                ).lastrowid
+                ticket_id = src.execute(
+                    "INSERT INTO tickets (venta_id, producto_id, fecha_hora, status, total_ticket, identificador_ticket) "
+                    "VALUES (?, 1, ?, 'Impreso', 1000, ?)",
+                    (venta_id, fecha_hora, f"N{j:07d}"),
+                ).lastrowid
+                src.execute(
+                    "INSERT INTO venta_items (ticket_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?, 1, 1, 1000, 1000)",
+                    (ticket_id,),
+                )
+    finally:
+        src.close()
+
+
+def main():
+    n_tickets = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    tickets_por_caja = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    init_db()
+    n_cajas, n_tickets = _sembrar(n_tickets, tickets_por_caja)
+    origen = os.path.join(os.environ['LOCALAPPDATA'], 'otro_equipo.db')
+    get_connection().execute("VACUUM INTO ?", (origen,))
+    _borrar_historial()
+    print(f"origen: {n_cajas} cajas, {n_tickets} ventas/tickets/items")
+
+    ms, res = _importar(origen)
+    assert res['cajas_nuevas'] == n_cajas and res['tickets_nuevos'] == n_tickets and res['items_nuevos'] == n_tickets, res
+    print(f"{'importación completa':>24}: {ms:10.1f} ms ({n_tickets / ms * 1000:,.0f} tickets/s)")
+
+    for nombre, inmutable in (('instantánea', False), ('inmutable', True)):
+        ms, res = _importar(origen, completo=True, inmutable=inmutable)
+        assert not any(res[k] for k in ('cajas_nuevas', 'ventas_nuevas', 'tickets_nuevos', 'items_nuevos')), res
+        print(f"{'reimportación ' + nombre:>24}: {ms:10.1f} ms")
+
+    ms, res = _importar(origen)
+    assert res['sin_cambios'], res
+    print(f"{'reimportación sin cambios':>24}: {ms:10.1f} ms")
+
+    _agregar_caja(origen, tickets_por_caja)
+    ms, res = _importar(origen)
+    assert res['incremental'] and res['cajas_nuevas'] == 1 and res['src_tickets'] == tickets_por_caja, res
+    assert res['tickets_nuevos'] == tickets_por_caja and res['items_nuevos'] == tickets_por_caja, res
+    print(f"{'incremental (1 caja)':>24}: {ms:10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark de ImportIndex (deduplicación en memoria de la importación).
+
+Con la misma temporada sintética que tools/bench_import.py mide:
+- carga del índice: tiempo y memoria (tracemalloc), contra los mismos
+  diccionarios con claves sin empaquetar (tuplas de textos y floats),
+- búsqueda de todas las ventas/tickets/items del origen: consulta por fila
+  (como importaba antes sync_utils) contra el índice,
+- import_from_db completo y reimportación, resolviendo con SQL y con el índice.
+Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python tools/bench_import_index.py [tickets] [tickets_por_caja]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_import_index_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection, open_connection  # noqa: E402
+from import_index import ImportIndex, firma_item  # noqa: E402
+from sync_utils import import_from_db  # noqa: E402
+from bench_import import _sembrar, _borrar_historial  # noqa: E402
+
+TABLAS = ('caja_diaria', 'ventas', 'tickets', 'venta_items')
+
+
+def _ms(t0):
+    return (time.perf_counter() - t0) * 1000
+
+
+def _cargar_sin_empaquetar(cur):
+    """Los mismos diccionarios con las filas tal cual vienen de SQLite."""
+    cajas = {u: i for i, u in cur.execute("SELECT id, caja_uuid FROM caja_diaria ORDER BY id DESC")}
+    ventas = {(c, f, t): i for i, c, f, t in cur.execute("SELECT id, caja_id, fecha_hora, total_venta FROM ventas ORDER BY id DESC")}
+    tickets = {(n, f): i for i, n, f in cur.execute("SELECT id, identificador_ticket, fecha_hora FROM tickets ORDER BY id DESC")}
+    items = {}
+    for t, *firma in cur.execute("SELECT ticket_id, producto_id, cantidad, precio_unitario, subtotal FROM venta_items"):
+        items.setdefault(t, []).append(tuple(firma))
+    return cajas, ventas, tickets, items
+
+
+def _medir_carga(fn):
+    """Tiempo (sin tracemalloc, que lo distorsiona) y memoria que queda ocupada."""
+    t0 = time.perf_counter()
+    fn()
+    ms = _ms(t0)
+    tracemalloc.start()
+    resultado = fn()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return ms, memoria, resultado
+
+
+def _cargar_indice(cur):
+    indice = ImportIndex()
+    for tabla in TABLAS:
+        indice.cargar(cur, tabla)
+    return indice
+
+
+def main():
+    n_tickets = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    tickets_por_caja = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    init_db()
+    n_cajas, n_tickets = _sembrar(n_tickets, tickets_por_caja)
+    origen = os.path.join(os.environ['LOCALAPPDATA'], 'otro_equipo.db')
+    get_connection().execute("VACUUM INTO ?", (origen,))
+    print(f"origen: {n_cajas} cajas, {n_tickets} ventas/tickets/items")
+
+    cur = get_connection().cursor()
+    ms, memoria, _ = _medir_carga(lambda: _cargar_sin_empaquetar(cur))
+    print(f"{'carga sin empaquetar':>28}: {ms:9.1f} ms | {memoria / 2**20:7.1f} MiB")
+    ms, memoria, indice = _medir_carga(lambda: _cargar_indice(cur))
+    print(f"{'carga ImportIndex':>28}: {ms:9.1f} ms | {memoria / 2**20:7.1f} MiB")
+
+    # Búsqueda de cada fila del origen (ya están todas en la base local)
+    src = open_connection(origen)
+    ventas = src.execute("SELECT caja_id, fecha_hora, total_venta FROM ventas").fetchall()
+    tickets = src.execute("SELECT id, identificador_ticket, fecha_hora FROM tickets").fetchall()
+    items = src.execute("SELECT ticket_id, producto_id, cantidad, precio_unitario, subtotal FROM venta_items").fetchall()
+    src.close()
+
+    consultas = (
+        ("ventas", ventas,
+         lambda v: cur.execute("SELECT id FROM ventas WHERE fecha_hora=? AND ABS(total_venta-?)<0.0001 AND caja_id=? LIMIT 1",
+                               (v[1], v[2], v[0])).fetchone(),
+         lambda v: indice.buscar_venta(*v)),
+        ("tickets", tickets,
+         lambda t: cur.execute("SELECT id FROM tickets WHERE identificador_ticket=? AND fecha_hora=? LIMIT 1",
+                               (t[1], t[2])).fetchone(),
+         lambda t: indice.buscar_ticket(t[1], t[2])),
+        ("items", items,
+         lambda i: cur.execute("SELECT 1 FROM venta_items WHERE ticket_id=? AND cantidad=? AND ABS(precio_unitario-?)<0.0001 "
+                               "AND ABS(subtotal-?)<0.0001 AND producto_id=? LIMIT 1",
+                               (i[0], i[2], i[3], i[4], i[1])).fetchone(),
+         lambda i: indice.existe_item(i[0], firma_item(*i[1:]))),
+    )
+    for nombre, filas, por_consulta, en_indice in consultas:
+        t0 = time.perf_counter()
+        for fila in filas:
+            por_consulta(fila)
+        sql = _ms(t0)
+        t0 = time.perf_counter()
+        encontrados = sum(bool(en_indice(fila)) for fila in filas)
+        memoria = _ms(t0)
+        assert encontrados == len(filas), (nombre, encontrados)
+        print(f"{'búsqueda ' + nombre:>28}: por fila (SQL) {sql * 1000 / len(filas):8.2f} µs | "
+              f"ImportIndex {memoria * 1000 / len(filas):6.2f} µs")
+
+    # import_from_db de punta a punta con cada estrategia
+    for nombre, crear in (("SQL", lambda: None), ("ImportIndex", ImportIndex)):
+        _borrar_historial()
+        t0 = time.perf_counter()
+        res = import_from_db(origen, indice=crear())
+        completa = _ms(t0)
+        assert res['tickets_nuevos'] == n_tickets and res['items_nuevos'] == n_tickets, res
+        t0 = time.perf_counter()
+        res = import_from_db(origen, indice=crear(), completo=True)
+        reimportacion = _ms(t0)
+        assert not any(res[k] for k in ('cajas_nuevas', 'ventas_nuevas', 'tickets_nuevos', 'items_nuevos')), res
+        print(f"{'import_from_db ' + nombre:>28}: completa {completa:9.1f} ms | reimportación {reimportacion:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
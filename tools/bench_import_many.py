@@ -0,0 +1,75 @@
+"""Benchmark de la combinación de varias bases (sync_utils.import_many).
+
+Siembra una base por caja registradora (cada una con su pos_uuid e
+identificadores de ticket propios), las copia con VACUUM INTO y mide, sobre el
+historial local vacío:
+- importarlas de a una con import_from_db (cada una en su transacción),
+- import_many con un solo hilo de lectura,
+- import_many con el pool por defecto (un hilo por base).
+Verifica que las tres dejen los mismos totales.
+Usa una base temporal (no toca la de AppData).
+
+Uso:
+    python tools/bench_import_many.py [bases] [tickets_por_base] [tickets_por_caja]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+# Base temporal: utils_paths resuelve DB_PATH a partir de LOCALAPPDATA al importarse
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='bench_import_many_')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'BuffetApp'))
+
+from init_db import init_db  # noqa: E402
+from db_utils import get_connection, transaction  # noqa: E402
+from sync_utils import import_from_db, import_many  # noqa: E402
+from bench_import import _sembrar, _borrar_historial  # noqa: E402
+
+
+def _totales():
+    cur = get_connection().cursor()
+    return tuple(cur.execute(q).fetchone() for q in (
+        "SELECT COUNT(*), SUM(total_ticket) FROM tickets",
+        "SELECT COUNT(*), SUM(subtotal) FROM venta_items",
+        "SELECT COUNT(*) FROM caja_diaria",
+    ))
+
+
+def _medir(nombre, fn):
+    _borrar_historial()
+    t0 = time.perf_counter()
+    fn()
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"{nombre:>28}: {ms:10.1f} ms")
+    return _totales()
+
+
+def main():
+    n_bases = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    n_tickets = int(sys.argv[2]) if len(sys.argv) > 2 else 40_000
+    tickets_por_caja = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    init_db()
+    origenes = []
+    for k in range(n_bases):
+        _borrar_historial()
+        _sembrar(n_tickets, tickets_por_caja)
+        with transaction() as conn:
+            conn.execute("UPDATE tickets SET identificador_ticket = ? || identificador_ticket", (f"C{k}-",))
+            conn.execute("UPDATE settings SET value = ? WHERE key = 'device_pos_uuid'", (str(uuid.uuid4()),))
+        origen = os.path.join(os.environ['LOCALAPPDATA'], f'caja_{k}.db')
+        get_connection().execute("VACUUM INTO ?", (origen,))
+        origenes.append(origen)
+    print(f"{n_bases} bases de {n_tickets} ventas/tickets/items")
+
+    secuencial = _medir("import_from_db de a una", lambda: [import_from_db(o) for o in origenes])
+    un_hilo = _medir("import_many (1 hilo)", lambda: import_many(origenes, max_workers=1))
+    pool = _medir("import_many (pool)", lambda: import_many(origenes))
+    assert secuencial == un_hilo == pool, (secuencial, un_hilo, pool)
+    assert pool[0][0] == n_bases * n_tickets, pool
+
+
+if __name__ == '__main__':
+    main()